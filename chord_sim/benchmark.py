@@ -0,0 +1,951 @@
+# coding:utf-8
+
+# シミュレータ上に構築したChordネットワークに対して各種処理の性能を計測するスクリプト
+# 使い方: python benchmark.py <ベンチマーク名> [オプション]
+#   query : 複数スレッドから global_get を同時に発行し、stabilize処理と並行してクエリを処理できる
+#           スループットとレイテンシを計測する
+#   store : 単一ノードの DataStore に対する store_new_data と get の1秒あたりの処理回数を計測する
+#   stabilize : ノードをシャードに分割し、複数のワーカープロセスで stabilize処理 を行った場合の
+#               1秒あたりのラウンド数(全ノードでの stabilize処理 の回数)を計測する
+#   routing : 通信の遅延を模擬した上で、反復的な探索と再帰的な探索それぞれの find_successor の
+#             ホップ数とレイテンシを計測する
+#   pns : 座標による遅延のモデルのもとで、経路表の近接性を考慮した選択(Proximity Neighbor Selection)の
+#         有無による探索のレイテンシとストレッチを計測する
+#   replica : asyncio で実行する put において、通信の遅延を模擬した上で、レプリカの配布を配布先に対して
+#             順に行った場合と並行して行った場合の1秒あたりの put の回数を計測する. put の回数には、ホップごとに
+#             遅延を待つ担当ノードの探索の時間も含まれる
+#   async_stabilize : 全ノードの stabilize処理 をノードごとのコルーチンとして1つのイベントループ上で実行し、1秒あたりの
+#                     stabilize処理 の周回数と、並行して asyncio で発行した global_get のレイテンシと成功数、
+#                     stabilize処理 を行わずに参加させたノードを含めた経路表の収束の度合いを計測する
+#   succ_list : successor_info_list を stabilize_successor_inner の応答に含める(piggyback)場合と含めない場合の、
+#               stabilize_successor 1回あたりの他ノードへの呼び出し回数を計測する
+#   churn : 全ノードの stabilize処理 を繰り返す場合と、メンバーシップの変化を通知されたノードのみ stabilize処理 を
+#           行う場合の、変化の無いネットワークでのCPU使用率と、ノードのダウンと参加の後に経路表が収束するまでの時間を計測する
+#   transfer : join時の successor からのデータの委譲と全データの受け取りを、一度に行う場合と DataChunk に分割して行う場合の
+#              所要時間と、並行して successor に対して発行した get のレイテンシの最大値を計測する
+#   restart : ダウンしたノードを同じアドレスで再起動させる際に、隣接ノードから全データを受け取る場合と、ディスクから
+#             保持データを復元して差分のみを受け取る場合の、再参加に要する時間を計測する
+#   engine : DataStore の保持データを dict に格納する場合と MmapValueStore に格納する場合の、1エントリあたりの
+#            プロセスのヒープの使用量と、get とダイジェストの生成の速度を計測する
+#   compaction : MmapValueStore に上書きと削除を繰り返した際の値のログのサイズと、並行して発行した get のレイテンシの最大値を、
+#                do_compaction を行わない場合、読み書きの量を制限せずに行う場合、制限して行う場合とで比較する
+#   reconcile : 同じデータの複数の版のレプリカが順序を入れ替えて届いた場合に、最新でない値が残ったデータの数と受け取りの速度を、
+#               版を比較して格納する場合と受け取った順に上書きする場合とで比較する
+
+import argparse
+import asyncio
+import bisect
+import contextlib
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple, cast
+
+import modules.gval as gval
+from modules.chord_util import ChordUtil, DataChunk, DataIdAndValue
+from modules.chord_node import ChordNode
+from modules.stabilizer import Stabilizer
+from modules.log_writer import LogLevel
+from modules.sharded_stabilizer import ShardedStabilizer
+from modules.async_runtime import AsyncChordRuntime
+from modules.latency_model import CoordinateLatencyModel
+from modules.stabilize_notifier import StabilizeNotifier
+from modules.data_store_persister import DataStorePersister
+from modules.data_store import DataStore
+from modules.mmap_value_store import MmapValueStore
+import chord_sim
+
+BENCH_NODE_NUM = 30
+BENCH_DATA_NUM = 300
+
+# ネットワークの構築とデータのputを行う
+# 各ノードのjoinの度に全ノードでstabilize処理を行い、経路表が整った状態のネットワークとする
+def build_network(node_num : int, data_num : int) -> List[int]:
+    first_node = ChordNode("THIS_VALUE_IS_NOT_USED", first_node=True)
+    first_node.is_join_op_finished = True
+    gval.all_node_dict[first_node.node_info.address_str] = first_node
+    for _ in range(node_num - 1):
+        chord_sim.add_new_node()
+        stabilize_all_node_once()
+    for _ in range(3):
+        stabilize_all_node_once()
+    gval.is_network_constructed = True
+
+    data_id_list : List[int] = []
+    for _ in range(data_num):
+        chord_sim.do_put_on_random_node()
+    for kv_data in gval.all_data_list:
+        data_id_list.append(kv_data.data_id)
+    return data_id_list
+
+def stabilize_all_node_once():
+    node_list = list(gval.all_node_dict.values())
+    chord_sim.do_stabilize_successor_th(node_list)
+    chord_sim.do_stabilize_ftable_th(node_list)
+
+# 比較用に、従来の排他ロック(re-entrantロック)を ReentrantRWLock と同じインタフェースで利用するためのクラス
+class ExclusiveLock:
+
+    def __init__(self):
+        self.lock : threading.RLock = threading.RLock()
+
+    def acquire_read(self, timeout : float = -1) -> bool:
+        return self.lock.acquire(timeout=timeout)
+
+    def release_read(self):
+        self.lock.release()
+
+    def acquire_write(self, timeout : float = -1) -> bool:
+        return self.lock.acquire(timeout=timeout)
+
+    def release_write(self):
+        self.lock.release()
+
+    def gen_rlock(self) -> threading.RLock:
+        return self.lock
+
+    def gen_wlock(self) -> threading.RLock:
+        return self.lock
+
+def replace_routing_locks_with_exclusive_lock():
+    for node in gval.all_node_dict.values():
+        node.node_info.lock_of_pred_info = ExclusiveLock()
+        node.node_info.lock_of_succ_infos = ExclusiveLock()
+
+# is_running がFalseになるまで全ノードの stabilize処理 を繰り返す
+def stabilize_loop_th(is_running : List[bool]):
+    while is_running[0]:
+        stabilize_all_node_once()
+
+def query_th(data_id_list : List[int], is_running : List[bool], latency_list : List[float]):
+    while is_running[0]:
+        node = chord_sim.get_a_random_node()
+        data_id = random.choice(data_id_list)
+        start = time.perf_counter()
+        node.global_get(data_id)
+        latency_list.append(time.perf_counter() - start)
+
+# 各スレッド数で duration_sec 秒間クエリを発行し続け、(スループット[クエリ/秒], 平均レイテンシ[ミリ秒], 99パーセンタイルレイテンシ[ミリ秒])
+# を返す
+def bench_concurrent_query(data_id_list : List[int], thread_num_list : List[int], duration_sec : float,
+                           with_stabilize : bool) -> Dict[int, Tuple[float, float, float]]:
+    results : Dict[int, Tuple[float, float, float]] = {}
+    for thread_num in thread_num_list:
+        is_running = [True]
+        latency_lists : List[List[float]] = [[] for _ in range(thread_num)]
+        thread_list : List[threading.Thread] = [
+            threading.Thread(target=query_th, args=(data_id_list, is_running, latency_lists[idx]))
+            for idx in range(thread_num)]
+        if with_stabilize:
+            thread_list.append(threading.Thread(target=stabilize_loop_th, args=(is_running,)))
+        for thread in thread_list:
+            thread.start()
+        time.sleep(duration_sec)
+        is_running[0] = False
+        for thread in thread_list:
+            thread.join()
+
+        latencies = sorted([latency for latency_list in latency_lists for latency in latency_list])
+        if len(latencies) == 0:
+            results[thread_num] = (0.0, 0.0, 0.0)
+            continue
+        results[thread_num] = (len(latencies) / duration_sec,
+                               sum(latencies) / len(latencies) * 1000,
+                               latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000)
+    return results
+
+def run_query_bench(args : argparse.Namespace):
+    thread_num_list = [int(num) for num in args.threads.split(",")]
+    # dprintによる大量の出力を抑制する
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        random.seed(args.seed)
+        data_id_list = build_network(args.nodes, args.data)
+        if args.exclusive_lock:
+            replace_routing_locks_with_exclusive_lock()
+        results = bench_concurrent_query(data_id_list, thread_num_list, args.duration, not args.no_stabilize)
+        # 非同期に出力されるログが出力先を戻した後に書き出されないようにする
+        ChordUtil.flush_log()
+
+    print("lock=" + ("exclusive" if args.exclusive_lock else "rwlock") + ",nodes=" + str(args.nodes)
+          + ",stabilize=" + str(not args.no_stabilize))
+    print("threads,queries_per_sec,mean_latency_ms,p99_latency_ms")
+    for thread_num, (qps, mean_ms, p99_ms) in results.items():
+        print(str(thread_num) + "," + "{:.1f}".format(qps) + "," + "{:.3f}".format(mean_ms) + "," + "{:.3f}".format(p99_ms))
+
+# 単一ノードの DataStore に対して key_num 個のデータの store_new_data と get を rounds 回ずつ繰り返し、
+# (store_new_data [回/秒], get [回/秒]) を返す
+def bench_data_store(key_num : int, rounds : int) -> Tuple[float, float]:
+    node = ChordNode("THIS_VALUE_IS_NOT_USED", first_node=True)
+    data_id_list = [ChordUtil.hash_str_to_int(str(idx)) for idx in range(key_num)]
+    value_str = "value"
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for data_id in data_id_list:
+            node.data_store.store_new_data(data_id, value_str)
+    put_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for data_id in data_id_list:
+            node.data_store.get(data_id)
+    get_elapsed = time.perf_counter() - start
+
+    op_num = key_num * rounds
+    return op_num / put_elapsed, op_num / get_elapsed
+
+def run_store_bench(args : argparse.Namespace):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        random.seed(args.seed)
+        put_ops, get_ops = bench_data_store(args.keys, args.rounds)
+        ChordUtil.flush_log()
+
+    print("keys=" + str(args.keys) + ",rounds=" + str(args.rounds))
+    print("op,ops_per_sec")
+    print("store_new_data," + "{:.1f}".format(put_ops))
+    print("get," + "{:.1f}".format(get_ops))
+
+# 比較用に、シャードに分割せず、このプロセス内で全ノードの stabilize処理 を rounds 回行い、1秒あたりのラウンド数を返す
+def bench_stabilize_in_process(rounds : int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        stabilize_all_node_once()
+    return rounds / (time.perf_counter() - start)
+
+# worker_num 個のワーカープロセスで全ノードの stabilize処理 を rounds 回行い、(1秒あたりのラウンド数, 失敗回数) を返す.
+# ワーカープロセスの生成と終了にかかる時間は含めない
+def bench_sharded_stabilize(worker_num : int, rounds : int, transport_kind : str) -> Tuple[float, int]:
+    sharded_stabilizer = ShardedStabilizer(worker_num, transport_kind)
+    try:
+        failed_cnt = 0
+        start = time.perf_counter()
+        for _ in range(rounds):
+            failed_cnt += sharded_stabilizer.stabilize_once()
+        elapsed = time.perf_counter() - start
+    finally:
+        sharded_stabilizer.shutdown()
+    return rounds / elapsed, failed_cnt
+
+def run_stabilize_bench(args : argparse.Namespace):
+    worker_num_list = [int(num) for num in args.workers.split(",")]
+    results : Dict[int, Tuple[float, int]] = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        random.seed(args.seed)
+        build_network(args.nodes, args.data)
+        gval.LOG_LEVEL = LogLevel.NONE
+        in_process_rps = bench_stabilize_in_process(args.rounds)
+        for worker_num in worker_num_list:
+            results[worker_num] = bench_sharded_stabilize(worker_num, args.rounds, args.transport)
+        ChordUtil.flush_log()
+
+    print("nodes=" + str(args.nodes) + ",rounds=" + str(args.rounds) + ",cpus=" + str(os.cpu_count())
+          + ",transport=" + args.transport)
+    print("workers,rounds_per_sec,failed_ops")
+    print("in-process," + "{:.3f}".format(in_process_rps) + ",-")
+    for worker_num, (rps, failed_cnt) in results.items():
+        print(str(worker_num) + "," + "{:.3f}".format(rps) + "," + str(failed_cnt))
+
+# ランダムに選んだノードから put_num 回の global_put を順に行い、1秒あたりの put の回数と失敗回数を返す
+async def bench_async_put(runtime : AsyncChordRuntime, put_num : int) -> Tuple[float, int]:
+    node_list = list(gval.all_node_dict.values())
+    failed_cnt = 0
+    start = time.perf_counter()
+    for idx in range(put_num):
+        async_node = runtime.get_async_node(random.choice(node_list))
+        data_id = ChordUtil.hash_str_to_int("async_put_" + str(idx))
+        if await async_node.global_put(data_id, "value" + str(idx)) == False:
+            failed_cnt += 1
+    return put_num / (time.perf_counter() - start), failed_cnt
+
+def run_replica_bench(args : argparse.Namespace):
+    results : Dict[str, Tuple[float, int]] = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        random.seed(args.seed)
+        build_network(args.nodes, args.data)
+        gval.LOG_LEVEL = LogLevel.NONE
+        gval.ASYNC_RPC_LATENCY_SEC = args.latency_ms / 1000.0
+        runtime = AsyncChordRuntime()
+        for fanout_name, is_concurrent in [("sequential", False), ("gather", True)]:
+            runtime.is_concurrent_replica_fanout = is_concurrent
+            results[fanout_name] = asyncio.run(bench_async_put(runtime, args.puts))
+        ChordUtil.flush_log()
+
+    print("nodes=" + str(args.nodes) + ",puts=" + str(args.puts) + ",latency_ms=" + str(args.latency_ms)
+          + ",replicas=" + str(gval.SUCCESSOR_LIST_NORMAL_LEN))
+    print("fanout,puts_per_sec,failed_ops")
+    for fanout_name, (pps, failed_cnt) in results.items():
+        print(fanout_name + "," + "{:.1f}".format(pps) + "," + str(failed_cnt))
+
+# runtime.run_stabilize で全ノードの stabilize処理 を各ノード interval_sec 秒おきに duration_sec 秒間行い、それと並行して、ランダムに選んだノードから
+# data_id_list 内のデータの global_get を順に発行し続ける.
+# (1秒あたりの全ノードでの stabilize処理 の周回数, 平均レイテンシ[ms], 99パーセンタイルのレイテンシ[ms], 成功した get の数, 発行した get の数)
+# を返す
+async def bench_async_stabilize(runtime : AsyncChordRuntime, duration_sec : float, interval_sec : float, data_id_list : List[int],
+                                value_dict : Dict[int, str]) -> Tuple[float, float, float, int, int]:
+    node_list = list(gval.all_node_dict.values())
+    latency_list : List[float] = []
+    ok_cnt = 0
+
+    async def query_loop():
+        nonlocal ok_cnt
+        end_time = time.monotonic() + duration_sec
+        while time.monotonic() < end_time:
+            data_id = random.choice(data_id_list)
+            start = time.perf_counter()
+            got_value_str = await runtime.get_async_node(random.choice(node_list)).global_get(data_id)
+            latency_list.append(time.perf_counter() - start)
+            if got_value_str == value_dict[data_id]:
+                ok_cnt += 1
+
+    round_cnt, _ = await asyncio.gather(runtime.run_stabilize(duration_sec, interval_sec), query_loop())
+    latency_list.sort()
+    if len(latency_list) == 0:
+        return round_cnt / duration_sec, 0.0, 0.0, 0, 0
+    return (round_cnt / duration_sec, 1000 * sum(latency_list) / len(latency_list),
+            1000 * latency_list[min(len(latency_list) - 1, int(len(latency_list) * 0.99))], ok_cnt, len(latency_list))
+
+# nodes 個のノードで経路表が整ったネットワークを構築した後、joins 個のノードを stabilize処理 を行わずに参加させ、
+# それらの経路表を AsyncChordRuntime 上の stabilize処理 で整えながら計測を行う
+def run_async_stabilize_bench(args : argparse.Namespace):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        random.seed(args.seed)
+        data_id_list = build_network(args.nodes, args.data)
+        gval.LOG_LEVEL = LogLevel.NONE
+        for _ in range(args.joins):
+            chord_sim.add_new_node()
+        value_dict = {kv_data.data_id : kv_data.value_data for kv_data in gval.all_data_list}
+        bad_cnt_before = count_bad_routing_infos(list(gval.all_node_dict.values()))
+        gval.ASYNC_RPC_LATENCY_SEC = args.latency_ms / 1000.0
+        runtime = AsyncChordRuntime()
+        rps, mean_ms, p99_ms, ok_cnt, get_cnt = asyncio.run(bench_async_stabilize(runtime, args.duration, args.interval, data_id_list, value_dict))
+        bad_cnt_after = count_bad_routing_infos(list(gval.all_node_dict.values()))
+        ChordUtil.flush_log()
+
+    print("nodes=" + str(args.nodes + args.joins) + ",joins=" + str(args.joins) + ",duration=" + str(args.duration)
+          + ",interval=" + str(args.interval) + ",latency_ms=" + str(args.latency_ms))
+    print("rounds_per_sec,get_mean_latency_ms,get_p99_latency_ms,gets_ok,gets_issued,bad_routing_infos_before,bad_routing_infos_after")
+    print("{:.1f}".format(rps) + "," + "{:.3f}".format(mean_ms) + "," + "{:.3f}".format(p99_ms) + "," + str(ok_cnt) + ","
+          + str(get_cnt) + "," + str(bad_cnt_before) + "," + str(bad_cnt_after))
+
+# ランダムに選んだノードからランダムなIDに対する find_successor を lookup_num 回行い、
+# (平均ホップ数, 平均レイテンシ[ms], 99パーセンタイルのレイテンシ[ms], 平均ストレッチ, 誤った担当ノードを得たか失敗した回数) を返す.
+# ストレッチは、探索のレイテンシを起点のノードから担当ノードへの直接の通信の遅延で割った値
+def bench_lookup(lookup_num : int, recursive : bool) -> Tuple[float, float, float, float, int]:
+    node_list = list(gval.all_node_dict.values())
+    sorted_node_ids = sorted(node.node_info.node_id for node in node_list)
+    for node in node_list:
+        node.router.lookup_cnt = 0
+        node.router.lookup_hop_cnt_sum = 0
+
+    latency_list : List[float] = []
+    stretch_list : List[float] = []
+    failed_cnt = 0
+    for _ in range(lookup_num):
+        node = random.choice(node_list)
+        target_id = random.randint(0, gval.ID_MAX)
+        start = time.perf_counter()
+        ret = node.router.find_successor(target_id, recursive=recursive)
+        latency = time.perf_counter() - start
+        latency_list.append(latency)
+        owner_id = sorted_node_ids[bisect.bisect_left(sorted_node_ids, target_id) % len(sorted_node_ids)]
+        if ret.is_ok == False or cast(ChordNode, ret.result).node_info.node_id != owner_id:
+            failed_cnt += 1
+            continue
+        direct_latency = ChordUtil.get_link_latency(node.node_info.address_str, cast(ChordNode, ret.result).node_info.address_str)
+        if direct_latency > 0:
+            stretch_list.append(latency / direct_latency)
+
+    hop_cnt_sum = sum(node.router.lookup_hop_cnt_sum for node in node_list)
+    lookup_cnt = sum(node.router.lookup_cnt for node in node_list)
+    latency_list.sort()
+    return (hop_cnt_sum / max(lookup_cnt, 1), 1000 * sum(latency_list) / len(latency_list),
+            1000 * latency_list[int(len(latency_list) * 0.99)], sum(stretch_list) / max(len(stretch_list), 1), failed_cnt)
+
+def print_lookup_results(results : Dict[str, Tuple[float, float, float, float, int]]):
+    print("mode,mean_hops,mean_latency_ms,p99_latency_ms,mean_stretch,failed_ops")
+    for mode_name, (mean_hops, mean_ms, p99_ms, mean_stretch, failed_cnt) in results.items():
+        print(mode_name + "," + "{:.2f}".format(mean_hops) + "," + "{:.3f}".format(mean_ms) + ","
+              + "{:.3f}".format(p99_ms) + "," + "{:.2f}".format(mean_stretch) + "," + str(failed_cnt))
+
+def run_routing_bench(args : argparse.Namespace):
+    results : Dict[str, Tuple[float, float, float, float, int]] = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        random.seed(args.seed)
+        build_network(args.nodes, 0)
+        gval.LOG_LEVEL = LogLevel.NONE
+        gval.ENABLE_SIM_LINK_DELAY = True
+        gval.SIM_LINK_DELAY_SEC = args.link_delay_ms / 1000.0
+        for mode_name, recursive in [("iterative", False), ("recursive", True)]:
+            random.seed(args.seed)
+            results[mode_name] = bench_lookup(args.lookups, recursive)
+        ChordUtil.flush_log()
+
+    print("nodes=" + str(args.nodes) + ",lookups=" + str(args.lookups) + ",link_delay_ms=" + str(args.link_delay_ms))
+    print_lookup_results(results)
+
+# 座標による遅延のモデルのもとで、Proximity Neighbor Selection の有無による探索のレイテンシとストレッチを比較する.
+# 経路表の更新(stabilize処理)の間は遅延を模擬しない
+def run_pns_bench(args : argparse.Namespace):
+    results : Dict[str, Tuple[float, float, float, float, int]] = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        random.seed(args.seed)
+        build_network(args.nodes, 0)
+        gval.LOG_LEVEL = LogLevel.NONE
+        gval.latency_model = CoordinateLatencyModel(latency_per_unit_sec=args.max_latency_ms / 1000.0, seed=args.seed)
+        for mode_name, is_pns_enabled in [("no_pns", False), ("pns", True)]:
+            gval.ENABLE_PROXIMITY_NEIGHBOR_SELECTION = is_pns_enabled
+            for _ in range(2):
+                stabilize_all_node_once()
+            gval.ENABLE_SIM_LINK_DELAY = True
+            random.seed(args.seed)
+            results[mode_name] = bench_lookup(args.lookups, args.recursive)
+            gval.ENABLE_SIM_LINK_DELAY = False
+        ChordUtil.flush_log()
+
+    print("nodes=" + str(args.nodes) + ",lookups=" + str(args.lookups) + ",max_latency_ms=" + str(args.max_latency_ms)
+          + ",recursive=" + str(args.recursive))
+    print_lookup_results(results)
+
+# node_list 内のノードのうち、successor_info_list か predecessor_info が node_list 内のノードの
+# IDの並びと一致していないノードの数を返す
+def count_bad_routing_infos(node_list : List[ChordNode]) -> int:
+    sorted_node_ids = sorted(node.node_info.node_id for node in node_list)
+    expected_len = min(gval.SUCCESSOR_LIST_NORMAL_LEN, len(sorted_node_ids) - 1)
+    bad_cnt = 0
+    for node in node_list:
+        pos = sorted_node_ids.index(node.node_info.node_id)
+        expected_ids = [sorted_node_ids[(pos + offset) % len(sorted_node_ids)] for offset in range(1, expected_len + 1)]
+        pred_info = node.node_info.predecessor_info
+        if [node_info.node_id for node_info in node.node_info.successor_info_list] != expected_ids \
+                or pred_info == None or pred_info.node_id != sorted_node_ids[pos - 1]:
+            bad_cnt += 1
+    return bad_cnt
+
+# 全ノードの stabilize_successor を rounds 回行い、(stabilize_successor 1回あたりの他ノードへの呼び出し回数,
+# 1秒あたりのラウンド数, successor_info_list が正しい並びになっていないノードの数) を返す
+def bench_stabilize_successor(rounds : int) -> Tuple[float, float, int]:
+    node_list = list(gval.all_node_dict.values())
+    for node in node_list:
+        node.stabilizer.stabilize_successor_cnt = 0
+        node.stabilizer.stabilize_successor_rpc_cnt = 0
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        chord_sim.do_stabilize_successor_th(node_list)
+    elapsed = time.perf_counter() - start
+
+    bad_cnt = count_bad_routing_infos(node_list)
+    rpc_cnt = sum(node.stabilizer.stabilize_successor_rpc_cnt for node in node_list)
+    call_cnt = sum(node.stabilizer.stabilize_successor_cnt for node in node_list)
+    return rpc_cnt / max(call_cnt, 1), rounds / elapsed, bad_cnt
+
+def run_succ_list_bench(args : argparse.Namespace):
+    results : Dict[str, Tuple[float, float, int]] = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        random.seed(args.seed)
+        build_network(args.nodes, 0)
+        gval.LOG_LEVEL = LogLevel.NONE
+        for mode_name, is_piggyback in [("separate", False), ("piggyback", True)]:
+            gval.ENABLE_SUCC_LIST_PIGGYBACK = is_piggyback
+            results[mode_name] = bench_stabilize_successor(args.rounds)
+        ChordUtil.flush_log()
+
+    print("nodes=" + str(args.nodes) + ",rounds=" + str(args.rounds) + ",succ_list_len=" + str(gval.SUCCESSOR_LIST_NORMAL_LEN))
+    print("mode,rpcs_per_stabilize,rounds_per_sec,bad_succ_lists")
+    for mode_name, (rpcs_per_call, rps, bad_cnt) in results.items():
+        print(mode_name + "," + "{:.2f}".format(rpcs_per_call) + "," + "{:.2f}".format(rps) + "," + str(bad_cnt))
+
+# gval.stabilize_notifier が設定されていれば通知されたノードのみ、設定されていなければ全ノードの
+# stabilize処理 を duration_sec 秒間繰り返し、その間のCPU使用率(%)を返す.
+# 通知されたノードのみ行う場合、全ノードの stabilize処理 は gval.BACKGROUND_STABILIZE_INTERVAL_SEC 秒後から行う
+def bench_idle_stabilize(duration_sec : float) -> float:
+    start_cpu = time.process_time()
+    end_time = time.monotonic() + duration_sec
+    next_background_time = time.monotonic() + gval.BACKGROUND_STABILIZE_INTERVAL_SEC
+    while time.monotonic() < end_time:
+        if gval.stabilize_notifier != None:
+            next_background_time = chord_sim.do_stabilize_on_notification(next_background_time, end_time - time.monotonic())
+        else:
+            chord_sim.do_stabilize_once_at_all_node()
+    return 100 * (time.process_time() - start_cpu) / duration_sec
+
+# join_num 個のノードを参加させ、kill_num 個のノードをダウンさせた後、生存しているノードの successor_info_list と
+# predecessor_info が正しくなるまで stabilize処理 を繰り返し、(収束までの秒数, 発行した探索の数) を返す.
+# ダウンの検出のきっかけとなるよう、stabilize処理 の合間に lookup_num 回ずつランダムなIDの探索を行う.
+# timeout_sec 秒以内に収束しなかった場合は秒数として inf を返す
+def bench_churn_convergence(kill_num : int, join_num : int, lookup_num : int, timeout_sec : float) -> Tuple[float, int]:
+    # ダウンしたノードを経由する探索で join が失敗しリトライ待ちとなることを避けるため、join を先に行う
+    for _ in range(join_num):
+        chord_sim.add_new_node()
+    for _ in range(kill_num):
+        chord_sim.do_kill_a_random_node()
+
+    issued_lookup_cnt = 0
+    start = time.monotonic()
+    next_background_time = start + gval.BACKGROUND_STABILIZE_INTERVAL_SEC
+    while time.monotonic() - start < timeout_sec:
+        alive_node_list = [node for node in gval.all_node_dict.values() if node.is_alive]
+        if count_bad_routing_infos(alive_node_list) == 0:
+            return time.monotonic() - start, issued_lookup_cnt
+        for _ in range(lookup_num):
+            random.choice(alive_node_list).router.find_successor(random.randint(0, gval.ID_MAX))
+            issued_lookup_cnt += 1
+        if gval.stabilize_notifier != None:
+            next_background_time = chord_sim.do_stabilize_on_notification(next_background_time, 0.0)
+        else:
+            chord_sim.do_stabilize_once_at_all_node()
+    return float("inf"), issued_lookup_cnt
+
+# 同じネットワーク上で、全ノードの stabilize処理 を繰り返す場合(loop)と通知されたノードのみ行う場合(notification)の
+# 計測を順に行う. ダウンとjoinは各モードで別々に行うため、notification の計測は loop で収束した後のネットワークに対して行う
+def run_churn_bench(args : argparse.Namespace):
+    results : Dict[str, Tuple[float, float, int]] = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        random.seed(args.seed)
+        build_network(args.nodes, args.data)
+        gval.LOG_LEVEL = LogLevel.NONE
+        for mode_name, is_notification_enabled in [("loop", False), ("notification", True)]:
+            gval.stabilize_notifier = StabilizeNotifier() if is_notification_enabled else None
+            idle_cpu_percent = bench_idle_stabilize(args.idle_sec)
+            convergence_sec, lookup_cnt = bench_churn_convergence(args.kills, args.joins, args.lookups, args.timeout)
+            results[mode_name] = (idle_cpu_percent, convergence_sec, lookup_cnt)
+        gval.stabilize_notifier = None
+        ChordUtil.flush_log()
+
+    print("nodes=" + str(args.nodes) + ",kills=" + str(args.kills) + ",joins=" + str(args.joins)
+          + ",background_interval_sec=" + str(gval.BACKGROUND_STABILIZE_INTERVAL_SEC))
+    print("mode,idle_cpu_percent,convergence_sec,lookups_issued")
+    for mode_name, (idle_cpu_percent, convergence_sec, lookup_cnt) in results.items():
+        print(mode_name + "," + "{:.1f}".format(idle_cpu_percent) + "," + "{:.3f}".format(convergence_sec) + "," + str(lookup_cnt))
+
+# successor が key_num 個のデータを保持している状態で、新規ノードが join時 に行う委譲の受け取りと partial_join_op で行う
+# 全データの受け取りを行い、(所要時間 [秒], successor 側の1回の呼び出しの所要時間の最大値 [秒],
+# 並行して successor に発行した get のレイテンシの最大値 [秒]) を返す
+def bench_range_transfer(key_num : int, is_chunked : bool) -> Tuple[float, float, float]:
+    successor = ChordNode("THIS_VALUE_IS_NOT_USED", first_node=True)
+    data_id_list = sorted(set(random.randint(0, gval.ID_MAX) for _ in range(key_num)))
+    successor.data_store.store_data_chunk(
+        DataChunk(data_ids=data_id_list, values=[hex(data_id) for data_id in data_id_list],
+                  versions=[1] * len(data_id_list), next_from_id=None))
+
+    # 新規ノードは successor の担当範囲の中央に位置するものとし、半分のデータの委譲を受ける
+    joiner = ChordNode("THIS_VALUE_IS_NOT_USED", first_node=True)
+    joiner.node_info.node_id = (successor.node_info.node_id + gval.ID_SPACE_RANGE // 2) % gval.ID_SPACE_RANGE
+    joiner_id = joiner.node_info.node_id
+
+    max_call_sec = [0.0]
+    def timed_call(func : Callable[[], Any]) -> Any:
+        call_start = time.perf_counter()
+        ret = func()
+        max_call_sec[0] = max(max_call_sec[0], time.perf_counter() - call_start)
+        return ret
+
+    is_running = [True]
+    max_get_sec = [0.0]
+    def get_th():
+        while is_running[0]:
+            get_start = time.perf_counter()
+            successor.data_store.get(random.choice(data_id_list))
+            max_get_sec[0] = max(max_get_sec[0], time.perf_counter() - get_start)
+            time.sleep(0.001)
+
+    get_thread = threading.Thread(target=get_th, daemon=True)
+    get_thread.start()
+    time.sleep(0.05)
+
+    start = time.perf_counter()
+    if is_chunked:
+        joiner.stabilizer.receive_data_chunks(
+            lambda from_id: timed_call(lambda: successor.endpoints.grpc__delegate_my_tantou_data_chunk(
+                joiner_id, from_id, gval.DATA_TRANSFER_CHUNK_SIZE)))
+        joiner.stabilizer.receive_data_chunks(
+            lambda from_id: timed_call(lambda: successor.endpoints.grpc__get_all_data_chunk(
+                from_id, gval.DATA_TRANSFER_CHUNK_SIZE)))
+    else:
+        tantou_data_list = timed_call(lambda: successor.endpoints.grpc__delegate_my_tantou_data(joiner_id))
+        with joiner.node_info.lock_of_datastore:
+            for key_value in tantou_data_list:
+                joiner.data_store.store_new_data(cast(int, key_value.data_id), key_value.value_data)
+        passed_all_replica = timed_call(lambda: successor.endpoints.grpc__get_all_data())
+        joiner.data_store.store_replica_of_multi_masters(passed_all_replica)
+    elapsed = time.perf_counter() - start
+
+    is_running[0] = False
+    get_thread.join()
+    if len(joiner.data_store.stored_data) != len(data_id_list):
+        raise Exception("joiner holds " + str(len(joiner.data_store.stored_data)) + " of " + str(len(data_id_list)) + " entries")
+    return elapsed, max_call_sec[0], max_get_sec[0]
+
+def run_transfer_bench(args : argparse.Namespace):
+    results : Dict[str, Tuple[float, float, float]] = {}
+    gval.DATA_TRANSFER_CHUNK_SIZE = args.chunk_size
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        random.seed(args.seed)
+        gval.LOG_LEVEL = LogLevel.NONE
+        for mode_name, is_chunked in [("bulk", False), ("chunked", True)]:
+            results[mode_name] = bench_range_transfer(args.keys, is_chunked)
+        ChordUtil.flush_log()
+
+    print("keys=" + str(args.keys) + ",chunk_size=" + str(args.chunk_size))
+    print("mode,transfer_sec,max_successor_call_ms,max_get_latency_ms")
+    for mode_name, (elapsed, max_call_sec, max_get_sec) in results.items():
+        print(mode_name + "," + "{:.3f}".format(elapsed) + "," + "{:.3f}".format(max_call_sec * 1000)
+              + "," + "{:.3f}".format(max_get_sec * 1000))
+
+# ランダムに選んだノードをダウンさせ、経路表が収束した後に put_num 回の put を行ってから、同じアドレスで再起動させる.
+# is_recovery が True の場合はディスクから保持データを復元して差分のみを受け取り、False の場合は永続化したファイルを
+# 削除した上で隣接ノードから全データを受け取る.
+# (再参加に要した秒数, ディスクから復元したデータの数, 再参加の際に隣接ノードから受け取ったデータの数,
+#  再参加後の担当範囲のデータのうち最新の値を保持していないものの数) を返す
+def bench_restart(put_num : int, is_recovery : bool) -> Tuple[float, int, int, int]:
+    # 前回までに永続化を無効にして再起動させたノードは対象としない
+    victim = chord_sim.get_a_random_node()
+    while victim.data_store.persister == None:
+        victim = chord_sim.get_a_random_node()
+    victim_address = victim.node_info.address_str
+    victim_node_id = victim.node_info.node_id
+    victim.is_alive = False
+    with victim.node_info.lock_of_datastore:
+        persister = cast(DataStorePersister, victim.data_store.persister)
+        if is_recovery:
+            persister.close()
+        else:
+            persister.remove_files()
+
+    # ダウンしたノードが経路表から取り除かれるまで、探索と stabilize処理 を繰り返す
+    alive_node_list = [node for node in gval.all_node_dict.values() if node.is_alive]
+    while count_bad_routing_infos(alive_node_list) > 0:
+        for _ in range(5):
+            random.choice(alive_node_list).router.find_successor(random.randint(0, gval.ID_MAX))
+        chord_sim.do_stabilize_once_at_all_node()
+
+    for _ in range(put_num):
+        chord_sim.do_put_on_random_node()
+
+    recovered_num = len(persister.load()) if is_recovery else 0
+
+    start = time.perf_counter()
+    gval.ENABLE_DATA_STORE_PERSISTENCE = is_recovery
+    restarted_node = ChordNode(chord_sim.get_a_random_node().node_info.address_str, recover_address=victim_address, recover_node_id=victim_node_id)
+    gval.ENABLE_DATA_STORE_PERSISTENCE = True
+    if Stabilizer.need_join_retry_node != None:
+        raise Exception("join of the restarted node failed")
+    gval.all_node_dict[victim_address] = restarted_node
+    ChordUtil.notify_node_registered(victim_address)
+    restarted_node.tqueue.exec_first()
+    elapsed = time.perf_counter() - start
+
+    for _ in range(3):
+        chord_sim.do_stabilize_once_at_all_node()
+
+    latest_values : Dict[int, str] = {}
+    for kv_data in gval.all_data_list:
+        latest_values[cast(int, kv_data.data_id)] = kv_data.value_data
+    pred_id = cast('NodeRef', restarted_node.node_info.predecessor_info).node_id
+    stale_cnt = 0
+    for data_id, value_str in latest_values.items():
+        if ChordUtil.exist_between_two_nodes_right_mawari(pred_id, restarted_node.node_info.node_id, data_id) \
+                and restarted_node.data_store.stored_data.get(data_id) != value_str:
+            stale_cnt += 1
+    return elapsed, recovered_num, restarted_node.stabilizer.join_received_data_cnt, stale_cnt
+
+# 単一ノードの DataStore に value_bytes バイトの値を key_num 個格納し、(格納した値を保持するためのヒープの使用量 [バイト/エントリ],
+# get [回/秒], 全データのダイジェストの生成 [秒]) を返す.
+# ヒープの使用量は stored_data と stored_versions への格納の前後の差とし、エンジンによらない sorted_data_ids 等は含めない
+def bench_value_store(key_num : int, value_bytes : int, use_mmap : bool) -> Tuple[float, float, float]:
+    gval.ENABLE_MMAP_VALUE_STORE = use_mmap
+    node = ChordNode("THIS_VALUE_IS_NOT_USED", first_node=True)
+    gval.ENABLE_MMAP_VALUE_STORE = False
+    data_id_list = [ChordUtil.hash_str_to_int(str(idx)) for idx in range(key_num)]
+
+    tracemalloc.start()
+    base_bytes, _ = tracemalloc.get_traced_memory()
+    with node.node_info.lock_of_datastore:
+        for data_id in data_id_list:
+            # 他ノードから受け取った値と同様に、エントリごとに別の文字列とする
+            node.data_store.put_stored_entry(data_id, str(data_id).rjust(value_bytes, "v"), 1)
+    heap_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    heap_per_entry = (heap_bytes - base_bytes) / key_num
+
+    # ダイジェストの生成は sorted_data_ids を辿るため、格納した data_id を反映させる
+    node.data_store.sorted_data_ids = sorted(data_id_list)
+    start = time.perf_counter()
+    for data_id in data_id_list:
+        node.data_store.get(data_id)
+    get_ops = key_num / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    node.data_store.gen_all_data_digest()
+    digest_sec = time.perf_counter() - start
+    return heap_per_entry, get_ops, digest_sec
+
+def run_engine_bench(args : argparse.Namespace):
+    results : Dict[str, Tuple[float, float, float]] = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        random.seed(args.seed)
+        gval.LOG_LEVEL = LogLevel.NONE
+        for engine_name, use_mmap in [("dict", False), ("mmap", True)]:
+            results[engine_name] = bench_value_store(args.keys, args.value_bytes, use_mmap)
+        ChordUtil.flush_log()
+
+    print("keys=" + str(args.keys) + ",value_bytes=" + str(args.value_bytes))
+    print("engine,heap_bytes_per_entry,get_ops_per_sec,digest_sec")
+    for engine_name, (heap_per_entry, get_ops, digest_sec) in results.items():
+        print(engine_name + "," + "{:.1f}".format(heap_per_entry) + "," + "{:.1f}".format(get_ops) + "," + "{:.3f}".format(digest_sec))
+
+# MmapValueStore を用いる単一ノードに key_num 個のデータを格納した上で、全データの上書きを rounds 回行い、最後に4分の1のデータを
+# 削除する. 上書きと削除の key_num // 10 回ごとに、is_compaction_enabled であれば do_compaction を呼び出す.
+# (値のログの使用済みのバイト数, うち参照されなくなったレコードのバイト数, do_compaction の所要時間の合計 [秒],
+#  並行して発行した get のレイテンシの最大値 [秒]) を返す
+def bench_compaction(key_num : int, rounds : int, is_compaction_enabled : bool) -> Tuple[int, int, float, float]:
+    gval.ENABLE_MMAP_VALUE_STORE = True
+    node = ChordNode("THIS_VALUE_IS_NOT_USED", first_node=True)
+    gval.ENABLE_MMAP_VALUE_STORE = False
+    data_id_list = [ChordUtil.hash_str_to_int(str(idx)) for idx in range(key_num)]
+    for data_id in data_id_list:
+        node.data_store.store_new_data(data_id, hex(data_id).rjust(100, "v"))
+
+    is_running = [True]
+    max_get_sec = [0.0]
+    def get_th():
+        while is_running[0]:
+            get_start = time.perf_counter()
+            node.data_store.get(random.choice(data_id_list))
+            max_get_sec[0] = max(max_get_sec[0], time.perf_counter() - get_start)
+            time.sleep(0.001)
+
+    get_thread = threading.Thread(target=get_th, daemon=True)
+    get_thread.start()
+
+    compaction_sec = 0.0
+    update_list = [(data_id, hex(round_idx).rjust(100, "v")) for round_idx in range(rounds) for data_id in data_id_list] \
+                  + [(data_id, DataStore.DELETED_ENTRY_MARKING_STR) for data_id in data_id_list[:key_num // 4]]
+    for update_idx, (data_id, value_str) in enumerate(update_list):
+        node.data_store.store_new_data(data_id, value_str)
+        if is_compaction_enabled and update_idx % (key_num // 10) == key_num // 10 - 1:
+            compaction_start = time.perf_counter()
+            node.data_store.do_compaction()
+            compaction_sec += time.perf_counter() - compaction_start
+
+    is_running[0] = False
+    get_thread.join()
+    log_bytes, garbage_bytes = cast(MmapValueStore, node.data_store.stored_data).get_log_usage()
+    return log_bytes, garbage_bytes, compaction_sec, max_get_sec[0]
+
+def run_compaction_bench(args : argparse.Namespace):
+    results : Dict[str, Tuple[int, int, float, float]] = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        random.seed(args.seed)
+        gval.LOG_LEVEL = LogLevel.NONE
+        results["none"] = bench_compaction(args.keys, args.rounds, False)
+        # 1回の呼び出しで回収できるだけ回収し、その間ロックを解放しない
+        io_budget_bytes, io_unit_bytes = gval.COMPACTION_IO_BUDGET_BYTES, gval.COMPACTION_IO_UNIT_BYTES
+        gval.COMPACTION_IO_BUDGET_BYTES = gval.COMPACTION_IO_UNIT_BYTES = 1 << 40
+        results["unthrottled"] = bench_compaction(args.keys, args.rounds, True)
+        gval.COMPACTION_IO_BUDGET_BYTES, gval.COMPACTION_IO_UNIT_BYTES = io_budget_bytes, io_unit_bytes
+        results["throttled"] = bench_compaction(args.keys, args.rounds, True)
+        ChordUtil.flush_log()
+
+    print("keys=" + str(args.keys) + ",rounds=" + str(args.rounds) + ",io_budget_bytes=" + str(gval.COMPACTION_IO_BUDGET_BYTES)
+          + ",io_unit_bytes=" + str(gval.COMPACTION_IO_UNIT_BYTES))
+    print("mode,log_mb,garbage_mb,compaction_sec,max_get_latency_ms")
+    for mode_name, (log_bytes, garbage_bytes, compaction_sec, max_get_sec) in results.items():
+        print(mode_name + "," + "{:.1f}".format(log_bytes / 2**20) + "," + "{:.1f}".format(garbage_bytes / 2**20) + ","
+              + "{:.2f}".format(compaction_sec) + "," + "{:.1f}".format(max_get_sec * 1000))
+
+# 担当ノードで key_num 個のデータをそれぞれ rounds 回上書きし、各回の値を版とともにレプリカとして、順序を入れ替えた上で
+# batch_size 個ずつ別のノードに渡す. 非同期に行われるレプリカの配布や、partial_join_op での successor からの古いデータの
+# 受け取りが前後して届く状況を模擬する.
+# (担当ノードの最新の値と異なる値が残ったデータの数, 格納しなかったレプリカの数, レプリカの受け取り [個/秒]) を返す
+def bench_reconcile(key_num : int, rounds : int, batch_size : int, is_versioned : bool) -> Tuple[int, int, float]:
+    gval.ENABLE_VERSIONED_REPLICA_MERGE = is_versioned
+    master = ChordNode("THIS_VALUE_IS_NOT_USED", first_node=True)
+    replica_holder = ChordNode("THIS_VALUE_IS_NOT_USED", first_node=True)
+    data_id_list = [ChordUtil.hash_str_to_int(str(idx)) for idx in range(key_num)]
+
+    replica_list : List[DataIdAndValue] = []
+    for round_idx in range(rounds):
+        for data_id in data_id_list:
+            value_str = hex(data_id) + "_" + str(round_idx)
+            version = master.data_store.store_new_data(data_id, value_str)
+            replica_list.append(DataIdAndValue(data_id=data_id, value_data=value_str, version=version))
+    random.shuffle(replica_list)
+
+    receive_start = time.perf_counter()
+    for batch_start in range(0, len(replica_list), batch_size):
+        replica_holder.endpoints.grpc__receive_replica(replica_list[batch_start:batch_start + batch_size])
+    receive_sec = time.perf_counter() - receive_start
+    gval.ENABLE_VERSIONED_REPLICA_MERGE = True
+
+    stale_cnt = sum(1 for data_id in data_id_list
+                    if replica_holder.data_store.stored_data[data_id] != master.data_store.stored_data[data_id])
+    return stale_cnt, replica_holder.data_store.skipped_overwrite_cnt, len(replica_list) / receive_sec
+
+def run_reconcile_bench(args : argparse.Namespace):
+    results : Dict[str, Tuple[int, int, float]] = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        random.seed(args.seed)
+        gval.LOG_LEVEL = LogLevel.NONE
+        for mode_name, is_versioned in [("overwrite", False), ("versioned", True)]:
+            results[mode_name] = bench_reconcile(args.keys, args.rounds, args.batch, is_versioned)
+        ChordUtil.flush_log()
+
+    print("keys=" + str(args.keys) + ",rounds=" + str(args.rounds) + ",batch=" + str(args.batch))
+    print("mode,stale_entries,skipped_overwrites,receive_ops_per_sec")
+    for mode_name, (stale_cnt, skipped_cnt, receive_ops) in results.items():
+        print(mode_name + "," + str(stale_cnt) + "," + str(skipped_cnt) + "," + "{:.1f}".format(receive_ops))
+
+def run_restart_bench(args : argparse.Namespace):
+    results : Dict[str, Tuple[float, int, int, int]] = {}
+    persistence_dir = tempfile.mkdtemp(prefix="chord_sim_bench_")
+    gval.DATA_STORE_PERSISTENCE_DIR = persistence_dir
+    gval.ENABLE_DATA_STORE_PERSISTENCE = True
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            random.seed(args.seed)
+            gval.LOG_LEVEL = LogLevel.NONE
+            build_network(args.nodes, args.data)
+            for put_num in [int(put_num_str) for put_num_str in args.puts.split(",")]:
+                for mode_name, is_recovery in [("full", False), ("recovery", True)]:
+                    results[mode_name + "," + str(put_num)] = bench_restart(put_num, is_recovery)
+            ChordUtil.flush_log()
+    finally:
+        shutil.rmtree(persistence_dir, ignore_errors=True)
+
+    print("nodes=" + str(args.nodes) + ",data=" + str(args.data))
+    print("mode,puts_while_down,restart_ms,recovered_from_disk,received_from_neighbors,stale_tantou_entries")
+    for mode_and_puts, (elapsed, recovered_num, received_num, stale_cnt) in results.items():
+        print(mode_and_puts + "," + "{:.1f}".format(elapsed * 1000) + "," + str(recovered_num) + "," + str(received_num)
+              + "," + str(stale_cnt))
+
+BENCH_FUNCS : Dict[str, Callable[[argparse.Namespace], None]] = {
+    "query" : run_query_bench,
+    "store" : run_store_bench,
+    "stabilize" : run_stabilize_bench,
+    "replica" : run_replica_bench,
+    "async_stabilize" : run_async_stabilize_bench,
+    "routing" : run_routing_bench,
+    "pns" : run_pns_bench,
+    "succ_list" : run_succ_list_bench,
+    "churn" : run_churn_bench,
+    "transfer" : run_transfer_bench,
+    "restart" : run_restart_bench,
+    "engine" : run_engine_bench,
+    "compaction" : run_compaction_bench,
+    "reconcile" : run_reconcile_bench,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmarks of chord_sim")
+    subparsers = parser.add_subparsers(dest="bench_name", required=True)
+
+    query_parser = subparsers.add_parser("query", help="concurrent global_get throughput under stabilization")
+    query_parser.add_argument("--nodes", type=int, default=BENCH_NODE_NUM)
+    query_parser.add_argument("--data", type=int, default=BENCH_DATA_NUM)
+    query_parser.add_argument("--threads", type=str, default="1,2,4,8")
+    query_parser.add_argument("--duration", type=float, default=3.0)
+    query_parser.add_argument("--seed", type=int, default=1337)
+    query_parser.add_argument("--exclusive-lock", action="store_true",
+                              help="use an exclusive lock for routing state instead of the reader-writer lock")
+    query_parser.add_argument("--no-stabilize", action="store_true")
+
+    store_parser = subparsers.add_parser("store", help="put/get throughput of a single node's DataStore")
+    store_parser.add_argument("--keys", type=int, default=10000)
+    store_parser.add_argument("--rounds", type=int, default=5)
+    store_parser.add_argument("--seed", type=int, default=1337)
+
+    stabilize_parser = subparsers.add_parser("stabilize", help="stabilize rounds per second with the ring sharded over worker processes")
+    stabilize_parser.add_argument("--nodes", type=int, default=BENCH_NODE_NUM)
+    stabilize_parser.add_argument("--data", type=int, default=BENCH_DATA_NUM)
+    stabilize_parser.add_argument("--workers", type=str, default="1,2,4,8")
+    stabilize_parser.add_argument("--rounds", type=int, default=3)
+    stabilize_parser.add_argument("--transport", type=str, choices=["queue", "tcp"], default="queue",
+                                  help="how calls to nodes in other worker processes are delivered")
+    stabilize_parser.add_argument("--seed", type=int, default=1337)
+
+    replica_parser = subparsers.add_parser("replica", help="asyncio put throughput with sequential or concurrent replica fan-out")
+    replica_parser.add_argument("--nodes", type=int, default=BENCH_NODE_NUM)
+    replica_parser.add_argument("--data", type=int, default=BENCH_DATA_NUM)
+    replica_parser.add_argument("--puts", type=int, default=100)
+    replica_parser.add_argument("--latency-ms", type=float, default=5.0)
+    replica_parser.add_argument("--seed", type=int, default=1337)
+
+    async_stabilize_parser = subparsers.add_parser("async_stabilize", help="stabilize rounds and concurrent get latency with every node run as a coroutine on one event loop")
+    async_stabilize_parser.add_argument("--nodes", type=int, default=BENCH_NODE_NUM)
+    async_stabilize_parser.add_argument("--data", type=int, default=BENCH_DATA_NUM)
+    async_stabilize_parser.add_argument("--joins", type=int, default=1000,
+                                        help="nodes joined without stabilization before the run, left for the coroutines to converge")
+    async_stabilize_parser.add_argument("--duration", type=float, default=10.0)
+    async_stabilize_parser.add_argument("--interval", type=float, default=1.0,
+                                        help="seconds each node waits between its stabilize rounds")
+    async_stabilize_parser.add_argument("--latency-ms", type=float, default=1.0)
+    async_stabilize_parser.add_argument("--seed", type=int, default=1337)
+
+    routing_parser = subparsers.add_parser("routing", help="hop count and latency of iterative and recursive lookups")
+    routing_parser.add_argument("--nodes", type=int, default=BENCH_NODE_NUM)
+    routing_parser.add_argument("--lookups", type=int, default=500)
+    routing_parser.add_argument("--link-delay-ms", type=float, default=1.0)
+    routing_parser.add_argument("--seed", type=int, default=1337)
+
+    pns_parser = subparsers.add_parser("pns", help="lookup latency and stretch with and without proximity neighbor selection")
+    pns_parser.add_argument("--nodes", type=int, default=BENCH_NODE_NUM)
+    pns_parser.add_argument("--lookups", type=int, default=300)
+    pns_parser.add_argument("--max-latency-ms", type=float, default=20.0,
+                            help="latency per unit distance on the unit square of the coordinate model")
+    pns_parser.add_argument("--recursive", action="store_true")
+    pns_parser.add_argument("--seed", type=int, default=1337)
+
+    succ_list_parser = subparsers.add_parser("succ_list", help="calls to other nodes per stabilize_successor with and without successor list piggybacking")
+    succ_list_parser.add_argument("--nodes", type=int, default=BENCH_NODE_NUM)
+    succ_list_parser.add_argument("--rounds", type=int, default=20)
+    succ_list_parser.add_argument("--seed", type=int, default=1337)
+
+    churn_parser = subparsers.add_parser("churn", help="idle CPU and convergence after churn with the blind stabilize loop and with membership notifications")
+    churn_parser.add_argument("--nodes", type=int, default=BENCH_NODE_NUM)
+    churn_parser.add_argument("--data", type=int, default=0)
+    churn_parser.add_argument("--idle-sec", type=float, default=3.0)
+    churn_parser.add_argument("--kills", type=int, default=2)
+    churn_parser.add_argument("--joins", type=int, default=2)
+    churn_parser.add_argument("--lookups", type=int, default=5,
+                              help="random lookups issued between stabilize steps, which is what detects downed nodes")
+    churn_parser.add_argument("--timeout", type=float, default=60.0)
+    churn_parser.add_argument("--seed", type=int, default=1337)
+
+    transfer_parser = subparsers.add_parser("transfer", help="join data transfer time and successor get latency with bulk and chunked range transfer")
+    transfer_parser.add_argument("--keys", type=int, default=200000)
+    transfer_parser.add_argument("--chunk-size", type=int, default=gval.DATA_TRANSFER_CHUNK_SIZE)
+    transfer_parser.add_argument("--seed", type=int, default=1337)
+
+    restart_parser = subparsers.add_parser("restart", help="rejoin time of a restarted node with a full refill and with recovery from its local log and snapshot")
+    restart_parser.add_argument("--nodes", type=int, default=BENCH_NODE_NUM)
+    restart_parser.add_argument("--data", type=int, default=20000)
+    restart_parser.add_argument("--puts", type=str, default="0,100,1000",
+                                help="numbers of puts issued while the node is down")
+    restart_parser.add_argument("--seed", type=int, default=1337)
+
+    engine_parser = subparsers.add_parser("engine", help="heap usage per entry and get/digest speed of the dict and mmap value stores")
+    engine_parser.add_argument("--keys", type=int, default=200000)
+    engine_parser.add_argument("--value-bytes", type=int, default=100)
+    engine_parser.add_argument("--seed", type=int, default=1337)
+
+    compaction_parser = subparsers.add_parser("compaction", help="value log size and get latency under overwrites and deletes with and without throttled compaction")
+    compaction_parser.add_argument("--keys", type=int, default=50000)
+    compaction_parser.add_argument("--rounds", type=int, default=4)
+    compaction_parser.add_argument("--seed", type=int, default=1337)
+
+    reconcile_parser = subparsers.add_parser("reconcile", help="stale replicas left after out-of-order delivery with and without versioned last-writer-wins merge")
+    reconcile_parser.add_argument("--keys", type=int, default=10000)
+    reconcile_parser.add_argument("--rounds", type=int, default=3)
+    reconcile_parser.add_argument("--batch", type=int, default=100)
+    reconcile_parser.add_argument("--seed", type=int, default=1337)
+
+    args = parser.parse_args()
+    BENCH_FUNCS[args.bench_name](args)
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,21 @@
 # coding:utf-8
 
+import argparse
+import math
 import threading
 from threading import Thread
 import time
 import random
-from typing import List, Optional, Union, cast
+from typing import List, Optional, Tuple, Union, cast
 
 import modules.gval as gval
-from modules.node_info import NodeInfo
+from modules.node_info import NodeInfo, NodeRef
 from modules.chord_util import ChordUtil, KeyValue, DataIdAndValue, ErrorCode, PResult, NodeIsDownedExceptiopn, InternalControlFlowException
+from modules.log_writer import LogLevel
+from modules.event_scheduler import EventScheduler
 from modules.chord_node import ChordNode
 from modules.stabilizer import Stabilizer
+from modules.stabilize_notifier import StabilizeNotifier
 
 # ネットワークに存在するノードから1ノードをランダムに取得する
 # is_aliveフィールドがFalseとなっているダウン状態となっているノードは返らない
@@ -27,7 +32,7 @@ def get_a_random_node() -> ChordNode:
 # また、predecessorの方向にpredecesorの繋がりでもたどって出力する
 def check_nodes_connectivity():
     ChordUtil.dprint("check_nodes_connectivity_1")
-    print("flush", flush=True)
+    ChordUtil.print_no_lf("flush\n", flush=True, level=LogLevel.INFO)
     counter : int = 0
     # まずはsuccessor方向に辿る
     cur_node_info : NodeInfo = get_a_random_node().node_info
@@ -35,11 +40,11 @@ def check_nodes_connectivity():
     # ノードの総数（is_aliveフィールドがFalseのものは除外して算出）
     with gval.lock_of_all_node_dict:
         all_node_num = len(list(filter(lambda node: node.is_alive == True ,list(gval.all_node_dict.values()))))
-    ChordUtil.print_no_lf("check_nodes_connectivity__succ,all_node_num=" + str(all_node_num) + ",already_born_node_num=" + str(gval.already_born_node_num))
-    print(",", flush=True, end="")
+    ChordUtil.print_no_lf("check_nodes_connectivity__succ,all_node_num=" + str(all_node_num) + ",already_born_node_num=" + str(gval.already_born_node_num), level=LogLevel.INFO)
+    ChordUtil.print_no_lf(",", flush=True, level=LogLevel.INFO)
 
     while counter < all_node_num:
-        ChordUtil.print_no_lf(str(cur_node_info.born_id) + "," + ChordUtil.conv_id_to_ratio_str(cur_node_info.node_id) + " -> ")
+        ChordUtil.print_no_lf(str(cur_node_info.born_id) + "," + ChordUtil.conv_id_to_ratio_str(cur_node_info.node_id) + " -> ", level=LogLevel.INFO)
 
         # 各ノードはsuccessorの情報を保持しているが、successorのsuccessorは保持しないようになって
         # いるため、単純にsuccessorのチェーンを辿ることはできないため、各ノードから最新の情報を
@@ -49,16 +54,16 @@ def check_nodes_connectivity():
             #cur_node_info = ChordUtil.get_node_by_address(cur_node_info.address_str).node_info.successor_info_list[0]
         ret = ChordUtil.get_node_by_address(cur_node_info.address_str)
         if (ret.is_ok):
-            cur_node_info : 'NodeInfo' = cast('ChordNode', ret.result).node_info.successor_info_list[0]
+            cur_node_info : 'NodeRef' = cast('ChordNode', ret.result).node_info.successor_info_list[0]
         else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE || ret.err_code == ErrorCode.NodeIsDownedException_CODE
             if cast(int, ret.err_code) == ErrorCode.NodeIsDownedException_CODE:
-                print("")
+                ChordUtil.print_no_lf("\n", level=LogLevel.INFO)
                 ChordUtil.dprint("check_nodes_connectivity__succ,NODE_IS_DOWNED")
                 return
             else: #cast(int, ret.err_code) == ErrorCode.InternalControlFlowException_CODE
                 # join中のノードのノードオブジェクトを get_node_by_address しようとした場合に
                 # TargetNodeDoesNotExistExceptionがraiseされてくるのでその場合は、対象ノードのstabilize_successorはあきらめる
-                print("")
+                ChordUtil.print_no_lf("\n", level=LogLevel.INFO)
                 ChordUtil.dprint("check_nodes_connectivity__succ,TARGET_NODE_DOES_NOT_EXIST_EXCEPTION_IS_RAISED")
                 return
 
@@ -74,34 +79,34 @@ def check_nodes_connectivity():
         #     return
 
         if cur_node_info == None:
-            print("", flush=True, end="")
+            ChordUtil.flush_log()
             raise Exception("no successor having node was detected!")
         counter += 1
-    print("")
+    ChordUtil.print_no_lf("\n", level=LogLevel.INFO)
 
     # 2ノード目が参加して以降をチェック対象とする
     # successorを辿って最初のノードに戻ってきているはずだが、そうなっていない場合は successorの
     # チェーン構造が正しく構成されていないことを意味するためエラーとして終了する
     if all_node_num >=2 and cur_node_info.node_id != start_node_info.node_id:
-        ChordUtil.dprint("check_nodes_connectivity_succ_err,chain does not includes all node. all_node_num = "
+        ChordUtil.dprint(lambda: "check_nodes_connectivity_succ_err,chain does not includes all node. all_node_num = "
                          + str(all_node_num) + ","
                          + ChordUtil.gen_debug_str_of_node(start_node_info) + ","
-                         + ChordUtil.gen_debug_str_of_node(cur_node_info))
+                         + ChordUtil.gen_debug_str_of_node(cur_node_info), level=LogLevel.WARN)
         # raise exception("SUCCESSOR_CHAIN_IS_NOT_CONSTRUCTED_COLLECTLY")
     else:
-        ChordUtil.dprint("check_nodes_connectivity_succ_success,chain includes all node. all_node_num = "
+        ChordUtil.dprint(lambda: "check_nodes_connectivity_succ_success,chain includes all node. all_node_num = "
                          + str(all_node_num) + ","
                          + ChordUtil.gen_debug_str_of_node(start_node_info) + ","
-                         + ChordUtil.gen_debug_str_of_node(cur_node_info))
+                         + ChordUtil.gen_debug_str_of_node(cur_node_info), level=LogLevel.INFO)
 
     # 続いてpredecessor方向に辿る
     counter = 0
     cur_node_info = get_a_random_node().node_info
     start_node_info = cur_node_info
-    ChordUtil.print_no_lf("check_nodes_connectivity__pred,all_node_num=" + str(all_node_num) + ",already_born_node_num=" + str(gval.already_born_node_num))
-    print(",", flush=True, end="")
+    ChordUtil.print_no_lf("check_nodes_connectivity__pred,all_node_num=" + str(all_node_num) + ",already_born_node_num=" + str(gval.already_born_node_num), level=LogLevel.INFO)
+    ChordUtil.print_no_lf(",", flush=True, level=LogLevel.INFO)
     while counter < all_node_num:
-        ChordUtil.print_no_lf(str(cur_node_info.born_id) + "," + ChordUtil.conv_id_to_ratio_str(cur_node_info.node_id) + " -> ")
+        ChordUtil.print_no_lf(str(cur_node_info.born_id) + "," + ChordUtil.conv_id_to_ratio_str(cur_node_info.node_id) + " -> ", level=LogLevel.INFO)
         # try:
             #cur_node_info = ChordUtil.get_node_by_address(cur_node_info.address_str).node_info.predecessor_info
         ret = ChordUtil.get_node_by_address(cur_node_info.address_str)
@@ -109,13 +114,13 @@ def check_nodes_connectivity():
             cur_node_info: 'ChordNode' = cast('ChordNode', ret.result).node_info.predecessor_info
         else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE || ret.err_code == ErrorCode.NodeIsDownedException_CODE
             if cast(int, ret.err_code) == ErrorCode.NodeIsDownedException_CODE:
-                print("")
+                ChordUtil.print_no_lf("\n", level=LogLevel.INFO)
                 ChordUtil.dprint("check_nodes_connectivity__pred,NODE_IS_DOWNED")
                 return
             else: #cast(int, ret.err_code) == ErrorCode.InternalControlFlowException_CODE
                 # join中のノードのノードオブジェクトを get_node_by_address しようとした場合に
                 # TargetNodeDoesNotExistExceptionがraiseされてくるのでその場合は、対象ノードのstabilize_successorはあきらめる
-                print("")
+                ChordUtil.print_no_lf("\n", level=LogLevel.INFO)
                 ChordUtil.dprint("check_nodes_connectivity__pred,TARGET_NODE_DOES_NOT_EXIST_EXCEPTION_IS_RAISED")
                 return
 
@@ -137,7 +142,7 @@ def check_nodes_connectivity():
 
         counter += 1
 
-    print("")
+    ChordUtil.print_no_lf("\n", level=LogLevel.INFO)
 
     # 2ノード目から本来チェック可能であるべきだが、stabilize処理の実行タイミングの都合で
     # 2ノード目がjoinした後、いくらかpredecessorがNoneの状態が生じ、そのタイミングで本チェックが走る場合が
@@ -145,16 +150,16 @@ def check_nodes_connectivity():
     # successorを辿って最初のノードに戻ってきているはずだが、そうなっていない場合は successorの
     # チェーン構造が正しく構成されていないことを意味するためエラーとして終了する
     if all_node_num >=5 and cur_node_info.node_id != start_node_info.node_id:
-        ChordUtil.dprint("check_nodes_connectivity_pred_err,chain does not includes all node. all_node_num = "
+        ChordUtil.dprint(lambda: "check_nodes_connectivity_pred_err,chain does not includes all node. all_node_num = "
                          + str(all_node_num) + ","
                          + ChordUtil.gen_debug_str_of_node(start_node_info) + ","
-                         + ChordUtil.gen_debug_str_of_node(cur_node_info))
+                         + ChordUtil.gen_debug_str_of_node(cur_node_info), level=LogLevel.WARN)
         # raise Exception("PREDECESSOR_CHAIN_IS_NOT_CONSTRUCTED_COLLECTLY")
     else:
-        ChordUtil.dprint("check_nodes_connectivity_pred_success,chain includes all node. all_node_num = "
+        ChordUtil.dprint(lambda: "check_nodes_connectivity_pred_success,chain includes all node. all_node_num = "
                          + str(all_node_num) + ","
                          + ChordUtil.gen_debug_str_of_node(start_node_info) + ","
-                         + ChordUtil.gen_debug_str_of_node(cur_node_info))
+                         + ChordUtil.gen_debug_str_of_node(cur_node_info), level=LogLevel.INFO)
 
 # TODO: 実システム化する際は、リトライ処理は各オペレーションに対応するRESTインタフェースの呼び出し
 #       の中で行う形に書き直す必要あり
@@ -164,28 +169,37 @@ def add_new_node():
     # # ロックの取得
     # gval.lock_of_all_data.acquire()
 
-    if Stabilizer.need_join_retry_node != None:
-        # 前回の呼び出しが失敗していた場合はリトライを行う
-        tyukai_node = cast('ChordNode', Stabilizer.need_join_retry_tyukai_node)
-        new_node = cast('ChordNode', Stabilizer.need_join_retry_node)
-        new_node.stabilizer.join(tyukai_node.node_info.address_str)
-        if Stabilizer.need_join_retry_node == None:
-            # リトライ情報が再設定されていないためリトライに成功したと判断
-            ChordUtil.dprint(
-                "add_new_node_1,retry of join is succeeded," + ChordUtil.gen_debug_str_of_node(new_node.node_info))
+    # join処理 の中で行われる stabilize処理 の通知は、参加したノードが all_node_dict に登録されるまで保留させる
+    if gval.stabilize_notifier != None:
+        cast(StabilizeNotifier, gval.stabilize_notifier).begin_defer()
+
+    try:
+        if Stabilizer.need_join_retry_node != None:
+            # 前回の呼び出しが失敗していた場合はリトライを行う
+            tyukai_node = cast('ChordNode', Stabilizer.need_join_retry_tyukai_node)
+            new_node = cast('ChordNode', Stabilizer.need_join_retry_node)
+            new_node.stabilizer.join(tyukai_node.node_info.address_str)
+            if Stabilizer.need_join_retry_node == None:
+                # リトライ情報が再設定されていないためリトライに成功したと判断
+                ChordUtil.dprint(
+                    lambda: "add_new_node_1,retry of join is succeeded," + ChordUtil.gen_debug_str_of_node(new_node.node_info), level=LogLevel.INFO)
+            else:
+                ChordUtil.dprint(
+                    lambda: "add_new_node_2,retry of join is failed," + ChordUtil.gen_debug_str_of_node(new_node.node_info), level=LogLevel.WARN)
         else:
-            ChordUtil.dprint(
-                "add_new_node_2,retry of join is failed," + ChordUtil.gen_debug_str_of_node(new_node.node_info))
-    else:
-        tyukai_node = get_a_random_node()
-        new_node = ChordNode(tyukai_node.node_info.address_str)
+            tyukai_node = get_a_random_node()
+            new_node = ChordNode(tyukai_node.node_info.address_str)
 
-    if Stabilizer.need_join_retry_node == None:
-        # join処理(リトライ時以外はChordNodeクラスのコンストラクタ内で行われる)が成功していれば
-        gval.all_node_dict[new_node.node_info.address_str] = new_node
-        # join処理のうち、ネットワーク参加時に必ずしも完了していなくてもデータの整合性やネットワークの安定性に
-        # に問題を生じさせないような処理をここで行う（当該処理がノード内のタスクキューに入っているのでそれを実行する形にする）
-        new_node.tqueue.exec_first()
+        if Stabilizer.need_join_retry_node == None:
+            # join処理(リトライ時以外はChordNodeクラスのコンストラクタ内で行われる)が成功していれば
+            gval.all_node_dict[new_node.node_info.address_str] = new_node
+            ChordUtil.notify_node_registered(new_node.node_info.address_str)
+            # join処理のうち、ネットワーク参加時に必ずしも完了していなくてもデータの整合性やネットワークの安定性に
+            # に問題を生じさせないような処理をここで行う（当該処理がノード内のタスクキューに入っているのでそれを実行する形にする）
+            new_node.tqueue.exec_first()
+    finally:
+        if gval.stabilize_notifier != None:
+            cast(StabilizeNotifier, gval.stabilize_notifier).end_defer()
 
     # # ロックの解放
     # gval.lock_of_all_data.release()
@@ -202,7 +216,7 @@ def do_stabilize_successor_th(node_list : List[ChordNode]):
                 # join中のノードのノードオブジェクトを get_node_by_address しようとした場合に
                 # InternalCtronlFlowExceptionがraiseされてくるのでその場合は、対象ノードのstabilize_finger_tableはあきらめる
                 ChordUtil.dprint(
-                    "do_stabilize_successor_th," + ChordUtil.gen_debug_str_of_node(node.node_info)
+                    lambda: "do_stabilize_successor_th," + ChordUtil.gen_debug_str_of_node(node.node_info)
                     + ",STABILIZE_FAILED_DUE_TO_INTERNAL_CONTROL_FLOW_EXCEPTION_RAISED")
             # except (InternalControlFlowException, NodeIsDownedExceptiopn):
             #     # join中のノードのノードオブジェクトを get_node_by_address しようとした場合に
@@ -212,6 +226,10 @@ def do_stabilize_successor_th(node_list : List[ChordNode]):
             #         + ",STABILIZE_FAILED_DUE_TO_INTERNAL_CONTROL_FLOW_EXCEPTION_RAISED")
 
 def do_stabilize_ftable_th(node_list : List[ChordNode]):
+    if gval.ENABLE_ADAPTIVE_FINGER_REFRESH:
+        do_stabilize_ftable_adaptive_th(node_list)
+        return
+
     for times in range(0, gval.STABILIZE_FTABLE_BATCH_TIMES):
         for table_idx in range(0, gval.ID_SPACE_BITS):
             for node in node_list:
@@ -224,7 +242,7 @@ def do_stabilize_ftable_th(node_list : List[ChordNode]):
                     # join中のノードのノードオブジェクトを get_node_by_address しようとした場合に
                     # InternalCtronlFlowExceptionがraiseされてくるのでその場合は、対象ノードのstabilize_finger_tableはあきらめる
                     ChordUtil.dprint(
-                        "do_stabilize_ftable_th," + ChordUtil.gen_debug_str_of_node(node.node_info)
+                        lambda: "do_stabilize_ftable_th," + ChordUtil.gen_debug_str_of_node(node.node_info)
                         + ",STABILIZE_FAILED_DUE_TO_INTERNAL_CONTROL_FLOW_EXCEPTION_RAISED")
 
                 # except (InternalControlFlowException, NodeIsDownedExceptiopn):
@@ -234,6 +252,18 @@ def do_stabilize_ftable_th(node_list : List[ChordNode]):
                 #         "do_stabilize_ftable_th," + ChordUtil.gen_debug_str_of_node(node.node_info)
                 #         + ",STABILIZE_FAILED_DUE_TO_INTERNAL_CONTROL_FLOW_EXCEPTION_RAISED")
 
+# 各ノードに、更新が必要と判断した finger_table のエントリのみを FINGER_REFRESH_TICKS_PER_ROUND 個まで更新させる
+def do_stabilize_ftable_adaptive_th(node_list : List[ChordNode]):
+    for tick in range(0, gval.FINGER_REFRESH_TICKS_PER_ROUND):
+        for node in node_list:
+            ret = node.stabilizer.stabilize_finger_table_adaptive()
+            if (ret.is_ok):
+                pass
+            else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE
+                ChordUtil.dprint(
+                    lambda: "do_stabilize_ftable_adaptive_th," + ChordUtil.gen_debug_str_of_node(node.node_info)
+                    + ",STABILIZE_FAILED_DUE_TO_INTERNAL_CONTROL_FLOW_EXCEPTION_RAISED")
+
 def do_stabilize_onace_at_all_node_successor(node_list : List[ChordNode]) -> List[Thread]:
     list_len = len(node_list)
     range_start = 0
@@ -273,6 +303,28 @@ def do_stabilize_onace_at_all_node_ftable(node_list : List[ChordNode]) -> List[T
 
     return thread_list
 
+# 各ノードに successor_info_list 内のノードとの間でレプリカのアンチエントロピー処理を行わせる
+def do_anti_entropy_at_all_node(node_list : List[ChordNode]):
+    for node in node_list:
+        ret = node.data_store.do_anti_entropy()
+        if (ret.is_ok):
+            pass
+        else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE
+            ChordUtil.dprint(
+                lambda: "do_anti_entropy_at_all_node," + ChordUtil.gen_debug_str_of_node(node.node_info)
+                + ",ANTI_ENTROPY_FAILED_DUE_TO_INTERNAL_CONTROL_FLOW_EXCEPTION_RAISED")
+
+# 各ノードに tombstone と参照されなくなった値の回収を行わせる
+def do_compaction_at_all_node(node_list : List[ChordNode]):
+    for node in node_list:
+        ret = node.data_store.do_compaction()
+        if (ret.is_ok):
+            pass
+        else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE
+            ChordUtil.dprint(
+                lambda: "do_compaction_at_all_node," + ChordUtil.gen_debug_str_of_node(node.node_info)
+                + ",COMPACTION_FAILED_DUE_TO_INTERNAL_CONTROL_FLOW_EXCEPTION_RAISED")
+
 # all_node_id辞書のvaluesリスト内から重複なく選択したノードに stabilize のアクションをとらせていく
 def do_stabilize_once_at_all_node():
     ChordUtil.dprint("do_stabilize_once_at_all_node_0,START")
@@ -290,8 +342,60 @@ def do_stabilize_once_at_all_node():
     for thread in thread_list_ftable:
         thread.join()
 
+    do_anti_entropy_at_all_node(shuffled_node_list)
+    do_compaction_at_all_node(shuffled_node_list)
+
     check_nodes_connectivity()
 
+# do_stabilize_once_at_all_node と同じ処理をスレッドを用いずに行う
+# 離散イベントシミュレーションとして実行する場合に用いる
+def do_stabilize_once_at_all_node_sequential():
+    ChordUtil.dprint("do_stabilize_once_at_all_node_sequential_0,START")
+    node_list = list(gval.all_node_dict.values())
+    shuffled_node_list : List[ChordNode] = random.sample(node_list, len(node_list))
+    do_stabilize_successor_th(shuffled_node_list)
+    do_stabilize_ftable_th(shuffled_node_list)
+    do_anti_entropy_at_all_node(shuffled_node_list)
+    do_compaction_at_all_node(shuffled_node_list)
+
+    check_nodes_connectivity()
+
+# gval.stabilize_notifier に通知されたノードにのみ stabilize処理 を行わせる.
+# successor_info_list が変化したノードについては、その predecessor の successor_info_list にも影響するため、
+# 伝播させる残りの回数が0になるまで predecessor にも通知を伝播させる
+def do_stabilize_notified_nodes(notified_list : List[Tuple[str, int]]):
+    for address, propagate_cnt in notified_list:
+        ret = ChordUtil.get_node_by_address(address)
+        if (ret.is_ok):
+            node : ChordNode = cast(ChordNode, ret.result)
+        else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE || ret.err_code == ErrorCode.NodeIsDownedException_CODE
+            # join処理中のノードか、通知の後にダウンしたノード. 全ノードの stabilize処理 に任せる
+            ChordUtil.dprint(lambda: "do_stabilize_notified_nodes_1," + address + ",NOTIFIED_NODE_IS_NOT_AVAILABLE")
+            continue
+
+        succ_list_before = node.node_info.successor_info_list
+        for times in range(0, gval.NOTIFIED_STABILIZE_SUCCESSOR_TIMES):
+            if node.stabilizer.stabilize_successor().is_ok == False:
+                ChordUtil.dprint(
+                    lambda: "do_stabilize_notified_nodes_2," + ChordUtil.gen_debug_str_of_node(node.node_info)
+                    + ",STABILIZE_FAILED_DUE_TO_INTERNAL_CONTROL_FLOW_EXCEPTION_RAISED")
+        do_stabilize_ftable_th([node])
+
+        pred_info = node.node_info.predecessor_info
+        if propagate_cnt > 0 and pred_info != None and node.node_info.successor_info_list != succ_list_before:
+            cast(StabilizeNotifier, gval.stabilize_notifier).notify(cast(NodeRef, pred_info).address_str, propagate_cnt - 1)
+
+# gval.stabilize_notifier に通知されたノードの stabilize処理 を行い、現在時刻(time.monotonic())が
+# next_background_time に達していれば全ノードの stabilize処理 を行う. 通知が無い間は next_background_time か、
+# max_wait_sec 秒経過するまで待つ. 次に全ノードの stabilize処理 を行う時刻を返す
+def do_stabilize_on_notification(next_background_time : float, max_wait_sec : float = math.inf) -> float:
+    if time.monotonic() >= next_background_time:
+        do_stabilize_once_at_all_node()
+        next_background_time = time.monotonic() + gval.BACKGROUND_STABILIZE_INTERVAL_SEC
+    wait_sec = min(next_background_time - time.monotonic(), max_wait_sec)
+    do_stabilize_notified_nodes(cast(StabilizeNotifier, gval.stabilize_notifier).wait_notified(wait_sec))
+    return next_background_time
+
 # 適当なデータを生成し、IDを求めて、そのIDなデータを担当するChordネットワーク上のノードの
 # アドレスをよろしく解決し、見つかったノードにputの操作を依頼する
 def do_put_on_random_node():
@@ -312,8 +416,8 @@ def do_put_on_random_node():
         kv_data.data_id = ChordNode.need_put_retry_data_id
         node = cast('ChordNode', ChordNode.need_put_retry_node)
     else:
-        # ミリ秒精度で取得したUNIXTIMEを文字列化してkeyに用いる
-        unixtime_str = str(time.time())
+        # ミリ秒精度で取得したUNIXTIME(離散イベントシミュレーションの場合は仮想時刻)を文字列化してkeyに用いる
+        unixtime_str = str(ChordUtil.get_current_time())
 
         # valueは乱数を生成して、それを16進表示したもの
         random_num = random.randint(0, gval.ID_SPACE_RANGE - 1)
@@ -337,12 +441,12 @@ def do_put_on_random_node():
         if ChordNode.need_put_retry_data_id == -1:
             # リトライ情報が再設定されていないためリトライに成功したと判断
             ChordUtil.dprint(
-                "do_put_on_random_node_1,retry of global_put is succeeded," + ChordUtil.gen_debug_str_of_node(node.node_info) + ","
-                + ChordUtil.gen_debug_str_of_data(cast(int, kv_data.data_id)))
+                lambda: "do_put_on_random_node_1,retry of global_put is succeeded," + ChordUtil.gen_debug_str_of_node(node.node_info) + ","
+                + ChordUtil.gen_debug_str_of_data(cast(int, kv_data.data_id)), level=LogLevel.INFO)
         else:
             ChordUtil.dprint(
-                "do_put_on_random_node_2,retry of global_put is failed," + ChordUtil.gen_debug_str_of_node(node.node_info) + ","
-                + ChordUtil.gen_debug_str_of_data(cast(int, kv_data.data_id)))
+                lambda: "do_put_on_random_node_2,retry of global_put is failed," + ChordUtil.gen_debug_str_of_node(node.node_info) + ","
+                + ChordUtil.gen_debug_str_of_data(cast(int, kv_data.data_id)), level=LogLevel.WARN)
 
     # # ロックの解放
     # gval.lock_of_all_data.release()
@@ -402,16 +506,16 @@ def do_get_on_random_node():
 
         if got_result == latest_elem.value_data:
             ChordUtil.dprint(
-                "do_get_on_random_node_1," + ChordUtil.gen_debug_str_of_node(node.node_info) + ","
+                lambda: "do_get_on_random_node_1," + ChordUtil.gen_debug_str_of_node(node.node_info) + ","
                 + ChordUtil.gen_debug_str_of_data(target_data_id) + ","
                 + got_result
-                + ",OK_GOT_VALUE_WAS_LATEST")
+                + ",OK_GOT_VALUE_WAS_LATEST", level=LogLevel.INFO)
         else:
             ChordUtil.dprint(
-                "do_get_on_random_node_1," + ChordUtil.gen_debug_str_of_node(node.node_info) + ","
+                lambda: "do_get_on_random_node_1," + ChordUtil.gen_debug_str_of_node(node.node_info) + ","
                 + ChordUtil.gen_debug_str_of_data(target_data_id) + ","
                 + got_result
-                + ",WARN__GOT_VALUE_WAS_INCONSISTENT")
+                + ",WARN__GOT_VALUE_WAS_INCONSISTENT", level=LogLevel.WARN)
 
     if is_retry:
         if ChordNode.need_getting_retry_data_id == -1:
@@ -420,14 +524,14 @@ def do_get_on_random_node():
             print_data_consistency()
 
             ChordUtil.dprint(
-                "do_get_on_random_node_2,retry of global_get is succeeded," + ChordUtil.gen_debug_str_of_node(
+                lambda: "do_get_on_random_node_2,retry of global_get is succeeded," + ChordUtil.gen_debug_str_of_node(
                     node.node_info) + ","
-                + ChordUtil.gen_debug_str_of_data(target_data_id))
+                + ChordUtil.gen_debug_str_of_data(target_data_id), level=LogLevel.INFO)
         else:
             ChordUtil.dprint(
-                "do_get_on_random_node_2,retry of global_get is failed," + ChordUtil.gen_debug_str_of_node(
+                lambda: "do_get_on_random_node_2,retry of global_get is failed," + ChordUtil.gen_debug_str_of_node(
                     node.node_info) + ","
-                + ChordUtil.gen_debug_str_of_data(target_data_id))
+                + ChordUtil.gen_debug_str_of_data(target_data_id), level=LogLevel.WARN)
     else:
         if ChordNode.need_getting_retry_data_id == -1:
             # global_getが成功していた場合のみチェックを行う
@@ -469,15 +573,13 @@ def do_kill_a_random_node():
                          and Stabilizer.need_join_retry_node == None):
                 node.is_alive = False
                 ChordUtil.dprint(
-                    "do_kill_a_random_node_1,"
+                    lambda: "do_kill_a_random_node_1,"
                     + ChordUtil.gen_debug_str_of_node(node.node_info))
                 with node.node_info.lock_of_datastore:
-                    for key, value in node.data_store.stored_data.items():
-                        data_id: str = key
-                        sv_entry : DataIdAndValue = value
-                        ChordUtil.dprint("do_kill_a_random_node_2,"
+                    for data_id in node.data_store.stored_data.keys():
+                        ChordUtil.dprint(lambda: "do_kill_a_random_node_2,"
                                          + ChordUtil.gen_debug_str_of_node(node.node_info) + ","
-                                         + hex(int(data_id)) + "," + hex(sv_entry.data_id))
+                                         + hex(data_id))
     finally:
         # node.node_info.lock_of_datastore.release()
         # node.node_info.lock_of_succ_infos.release()
@@ -502,6 +604,13 @@ def node_join_th():
         time.sleep(gval.JOIN_INTERVAL_SEC)
 
 def stabilize_th():
+    if gval.stabilize_notifier != None:
+        # 通知されたノードのみ stabilize処理 を行い、全ノードの stabilize処理 は
+        # gval.BACKGROUND_STABILIZE_INTERVAL_SEC 秒ごとに行う
+        next_background_time = time.monotonic()
+        while True:
+            next_background_time = do_stabilize_on_notification(next_background_time)
+
     while True:
         # 内部で適宜ロックを解放することで他のスレッドの処理も行えるようにしつつ
         # 呼び出し時点でのノードリストを対象に stabilize 処理を行う
@@ -548,7 +657,106 @@ def node_kill_th():
 
         time.sleep(gval.NODE_KILL_INTERVAL_SEC)
 
+# 以下は離散イベントシミュレーションとして実行する場合に、上記の各スレッドの処理の代わりに
+# gval.event_scheduler から呼び出されるイベントの処理.
+# 各スレッドの1回分のループの処理を行い、sleep する代わりに次回の実行をスケジューラに登録する
+
+def node_join_event():
+    scheduler = cast('EventScheduler', gval.event_scheduler)
+    if gval.already_born_node_num >= gval.NODE_NUM_MAX:
+        return
+    if gval.already_born_node_num == gval.KEEP_NODE_NUM and gval.is_network_constructed == False:
+        scheduler.schedule(60.0, "network_constructed", network_constructed_event)
+        return
+
+    add_new_node()
+    scheduler.schedule(gval.JOIN_INTERVAL_SEC, "join", node_join_event)
+
+def network_constructed_event():
+    gval.is_network_constructed = True
+    gval.JOIN_INTERVAL_SEC = 120.0 #20.0
+    add_new_node()
+    cast('EventScheduler', gval.event_scheduler).schedule(gval.JOIN_INTERVAL_SEC, "join", node_join_event)
+
+def stabilize_event():
+    do_stabilize_once_at_all_node_sequential()
+    # 通知されたノードの stabilize処理 を notified_stabilize_event で行う場合は、全ノードの stabilize処理 の間隔を空ける
+    interval_sec = gval.SIM_STABILIZE_INTERVAL_SEC if gval.stabilize_notifier == None else gval.BACKGROUND_STABILIZE_INTERVAL_SEC
+    cast('EventScheduler', gval.event_scheduler).schedule(interval_sec, "stabilize", stabilize_event)
+
+def notified_stabilize_event():
+    do_stabilize_notified_nodes(cast(StabilizeNotifier, gval.stabilize_notifier).wait_notified(0.0))
+    cast('EventScheduler', gval.event_scheduler).schedule(gval.SIM_NOTIFIED_STABILIZE_INTERVAL_SEC, "notified_stabilize",
+                                                          notified_stabilize_event)
+
+def data_put_event():
+    scheduler = cast('EventScheduler', gval.event_scheduler)
+    if gval.is_network_constructed == False:
+        scheduler.schedule(gval.SIM_WAIT_CONSTRUCTION_INTERVAL_SEC, "put", data_put_event)
+        return
+
+    do_put_on_random_node()
+    scheduler.schedule(gval.PUT_INTERVAL_SEC, "put", data_put_event)
+
+def data_get_event():
+    scheduler = cast('EventScheduler', gval.event_scheduler)
+    if gval.is_network_constructed == False:
+        scheduler.schedule(gval.SIM_WAIT_CONSTRUCTION_INTERVAL_SEC, "get", data_get_event)
+        return
+
+    do_get_on_random_node()
+    scheduler.schedule(gval.GET_INTERVAL_SEC, "get", data_get_event)
+
+def node_kill_event():
+    scheduler = cast('EventScheduler', gval.event_scheduler)
+    if gval.is_network_constructed == False:
+        scheduler.schedule(gval.SIM_WAIT_CONSTRUCTION_INTERVAL_SEC, "kill", node_kill_event)
+        return
+
+    do_kill_a_random_node()
+    scheduler.schedule(gval.NODE_KILL_INTERVAL_SEC, "kill", node_kill_event)
+
+# スレッドの代わりに離散イベントシミュレーションとして、仮想時刻で duration_sec 秒分の処理を実行する.
+# 処理は単一のスレッドで行われるため、乱数のシードが同じであれば毎回同じ結果となる
+def run_event_driven_sim(duration_sec : float):
+    scheduler = EventScheduler()
+    gval.event_scheduler = scheduler
+
+    # 最初の1ノードはここで登録する
+    first_node = ChordNode("THIS_VALUE_IS_NOT_USED", first_node=True)
+    first_node.is_join_op_finished = True
+    gval.all_node_dict[first_node.node_info.address_str] = first_node
+
+    # 各スレッドの起動順と同じ順で登録しておく
+    scheduler.schedule(0.0, "join", node_join_event)
+    scheduler.schedule(0.0, "stabilize", stabilize_event)
+    scheduler.schedule(0.0, "put", data_put_event)
+    scheduler.schedule(0.0, "get", data_get_event)
+    scheduler.schedule(0.0, "kill", node_kill_event)
+    if gval.stabilize_notifier != None:
+        scheduler.schedule(0.0, "notified_stabilize", notified_stabilize_event)
+
+    start_time = time.perf_counter()
+    executed_cnt = scheduler.run(duration_sec)
+    elapsed_sec = time.perf_counter() - start_time
+
+    ChordUtil.dprint(lambda: "run_event_driven_sim_1,virtual_sec=" + str(scheduler.now) + ",elapsed_sec=" + "{:.3f}".format(elapsed_sec)
+                     + ",executed_events=" + str(executed_cnt) + ",node_num=" + str(len(gval.all_node_dict))
+                     + "," + str(scheduler.executed_event_cnt), level=LogLevel.INFO)
+    ChordUtil.flush_log()
+
 def main():
+    parser = argparse.ArgumentParser(description="Chord DHT simulator")
+    parser.add_argument("--event-driven", action="store_true",
+                        help="run as a deterministic discrete-event simulation on a virtual clock instead of threads")
+    parser.add_argument("--duration", type=float, default=3600.0,
+                        help="virtual seconds to simulate with --event-driven")
+    parser.add_argument("--seed", type=int, default=1337)
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARN", "NONE"], default="DEBUG")
+    args = parser.parse_args()
+
+    gval.LOG_LEVEL = getattr(LogLevel, args.log_level)
+
     # result1 : PResult[Optional[NodeInfo]] = ChordUtil.generic_test_ok(NodeInfo())
     # print(result1)
     # result2 : PResult[Optional[NodeInfo]] = ChordUtil.generic_test_err(ErrorCode.NodeIsDownedException_CODE)
@@ -573,7 +781,15 @@ def main():
     # 再現性のため乱数シードを固定
     # ただし、複数スレッドが存在し、個々の処理の終了するタイミングや、どのタイミングで
     # スイッチするかは実行毎に異なる可能性があるため、あまり意味はないかもしれない
-    random.seed(1337)
+    # (--event-driven を指定した場合は単一スレッドで実行されるため、毎回同じ結果となる)
+    random.seed(args.seed)
+
+    if gval.ENABLE_STABILIZE_NOTIFICATION:
+        gval.stabilize_notifier = StabilizeNotifier()
+
+    if args.event_driven:
+        run_event_driven_sim(args.duration)
+        return
 
     # 最初の1ノードはここで登録する
     first_node = ChordNode("THIS_VALUE_IS_NOT_USED", first_node=True)
@@ -0,0 +1,312 @@
+# coding:utf-8
+
+import asyncio
+from typing import Dict, List, Tuple, Optional, cast, TYPE_CHECKING
+
+import modules.gval as gval
+from .chord_util import ChordUtil, DataIdAndValue, PResult, ErrorCode
+
+if TYPE_CHECKING:
+    from .chord_node import ChordNode
+    from .node_info import NodeRef
+
+# asyncio による実行を行う場合の、ノード間の呼び出しのインタフェース.
+# 各メソッドは gval.ASYNC_RPC_LATENCY_SEC だけ待った上で Endpoints の同名のメソッドに相当する処理を行うコルーチンである.
+# 待ち合わせの間はイベントループが他のノードのコルーチンを実行するため、通信の遅延を並行して待つ状況を再現できる.
+# AsyncChordNode が await する呼び出しのみを定義している.
+# put については AsyncChordNode.put を呼び出し、レプリカの配布も asyncio で行われるようにしている.
+# 呼び出しを await するのは AsyncChordNode の担当ノードの探索とレプリカの配布のみで、stabilize処理 は
+# Stabilizer をそのまま同期的に実行する
+class AsyncEndpoints:
+
+    def __init__(self, async_node : 'AsyncChordNode'):
+        self.async_node = async_node
+        self.existing_node : 'ChordNode' = async_node.existing_node
+
+    # 1回の呼び出しの往復にかかる遅延を模擬する
+    @classmethod
+    async def wait_rpc_latency(cls):
+        if gval.ASYNC_RPC_LATENCY_SEC > 0:
+            await asyncio.sleep(gval.ASYNC_RPC_LATENCY_SEC)
+        else:
+            # 遅延を模擬しない場合も他のコルーチンに実行を譲る
+            await asyncio.sleep(0)
+
+    async def grpc__put(self, data_id : int, value_str : str) -> bool:
+        await AsyncEndpoints.wait_rpc_latency()
+        return await self.async_node.put(data_id, value_str)
+
+    async def grpc__get(self, data_id : int, for_recovery = False) -> str:
+        await AsyncEndpoints.wait_rpc_latency()
+        return self.existing_node.get(data_id, for_recovery)
+
+    async def grpc__receive_replica(self, pass_datas : List[DataIdAndValue]):
+        await AsyncEndpoints.wait_rpc_latency()
+        return self.existing_node.data_store.receive_replica(pass_datas)
+
+    async def grpc__exchange_digest(self, digest : List[Tuple[int, int, int]]) -> Tuple[List[int], List[DataIdAndValue]]:
+        await AsyncEndpoints.wait_rpc_latency()
+        return self.existing_node.data_store.exchange_digest(digest)
+
+    async def grpc__closest_preceding_finger(self, id : int) -> 'ChordNode':
+        await AsyncEndpoints.wait_rpc_latency()
+        return self.existing_node.router.closest_preceding_finger(id)
+
+    async def grpc__pass_successor_list(self) -> List['NodeRef']:
+        await AsyncEndpoints.wait_rpc_latency()
+        return self.existing_node.stabilizer.pass_successor_list()
+
+# ChordNode を asyncio のイベントループ上で動作させるためのラッパー.
+# 1つのスレッドで多数のノードをコルーチンとして動かすことを想定しており、スレッドを用いる場合と比べて
+# 1ノードあたりのコストが小さいため、数千ノード規模のネットワークを1プロセスで扱える.
+# ノードの状態を変更する処理は lock_of_node_op により直列化する. ReentrantRWLock などのスレッド用のロックは
+# 同一スレッドからの取得を再入とみなすため、await を挟んで保持してはならない. 同期的に完結する部分でのみ取得する
+class AsyncChordNode:
+
+    def __init__(self, existing_node : 'ChordNode', runtime : 'AsyncChordRuntime'):
+        self.existing_node = existing_node
+        self.runtime = runtime
+        self.endpoints : AsyncEndpoints = AsyncEndpoints(self)
+        # stabilize処理 と put処理 の実行を、await を挟んだ区間も含めてノード単位で直列化する
+        self.lock_of_node_op : asyncio.Lock = asyncio.Lock()
+
+    async def global_put(self, data_id : int, value_str : str) -> bool:
+        ret = await self.find_successor(data_id)
+        if ret.is_ok == False:
+            ChordUtil.dprint(lambda: "async_global_put_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                             + ChordUtil.gen_debug_str_of_data(data_id) + ",FIND_NODE_FAILED")
+            return False
+        tantou_node = self.runtime.get_async_node(cast('ChordNode', ret.result))
+        return await tantou_node.endpoints.grpc__put(data_id, value_str)
+
+    # ChordNode.global_get の asyncio版. 担当ノードを探索して get を行い、データが見つからなかった場合は
+    # ChordNode.global_get と同様に担当ノードから predecessor、successor の順に周辺のノードをたどって問い合わせる.
+    # 探索と各ノードへの問い合わせはいずれも await するため、イベントループを止めることはない
+    async def global_get(self, data_id : int) -> str:
+        ret = await self.find_successor(data_id)
+        if ret.is_ok == False:
+            ChordUtil.dprint(lambda: "async_global_get_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                             + ChordUtil.gen_debug_str_of_data(data_id) + ",FIND_NODE_FAILED")
+            return self.existing_node.OP_FAIL_DUE_TO_FIND_NODE_FAIL_STR
+        tantou_node = cast('ChordNode', ret.result)
+        got_value_str = await self.runtime.get_async_node(tantou_node).endpoints.grpc__get(data_id)
+        if got_value_str != self.existing_node.QUERIED_DATA_NOT_FOUND_STR:
+            return got_value_str
+
+        for is_prev in [True, False]:
+            got_value_str = await self.get_from_near_nodes(tantou_node, data_id, is_prev)
+            if got_value_str != self.existing_node.QUERIED_DATA_NOT_FOUND_STR:
+                # ChordNode.global_get と同様に、リカバリ処理で取得した値は自身のデータストアにも保持しておく
+                self.existing_node.data_store.receive_replica([DataIdAndValue(data_id=data_id, value_data=got_value_str)])
+                ChordUtil.dprint(lambda: "async_global_get_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                                 + ChordUtil.gen_debug_str_of_data(data_id) + ",RECOVERED")
+                return got_value_str
+        return self.existing_node.QUERIED_DATA_NOT_FOUND_STR
+
+    # start_node から is_prev が True なら predecessor、False なら successor をたどり、
+    # 最大 ChordNode.GLOBAL_GET_NEAR_NODES_TRY_MAX_NODES 個のノードに data_id のデータを問い合わせる.
+    # 見つからなかった場合は ChordNode.QUERIED_DATA_NOT_FOUND_STR を返す
+    async def get_from_near_nodes(self, start_node : 'ChordNode', data_id : int, is_prev : bool) -> str:
+        cur_node = start_node
+        for _ in range(self.existing_node.GLOBAL_GET_NEAR_NODES_TRY_MAX_NODES):
+            # TODO: x direct access to node_info of cur_node at get_from_near_nodes
+            next_info = cur_node.node_info.predecessor_info if is_prev else cur_node.node_info.successor_info_list[0]
+            if next_info == None:
+                break
+            ret = ChordUtil.get_node_by_address(cast('NodeRef', next_info).address_str)
+            if ret.is_ok == False:
+                break
+            cur_node = cast('ChordNode', ret.result)
+            got_value_str = await self.runtime.get_async_node(cur_node).endpoints.grpc__get(data_id, for_recovery=True)
+            if got_value_str != self.existing_node.QUERIED_DATA_NOT_FOUND_STR:
+                return got_value_str
+        return self.existing_node.QUERIED_DATA_NOT_FOUND_STR
+
+    # Router.find_successor による反復的な探索の asyncio版.
+    # n_dash への closest_preceding_finger と、新たな n_dash の successor の問い合わせをそれぞれ await するため、
+    # ホップごとの通信の遅延を待つ間は他のノードのコルーチンが実行される.
+    # 探索を打ち切る条件は Router.find_predecessor と同じとする
+    async def find_successor(self, id : int) -> PResult[Optional['ChordNode']]:
+        if self.existing_node.is_alive == False:
+            ChordUtil.dprint(lambda: "async_find_successor_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                             + "REQUEST_RECEIVED_BUT_I_AM_ALREADY_DEAD")
+            return PResult.Err(None, ErrorCode.NodeIsDownedException_CODE)
+
+        self_id = self.existing_node.node_info.node_id
+        n_dash : 'ChordNode' = self.existing_node
+        n_dash_succ_info : 'NodeRef' = self.existing_node.node_info.successor_info_list[0]
+        hop_cnt = 0
+        while not ChordUtil.exist_between_two_nodes_right_mawari(n_dash.node_info.node_id, n_dash_succ_info.node_id, id):
+            if n_dash is self.existing_node:
+                n_dash_found = self.existing_node.router.closest_preceding_finger(id)
+            else:
+                n_dash_found = await self.runtime.get_async_node(n_dash).endpoints.grpc__closest_preceding_finger(id)
+            if n_dash_found.node_info.node_id == n_dash.node_info.node_id:
+                break
+            distance_old = ChordUtil.calc_distance_between_nodes_right_mawari(self_id, n_dash.node_info.node_id)
+            distance_found = ChordUtil.calc_distance_between_nodes_right_mawari(self_id, n_dash_found.node_info.node_id)
+            distance_data_id = ChordUtil.calc_distance_between_nodes_right_mawari(self_id, id)
+            if distance_found < distance_old and not (distance_old >= distance_data_id):
+                break
+            n_dash = n_dash_found
+            n_dash_succ_info = (await self.runtime.get_async_node(n_dash).endpoints.grpc__pass_successor_list())[0]
+            hop_cnt += 1
+
+        self.existing_node.router.lookup_cnt += 1
+        self.existing_node.router.lookup_hop_cnt_sum += hop_cnt
+
+        ret = ChordUtil.get_node_by_address(n_dash_succ_info.address_str)
+        if ret.is_ok == False:
+            ChordUtil.dprint(lambda: "async_find_successor_1,FOUND_NODE_IS_DOWNED," + ChordUtil.gen_debug_str_of_node(
+                self.existing_node.node_info) + "," + ChordUtil.gen_debug_str_of_data(id))
+            return PResult.Err(None, ErrorCode.AppropriateNodeNotFoundException_CODE)
+        return PResult.Ok(cast('ChordNode', ret.result))
+
+    # ChordNode.put の asyncio版. 担当データの格納までは同期的に行い、レプリカの配布は
+    # distribute_replica で successor_info_list内の各ノードに対して並行して行う
+    async def put(self, data_id : int, value_str : str) -> bool:
+        node_info = self.existing_node.node_info
+        ChordUtil.dprint(lambda: "async_put_0," + ChordUtil.gen_debug_str_of_node(node_info) + ","
+                         + ChordUtil.gen_debug_str_of_data(data_id))
+
+        async with self.lock_of_node_op:
+            if self.existing_node.is_alive == False:
+                return False
+            if node_info.predecessor_info == None:
+                return False
+            if not ChordUtil.exist_between_two_nodes_right_mawari(cast('NodeRef', node_info.predecessor_info).node_id, node_info.node_id, data_id):
+                return False
+
+            with node_info.lock_of_datastore:
+                version = self.existing_node.data_store.store_new_data(data_id, value_str)
+            await self.distribute_replica([DataIdAndValue(data_id=data_id, value_data=value_str, version=version)])
+
+        ChordUtil.dprint(lambda: "async_put_1," + ChordUtil.gen_debug_str_of_node(node_info) + ","
+                         + ChordUtil.gen_debug_str_of_data(data_id) + "," + value_str)
+        return True
+
+    # DataStore.distribute_replica の asyncio版. 配布先ごとの処理を asyncio.gather で並行に行うため、
+    # 通信の遅延が successor_info_list の長さ分積み重ならない.
+    # runtime.is_concurrent_replica_fanout が False の場合は配布先ごとに順に行う(比較用)
+    # lock_of_node_op は呼び出し元でとってある前提
+    async def distribute_replica(self, new_entries : Optional[List[DataIdAndValue]] = None):
+        node_info = self.existing_node.node_info
+        data_store = self.existing_node.data_store
+        if node_info.predecessor_info == None:
+            return
+        pred_id = cast('NodeRef', node_info.predecessor_info).node_id
+
+        # 配布先と配布内容の決定は await を挟まずに行い、その時点の状態に対して配布する
+        synced_seq = data_store.tantou_update_seq
+        tantou_data_list : Optional[List[DataIdAndValue]] = None
+        digest : List[Tuple[int, int, int]] = []
+        targets : List[Tuple[str, AsyncChordNode, bool]] = []
+        with node_info.lock_of_datastore:
+            for succ_info in node_info.successor_info_list:
+                ret = ChordUtil.get_node_by_address(succ_info.address_str)
+                if ret.is_ok == False:
+                    # 同期状態は更新されないため、次回の配布時に再同期が行われる
+                    continue
+                is_delta = data_store.is_replica_delta_applicable(succ_info.address_str, new_entries, pred_id)
+                if is_delta == False and tantou_data_list == None:
+                    tantou_data_list, digest = data_store.gen_tantou_data_digest()
+                targets.append((succ_info.address_str, self.runtime.get_async_node(cast('ChordNode', ret.result)), is_delta))
+
+        coros = []
+        for _, succ_node, is_delta in targets:
+            if is_delta:
+                coros.append(succ_node.endpoints.grpc__receive_replica(cast(List[DataIdAndValue], new_entries)))
+            else:
+                coros.append(self.resync_replica(succ_node, cast(List[DataIdAndValue], tantou_data_list), digest))
+        if self.runtime.is_concurrent_replica_fanout:
+            await asyncio.gather(*coros)
+        else:
+            for coro in coros:
+                await coro
+
+        with node_info.lock_of_datastore:
+            for address, _, _ in targets:
+                data_store.replica_synced_seq_dict[address] = (synced_seq, pred_id)
+            data_store.remove_unused_replica_sync_states()
+
+        ChordUtil.dprint(lambda: "async_distribute_replica_1," + ChordUtil.gen_debug_str_of_node(node_info) + ","
+                         + str(len(targets)))
+
+    # DataStore.resync_replica の asyncio版
+    async def resync_replica(self, succ_node : 'AsyncChordNode', tantou_data_list : List[DataIdAndValue],
+                             digest : List[Tuple[int, int, int]]):
+        missing_id_list, newer_datas = await succ_node.endpoints.grpc__exchange_digest(digest)
+        missing_ids = set(missing_id_list)
+        if len(missing_ids) > 0:
+            await succ_node.endpoints.grpc__receive_replica(
+                [entry for entry in tantou_data_list if entry.data_id in missing_ids])
+        if len(newer_datas) > 0:
+            self.existing_node.data_store.receive_replica(newer_datas)
+
+    # 以下の stabilize処理 は Stabilizer のものを同期的に実行する. 処理中のノード間の呼び出しは await されず、
+    # 通信の遅延も模擬しないため、他のノードの stabilize処理 と並行に進むことはない.
+    # 各呼び出しの前に他のコルーチンに実行を譲ることで、put や get が stabilize処理 の間に割り込めるようにしている
+    async def stabilize_successor(self) -> PResult[bool]:
+        await asyncio.sleep(0)
+        async with self.lock_of_node_op:
+            return self.existing_node.stabilizer.stabilize_successor()
+
+    async def stabilize_finger_table_adaptive(self) -> PResult[bool]:
+        await asyncio.sleep(0)
+        async with self.lock_of_node_op:
+            return self.existing_node.stabilizer.stabilize_finger_table_adaptive()
+
+    async def stabilize_finger_table(self, idx : int) -> PResult[bool]:
+        await asyncio.sleep(0)
+        async with self.lock_of_node_op:
+            return self.existing_node.stabilizer.stabilize_finger_table(idx)
+
+# gval.all_node_dict 内のノードを AsyncChordNode として扱い、各ノードの stabilize処理 をノードごとの
+# コルーチンとして1つのイベントループ上で実行する. 各ノードの stabilize処理 の1回分は同期的に行われるため、
+# コルーチン間で交互に実行されるのみであり、通信の遅延を並行して待つのは put と get の処理である
+class AsyncChordRuntime:
+
+    def __init__(self):
+        # アドレスをキーとし、AsyncChordNode を値とする
+        self.async_node_dict : Dict[str, AsyncChordNode] = {}
+        self.is_running : bool = False
+        # レプリカの配布を配布先に対して並行して行うか
+        self.is_concurrent_replica_fanout : bool = True
+
+    def get_async_node(self, node : 'ChordNode') -> AsyncChordNode:
+        address = node.node_info.address_str
+        async_node = self.async_node_dict.get(address)
+        if async_node == None or cast(AsyncChordNode, async_node).existing_node is not node:
+            async_node = AsyncChordNode(node, self)
+            self.async_node_dict[address] = async_node
+        return cast(AsyncChordNode, async_node)
+
+    # ノード1つ分の stabilize処理 のループ. 1周ごとに interval_sec 秒待つ.
+    # 実行した周回数を返す
+    async def stabilize_loop(self, async_node : AsyncChordNode, interval_sec : float) -> int:
+        round_cnt = 0
+        while self.is_running and async_node.existing_node.is_alive:
+            ret = await async_node.stabilize_successor()
+            if ret.is_ok == False:
+                ChordUtil.dprint(lambda: "async_stabilize_loop_1," + ChordUtil.gen_debug_str_of_node(async_node.existing_node.node_info)
+                                 + ",STABILIZE_FAILED")
+            if gval.ENABLE_ADAPTIVE_FINGER_REFRESH:
+                for _ in range(gval.FINGER_REFRESH_TICKS_PER_ROUND):
+                    await async_node.stabilize_finger_table_adaptive()
+            else:
+                for idx in range(gval.ID_SPACE_BITS):
+                    if self.is_running == False:
+                        break
+                    await async_node.stabilize_finger_table(idx)
+            round_cnt += 1
+            await asyncio.sleep(interval_sec)
+        return round_cnt
+
+    # join済みの全ノードの stabilize処理 を duration_sec 秒間並行して行い、全ノードでの周回数の合計を返す
+    async def run_stabilize(self, duration_sec : float, interval_sec : float = 0.0) -> int:
+        self.is_running = True
+        tasks = [asyncio.ensure_future(self.stabilize_loop(self.get_async_node(node), interval_sec))
+                 for node in list(gval.all_node_dict.values()) if node.is_join_op_finished]
+        await asyncio.sleep(duration_sec)
+        self.is_running = False
+        return sum(await asyncio.gather(*tasks))
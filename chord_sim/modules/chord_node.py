@@ -3,8 +3,9 @@
 from typing import Dict, List, Tuple, Optional, cast
 
 import sys
+import bisect
 import modules.gval as gval
-from .node_info import NodeInfo
+from .node_info import NodeInfo, NodeRef
 from .data_store import DataStore
 from .stabilizer import Stabilizer
 from .router import Router
@@ -33,7 +34,11 @@ class ChordNode:
     need_put_retry_node : Optional['ChordNode'] = None
 
     # join処理もコンストラクタで行ってしまう
-    def __init__(self, node_address: str, first_node=False):
+    # recover_address を指定した場合は、ダウンしたノードをそのアドレスで再起動させたものとし、
+    # gval.ENABLE_DATA_STORE_PERSISTENCE が True であればディスクから保持データを復元してから join する.
+    # 本来IDはアドレスのハッシュ値であり再起動しても変わらないが、この検証コードでは乱数で求めているため、
+    # ダウンしたノードのIDを recover_node_id で与える
+    def __init__(self, node_address: str, first_node=False, recover_address : Optional[str] = None, recover_node_id : Optional[int] = None):
         self.node_info : NodeInfo = NodeInfo()
 
         self.data_store : DataStore = DataStore(self)
@@ -43,8 +48,8 @@ class ChordNode:
         self.endpoints : Endpoints = Endpoints(self)
 
         # ミリ秒精度のUNIXTIMEから自身のアドレスにあたる文字列と、Chordネットワーク上でのIDを決定する
-        self.node_info.address_str = ChordUtil.gen_address_str()
-        self.node_info.node_id = ChordUtil.hash_str_to_int(self.node_info.address_str)
+        self.node_info.address_str = ChordUtil.gen_address_str() if recover_address == None else cast(str, recover_address)
+        self.node_info.node_id = ChordUtil.hash_str_to_int(self.node_info.address_str) if recover_node_id == None else cast(int, recover_node_id)
 
         gval.already_born_node_num += 1
         self.node_info.born_id = gval.already_born_node_num
@@ -56,13 +61,16 @@ class ChordNode:
         # 大本から呼び出されないようにするためのフラグ
         self.is_join_op_finished = False
 
+        if gval.ENABLE_DATA_STORE_PERSISTENCE:
+            self.data_store.open_persister(recover_address != None)
+
         if first_node:
-            with self.node_info.lock_of_pred_info, self.node_info.lock_of_succ_infos:
+            with self.node_info.lock_of_pred_info.gen_wlock(), self.node_info.lock_of_succ_infos.gen_wlock():
                 # 最初の1ノードの場合
 
                 # successorとpredecessorは自身として終了する
-                self.node_info.successor_info_list.append(self.node_info.get_partial_deepcopy())
-                self.node_info.predecessor_info = self.node_info.get_partial_deepcopy()
+                self.node_info.successor_info_list = [self.node_info.get_ref()]
+                self.node_info.predecessor_info = self.node_info.get_ref()
 
                 # 最初の1ノードなので、joinメソッド内で行われるsuccessor からの
                 # データの委譲は必要ない
@@ -72,6 +80,19 @@ class ChordNode:
             self.stabilizer.join(node_address)
 
     def global_put(self, data_id : int, value_str : str) -> bool:
+        # 担当ノードがキャッシュされていれば探索を行わずに put を依頼する
+        cached_node = self.router.get_cached_owner(data_id)
+        if cached_node != None:
+            if cast('ChordNode', cached_node).endpoints.grpc__put(data_id, value_str):
+                ChordNode.need_put_retry_data_id = -1
+                # TODO: x direct access to node_info of cached_node at global_put
+                ChordUtil.dprint(lambda: "global_put_0_5,CACHE_HIT," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+                                 + ChordUtil.gen_debug_str_of_node(cast('ChordNode', cached_node).node_info) + ","
+                                 + ChordUtil.gen_debug_str_of_data(data_id))
+                return True
+            # 担当範囲外とされたためキャッシュは古くなっている. 取り除いて通常の探索を行う
+            self.router.owner_cache.invalidate(data_id)
+
         # try:
 
         #target_node = self.router.find_successor(data_id)
@@ -87,7 +108,7 @@ class ChordNode:
             # となってしまったため次回呼び出し時にリトライする形で呼び出しをうけられるように情報を設定しておく
             ChordNode.need_put_retry_data_id = data_id
             ChordNode.need_put_retry_node = self
-            ChordUtil.dprint("global_put_1,RETRY_IS_NEEDED" + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+            ChordUtil.dprint(lambda: "global_put_1,RETRY_IS_NEEDED" + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
                              + ChordUtil.gen_debug_str_of_data(data_id))
             return False
 
@@ -104,25 +125,25 @@ class ChordNode:
         if not success:
             ChordNode.need_put_retry_data_id = data_id
             ChordNode.need_put_retry_node = self
-            ChordUtil.dprint("global_put_2,RETRY_IS_NEEDED" + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+            ChordUtil.dprint(lambda: "global_put_2,RETRY_IS_NEEDED" + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
                              + ChordUtil.gen_debug_str_of_data(data_id))
             return False
 
         # TODO: x direct access to node_info of target_node at global_put
-        ChordUtil.dprint("global_put_3," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+        ChordUtil.dprint(lambda: "global_put_3," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
                          + ChordUtil.gen_debug_str_of_node(target_node.node_info) + ","
                          + ChordUtil.gen_debug_str_of_data(data_id))
 
         return True
 
     def put(self, data_id : int, value_str : str) -> bool:
-        ChordUtil.dprint("put_0," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+        ChordUtil.dprint(lambda: "put_0," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
                          + ChordUtil.gen_debug_str_of_data(data_id))
 
         if self.is_alive == False:
             # 処理の合間でkillされてしまっていた場合の考慮
             # 何もしないで終了する
-            ChordUtil.dprint("put_0_5," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+            ChordUtil.dprint(lambda: "put_0_5," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
                              + "REQUEST_RECEIVED_BUT_I_AM_ALREADY_DEAD")
             return False
 
@@ -135,31 +156,148 @@ class ChordNode:
             return False
         # Chordネットワークを右回りにたどった時に、データの id (data_id) が predecessor の node_id から
         # 自身の node_id の間に位置する場合、そのデータは自身の担当だが、そうではない場合
-        if not ChordUtil.exist_between_two_nodes_right_mawari(cast(NodeInfo,self.node_info.predecessor_info).node_id, self.node_info.node_id, data_id):
+        if not ChordUtil.exist_between_two_nodes_right_mawari(cast(NodeRef,self.node_info.predecessor_info).node_id, self.node_info.node_id, data_id):
             return False
 
-        if self.node_info.lock_of_succ_infos.acquire(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+        if self.node_info.lock_of_succ_infos.acquire_read(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
             # 今回は失敗としてしまう
-            ChordUtil.dprint("put_1," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+            ChordUtil.dprint(lambda: "put_1," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
                              + "LOCK_ACQUIRE_TIMEOUT")
             return False
         try:
             with self.node_info.lock_of_datastore:
-                self.data_store.store_new_data(data_id, value_str)
-                self.data_store.distribute_replica()
+                version = self.data_store.store_new_data(data_id, value_str)
+                self.data_store.distribute_replica([DataIdAndValue(data_id=data_id, value_data=value_str, version=version)])
         finally:
-            self.node_info.lock_of_succ_infos.release()
+            self.node_info.lock_of_succ_infos.release_read()
 
-        ChordUtil.dprint("put_4," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+        ChordUtil.dprint(lambda: "put_4," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
                          + ChordUtil.gen_debug_str_of_data(data_id) + "," + value_str)
 
         return True
 
+    # 複数のデータIDを、それぞれを担当するノードごとにまとめたリストを返す.
+    # データIDをID空間上の順に並べておき、先頭のIDの担当ノードを find_successor で求めたら、その担当範囲
+    # (担当ノードのpredecessorから担当ノードまで) に含まれるIDは同じノードの担当であるとしてまとめる.
+    # これにより、担当ノードの探索はデータIDごとではなく、担当ノードごとに1回で済む.
+    # 担当ノードを得られなかったIDは、担当ノードを None としたグループとして返す
+    def group_data_ids_by_tantou_node(self, data_ids : List[int]) -> List[Tuple[Optional['ChordNode'], List[int]]]:
+        remaining_ids : List[int] = sorted(set(data_ids))
+        ret_groups : List[Tuple[Optional['ChordNode'], List[int]]] = []
+        while len(remaining_ids) > 0:
+            first_id = remaining_ids[0]
+            ret = self.router.find_successor(first_id)
+            if (ret.is_ok):
+                target_node: 'ChordNode' = cast('ChordNode', ret.result)
+            else:  # ret.err_code == ErrorCode.AppropriateNodeNotFoundException_CODE || ret.err_code == ErrorCode.InternalControlFlowException_CODE || ret.err_code == ErrorCode.NodeIsDownedException_CODE
+                ChordUtil.dprint(lambda: "group_data_ids_by_tantou_node_1,FIND_NODE_FAILED," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+                                 + ChordUtil.gen_debug_str_of_data(first_id))
+                ret_groups.append((None, [first_id]))
+                remaining_ids.pop(0)
+                continue
+
+            group_ids : List[int] = []
+            # TODO: pass_predecessor_info call at group_data_ids_by_tantou_node
+            target_pred_info = target_node.endpoints.grpc__pass_predecessor_info()
+            if target_pred_info != None:
+                # TODO: x direct access to node_info of target_node at group_data_ids_by_tantou_node
+                for range_start, range_end in ChordUtil.conv_ring_range_to_linear_ranges(
+                        cast(NodeRef, target_pred_info).node_id, target_node.node_info.node_id):
+                    start_idx = bisect.bisect_left(remaining_ids, range_start)
+                    end_idx = bisect.bisect_left(remaining_ids, range_end)
+                    group_ids.extend(remaining_ids[start_idx:end_idx])
+            if first_id not in group_ids:
+                # 経路情報が安定していない場合の考慮. 少なくとも先頭のIDは見つかったノードに依頼する
+                # (担当範囲外であれば依頼先でエラーとなる)
+                group_ids.append(first_id)
+
+            ret_groups.append((target_node, group_ids))
+            group_id_set = set(group_ids)
+            remaining_ids = [data_id for data_id in remaining_ids if data_id not in group_id_set]
+
+        return ret_groups
+
+    # 複数のデータをまとめてputする
+    # 担当ノードごとにまとめて、担当ノード1つにつき1回の multi_put を発行する
+    # items の各要素に対応する形で、putに成功したか否かのリストを返す
+    def global_multi_put(self, items : List[DataIdAndValue]) -> List[bool]:
+        ChordUtil.dprint(lambda: "global_multi_put_0," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+                         + str(len(items)))
+
+        # 同じIDのデータが複数含まれる場合は後のものを用いる
+        item_dict : Dict[int, DataIdAndValue] = {item.data_id : item for item in items}
+        result_dict : Dict[int, bool] = {}
+        for target_node, group_ids in self.group_data_ids_by_tantou_node(list(item_dict.keys())):
+            if target_node == None:
+                for data_id in group_ids:
+                    result_dict[data_id] = False
+                continue
+
+            results = cast('ChordNode', target_node).endpoints.grpc__multi_put([item_dict[data_id] for data_id in group_ids])
+            for data_id, is_success in zip(group_ids, results):
+                result_dict[data_id] = is_success
+
+            # TODO: x direct access to node_info of target_node at global_multi_put
+            ChordUtil.dprint(lambda: "global_multi_put_1," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+                             + ChordUtil.gen_debug_str_of_node(cast('ChordNode', target_node).node_info) + ","
+                             + str(len(group_ids)))
+
+        return [result_dict[item.data_id] for item in items]
+
+    # 複数のデータをまとめて格納する. 各データについての判定は put と同様である
+    # 格納したデータのレプリカの配布もまとめて行う
+    # items の各要素に対応する形で、格納したか否かのリストを返す
+    def multi_put(self, items : List[DataIdAndValue]) -> List[bool]:
+        ChordUtil.dprint(lambda: "multi_put_0," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+                         + str(len(items)))
+
+        if self.is_alive == False:
+            # 処理の合間でkillされてしまっていた場合の考慮
+            # 何もしないで終了する
+            ChordUtil.dprint(lambda: "multi_put_0_5," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+                             + "REQUEST_RECEIVED_BUT_I_AM_ALREADY_DEAD")
+            return [False] * len(items)
+
+        if self.node_info.predecessor_info == None:
+            return [False] * len(items)
+        pred_id = cast(NodeRef, self.node_info.predecessor_info).node_id
+
+        if self.node_info.lock_of_succ_infos.acquire_read(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+            # 今回は失敗としてしまう
+            ChordUtil.dprint(lambda: "multi_put_1," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+                             + "LOCK_ACQUIRE_TIMEOUT")
+            return [False] * len(items)
+        try:
+            results : List[bool] = []
+            stored_entries : List[DataIdAndValue] = []
+            # 担当範囲のデータであるかの判定はまとめて行う
+            is_tantou_list = ChordUtil.exist_between_two_nodes_right_mawari_batch(
+                pred_id, self.node_info.node_id, [item.data_id for item in items])
+            with self.node_info.lock_of_datastore:
+                for item, is_tantou in zip(items, is_tantou_list):
+                    # 担当範囲のデータでなければ格納しない
+                    if not is_tantou:
+                        results.append(False)
+                        continue
+                    version = self.data_store.store_new_data(item.data_id, item.value_data)
+                    stored_entries.append(DataIdAndValue(data_id=item.data_id, value_data=item.value_data, version=version))
+                    results.append(True)
+
+                if len(stored_entries) > 0:
+                    self.data_store.distribute_replica(stored_entries)
+        finally:
+            self.node_info.lock_of_succ_infos.release_read()
+
+        ChordUtil.dprint(lambda: "multi_put_2," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+                         + str(len(items)) + "," + str(len(stored_entries)))
+
+        return results
+
     # global_getで取得しようとしたKeyが探索したノードに存在なかった場合に、当該ノードから
     # predecessorを辿ってリカバリを試みる処理をくくり出したもの
     def global_get_recover_prev(self, data_id : int) -> Tuple[str, Optional['ChordNode']]:
-        if self.node_info.lock_of_pred_info.acquire(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
-            ChordUtil.dprint("global_get_recover_prev_0," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+        if self.node_info.lock_of_pred_info.acquire_read(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+            ChordUtil.dprint(lambda: "global_get_recover_prev_0," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
                              + "LOCK_ACQUIRE_TIMEOUT")
             return ChordNode.QUERIED_DATA_NOT_FOUND_STR, None
         try:
@@ -169,8 +307,8 @@ class ChordNode:
             # try:
 
                 # cur_predecessor : ChordNode = ChordUtil.get_node_by_address(
-                #     cast(NodeInfo, self.node_info.predecessor_info).address_str)
-            ret = ChordUtil.get_node_by_address(cast(NodeInfo, self.node_info.predecessor_info).address_str)
+                #     cast(NodeRef, self.node_info.predecessor_info).address_str)
+            ret = ChordUtil.get_node_by_address(cast(NodeRef, self.node_info.predecessor_info).address_str)
             if (ret.is_ok):
                 cur_predecessor : 'ChordNode' = cast('ChordNode', ret.result)
                 got_value_str = cur_predecessor.endpoints.grpc__get(data_id, for_recovery=True)
@@ -193,13 +331,13 @@ class ChordNode:
             #     ChordUtil.dprint("global_get_recover_prev_3,TARGET_NODE_DOES_NOT_EXIST_EXCEPTION_IS_OCCURED")
             #     return ChordNode.QUERIED_DATA_NOT_FOUND_STR, None
 
-            ChordUtil.dprint("global_get_recover_prev_4," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+            ChordUtil.dprint(lambda: "global_get_recover_prev_4," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
                              + ChordUtil.gen_debug_str_of_data(data_id))
             if got_value_str != ChordNode.QUERIED_DATA_NOT_FOUND_STR:
                 # データが円環上でIDが小さくなっていく方向（反時計時計回りの方向）を前方とした場合に
                 # 前方に位置するpredecessorを辿ることでデータを取得することができた
                 # TODO: x direct access to node_info of cur_predecessor at global_get
-                ChordUtil.dprint("global_get_recover_prev_5,"
+                ChordUtil.dprint(lambda: "global_get_recover_prev_5,"
                                  + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
                                  + "data found at predecessor,"
                                  + ChordUtil.gen_debug_str_of_node(cur_predecessor.node_info))
@@ -207,13 +345,13 @@ class ChordNode:
             else:
                 # できなかった
                 # TODO: x direct access to node_info of cur_predecessor at global_get
-                ChordUtil.dprint("global_get_recover_prev_6,"
+                ChordUtil.dprint(lambda: "global_get_recover_prev_6,"
                                  + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
                                  + "data not found at predecessor,"
                                  + ChordUtil.gen_debug_str_of_node(cur_predecessor.node_info))
                 return ChordNode.QUERIED_DATA_NOT_FOUND_STR, cur_predecessor
         finally:
-            self.node_info.lock_of_pred_info.release()
+            self.node_info.lock_of_pred_info.release_read()
 
         # 他の例外の発生ででここに到達した
         return ChordNode.QUERIED_DATA_NOT_FOUND_STR, None
@@ -223,10 +361,10 @@ class ChordNode:
     def global_get_recover_succ(self, data_id : int) -> Tuple[str, Optional['ChordNode']]:
         # try:
             # cur_successor : ChordNode = ChordUtil.get_node_by_address(
-            #     cast(NodeInfo, self.node_info.successor_info_list[0]).address_str)
+            #     cast(NodeRef, self.node_info.successor_info_list[0]).address_str)
             # got_value_str = cur_successor.endpoints.grpc__get(data_id, for_recovery=True)
 
-        ret = ChordUtil.get_node_by_address(cast(NodeInfo, self.node_info.successor_info_list[0]).address_str)
+        ret = ChordUtil.get_node_by_address(cast(NodeRef, self.node_info.successor_info_list[0]).address_str)
         if (ret.is_ok):
             cur_successor : 'ChordNode' = cast('ChordNode', ret.result)
             got_value_str = cur_successor.endpoints.grpc__get(data_id, for_recovery=True)
@@ -249,14 +387,14 @@ class ChordNode:
         #     ChordUtil.dprint("global_get_recover_succ_3,TARGET_NODE_DOES_NOT_EXIST_EXCEPTION_IS_OCCURED")
         #     return ChordNode.QUERIED_DATA_NOT_FOUND_STR, None
 
-        ChordUtil.dprint("global_get_recover_succ_4," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+        ChordUtil.dprint(lambda: "global_get_recover_succ_4," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
                          + ChordUtil.gen_debug_str_of_data(data_id))
 
         if got_value_str != ChordNode.QUERIED_DATA_NOT_FOUND_STR:
             # データが円環上でIDが小さくなっていく方向（反時計時計回りの方向）を前方とした場合に
             # 前方に位置するsuccessorを辿ることでデータを取得することができた
             # TODO: x direct access to node_info of cur_successor at global_get
-            ChordUtil.dprint("global_get_recover_succ_5,"
+            ChordUtil.dprint(lambda: "global_get_recover_succ_5,"
                              + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
                              + "data found at successor,"
                              + ChordUtil.gen_debug_str_of_node(cur_successor.node_info))
@@ -264,7 +402,7 @@ class ChordNode:
         else:
             # できなかった
             # TODO: x direct access to node_info of cur_successor at global_get
-            ChordUtil.dprint("global_get_recover_succ_6,"
+            ChordUtil.dprint(lambda: "global_get_recover_succ_6,"
                              + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
                              + "data not found at successor,"
                              + ChordUtil.gen_debug_str_of_node(cur_successor.node_info))
@@ -281,31 +419,42 @@ class ChordNode:
     #       実システムでは一定回数リトライを行い、それでもダメな場合は ChordNode.QUERIED_DATA_NOT_FOUND_STR を返すという
     #       形にしなければならない at global_get
     def global_get(self, data_id : int) -> str:
-        ChordUtil.dprint("global_get_0," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+        ChordUtil.dprint(lambda: "global_get_0," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
                          + ChordUtil.gen_debug_str_of_data(data_id))
 
         # try:
             # target_node = self.router.find_successor(data_id)
             # got_value_str = target_node.endpoints.grpc__get(data_id)
 
-        ret = self.router.find_successor(data_id)
-        if (ret.is_ok):
-            target_node: 'ChordNode' = cast('ChordNode', ret.result)
+        # 担当ノードがキャッシュされていれば探索を行わずに get を依頼する
+        cached_node = self.router.get_cached_owner(data_id)
+        if cached_node != None:
+            target_node : 'ChordNode' = cast('ChordNode', cached_node)
             got_value_str = target_node.endpoints.grpc__get(data_id)
-        else:
-            # ret.err_code == ErrorCode.AppropriateNodeNotFoundException_CODE || ret.err_code == ErrorCode.InternalControlFlowException_CODE
-            # || ret.err_code == ErrorCode.NodeIsDownedException_CODE
+            if got_value_str == ChordNode.QUERIED_DATA_NOT_FOUND_STR or got_value_str == ChordNode.OP_FAIL_DUE_TO_FIND_NODE_FAIL_STR:
+                # キャッシュが古くなっている可能性があるため取り除いて通常の探索を行う
+                self.router.owner_cache.invalidate(data_id)
+                cached_node = None
 
-            # 適切なノードを得ることができなかった、もしくは、内部エラーが発生した
+        if cached_node == None:
+            ret = self.router.find_successor(data_id)
+            if (ret.is_ok):
+                target_node: 'ChordNode' = cast('ChordNode', ret.result)
+                got_value_str = target_node.endpoints.grpc__get(data_id)
+            else:
+                # ret.err_code == ErrorCode.AppropriateNodeNotFoundException_CODE || ret.err_code == ErrorCode.InternalControlFlowException_CODE
+                # || ret.err_code == ErrorCode.NodeIsDownedException_CODE
 
-            # リトライに必要な情報をクラス変数に設定しておく
-            ChordNode.need_getting_retry_data_id = data_id
-            ChordNode.need_getting_retry_node = self
+                # 適切なノードを得ることができなかった、もしくは、内部エラーが発生した
 
-            ChordUtil.dprint("global_get_0_1,FIND_NODE_FAILED," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
-                             + ChordUtil.gen_debug_str_of_data(data_id))
-            # 処理を終える
-            return ChordNode.OP_FAIL_DUE_TO_FIND_NODE_FAIL_STR
+                # リトライに必要な情報をクラス変数に設定しておく
+                ChordNode.need_getting_retry_data_id = data_id
+                ChordNode.need_getting_retry_node = self
+
+                ChordUtil.dprint(lambda: "global_get_0_1,FIND_NODE_FAILED," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+                                 + ChordUtil.gen_debug_str_of_data(data_id))
+                # 処理を終える
+                return ChordNode.OP_FAIL_DUE_TO_FIND_NODE_FAIL_STR
 
         # except (AppropriateNodeNotFoundException, InternalControlFlowException, NodeIsDownedExceptiopn):
         #     # 適切なノードを得ることができなかった、もしくは、内部エラーが発生した
@@ -327,7 +476,7 @@ class ChordNode:
             # 最初は処理の都合上、最初にgetをかけたノードを設定する
             cur_predecessor : 'ChordNode' = target_node
             while tried_node_num < ChordNode.GLOBAL_GET_NEAR_NODES_TRY_MAX_NODES:
-                ChordUtil.dprint("global_get_1," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+                ChordUtil.dprint(lambda: "global_get_1," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
                                  + ChordUtil.gen_debug_str_of_data(data_id) + ","
                                  + got_value_str + "," + str(tried_node_num))
 
@@ -348,7 +497,7 @@ class ChordNode:
             # 最初は処理の都合上、最初にgetをかけたノードを設定する
             cur_successor = target_node
             while tried_node_num < ChordNode.GLOBAL_GET_NEAR_NODES_TRY_MAX_NODES:
-                ChordUtil.dprint("global_get_2," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+                ChordUtil.dprint(lambda: "global_get_2," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
                                  + ChordUtil.gen_debug_str_of_data(data_id) + ","
                                  + got_value_str + "," + str(tried_node_num))
 
@@ -381,11 +530,12 @@ class ChordNode:
             ChordNode.need_getting_retry_node = self
 
         if is_data_got_on_recovery == True:
-            # リカバリ処理でデータを取得した場合は自身のデータストアにもその値を保持しておく
-            self.data_store.store_new_data(data_id, got_value_str)
+            # リカバリ処理でデータを取得した場合は自身のデータストアにもその値を保持しておく.
+            # 取得した値の版は分からないため版 0 として扱い、保持している値があればそちらを優先する
+            self.data_store.receive_replica([DataIdAndValue(data_id=data_id, value_data=got_value_str)])
 
         # TODO: x direct access to node_info of target_node at global_get
-        ChordUtil.dprint("global_get_3," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+        ChordUtil.dprint(lambda: "global_get_3," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
               + ChordUtil.gen_debug_str_of_node(target_node.node_info) + ","
               + ChordUtil.gen_debug_str_of_data(data_id) + "," + got_value_str)
         return got_value_str
@@ -395,55 +545,97 @@ class ChordNode:
         if self.is_alive == False:
             # 処理の合間でkillされてしまっていた場合の考慮
             # 何もしないで終了する
-            ChordUtil.dprint("get_0," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+            ChordUtil.dprint(lambda: "get_0," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
                              + "REQUEST_RECEIVED_BUT_I_AM_ALREADY_DEAD")
             return ChordNode.OP_FAIL_DUE_TO_FIND_NODE_FAIL_STR
 
-        if self.node_info.predecessor_info == None:
-            # まだpredecessorが設定されれていなかった場合の考慮
-            ChordUtil.dprint("get_0_5," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
-                             + "REQUEST_RECEIVED_BUT_I_CAN_NOT_KNOW_TANTOU_RANGE")
-            return ChordNode.QUERIED_DATA_NOT_FOUND_STR
+        # 担当範囲の判定に predecessor_info を参照するため Readerロックをとる
+        # (stabilize処理による更新とは排他されるが、他のクエリとは並行して処理できる)
+        if self.node_info.lock_of_pred_info.acquire_read(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+            ChordUtil.dprint(lambda: "get_0_1," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+                             + "LOCK_ACQUIRE_TIMEOUT")
+            return ChordNode.OP_FAIL_DUE_TO_FIND_NODE_FAIL_STR
+        try:
+            if self.node_info.predecessor_info == None:
+                # まだpredecessorが設定されれていなかった場合の考慮
+                ChordUtil.dprint(lambda: "get_0_5," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+                                 + "REQUEST_RECEIVED_BUT_I_CAN_NOT_KNOW_TANTOU_RANGE")
+                return ChordNode.QUERIED_DATA_NOT_FOUND_STR
 
-        # try:
-            #di_entry : DataIdAndValue = self.data_store.get(data_id)
-        ret = self.data_store.get(data_id)
-        if (ret.is_ok):
-            di_entry: DataIdAndValue = cast(DataIdAndValue, ret.result)
-        else:  # ret.err_code == ErrorCode.KeyError_CODE
-            err_str = ChordNode.QUERIED_DATA_NOT_FOUND_STR
-            ChordUtil.dprint("get_1," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
-                             + ChordUtil.gen_debug_str_of_data(data_id) + "," + err_str)
-            return err_str
-        # except KeyError:
-        #     err_str = ChordNode.QUERIED_DATA_NOT_FOUND_STR
-        #     ChordUtil.dprint("get_1," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
-        #                  + ChordUtil.gen_debug_str_of_data(data_id) + "," + err_str)
-        #     return err_str
-
-        # Chordネットワークを右回りにたどった時に、データの id (data_id) がpredecessorの node_id から
-        # 自身の node_id の間に位置した.
-        # つまり、自身の担当ID範囲であった
-        if ChordUtil.exist_between_two_nodes_right_mawari(cast('NodeInfo', self.node_info.predecessor_info).node_id,
-                                                          self.node_info.node_id,
-                                                          data_id) or for_recovery == True:
-            # 担当ノード（マスター）のデータであったか、担当ノードとしてgetを受け付けたがデータを持っていなかったために
-            # 周囲のノードに当該データを持っていないか問い合わせる処理を行っていた場合
-            ret_value_str = di_entry.value_data
-            ChordUtil.dprint("get_2," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
-                             + ChordUtil.gen_debug_str_of_data(data_id) + "," + ret_value_str)
-        else:
-            # 自身の担当範囲のIDのデータでは無かった
-            # 該当IDのデータを保持していたとしてもレプリカであるので返さずにエラー文字列を返す
-            ret_value_str = self.QUERIED_DATA_NOT_FOUND_STR
+            # try:
+                #di_entry : DataIdAndValue = self.data_store.get(data_id)
+            ret = self.data_store.get(data_id)
+            if (ret.is_ok):
+                di_entry: DataIdAndValue = cast(DataIdAndValue, ret.result)
+            else:  # ret.err_code == ErrorCode.KeyError_CODE
+                err_str = ChordNode.QUERIED_DATA_NOT_FOUND_STR
+                ChordUtil.dprint(lambda: "get_1," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+                                 + ChordUtil.gen_debug_str_of_data(data_id) + "," + err_str)
+                return err_str
+            # except KeyError:
+            #     err_str = ChordNode.QUERIED_DATA_NOT_FOUND_STR
+            #     ChordUtil.dprint("get_1," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+            #                  + ChordUtil.gen_debug_str_of_data(data_id) + "," + err_str)
+            #     return err_str
+
+            # Chordネットワークを右回りにたどった時に、データの id (data_id) がpredecessorの node_id から
+            # 自身の node_id の間に位置した.
+            # つまり、自身の担当ID範囲であった
+            if ChordUtil.exist_between_two_nodes_right_mawari(cast('NodeRef', self.node_info.predecessor_info).node_id,
+                                                              self.node_info.node_id,
+                                                              data_id) or for_recovery == True:
+                # 担当ノード（マスター）のデータであったか、担当ノードとしてgetを受け付けたがデータを持っていなかったために
+                # 周囲のノードに当該データを持っていないか問い合わせる処理を行っていた場合
+                ret_value_str = di_entry.value_data
+                ChordUtil.dprint(lambda: "get_2," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+                                 + ChordUtil.gen_debug_str_of_data(data_id) + "," + ret_value_str)
+            else:
+                # 自身の担当範囲のIDのデータでは無かった
+                # 該当IDのデータを保持していたとしてもレプリカであるので返さずにエラー文字列を返す
+                ret_value_str = self.QUERIED_DATA_NOT_FOUND_STR
 
-            ChordUtil.dprint("get_3," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
-                             + ChordUtil.gen_debug_str_of_data(data_id) + "," + ret_value_str)
+                ChordUtil.dprint(lambda: "get_3," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+                                 + ChordUtil.gen_debug_str_of_data(data_id) + "," + ret_value_str)
 
-        ChordUtil.dprint("get_4," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
-                         + ChordUtil.gen_debug_str_of_data(data_id) + "," + ret_value_str)
+            ChordUtil.dprint(lambda: "get_4," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+                             + ChordUtil.gen_debug_str_of_data(data_id) + "," + ret_value_str)
 
-        return ret_value_str
+            return ret_value_str
+        finally:
+            self.node_info.lock_of_pred_info.release_read()
+
+    # 複数のデータをまとめてgetする
+    # 担当ノードごとにまとめて、担当ノード1つにつき1回の multi_get を発行する.
+    # 担当ノードから取得できなかったデータについては、周囲のノードからのリカバリを含む global_get
+    # で個別に取得を試みる.
+    # data_ids の各要素に対応する形で、得られた value の文字列のリストを返す
+    def global_multi_get(self, data_ids : List[int]) -> List[str]:
+        ChordUtil.dprint(lambda: "global_multi_get_0," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+                         + str(len(data_ids)))
+
+        result_dict : Dict[int, str] = {}
+        for target_node, group_ids in self.group_data_ids_by_tantou_node(data_ids):
+            if target_node == None:
+                for data_id in group_ids:
+                    result_dict[data_id] = ChordNode.OP_FAIL_DUE_TO_FIND_NODE_FAIL_STR
+                continue
+
+            got_values = cast('ChordNode', target_node).endpoints.grpc__multi_get(group_ids)
+            for data_id, got_value_str in zip(group_ids, got_values):
+                if got_value_str == ChordNode.QUERIED_DATA_NOT_FOUND_STR:
+                    got_value_str = self.global_get(data_id)
+                result_dict[data_id] = got_value_str
+
+            # TODO: x direct access to node_info of target_node at global_multi_get
+            ChordUtil.dprint(lambda: "global_multi_get_1," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+                             + ChordUtil.gen_debug_str_of_node(cast('ChordNode', target_node).node_info) + ","
+                             + str(len(group_ids)))
+
+        return [result_dict[data_id] for data_id in data_ids]
+
+    # 複数のデータIDに対応する value の文字列をまとめて返す. 各データについての処理は get と同様である
+    def multi_get(self, data_ids : List[int]) -> List[str]:
+        return [self.get(data_id) for data_id in data_ids]
 
     # 指定されたデータが存在した場合は true を返し、そうでない場合は false を返す
     # TODO: global_getとglobal_putを呼び出しているがそれぞれで発見したノードが異なった場合
@@ -457,17 +649,17 @@ class ChordNode:
         return not (cur_val == ChordNode.QUERIED_DATA_NOT_FOUND_STR
                     or cur_val == DataStore.DELETED_ENTRY_MARKING_STR)
 
-    def pass_node_info(self) -> 'NodeInfo':
-        return self.node_info.get_partial_deepcopy()
+    def pass_node_info(self) -> 'NodeRef':
+        return self.node_info.get_ref()
 
     # TODO: 実システムでのみ利用される. 他ノードのChordNodeオブジェクトはデフォルトで
     #       successor_info_listが空リストとなっているので、その内容をrpc呼び出しを
     #       行って取得したデータで埋める
     def fill_succ_info_list(self):
-        if self.node_info.lock_of_succ_infos.acquire(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
-            ChordUtil.dprint("fill_succ_info_list_1," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
+        if self.node_info.lock_of_succ_infos.acquire_write(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+            ChordUtil.dprint(lambda: "fill_succ_info_list_1," + ChordUtil.gen_debug_str_of_node(self.node_info) + ","
                              + "LOCK_ACQUIRE_TIMEOUT")
         try:
             self.node_info.successor_info_list = self.endpoints.grpc__pass_successor_list()
         finally:
-            self.node_info.lock_of_succ_infos.release()
+            self.node_info.lock_of_succ_infos.release_write()
@@ -6,13 +6,29 @@ import random
 import datetime
 import dataclasses
 import traceback
-from typing import List, Any, Optional, TypeVar, Generic, Union, cast, TYPE_CHECKING
+import zlib
+from typing import List, Tuple, Any, Callable, Optional, TypeVar, Generic, Union, cast, TYPE_CHECKING
 
 from . import gval
+from .log_writer import LogLevel
+
+# numpy が利用可能な場合は、複数のIDをまとめて扱うID空間上の距離や範囲の計算をベクトル演算で行う.
+# 利用できない環境でも動作するよう、その場合は要素毎に計算する実装にフォールバックする
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# int64 で ID空間 の値を扱えるのは ID_SPACE_BITS が 62 以下の場合のみ (差をとる際の符号の分を考慮).
+# sha1 の 160bit とした場合などはベクトル演算は用いない
+IS_VECTORIZED_RING_CALC_ENABLED = np is not None and gval.ID_SPACE_BITS <= 62
 
 if TYPE_CHECKING:
     from .chord_node import ChordNode
-    from .node_info import NodeInfo
+    from .transport import Transport
+    from .latency_model import LatencyModel
+    from .stabilize_notifier import StabilizeNotifier
+    from .node_info import NodeInfo, NodeRef
 
 class ErrorCode:
     KeyError_CODE = 1
@@ -67,10 +83,52 @@ class ChordUtil:
         return ChordUtil.get_random_elem(gval.all_data_list)
 
     # UNIXTIME（ミリ秒精度）にいくつか値を加算した値からアドレス文字列を生成する
+    # 離散イベントシミュレーションとして実行している場合は、再現性のため何ノード目として生成されたかの値から生成する
     @classmethod
     def gen_address_str(cls) -> str:
+        if gval.event_scheduler != None:
+            return "sim_node_" + str(gval.already_born_node_num + 1)
         return str(time.time() + 10)
 
+    # 現在時刻(秒)を返す
+    # 離散イベントシミュレーションとして実行している場合は仮想時刻、そうでない場合はUNIXTIMEとなる
+    @classmethod
+    def get_current_time(cls) -> float:
+        if gval.event_scheduler != None:
+            return gval.event_scheduler.now
+        return time.time()
+
+    # from_address のノードから to_address のノードへの片道の通信の遅延(秒)を返す
+    # gval.latency_model が設定されていればそれに従い、そうでなければ一律に gval.SIM_LINK_DELAY_SEC とする
+    @classmethod
+    def get_link_latency(cls, from_address : str, to_address : str) -> float:
+        if gval.latency_model != None:
+            return cast('LatencyModel', gval.latency_model).get_latency(from_address, to_address)
+        return gval.SIM_LINK_DELAY_SEC
+
+    # from_address のノードから to_address のノードへの片道の通信の遅延を模擬する
+    # gval.ENABLE_SIM_LINK_DELAY が False の場合は何もしない
+    @classmethod
+    def simulate_link_delay(cls, from_address : str, to_address : str):
+        if gval.ENABLE_SIM_LINK_DELAY:
+            delay_sec = ChordUtil.get_link_latency(from_address, to_address)
+            if delay_sec > 0:
+                time.sleep(delay_sec)
+
+    # メンバーシップの変化により address のノードで stabilize処理 が必要になったことを
+    # gval.stabilize_notifier に通知する. 通知先が設定されていない場合は何もしない
+    @classmethod
+    def request_stabilize(cls, address : str):
+        if gval.stabilize_notifier != None:
+            cast('StabilizeNotifier', gval.stabilize_notifier).notify(address, gval.SUCCESSOR_LIST_NORMAL_LEN - 1)
+
+    # address のノードを gval.all_node_dict に登録した際に gval.stabilize_notifier に通知する.
+    # 通知先が設定されていない場合は何もしない
+    @classmethod
+    def notify_node_registered(cls, address : str):
+        if gval.stabilize_notifier != None:
+            cast('StabilizeNotifier', gval.stabilize_notifier).notify_node_registered(address)
+
     # 計算したID値がID空間の最大値を超えていた場合は、空間内に収まる値に変換する
     @classmethod
     def overflow_check_and_conv(cls, id : int) -> int:
@@ -103,8 +161,9 @@ class ChordUtil:
         slided_base_id = base_id - target_id
         if(slided_base_id < 0):
             # マイナスの値をとった場合は値0を通り越しているので
-            # それにあった値に置き換える
-            slided_base_id = gval.ID_MAX + slided_base_id
+            # それにあった値に置き換える.
+            # ID空間の要素数(ID_MAX + 1)を足すことで 環状のID空間 上の距離となる
+            slided_base_id = gval.ID_SPACE_RANGE + slided_base_id
 
         # 0を跨いだ場合の考慮はされているのであとは単純に値の大きな方から小さな方との差
         # が結果となる. ここでは slided_target_id は 0 であり、slided_base_id は必ず正の値
@@ -127,8 +186,9 @@ class ChordUtil:
         slided_target_id = target_id - base_id
         if(slided_target_id < 0):
             # マイナスの値をとった場合は値0を通り越しているので
-            # それにあった値に置き換える
-            slided_target_id = gval.ID_MAX + slided_target_id
+            # それにあった値に置き換える.
+            # ID空間の要素数(ID_MAX + 1)を足すことで 環状のID空間 上の距離となる
+            slided_target_id = gval.ID_SPACE_RANGE + slided_target_id
 
         # 0を跨いだ場合の考慮はされているのであとは単純に値の大きな方から小さな方との差
         # が結果となる. ここでは slided_base_id は 0 であり、slided_target_id は必ず正の値
@@ -148,18 +208,84 @@ class ChordUtil:
         else:
             return False
 
+    # calc_distance_between_nodes_right_mawari を複数の target_id に対してまとめて行い、
+    # 各 target_id までの距離のリストを返す.
+    # base_id と一致する target_id の距離は、スカラー版と同じく一周分となる
+    @classmethod
+    def calc_distance_between_nodes_right_mawari_batch(cls, base_id : int, target_ids : List[int]) -> List[int]:
+        if not IS_VECTORIZED_RING_CALC_ENABLED:
+            return [ChordUtil.calc_distance_between_nodes_right_mawari(base_id, target_id) for target_id in target_ids]
+
+        return ChordUtil.calc_distance_array_right_mawari(base_id, np.asarray(target_ids, dtype=np.int64)).tolist()
+
+    # exist_between_two_nodes_right_mawari を複数の target_id に対してまとめて行い、
+    # target_ids と同じ並びで判定結果の bool値 のリストを返す
+    @classmethod
+    def exist_between_two_nodes_right_mawari_batch(cls, from_id : int, end_id : int, target_ids : List[int]) -> List[bool]:
+        if not IS_VECTORIZED_RING_CALC_ENABLED:
+            return [ChordUtil.exist_between_two_nodes_right_mawari(from_id, end_id, target_id) for target_id in target_ids]
+
+        distance_end = ChordUtil.calc_distance_between_nodes_right_mawari(from_id, end_id)
+        distance_targets = ChordUtil.calc_distance_array_right_mawari(from_id, np.asarray(target_ids, dtype=np.int64))
+        return (distance_targets < distance_end).tolist()
+
+    # 上記のバッチ版の距離計算の本体. IS_VECTORIZED_RING_CALC_ENABLED が True の場合のみ呼び出される
+    @classmethod
+    def calc_distance_array_right_mawari(cls, base_id : int, target_id_arr : Any) -> Any:
+        # 0 を跨いだ場合も含めて、剰余をとることでスカラー版と同じ値となる
+        distance_arr = (target_id_arr - base_id) % gval.ID_SPACE_RANGE
+        distance_arr[distance_arr == 0] = gval.ID_SPACE_RANGE - 1
+        return distance_arr
+
+    # レプリカの同期の際にデータの値が一致しているかを比較するためのチェックサムを返す
+    # プロセスを跨いでも同じ値となるよう組み込みの hash関数 ではなく crc32 を用いる
+    @classmethod
+    def calc_value_checksum(cls, value_str : str) -> int:
+        return zlib.crc32(value_str.encode())
+
+    # UTF-8 でエンコード済みの値に対して calc_value_checksum と同じチェックサムを返す
+    @classmethod
+    def calc_value_checksum_of_bytes(cls, value_bytes : Union[bytes, memoryview]) -> int:
+        return zlib.crc32(value_bytes)
+
+    # from_id から IDが大きくなる方向にたどった場合の end_id との間の範囲（両端を含まない）を
+    # 0 を跨がない [始点, 終点) の形の範囲のリストに変換して返す
+    # from_id と end_id が一致する場合は from_id 以外の全てのIDを範囲とする
+    @classmethod
+    def conv_ring_range_to_linear_ranges(cls, from_id : int, end_id : int) -> List[Tuple[int, int]]:
+        if from_id < end_id:
+            return [(from_id + 1, end_id)]
+        else:
+            return [(from_id + 1, gval.ID_SPACE_RANGE), (0, end_id)]
+
     # TODO: マルチプロセス安全ないしそれに近いものにする必要あり dprint
+    # print_str には文字列の代わりに文字列を返す関数(lambda式)を渡すことができ、その場合は level が
+    # gval.LOG_LEVEL 以上である場合のみ呼び出して文字列を生成する. 出力が抑止されている場合の処理が
+    # 1回の比較で済むよう、gen_debug_str_of_node などを用いて文字列を組み立てる箇所では lambda式 を渡すこと.
+    # 出力は gval.log_writer のスレッドで非同期に行われる. flush=True とした場合は出力されるまで待つ
     @classmethod
-    def dprint(cls, print_str : str, flush=False):
-        print(str(datetime.datetime.now()) + "," + print_str, flush=flush)
+    def dprint(cls, print_str : Union[str, Callable[[], str]], flush=False, level : int = LogLevel.DEBUG):
+        if level < gval.LOG_LEVEL:
+            return
+        if not isinstance(print_str, str):
+            print_str = print_str()
+        gval.log_writer.write(str(datetime.datetime.now()) + "," + print_str + "\n", flush=flush)
+
+    # dprint と同じく gval.log_writer を介して出力するため、dprint による出力と順序が入れ替わることはない
+    @classmethod
+    def print_no_lf(cls, print_str : str, flush=False, level : int = LogLevel.DEBUG):
+        if level < gval.LOG_LEVEL:
+            return
+        gval.log_writer.write(print_str, flush=flush)
 
+    # 非同期に出力されるログのうち、呼び出し時点までに dprint されたものが書き出されるまで待つ
     @classmethod
-    def print_no_lf(cls, print_str : str):
-        print(print_str, end="")
+    def flush_log(cls):
+        gval.log_writer.flush()
 
     @classmethod
-    def gen_debug_str_of_node(cls, node_info : Optional['NodeInfo']) -> str:
-        casted_info : 'NodeInfo' = cast('NodeInfo', node_info)
+    def gen_debug_str_of_node(cls, node_info : Optional[Union['NodeInfo', 'NodeRef']]) -> str:
+        casted_info : 'NodeRef' = cast('NodeRef', node_info)
         return str(casted_info.born_id) + "," + hex(casted_info.node_id) + "," \
                + ChordUtil.conv_id_to_ratio_str(casted_info.node_id)
 
@@ -175,6 +301,15 @@ class ChordUtil:
     #       ChordNodeオブジェクトを返す get_node_by_address
     @classmethod
     def get_node_by_address(cls, address : str) -> PResult[Optional['ChordNode']]:
+        # 他のプロセスのノードを扱う Transport が設定されている場合、そのプロセスのノードについては
+        # 呼び出しを仲介するプロキシが返る
+        if gval.transport != None:
+            return cast('Transport', gval.transport).get_node_by_address(address)
+        return ChordUtil.get_local_node_by_address(address)
+
+    # 同一プロセスの gval.all_node_dict に存在するノードを返す
+    @classmethod
+    def get_local_node_by_address(cls, address : str) -> PResult[Optional['ChordNode']]:
         try:
             # with gval.lock_of_all_node_dict:
             ret_val = gval.all_node_dict[address]
@@ -192,7 +327,15 @@ class ChordUtil:
         #     sys.exit(1)
 
         if ret_val.is_alive == False:
-            ChordUtil.dprint("get_node_by_address_1,NODE_IS_DOWNED," + ChordUtil.gen_debug_str_of_node(ret_val.node_info))
+            ChordUtil.dprint(lambda: "get_node_by_address_1,NODE_IS_DOWNED," + ChordUtil.gen_debug_str_of_node(ret_val.node_info))
+            if gval.stabilize_notifier != None:
+                # ダウンしたノードの predecessor と successor に stabilize処理 を行わせる
+                # TODO: x direct access to node_info of ret_val at get_local_node_by_address
+                neighbor_address_list : List[str] = [node_info.address_str for node_info
+                                                     in [ret_val.node_info.predecessor_info] + ret_val.node_info.successor_info_list[0:1]
+                                                     if node_info != None]
+                cast('StabilizeNotifier', gval.stabilize_notifier).notify_node_downed(
+                    address, neighbor_address_list, gval.SUCCESSOR_LIST_NORMAL_LEN - 1)
             #raise NodeIsDownedExceptiopn()
             return PResult.Err(None, ErrorCode.NodeIsDownedException_CODE)
 
@@ -206,6 +349,10 @@ class ChordUtil:
     #       RPC化する必要がありそう。もしくはこのメソッドの呼び出し自体を無くすか。 is_node_alive
     @classmethod
     def is_node_alive(cls, address : str) -> PResult[Optional[bool]]:
+        # stabilize処理 から呼び出されるため、ここで他のプロセスのノードの生存を問い合わせ、Transport が
+        # キャッシュしている生存状態を更新する. get_node_by_address はキャッシュされた状態を用いる
+        if gval.transport != None:
+            cast('Transport', gval.transport).refresh_liveness(address)
         # try:
             # node_obj = ChordUtil.get_node_by_address(address)
         ret = ChordUtil.get_node_by_address(address)
@@ -231,10 +378,10 @@ class ChordUtil:
     @classmethod
     def add_data_placement_info(cls, data_id : int, node_info : 'NodeInfo'):
         try:
-            node_list : List['NodeInfo'] = gval.all_data_placement_dict[str(data_id)]
+            node_list : List['NodeInfo'] = gval.all_data_placement_dict[data_id]
         except KeyError:
             node_list = []
-            gval.all_data_placement_dict[str(data_id)] = node_list
+            gval.all_data_placement_dict[data_id] = node_list
 
         # 既に引数で指定されたノードでの存在が記録されていた場合、同じノードのエントリが
         # 重複してしまうので追加せずに終了する
@@ -249,10 +396,10 @@ class ChordUtil:
     @classmethod
     def remove_data_placement_info(cls, data_id : int, node_info : 'NodeInfo'):
         try:
-            node_list : List['NodeInfo'] = gval.all_data_placement_dict[str(data_id)]
+            node_list : List['NodeInfo'] = gval.all_data_placement_dict[data_id]
         except KeyError:
             # 本来は起きてはならないエラーだが対処のし様もないのでワーニングを出力しておく
-            ChordUtil.dprint("remove_data_1," + ChordUtil.gen_debug_str_of_node(node_info) + ","
+            ChordUtil.dprint(lambda: "remove_data_1," + ChordUtil.gen_debug_str_of_node(node_info) + ","
                              + ChordUtil.gen_debug_str_of_data(data_id)
                              + ",WARNING__DATA_AND_BELONGS_NODE_RERATION_MAY_BE_BROKEN")
             return
@@ -265,10 +412,10 @@ class ChordUtil:
     @classmethod
     def print_data_placement_info(cls, data_id : int, after_notfound_limit = False):
         try:
-            node_list : List['NodeInfo'] = gval.all_data_placement_dict[str(data_id)]
+            node_list : List['NodeInfo'] = gval.all_data_placement_dict[data_id]
         except KeyError:
             # データを持っているノードがいないか、記録のバグ
-            ChordUtil.dprint("print_data_placement_info_1,"
+            ChordUtil.dprint(lambda: "print_data_placement_info_1,"
                              + ChordUtil.gen_debug_str_of_data(data_id)
                              + ",DATA_HAVING_NODE_DOES_NOT_EXIST_OR_INFORMATION_BUG")
             return
@@ -284,7 +431,7 @@ class ChordUtil:
         list_len = len(node_list)
         for idx in range(0, list_len):
             if idx < len(node_list):
-                ChordUtil.dprint("print_data_placement_info_INFO," + additional_str
+                ChordUtil.dprint(lambda: "print_data_placement_info_INFO," + additional_str
                                  + ChordUtil.gen_debug_str_of_data(data_id) + ","
                                  + ChordUtil.gen_debug_str_of_node(node_list[idx]))
 
@@ -292,16 +439,16 @@ class ChordUtil:
     def dprint_data_storage_operations(cls, callee_node : 'NodeInfo', operation_type : str, data_id : int):
         if gval.ENABLE_DATA_STORE_OPERATION_DPRINT == False:
             return
-        ChordUtil.dprint("dprint_data_storage_operations," + ChordUtil.gen_debug_str_of_node(callee_node) + ","
+        ChordUtil.dprint(lambda: "dprint_data_storage_operations," + ChordUtil.gen_debug_str_of_node(callee_node) + ","
                          + operation_type + "," + ChordUtil.gen_debug_str_of_data(data_id))
 
     @classmethod
     def dprint_routing_info(cls, callee_node : 'ChordNode', calee_method : str):
         if gval.ENABLE_ROUTING_INFO_DPRINT == False:
             return
-        ChordUtil.dprint("dprint_routing_info__PRED," + ChordUtil.gen_debug_str_of_node(callee_node.node_info) + ","
+        ChordUtil.dprint(lambda: "dprint_routing_info__PRED," + ChordUtil.gen_debug_str_of_node(callee_node.node_info) + ","
                          + calee_method + "," + "PREDECESSOR_INFO," + str(callee_node.node_info.predecessor_info))
-        ChordUtil.dprint("dprint_routing_info__SUCC," +ChordUtil.gen_debug_str_of_node(callee_node.node_info) + "," + calee_method + ","
+        ChordUtil.dprint(lambda: "dprint_routing_info__SUCC," +ChordUtil.gen_debug_str_of_node(callee_node.node_info) + "," + calee_method + ","
                          + "SUCCESSOR_INFO_LIST," + str(len(callee_node.node_info.successor_info_list)) + ","
                          + " ,| ".join([str(ninfo)  for ninfo in callee_node.node_info.successor_info_list]))
 
@@ -326,6 +473,8 @@ class KeyValue:
         self.key : Optional[str] = key
         self.value_data : str = value
         self.data_id : Optional[int] = None
+        # DataStore から値を渡す際に、DataIdAndValue.version と同じく値の版を設定する
+        self.version : int = 0
         # keyのハッシュ値
         if key == None:
             self.data_id = None
@@ -342,12 +491,27 @@ class KeyValue:
 class DataIdAndValue:
     data_id : int
     value_data : str
+    # 担当ノードが格納した時点の HybridLogicalClock による版. 版の分からない値は 0 とし、どの版よりも古いものとして扱う
+    version : int = 0
 
     def __eq__(self, other):
         if not isinstance(other, DataIdAndValue):
             return False
         return self.data_id == other.data_id
 
+# ID空間上の範囲のデータを分割して受け渡す際の1回分のデータ
+# エントリごとにオブジェクトを生成しないよう、data_id と value を別々のリストで保持する
+@dataclasses.dataclass
+class DataChunk:
+    # 昇順(範囲の始点から近い順)に並んだ data_id
+    data_ids : List[int]
+    # data_ids と同じ順に並んだ value
+    values : List[str]
+    # data_ids と同じ順に並んだ、各 value の版
+    versions : List[int]
+    # 続きを要求する際に範囲の始点として渡す値. 範囲内のデータを全て渡し終えている場合は None
+    next_from_id : Optional[int]
+
 class NodeIsDownedExceptiopn(Exception):
 
     def __init__(self):
@@ -1,59 +1,266 @@
 # coding:utf-8
 
-from typing import Dict, List, Optional, cast, TYPE_CHECKING
+import bisect
+import time
+from typing import Dict, List, Mapping, MutableMapping, Tuple, Optional, cast, TYPE_CHECKING
 
-from .chord_util import ChordUtil, KeyValue, DataIdAndValue, PResult, ErrorCode
+import modules.gval as gval
+from .chord_util import ChordUtil, KeyValue, DataIdAndValue, DataChunk, PResult, ErrorCode
+from .merkle_tree import MerkleTree
+from .data_store_persister import DataStorePersister
+from .mmap_value_store import MmapValueStore
+from .hybrid_logical_clock import HybridLogicalClock
 
 if TYPE_CHECKING:
     from .chord_node import ChordNode
-    from .node_info import NodeInfo
+    from .node_info import NodeRef
 
 class DataStore:
 
     DELETED_ENTRY_MARKING_STR = "THIS_KEY_IS_DELETED"
     DATA_STORE_OP_DIRECT_STORE = "DIRECT_STORE"
     DATA_STORE_OP_DIRECT_REMOVE = "DIRECT_REMOVE"
+    # do_compaction で tombstone の削除1件を、読み書きの量に換算したバイト数.
+    # 削除は sorted_data_ids、Merkle木、インデックスの更新を伴い、MmapValueStore.compact で値を書き直す場合の
+    # 数レコード分の時間を要するため、その分を見込んだ値とする
+    TOMBSTONE_REMOVAL_COST_BYTES = 512
 
     def __init__(self, existing_node : 'ChordNode'):
         self.existing_node : 'ChordNode' = existing_node
 
+        # data_id をキーとし、valueの文字列を値とする
         # Keyはハッシュを通されたものなので元データの値とは異なる
-        self.stored_data : Dict[str, DataIdAndValue] = {}
+        # DataIdAndValue の形で返す必要がある場合は、返す際に生成する
+        # gval.ENABLE_MMAP_VALUE_STORE が True の場合は、dict の代わりにメモリマップしたファイルに格納する MmapValueStore を用いる
+        self.stored_data : MutableMapping[int, str] = MmapValueStore() if gval.ENABLE_MMAP_VALUE_STORE else {}
+
+        # stored_data に格納されているデータの data_id を昇順に保持するリスト
+        # ID空間上の範囲を指定したデータの抽出を、全データの走査ではなく二分探索で行うために用いる
+        # stored_data と内容が一致するよう、更新は store_new_data、store_data_chunk と remove_data でのみ行う
+        self.sorted_data_ids : List[int] = []
+
+        # stored_data に格納されているデータの data_id をキーとし、その値の版を値とする
+        # 更新は put_stored_entry と remove_data でのみ行う.
+        # MmapValueStore を用いている場合は、版を値のログのレコードのヘッダから読む MmapVersionView となる
+        self.stored_versions : Mapping[int, int] = \
+            cast(MmapValueStore, self.stored_data).versions if isinstance(self.stored_data, MmapValueStore) else {}
+        # 自ノードでの格納の際に版を発行し、他ノードから受け取った版を反映する時計
+        self.clock : HybridLogicalClock = HybridLogicalClock()
+        # 他ノードから受け取ったデータのうち、保持している値より新しくないために格納しなかったものの数
+        self.skipped_overwrite_cnt : int = 0
+
+        # 自ノードの担当範囲のデータが更新される度にインクリメントされる通番
+        self.tantou_update_seq : int = 0
+        # successor_info_list内のノードのアドレスをキーとし、当該ノードに担当データのレプリカを
+        # どの時点まで渡し終えているかを (tantou_update_seq, その時点のpredecessorのnode_id) で保持する.
+        # 通番が一つ前のもので、predecessorも変わっていなければ、putされたデータだけを渡せば良い
+        self.replica_synced_seq_dict : Dict[str, Tuple[int, int]] = {}
+
+        # 保持している削除済みを示すエントリ(値が DELETED_ENTRY_MARKING_STR のもの. tombstone)の data_id をキーとし、
+        # 格納した時点の tantou_update_seq を値とする. successor_info_list内の全ノードにその通番以降まで
+        # レプリカを渡し終えた担当範囲の tombstone は、do_compaction で各ノードから削除される
+        self.tombstone_seq_dict : Dict[int, int] = {}
+        # do_compaction か remove_tombstones で削除した tombstone の data_id をキーとし、(その版, 削除した時刻) を値とする.
+        # 削除の後に、successor_info_list外のノードやディスクから復元したノードが持っていた古い値を受け取っても、
+        # 削除したデータを復活させないために is_newer_than_stored で参照する.
+        # 削除してから gval.TOMBSTONE_REMOVAL_WATERMARK_RETENTION_SEC が経過したものは do_compaction で取り除かれる
+        self.removed_tombstone_versions : Dict[int, Tuple[int, float]] = {}
+
+        # 保持データ全てを対象としたMerkle木
+        # successorとのアンチエントロピー処理で、差異のある範囲のみを特定するために用いる
+        self.merkle_tree : MerkleTree = MerkleTree()
+
+        # 保持データをローカルディスクに永続化するオブジェクト. gval.ENABLE_DATA_STORE_PERSISTENCE が True の場合に
+        # open_persister で生成される
+        self.persister : Optional[DataStorePersister] = None
+        # open_persister でディスクから保持データを復元したか. True の場合、join処理 では隣接ノードから差分のみを受け取る
+        self.is_recovered : bool = False
+        # write_snapshot_if_needed でロックを解放してスナップショットを書き出している間 True となる
+        self.is_snapshot_writing : bool = False
+
+    # 保持データの永続化を開始する. is_recovering が True の場合は、先にディスクに残っている保持データを復元する.
+    # ノードのアドレスが決まった後に呼び出される
+    def open_persister(self, is_recovering : bool):
+        persister = DataStorePersister(self.existing_node.node_info.address_str)
+        if is_recovering:
+            recovered_data = persister.load()
+            recovered_ids = sorted(recovered_data.keys())
+            # persister を設定する前に格納することで、復元したデータが WAL に再度書き出されないようにする
+            self.store_data_chunk(DataChunk(data_ids=recovered_ids, values=[recovered_data[data_id][0] for data_id in recovered_ids],
+                                            versions=[recovered_data[data_id][1] for data_id in recovered_ids], next_from_id=None))
+            self.is_recovered = True
+            ChordUtil.dprint(lambda: "open_persister_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                             + str(len(recovered_ids)))
+        self.persister = persister
+
+    # 最後のスナップショット以降の更新が規定数に達していれば、スナップショットを書き出す.
+    # ロックを保持したまま行うのは保持データの複製と WAL の切り替えのみとし、JSON への変換と fsync を伴う書き出しは
+    # ロックを解放してから複製に対して行うため、その間も get や put を待たせない.
+    # put の中で行うと、その put が書き出しの完了まで待たされるため、do_compaction から定期的に呼び出す
+    def write_snapshot_if_needed(self):
+        with self.existing_node.node_info.lock_of_datastore:
+            if self.persister == None or self.is_snapshot_writing or not self.persister.is_snapshot_needed():
+                return
+            persister = cast(DataStorePersister, self.persister)
+            stored_data_copy : Dict[int, str] = dict(self.stored_data)
+            stored_versions_copy : Dict[int, int] = dict(self.stored_versions)
+            persister.rotate_wal()
+            self.is_snapshot_writing = True
+
+        try:
+            persister.write_snapshot(stored_data_copy, stored_versions_copy)
+        finally:
+            with self.existing_node.node_info.lock_of_datastore:
+                self.is_snapshot_writing = False
 
     # DataStoreクラスオブジェクトのデータ管理の枠組みに従った、各関連フィールドの一貫性を維持したまま
     # データ追加・更新処理を行うアクセサメソッド
-    # master_node引数を指定しなかった場合は、self.existing_node.node_info をデータのマスターの情報として格納する
-    def store_new_data(self, data_id : int, value_str : str):
+    # version を指定しなかった場合は、自ノードでの新たな書き込みとして self.clock で発行した版を付ける.
+    # 保持している値との版の比較は行わずに上書きする. 格納した値の版を返す
+    def store_new_data(self, data_id : int, value_str : str, version : Optional[int] = None) -> int:
         # ログの量が多くなりすぎるのでコメントアウトしておく
         # ChordUtil.dprint("store_new_data_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
         #                  + ChordUtil.gen_debug_str_of_data(data_id))
 
         with self.existing_node.node_info.lock_of_datastore:
-            di_entry = DataIdAndValue(data_id=data_id, value_data=value_str)
-
             # デバッグプリント
             ChordUtil.dprint_data_storage_operations(self.existing_node.node_info,
                                                      DataStore.DATA_STORE_OP_DIRECT_STORE,
                                                      data_id
                                                      )
 
-            self.stored_data[str(data_id)] = di_entry
+            if version == None:
+                version = self.clock.now()
+            else:
+                self.clock.update(cast(int, version))
+
+            old_value = self.stored_data.get(data_id)
+            if old_value == None:
+                bisect.insort(self.sorted_data_ids, data_id)
+                delta_hash = MerkleTree.calc_entry_hash(data_id, value_str, cast(int, version))
+            else:
+                delta_hash = MerkleTree.calc_entry_hash(data_id, cast(str, old_value), self.stored_versions[data_id]) \
+                             ^ MerkleTree.calc_entry_hash(data_id, value_str, cast(int, version))
+            self.put_stored_entry(data_id, value_str, cast(int, version))
+            self.merkle_tree.update(data_id, delta_hash)
+            if self.persister != None:
+                self.persister.append_store(data_id, value_str, cast(int, version))
+
+            # 担当範囲のデータの更新であれば通番を進める
+            if self.existing_node.node_info.predecessor_info != None \
+                    and ChordUtil.exist_between_two_nodes_right_mawari(
+                        cast('NodeRef', self.existing_node.node_info.predecessor_info).node_id,
+                        self.existing_node.node_info.node_id, data_id):
+                self.tantou_update_seq += 1
+            self.update_tombstone_info(data_id, value_str)
             # デバッグのためにグローバル変数の形で管理されているデータのロケーション情報を更新する
             ChordUtil.add_data_placement_info(data_id, self.existing_node.node_info)
 
+        return cast(int, version)
+
+    # stored_data に値を版とともに格納する. MmapValueStore を用いている場合は、版は値と同じレコードに格納される
+    # 必要なロックは呼び出し元でとってある前提
+    def put_stored_entry(self, data_id : int, value_str : str, version : int):
+        if isinstance(self.stored_data, MmapValueStore):
+            cast(MmapValueStore, self.stored_data).store(data_id, value_str, version)
+        else:
+            self.stored_data[data_id] = value_str
+            cast(Dict[int, int], self.stored_versions)[data_id] = version
+
+    # 他ノードから受け取った版 version の値 value_str を、保持している値に上書きすべきかを返す.
+    # gval.ENABLE_VERSIONED_REPLICA_MERGE が True の場合は、保持している値より版が新しい場合のみ上書きする(last-writer-wins).
+    # 版が同じ場合は値の文字列の大小で決めるため、どのノードで受け取っても同じ値が残る. 値も同じであれば上書きは不要となる
+    # 必要なロックは呼び出し元でとってある前提
+    def is_newer_than_stored(self, data_id : int, value_str : str, version : int) -> bool:
+        if not gval.ENABLE_VERSIONED_REPLICA_MERGE:
+            return True
+        stored_version = self.stored_versions.get(data_id)
+        if stored_version == None:
+            return version > self.get_removed_tombstone_version(data_id)
+        if version != stored_version:
+            return version > cast(int, stored_version)
+        return value_str > self.stored_data[data_id]
+
+    # 他ノードから受け取った DataChunk のデータのうち、is_newer_than_stored で上書きすべきとされたものをまとめて格納する.
+    # 各関連フィールドの一貫性は store_new_data と同様に維持するが、predecessor の参照やロックの取得は
+    # chunk ごとに1回とし、sorted_data_ids への新規IDの追加は chunk 内の数が多ければ末尾に連結してから
+    # まとめてソートする
+    def store_data_chunk(self, chunk : DataChunk):
+        with self.existing_node.node_info.lock_of_datastore:
+            pred_info : Optional['NodeRef'] = self.existing_node.node_info.predecessor_info
+            self_id = self.existing_node.node_info.node_id
+            new_ids : List[int] = []
+            for data_id, value_str, version in zip(chunk.data_ids, chunk.values, chunk.versions):
+                self.clock.update(version)
+                if not self.is_newer_than_stored(data_id, value_str, version):
+                    self.skipped_overwrite_cnt += 1
+                    continue
+                ChordUtil.dprint_data_storage_operations(self.existing_node.node_info,
+                                                         DataStore.DATA_STORE_OP_DIRECT_STORE,
+                                                         data_id
+                                                         )
+
+                old_value = self.stored_data.get(data_id)
+                if old_value == None:
+                    new_ids.append(data_id)
+                    delta_hash = MerkleTree.calc_entry_hash(data_id, value_str, version)
+                else:
+                    delta_hash = MerkleTree.calc_entry_hash(data_id, cast(str, old_value), self.stored_versions[data_id]) \
+                                 ^ MerkleTree.calc_entry_hash(data_id, value_str, version)
+                self.put_stored_entry(data_id, value_str, version)
+                self.merkle_tree.update(data_id, delta_hash)
+                if self.persister != None:
+                    self.persister.append_store(data_id, value_str, version)
+
+                if pred_info != None \
+                        and ChordUtil.exist_between_two_nodes_right_mawari(pred_info.node_id, self_id, data_id):
+                    self.tantou_update_seq += 1
+                self.update_tombstone_info(data_id, value_str)
+                ChordUtil.add_data_placement_info(data_id, self.existing_node.node_info)
+
+            # 1件ずつの insort はリストの要素の移動を伴うため、追加が多い場合は連結してからソートする
+            # (連結前の各部分はソート済みであるため、ソートはほぼ線形時間で済む)
+            if len(new_ids) * 8 > len(self.sorted_data_ids):
+                self.sorted_data_ids.extend(new_ids)
+                self.sorted_data_ids.sort()
+            else:
+                for data_id in new_ids:
+                    bisect.insort(self.sorted_data_ids, data_id)
+
+    # 格納した値が tombstone であれば、格納時点の通番とともに記録する. tombstone が上書きされた場合は記録を消す.
+    # 削除した tombstone の版の記録は、改めて値が格納された時点で不要となるため消す
+    # 必要なロックは呼び出し元でとってある前提
+    def update_tombstone_info(self, data_id : int, value_str : str):
+        self.removed_tombstone_versions.pop(data_id, None)
+        if value_str == DataStore.DELETED_ENTRY_MARKING_STR:
+            self.tombstone_seq_dict[data_id] = self.tantou_update_seq
+        else:
+            self.tombstone_seq_dict.pop(data_id, None)
+
     # DataStoreクラスオブジェクトのデータ管理の枠組みに従った、各関連フィールドの一貫性を維持したまま
     # データ削除処理を行うアクセサメソッド
     def remove_data(self, data_id: int):
         with self.existing_node.node_info.lock_of_datastore:
             try:
-                del self.stored_data[str(data_id)]
+                # MmapValueStore の場合は値とともに版も削除されるため、先に読んでおく
+                removed_version = self.stored_versions[data_id]
+                removed_value = self.stored_data.pop(data_id)
             except KeyError:
                 # 本来は起きてはならないエラーだが対処のし様もないのでワーニングだけ出力する
-                ChordUtil.dprint("remove_data_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                ChordUtil.dprint(lambda: "remove_data_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                                  + ChordUtil.gen_debug_str_of_data(data_id)
                                  + ",WARNING__REMOVE_TARGET_DATA_NOT_EXIST")
                 return
 
+            idx = bisect.bisect_left(self.sorted_data_ids, data_id)
+            del self.sorted_data_ids[idx]
+            if not isinstance(self.stored_data, MmapValueStore):
+                del cast(Dict[int, int], self.stored_versions)[data_id]
+            self.tombstone_seq_dict.pop(data_id, None)
+            self.merkle_tree.update(data_id, MerkleTree.calc_entry_hash(data_id, removed_value, removed_version))
+            if self.persister != None:
+                self.persister.append_remove(data_id)
+
             # デバッグのためにグローバル変数の形で管理されているデータのロケーション情報を更新する
             ChordUtil.remove_data_placement_info(data_id, self.existing_node.node_info)
             # デバッグプリント
@@ -62,65 +269,152 @@ class DataStore:
                                                      data_id
                                                      )
 
+    # from_id から IDが大きくなる方向にたどった場合に、 end_id との間に位置する保持データの data_id
+    # を昇順（from_id から近い順）のリストで返す.
+    # 範囲の判定は ChordUtil.exist_between_two_nodes_right_mawari と同じく両端を含まない.
+    # from_id と end_id が一致する場合は from_id 以外の全てのIDが範囲に含まれる.
+    # sorted_data_ids に対する二分探索で範囲を求めるため、計算量は O(log n + 返すデータ数) となる
+    # 必要なロックは呼び出し元でとってある前提
+    def get_ids_between_right_mawari(self, from_id : int, end_id : int) -> List[int]:
+        start_idx = bisect.bisect_right(self.sorted_data_ids, from_id)
+        end_idx = bisect.bisect_left(self.sorted_data_ids, end_id)
+        if from_id < end_id:
+            return self.sorted_data_ids[start_idx:end_idx]
+        else:
+            # 0 を跨ぐ範囲なので ID空間の末尾側と先頭側を連結する
+            return self.sorted_data_ids[start_idx:] + self.sorted_data_ids[:end_idx]
+
+    # from_id から IDが大きくなる方向にたどった場合に、from_id を含まず end_id を含む範囲に位置する保持データを、
+    # from_id から近い順に最大 max_num 個まとめた DataChunk を返す.
+    # from_id と end_id が一致する場合は全てのIDが範囲に含まれる.
+    # 返り値の next_from_id を from_id として再度呼び出すことで、残りの範囲のデータを得られる
+    # 必要なロックは呼び出し元でとってある前提
+    def get_data_chunk_right_mawari(self, from_id : int, end_id : int, max_num : int) -> DataChunk:
+        start_idx = bisect.bisect_right(self.sorted_data_ids, from_id)
+        end_idx = bisect.bisect_right(self.sorted_data_ids, end_id)
+        if from_id < end_id:
+            rest_num = end_idx - start_idx
+            chunk_ids = self.sorted_data_ids[start_idx:start_idx + min(rest_num, max_num)]
+        else:
+            # 0 を跨ぐ範囲なので ID空間の末尾側と先頭側を連結する
+            rest_num = len(self.sorted_data_ids) - start_idx + end_idx
+            chunk_ids = self.sorted_data_ids[start_idx:start_idx + max_num]
+            if len(chunk_ids) < max_num:
+                chunk_ids += self.sorted_data_ids[:min(end_idx, max_num - len(chunk_ids))]
+
+        next_from_id : Optional[int] = None
+        if rest_num > max_num:
+            next_from_id = chunk_ids[-1]
+        return DataChunk(data_ids=chunk_ids, values=[self.stored_data[data_id] for data_id in chunk_ids],
+                         versions=[self.stored_versions[data_id] for data_id in chunk_ids], next_from_id=next_from_id)
+
     # 自ノードが担当ノードとなる保持データを全て返す
     def get_all_tantou_data(self, node_id : Optional[int] = None) -> List[DataIdAndValue]:
         with self.existing_node.node_info.lock_of_datastore:
             ChordUtil.dprint(
-                "pass_tantou_data_for_replication_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info))
+                lambda: "pass_tantou_data_for_replication_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info))
 
             if self.existing_node.node_info.predecessor_info == None and node_id == None:
                 ChordUtil.dprint(
-                    "pass_tantou_data_for_replication_2," + ChordUtil.gen_debug_str_of_node(
+                    lambda: "pass_tantou_data_for_replication_2," + ChordUtil.gen_debug_str_of_node(
                         self.existing_node.node_info))
                 return []
 
             if node_id != None:
                 pred_id = cast(int, node_id)
             else:
-                pred_id = cast('NodeInfo', self.existing_node.node_info.predecessor_info).node_id
+                pred_id = cast('NodeRef', self.existing_node.node_info.predecessor_info).node_id
 
             ret_data_list : List[DataIdAndValue] = []
-            for key, value in self.stored_data.items():
-                if ChordUtil.exist_between_two_nodes_right_mawari(pred_id, self.existing_node.node_info.node_id, int(key)):
-                    ret_data_list.append(DataIdAndValue(data_id=int(key), value_data=value.value_data))
+            for data_id in self.get_ids_between_right_mawari(pred_id, self.existing_node.node_info.node_id):
+                ret_data_list.append(DataIdAndValue(data_id=data_id, value_data=self.stored_data[data_id],
+                                                    version=self.stored_versions[data_id]))
 
-            ChordUtil.dprint("pass_tantou_data_for_replication_3," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            ChordUtil.dprint(lambda: "pass_tantou_data_for_replication_3," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              # + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info.predecessor_info) + ","
                              + str(len(ret_data_list)))
 
         return ret_data_list
 
+    # 自ノードが担当ノードとなる保持データのうち、呼び出し元から渡された digest に含まれないか、値が異なるもののみを返す
+    def get_all_tantou_data_delta(self, digest : List[Tuple[int, int, int]]) -> List[DataIdAndValue]:
+        with self.existing_node.node_info.lock_of_datastore:
+            if self.existing_node.node_info.predecessor_info == None:
+                return []
+            pred_id = cast('NodeRef', self.existing_node.node_info.predecessor_info).node_id
+            return self.filter_data_not_in_digest(
+                self.get_ids_between_right_mawari(pred_id, self.existing_node.node_info.node_id), digest)
+
     # レプリカデータを受け取る
     # 他のノードが、保持しておいて欲しいレプリカを渡す際に呼び出される.
     # なお、master_node 引数と呼び出し元ノードは一致しない場合がある.
     # replace_allオプション引数をTrueとした場合は、指定したノードのデータを丸っと入れ替える
     # 返り値として、処理が完了した時点でmaster_nodeに紐づいているレプリカをいくつ保持して
     # いるかを返す
+    # 渡されたデータのうち、is_newer_than_stored で上書きすべきとされたもののみを格納するため、
+    # 同じデータの異なる版が前後して届いても最終的に残る値は変わらない
     def receive_replica(self, pass_datas : List[DataIdAndValue]):
         with self.existing_node.node_info.lock_of_datastore:
-            ChordUtil.dprint("receive_replica_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            ChordUtil.dprint(lambda: "receive_replica_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + str(len(pass_datas)))
 
             for id_value in pass_datas:
-                self.store_new_data(id_value.data_id, id_value.value_data)
+                if not self.is_newer_than_stored(id_value.data_id, id_value.value_data, id_value.version):
+                    self.clock.update(id_value.version)
+                    self.skipped_overwrite_cnt += 1
+                    continue
+                self.store_new_data(id_value.data_id, id_value.value_data, id_value.version)
 
-            ChordUtil.dprint("receive_replica_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            ChordUtil.dprint(lambda: "receive_replica_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + str(len(pass_datas)))
 
     # 複数マスタのレプリカをまとめて受け取り格納する
     def store_replica_of_multi_masters(self, data_list: List[DataIdAndValue]):
         ChordUtil.dprint(
-            "store_replica_of_multi_masters_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            lambda: "store_replica_of_multi_masters_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
             + str(len(data_list)))
 
         self.receive_replica(data_list)
 
         ChordUtil.dprint(
-            "store_replica_of_multi_masters_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            lambda: "store_replica_of_multi_masters_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
             + str(len(data_list)))
 
+    # 他ノードから渡された (data_id, valueのチェックサム, 版) のリストであるダイジェストと自身の保持データを比較し、
+    # (保持していないか、呼び出し元より古い版を保持しているデータの data_id のリスト,
+    #  呼び出し元より新しい版を保持しているデータのリスト) を返す.
+    # 版が同じで値が異なる場合は両方に含め、互いに is_newer_than_stored で同じ値を残させる.
+    # gval.ENABLE_VERSIONED_REPLICA_MERGE が False の場合は、従来通り値か版が異なるものを全て前者に含める.
+    # レプリカの再同期とアンチエントロピー処理の際に、渡してもらう必要のあるデータを絞り込むとともに、
+    # 呼び出し元に新しい値を渡すために呼び出される
+    def exchange_digest(self, digest : List[Tuple[int, int, int]]) -> Tuple[List[int], List[DataIdAndValue]]:
+        with self.existing_node.node_info.lock_of_datastore:
+            missing_ids : List[int] = []
+            newer_datas : List[DataIdAndValue] = []
+            for data_id, checksum, version in digest:
+                stored_version = self.stored_versions.get(data_id)
+                if not gval.ENABLE_VERSIONED_REPLICA_MERGE:
+                    if stored_version != version or self.calc_stored_value_checksum(data_id) != checksum:
+                        missing_ids.append(data_id)
+                elif stored_version == None:
+                    # 削除した tombstone 以前の版であれば受け取っても格納しないため、渡してもらう必要はない
+                    if version > self.get_removed_tombstone_version(data_id):
+                        missing_ids.append(data_id)
+                elif cast(int, stored_version) < version:
+                    missing_ids.append(data_id)
+                elif cast(int, stored_version) > version:
+                    newer_datas.append(DataIdAndValue(data_id=data_id, value_data=self.stored_data[data_id], version=cast(int, stored_version)))
+                elif self.calc_stored_value_checksum(data_id) != checksum:
+                    missing_ids.append(data_id)
+                    newer_datas.append(DataIdAndValue(data_id=data_id, value_data=self.stored_data[data_id], version=cast(int, stored_version)))
+
+            ChordUtil.dprint(lambda: "exchange_digest_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                             + str(len(digest)) + "," + str(len(missing_ids)) + "," + str(len(newer_datas)))
+
+        return missing_ids, newer_datas
+
     # 自身が保持しているデータのうち委譲するものを返す.
-    # 対象となるデータは時計周りに辿った際に 引数 node_id と 自身の node_id
+    # 対象となるデータは時計周りに辿った際に 自身の predecessor と 引数 node_id
     # の間に data_id が位置するデータである.
     # join呼び出し時、新たに参加してきた新規ノードに、successorとなる自身が、担当から外れる
     # 範囲のデータの委譲を行うために、新規ノードから呼び出される形で用いられる.
@@ -128,88 +422,542 @@ class DataStore:
     # するかどうか選択できる
     def delegate_my_tantou_data(self, node_id : int) -> List[KeyValue]:
         with self.existing_node.node_info.lock_of_datastore:
-            ChordUtil.dprint("delegate_my_tantou_data_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            ChordUtil.dprint(lambda: "delegate_my_tantou_data_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + ChordUtil.gen_debug_str_of_data(node_id))
             ret_datas : List[KeyValue] = []
-            tantou_data: List[DataIdAndValue] = self.get_all_tantou_data(node_id)
-
-            for entry in tantou_data:
-                # Chordネットワークを右回りにたどった時に、データの id (data_id) が呼び出し元の node_id から
-                # 自身の node_id の間に位置する場合は、そのデータの担当は自身から変わらないため、渡すデータから
-                # 除外する
-                if ChordUtil.exist_between_two_nodes_right_mawari(node_id, self.existing_node.node_info.node_id, entry.data_id):
-                    ChordUtil.dprint(
-                        "delegate_my_tantou_data_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
-                        + ChordUtil.gen_debug_str_of_data(node_id) + "," + ChordUtil.gen_debug_str_of_data(entry.data_id))
-                    continue
 
+            if self.existing_node.node_info.predecessor_info == None:
+                return ret_datas
+            pred_id = cast('NodeRef', self.existing_node.node_info.predecessor_info).node_id
+
+            # 自身の担当範囲のうち、Chordネットワークを右回りにたどった時に呼び出し元の node_id から
+            # 自身の node_id の間に位置するデータは担当が自身から変わらないため、渡すのは predecessor から
+            # 呼び出し元の node_id までの範囲（node_id 自身を含む）のデータとなる.
+            # 呼び出し元の node_id が自身の担当範囲外であれば渡すデータは無い
+            if not ChordUtil.exist_between_two_nodes_right_mawari(pred_id, self.existing_node.node_info.node_id, node_id):
+                ChordUtil.dprint(
+                    lambda: "delegate_my_tantou_data_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                    + ChordUtil.gen_debug_str_of_data(node_id))
+                return ret_datas
+
+            delegate_ids : List[int] = self.get_ids_between_right_mawari(pred_id, node_id)
+            if node_id in self.stored_data:
+                delegate_ids.append(node_id)
+
+            for data_id in delegate_ids:
                 # 文字列の参照をそのまま用いてしまうが、文字列はイミュータブルであるため
                 # 問題ない
-                item = KeyValue(None, entry.value_data)
-                item.data_id = entry.data_id
+                item = KeyValue(None, self.stored_data[data_id])
+                item.data_id = data_id
+                item.version = self.stored_versions[data_id]
                 ret_datas.append(item)
 
         return ret_datas
 
-    # 存在しないKeyが与えられた場合 KeyErrorがraiseされる
+    # delegate_my_tantou_data と同じ範囲のデータを、max_num 個ずつに分割して返す.
+    # from_id には前回返した DataChunk の next_from_id を指定し、最初の呼び出しでは None とする.
+    # 呼び出しごとにロックを解放するため、委譲するデータが多い場合でも他の処理を長時間止めることがない.
+    # また、途中で失敗した場合も最後に受け取った next_from_id から再開できる
+    def delegate_my_tantou_data_chunk(self, node_id : int, from_id : Optional[int], max_num : int) -> DataChunk:
+        with self.existing_node.node_info.lock_of_datastore:
+            ChordUtil.dprint(lambda: "delegate_my_tantou_data_chunk_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                             + ChordUtil.gen_debug_str_of_data(node_id) + "," + str(from_id))
+
+            if self.existing_node.node_info.predecessor_info == None:
+                return DataChunk(data_ids=[], values=[], versions=[], next_from_id=None)
+            pred_id = cast('NodeRef', self.existing_node.node_info.predecessor_info).node_id
+
+            if not ChordUtil.exist_between_two_nodes_right_mawari(pred_id, self.existing_node.node_info.node_id, node_id):
+                ChordUtil.dprint(
+                    lambda: "delegate_my_tantou_data_chunk_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                    + ChordUtil.gen_debug_str_of_data(node_id))
+                return DataChunk(data_ids=[], values=[], versions=[], next_from_id=None)
+
+            # 前回の呼び出しから predecessor が変わり、再開位置が委譲する範囲から外れている場合は先頭からとする
+            if from_id == None or not ChordUtil.exist_between_two_nodes_right_mawari(pred_id, node_id, cast(int, from_id)):
+                from_id = pred_id
+
+            return self.get_data_chunk_right_mawari(cast(int, from_id), node_id, max_num)
+
+    # delegate_my_tantou_data と同じ範囲のデータのうち、呼び出し元から渡された digest に含まれないか、値が異なるもののみを返す.
+    # ディスクから保持データを復元した新規ノードが、join処理 で差分のみの委譲を受けるために用いる
+    def delegate_my_tantou_data_delta(self, node_id : int, digest : List[Tuple[int, int, int]]) -> List[DataIdAndValue]:
+        with self.existing_node.node_info.lock_of_datastore:
+            if self.existing_node.node_info.predecessor_info == None:
+                return []
+            pred_id = cast('NodeRef', self.existing_node.node_info.predecessor_info).node_id
+            if not ChordUtil.exist_between_two_nodes_right_mawari(pred_id, self.existing_node.node_info.node_id, node_id):
+                return []
+
+            delegate_ids : List[int] = self.get_ids_between_right_mawari(pred_id, node_id)
+            if node_id in self.stored_data:
+                delegate_ids.append(node_id)
+            ret_datas = self.filter_data_not_in_digest(delegate_ids, digest)
+
+            ChordUtil.dprint(lambda: "delegate_my_tantou_data_delta_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                             + ChordUtil.gen_debug_str_of_data(node_id) + "," + str(len(delegate_ids)) + "," + str(len(ret_datas)))
+
+        return ret_datas
+
+    # 存在しないKeyが与えられた場合 KeyErrorがraiseされる.
+    # 削除した tombstone の版を removed_tombstone_versions に保持しているデータは、削除済みを示す値を返す.
+    # 周囲のノードに残った古い値を、リカバリ処理で取得させないようにするため
     def get(self, data_id : int) -> PResult[Optional[DataIdAndValue]]:
         with self.existing_node.node_info.lock_of_datastore:
+            removed_version = self.get_removed_tombstone_version(data_id)
+            if removed_version >= 0:
+                return PResult.Ok(DataIdAndValue(data_id=data_id, value_data=DataStore.DELETED_ENTRY_MARKING_STR,
+                                                 version=removed_version))
             try:
-                return PResult.Ok(self.stored_data[str(data_id)])
+                if isinstance(self.stored_data, MmapValueStore):
+                    value_str, version = cast(MmapValueStore, self.stored_data).get_entry(data_id)
+                    return PResult.Ok(DataIdAndValue(data_id=data_id, value_data=value_str, version=version))
+                return PResult.Ok(DataIdAndValue(data_id=data_id, value_data=self.stored_data[data_id],
+                                                 version=self.stored_versions[data_id]))
             except KeyError:
                 return PResult.Err(None, ErrorCode.KeyError_CODE)
 
 
     # 全ての保持しているデータを返す
     def get_all_data(self) -> List[DataIdAndValue]:
-        ChordUtil.dprint("get_all_data_1," + ChordUtil.gen_debug_str_of_node(
+        ChordUtil.dprint(lambda: "get_all_data_1," + ChordUtil.gen_debug_str_of_node(
             self.existing_node.node_info))
 
         with self.existing_node.node_info.lock_of_datastore:
             ret_data_list: List[DataIdAndValue] = []
-            for key, value in self.stored_data.items():
-                ret_data_list.append(DataIdAndValue(data_id=int(key), value_data=value.value_data))
+            for data_id, value_str in self.stored_data.items():
+                ret_data_list.append(DataIdAndValue(data_id=data_id, value_data=value_str,
+                                                    version=self.stored_versions[data_id]))
 
-            ChordUtil.dprint("get_all_data_2," + ChordUtil.gen_debug_str_of_node(
+            ChordUtil.dprint(lambda: "get_all_data_2," + ChordUtil.gen_debug_str_of_node(
                 self.existing_node.node_info) + ","
                 + str(len(ret_data_list)))
 
         return ret_data_list
 
-    # 担当データ全てのレプリカを successor_info_list内のノードに配る
+    # 全ての保持しているデータのうち、呼び出し元から渡された digest に含まれないか、値が異なるもののみを返す
+    def get_all_data_delta(self, digest : List[Tuple[int, int, int]]) -> List[DataIdAndValue]:
+        with self.existing_node.node_info.lock_of_datastore:
+            ret_data_list = self.filter_data_not_in_digest(self.sorted_data_ids, digest)
+
+            ChordUtil.dprint(lambda: "get_all_data_delta_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                             + str(len(self.sorted_data_ids)) + "," + str(len(ret_data_list)))
+
+        return ret_data_list
+
+    # 自身の保持データ全ての (data_id, valueのチェックサム, 版) のリストであるダイジェストを返す
+    # ディスクから保持データを復元したノードが、隣接ノードから差分のみを受け取る際に渡す
+    def gen_all_data_digest(self) -> List[Tuple[int, int, int]]:
+        with self.existing_node.node_info.lock_of_datastore:
+            return [(data_id, cast(int, self.calc_stored_value_checksum(data_id)), self.stored_versions[data_id])
+                    for data_id in self.sorted_data_ids]
+
+    # data_ids のデータのうち、digest に含まれないか値か版が異なるものを返す
     # 必要なロックは呼び出し元でとってある前提
-    def distribute_replica(self):
-        ChordUtil.dprint("distribute_replica_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info))
+    def filter_data_not_in_digest(self, data_ids : List[int], digest : List[Tuple[int, int, int]]) -> List[DataIdAndValue]:
+        digest_dict : Dict[int, Tuple[int, int]] = {data_id : (checksum, version) for data_id, checksum, version in digest}
+        ret_datas : List[DataIdAndValue] = []
+        for data_id in data_ids:
+            if digest_dict.get(data_id) != (self.calc_stored_value_checksum(data_id), self.stored_versions[data_id]):
+                ret_datas.append(DataIdAndValue(data_id=data_id, value_data=self.stored_data[data_id],
+                                                version=self.stored_versions[data_id]))
+        return ret_datas
 
-        tantou_data_list: List[DataIdAndValue] = self.get_all_tantou_data()
+    # data_id の保持データの値のチェックサムを返す. 保持していなければ None を返す.
+    # MmapValueStore を用いている場合は値の文字列を生成せず、マップされた領域のスライスから直接求める
+    # 必要なロックは呼び出し元でとってある前提
+    def calc_stored_value_checksum(self, data_id : int) -> Optional[int]:
+        if isinstance(self.stored_data, MmapValueStore):
+            value_view = self.stored_data.get_view(data_id)
+            if value_view == None:
+                return None
+            with cast(memoryview, value_view):
+                return ChordUtil.calc_value_checksum_of_bytes(cast(memoryview, value_view))
+
+        value_str = self.stored_data.get(data_id)
+        if value_str == None:
+            return None
+        return ChordUtil.calc_value_checksum(cast(str, value_str))
+
+    # 全ての保持しているデータを、自ノードの node_id の次のIDから右回りに max_num 個ずつに分割して返す.
+    # from_id には前回返した DataChunk の next_from_id を指定し、最初の呼び出しでは None とする
+    def get_all_data_chunk(self, from_id : Optional[int], max_num : int) -> DataChunk:
+        with self.existing_node.node_info.lock_of_datastore:
+            self_id = self.existing_node.node_info.node_id
+            chunk = self.get_data_chunk_right_mawari(self_id if from_id == None else cast(int, from_id), self_id, max_num)
+
+            ChordUtil.dprint(lambda: "get_all_data_chunk_1," + ChordUtil.gen_debug_str_of_node(
+                self.existing_node.node_info) + "," + str(from_id) + "," + str(len(chunk.data_ids)))
+
+        return chunk
+
+    # 担当データのレプリカを successor_info_list内のノードに配る
+    # new_entries には put されたデータを指定する. 前回の配布以降に担当データの更新が new_entries の
+    # 格納だけであるノードには new_entries のみを渡し、そうでないノードとは resync_replica で再同期を行う
+    # 必要なロックは呼び出し元でとってある前提
+    def distribute_replica(self, new_entries : Optional[List[DataIdAndValue]] = None):
+        ChordUtil.dprint(lambda: "distribute_replica_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info))
+
+        if self.existing_node.node_info.predecessor_info == None:
+            return
+        pred_id = cast('NodeRef', self.existing_node.node_info.predecessor_info).node_id
 
-        # レプリカを successorList内のノードに渡す（手抜きでputされたもの含めた全てを渡してしまう）
         for succ_info in self.existing_node.node_info.successor_info_list:
-            # try:
-                # succ_node: ChordNode = ChordUtil.get_node_by_address(succ_info.address_str)
             ret = ChordUtil.get_node_by_address(succ_info.address_str)
             if (ret.is_ok):
                 succ_node : 'ChordNode' = cast('ChordNode', ret.result)
             else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE || ret.err_code == ErrorCode.NodeIsDownedException_CODE
                 # stabilize処理 と put処理 を経ていずれ正常な状態に
                 # なるため、ここでは何もせずに次のノードに移る
+                # (同期状態は更新されないため、次回の配布時に再同期が行われる)
                 ChordUtil.dprint(
-                    "distribute_replica_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                    lambda: "distribute_replica_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                     + ChordUtil.gen_debug_str_of_node(succ_info))
                 continue
-            # except (NodeIsDownedExceptiopn, InternalControlFlowException):
-            #     # stabilize処理 と put処理 を経ていずれ正常な状態に
-            #     # なるため、ここでは何もせずに次のノードに移る
-            #     ChordUtil.dprint("distribute_replica_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
-            #                      + ChordUtil.gen_debug_str_of_node(succ_info))
-            #     continue
 
-            # 非効率だが、putやstabilize_successorなどの度に担当データを全て渡してしまう
-            # TODO: putやstabilize_successorが呼び出される担当データ全てのレプリカを渡すのはあまりに非効率なので、担当データのIDリストを渡して
-            #       持っていないデータのIDのリストを返してもらい、それらのデータのみ渡すようにいずれ修正する
+            if self.is_replica_delta_applicable(succ_info.address_str, new_entries, pred_id):
+                # TODO: receive_replica call at distribute_replica
+                succ_node.endpoints.grpc__receive_replica(cast(List[DataIdAndValue], new_entries))
+            else:
+                self.resync_replica(succ_node)
 
-            # TODO: receive_replica call at distribute_replica
-            succ_node.endpoints.grpc__receive_replica(tantou_data_list)
+            self.replica_synced_seq_dict[succ_info.address_str] = (self.tantou_update_seq, pred_id)
 
-            ChordUtil.dprint("distribute_replica_3," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            ChordUtil.dprint(lambda: "distribute_replica_3," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + ChordUtil.gen_debug_str_of_node(succ_info))
+
+        self.remove_unused_replica_sync_states()
+
+    # address のノードが前回の配布以降の担当データの更新として new_entries の格納だけを受け取っていない
+    # 状態であり、new_entries のみを渡せば良いかを返す
+    def is_replica_delta_applicable(self, address : str, new_entries : Optional[List[DataIdAndValue]], pred_id : int) -> bool:
+        if new_entries == None:
+            return False
+        synced = self.replica_synced_seq_dict.get(address)
+        return synced == (self.tantou_update_seq - len(cast(List[DataIdAndValue], new_entries)), pred_id)
+
+    # successor_info_listから外れたノードの同期状態は不要なので削除する
+    def remove_unused_replica_sync_states(self):
+        succ_addrs = [succ_info.address_str for succ_info in self.existing_node.node_info.successor_info_list]
+        for address in list(self.replica_synced_seq_dict.keys()):
+            if address not in succ_addrs:
+                del self.replica_synced_seq_dict[address]
+
+    # 担当データと、その (data_id, valueのチェックサム, 版) のリストであるダイジェストを返す
+    # レプリカの再同期の際に、渡す側で用いる
+    def gen_tantou_data_digest(self) -> Tuple[List[DataIdAndValue], List[Tuple[int, int, int]]]:
+        tantou_data_list: List[DataIdAndValue] = self.get_all_tantou_data()
+        return tantou_data_list, DataStore.gen_digest_of_entries(tantou_data_list)
+
+    @classmethod
+    def gen_digest_of_entries(cls, entries : List[DataIdAndValue]) -> List[Tuple[int, int, int]]:
+        return [(entry.data_id, ChordUtil.calc_value_checksum(entry.value_data), entry.version) for entry in entries]
+
+    # 担当データのダイジェストを succ_node に渡し、succ_node が保持していないか、古い版を保持しているデータのみを
+    # レプリカとして渡す. succ_node が新しい版を保持していたデータは受け取って格納する
+    # 必要なロックは呼び出し元でとってある前提
+    def resync_replica(self, succ_node : 'ChordNode'):
+        tantou_data_list, digest = self.gen_tantou_data_digest()
+
+        # TODO: exchange_digest call at resync_replica
+        missing_id_list, newer_datas = succ_node.endpoints.grpc__exchange_digest(digest)
+        missing_ids = set(missing_id_list)
+        if len(missing_ids) > 0:
+            # TODO: receive_replica call at resync_replica
+            succ_node.endpoints.grpc__receive_replica(
+                [entry for entry in tantou_data_list if entry.data_id in missing_ids])
+        if len(newer_datas) > 0:
+            self.receive_replica(newer_datas)
+
+        # TODO: x direct access to node_info of succ_node at resync_replica
+        ChordUtil.dprint(lambda: "resync_replica_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                         + ChordUtil.gen_debug_str_of_node(succ_node.node_info) + ","
+                         + str(len(digest)) + "," + str(len(missing_ids)) + "," + str(len(newer_datas)))
+
+    # Merkle木のノード node_idx がカバーする範囲のうち、from_id から IDが大きくなる方向にたどった場合の
+    # end_id との間の範囲（両端を含まない）に位置するデータのみを対象としたハッシュ値を返す.
+    # ノードの範囲が全て対象範囲に含まれる場合は木に保持しているハッシュ値をそのまま用い、一部のみが含まれる
+    # 場合は子を辿る. 一部のみが含まれるのは対象範囲の両端を含むノードだけであるため、計算量は
+    # O(木の深さ + 両端の葉に含まれるデータ数) となる
+    # 必要なロックは呼び出し元でとってある前提
+    def calc_merkle_range_hash(self, node_idx : int, from_id : int, end_id : int) -> int:
+        node_start, node_end = self.merkle_tree.get_node_range(node_idx)
+        linear_ranges = ChordUtil.conv_ring_range_to_linear_ranges(from_id, end_id)
+
+        for range_start, range_end in linear_ranges:
+            if range_start <= node_start and node_end <= range_end:
+                return self.merkle_tree.get_hash(node_idx)
+
+        overlapped_ranges : List[Tuple[int, int]] = []
+        for range_start, range_end in linear_ranges:
+            if range_start < node_end and node_start < range_end:
+                overlapped_ranges.append((max(range_start, node_start), min(range_end, node_end)))
+        if len(overlapped_ranges) == 0:
+            return 0
+
+        if not self.merkle_tree.is_leaf(node_idx):
+            left_idx, right_idx = self.merkle_tree.get_children(node_idx)
+            return self.calc_merkle_range_hash(left_idx, from_id, end_id) \
+                   ^ self.calc_merkle_range_hash(right_idx, from_id, end_id)
+
+        ret_hash = 0
+        for data_id in self.get_ids_in_linear_ranges(overlapped_ranges):
+            ret_hash ^= MerkleTree.calc_entry_hash(data_id, self.stored_data[data_id], self.stored_versions[data_id])
+        return ret_hash
+
+    # [始点, 終点) の形の範囲のリストに含まれる保持データの data_id のリストを返す
+    # 必要なロックは呼び出し元でとってある前提
+    def get_ids_in_linear_ranges(self, linear_ranges : List[Tuple[int, int]]) -> List[int]:
+        ret_ids : List[int] = []
+        for range_start, range_end in linear_ranges:
+            start_idx = bisect.bisect_left(self.sorted_data_ids, range_start)
+            end_idx = bisect.bisect_left(self.sorted_data_ids, range_end)
+            ret_ids.extend(self.sorted_data_ids[start_idx:end_idx])
+        return ret_ids
+
+    # node_idx_list で指定されたMerkle木のノードそれぞれについて、from_id と end_id の間の範囲に
+    # 限定したハッシュ値を返す
+    # アンチエントロピー処理において、predecessorの側から呼び出される
+    def get_merkle_range_hashes(self, node_idx_list : List[int], from_id : int, end_id : int) -> List[int]:
+        with self.existing_node.node_info.lock_of_datastore:
+            return [self.calc_merkle_range_hash(node_idx, from_id, end_id) for node_idx in node_idx_list]
+
+    # successor_info_list内の各ノードと、自ノードの担当範囲のデータについてMerkle木の比較を行い、
+    # 差異のあった範囲のデータのうち、相手が保持していないか値が異なるもののみをレプリカとして渡す.
+    # distribute_replica や partial_join_op での配布が途中で失敗した場合の不整合を解消するために
+    # stabilize処理と合わせて定期的に呼び出される
+    # TODO: InternalExp at do_anti_entropy
+    def do_anti_entropy(self) -> PResult[bool]:
+        if self.existing_node.node_info.lock_of_succ_infos.acquire_read(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+            ChordUtil.dprint(lambda: "do_anti_entropy_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                             + "LOCK_ACQUIRE_TIMEOUT")
+            return PResult.Err(False, ErrorCode.InternalControlFlowException_CODE)
+
+        try:
+            if self.existing_node.is_alive == False:
+                # 処理の合間でkillされてしまっていた場合の考慮
+                # 何もしないで終了する
+                ChordUtil.dprint(lambda: "do_anti_entropy_0_5," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                                 + "REQUEST_RECEIVED_BUT_I_AM_ALREADY_DEAD")
+                return PResult.Ok(True)
+
+            with self.existing_node.node_info.lock_of_datastore:
+                if self.existing_node.node_info.predecessor_info == None:
+                    return PResult.Ok(True)
+                pred_id = cast('NodeRef', self.existing_node.node_info.predecessor_info).node_id
+
+                for succ_info in self.existing_node.node_info.successor_info_list:
+                    if succ_info.node_id == self.existing_node.node_info.node_id:
+                        continue
+                    ret = ChordUtil.get_node_by_address(succ_info.address_str)
+                    if (ret.is_ok):
+                        succ_node : 'ChordNode' = cast('ChordNode', ret.result)
+                    else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE || ret.err_code == ErrorCode.NodeIsDownedException_CODE
+                        # 次回以降のアンチエントロピー処理で対処されるため、ここでは何もせずに次のノードに移る
+                        ChordUtil.dprint(lambda: "do_anti_entropy_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                                         + ChordUtil.gen_debug_str_of_node(succ_info))
+                        continue
+
+                    self.anti_entropy_with(succ_node, pred_id)
+
+            return PResult.Ok(True)
+        finally:
+            self.existing_node.node_info.lock_of_succ_infos.release_read()
+
+    # succ_node とMerkle木の比較を根から行い、ハッシュ値の異なる範囲のみを子に辿っていく.
+    # 木の同じ深さのノードはまとめて問い合わせるため、RPCの回数は最大で木の深さ + 1 回となる.
+    # ハッシュ値の異なった葉に含まれるデータについてはダイジェストを交換し、必要なものだけを渡す
+    # 必要なロックは呼び出し元でとってある前提
+    def anti_entropy_with(self, succ_node : 'ChordNode', pred_id : int):
+        self_id = self.existing_node.node_info.node_id
+
+        target_idx_list : List[int] = [1]
+        differ_leaf_idx_list : List[int] = []
+        while len(target_idx_list) > 0:
+            # TODO: get_merkle_range_hashes call at anti_entropy_with
+            remote_hashes = succ_node.endpoints.grpc__get_merkle_range_hashes(target_idx_list, pred_id, self_id)
+            next_idx_list : List[int] = []
+            for node_idx, remote_hash in zip(target_idx_list, remote_hashes):
+                if remote_hash == self.calc_merkle_range_hash(node_idx, pred_id, self_id):
+                    continue
+                if self.merkle_tree.is_leaf(node_idx):
+                    differ_leaf_idx_list.append(node_idx)
+                else:
+                    next_idx_list.extend(self.merkle_tree.get_children(node_idx))
+            target_idx_list = next_idx_list
+
+        if len(differ_leaf_idx_list) == 0:
+            return
+
+        # ハッシュ値の異なった葉の範囲のうち、担当範囲に含まれるデータのダイジェストを作成する
+        differ_entries : List[DataIdAndValue] = []
+        differ_ids : List[int] = self.get_ids_in_linear_ranges(
+            [self.merkle_tree.get_node_range(node_idx) for node_idx in differ_leaf_idx_list])
+        is_tantou_list = ChordUtil.exist_between_two_nodes_right_mawari_batch(pred_id, self_id, differ_ids)
+        for data_id, is_tantou in zip(differ_ids, is_tantou_list):
+            if is_tantou:
+                differ_entries.append(DataIdAndValue(data_id=data_id, value_data=self.stored_data[data_id],
+                                                     version=self.stored_versions[data_id]))
+        digest = DataStore.gen_digest_of_entries(differ_entries)
+
+        # succ_node が保持していないか古い版のものは渡し、新しい版を保持しているものは受け取る.
+        # 一方向に渡すのみでは、succ_node の方が新しい版を保持している範囲のハッシュ値が一致することがなく、
+        # 毎回同じデータを渡し続けることになる
+        # TODO: exchange_digest call at anti_entropy_with
+        missing_id_list, newer_datas = succ_node.endpoints.grpc__exchange_digest(digest)
+        missing_ids = set(missing_id_list)
+        if len(missing_ids) > 0:
+            # TODO: receive_replica call at anti_entropy_with
+            succ_node.endpoints.grpc__receive_replica(
+                [entry for entry in differ_entries if entry.data_id in missing_ids])
+        if len(newer_datas) > 0:
+            self.receive_replica(newer_datas)
+
+        # TODO: x direct access to node_info of succ_node at anti_entropy_with
+        ChordUtil.dprint(lambda: "anti_entropy_with_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                         + ChordUtil.gen_debug_str_of_node(succ_node.node_info) + ","
+                         + str(len(differ_leaf_idx_list)) + "," + str(len(missing_ids)) + "," + str(len(newer_datas)))
+
+    # 削除済みを示すエントリ(tombstone)と、上書きや削除により参照されなくなった値の回収を行う.
+    # 担当範囲の tombstone のうち successor_info_list内の全ノードが受け取り済みのものを自ノードから削除した上で、
+    # それらのノードにも削除させる. 削除した tombstone の版は、保持期間が過ぎるまで古い値の格納を拒むために記録しておく.
+    # MmapValueStore を用いている場合は、続けてセグメントの回収を行う.
+    # 永続化を行っている場合は、最後に必要であればスナップショットの書き出しを行う.
+    # 読み書きするバイト数は合計で gval.COMPACTION_IO_BUDGET_BYTES までとし、gval.COMPACTION_IO_UNIT_BYTES ごとに
+    # データストアのロックを解放する.
+    # stabilize処理と合わせて定期的に呼び出される
+    # TODO: InternalExp at do_compaction
+    def do_compaction(self) -> PResult[bool]:
+        if self.existing_node.node_info.lock_of_succ_infos.acquire_read(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+            ChordUtil.dprint(lambda: "do_compaction_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                             + "LOCK_ACQUIRE_TIMEOUT")
+            return PResult.Err(False, ErrorCode.InternalControlFlowException_CODE)
+
+        try:
+            if self.existing_node.is_alive == False:
+                # 処理の合間でkillされてしまっていた場合の考慮
+                # 何もしないで終了する
+                ChordUtil.dprint(lambda: "do_compaction_0_5," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                                 + "REQUEST_RECEIVED_BUT_I_AM_ALREADY_DEAD")
+                return PResult.Ok(True)
+
+            with self.existing_node.node_info.lock_of_datastore:
+                acked_tombstones = self.get_acked_tantou_tombstones(gval.COMPACTION_IO_BUDGET_BYTES // DataStore.TOMBSTONE_REMOVAL_COST_BYTES)
+            used_bytes = len(acked_tombstones) * DataStore.TOMBSTONE_REMOVAL_COST_BYTES
+            unit_num = max(gval.COMPACTION_IO_UNIT_BYTES // DataStore.TOMBSTONE_REMOVAL_COST_BYTES, 1)
+
+            removed_ids : List[int] = []
+            for unit_start in range(0, len(acked_tombstones), unit_num):
+                with self.existing_node.node_info.lock_of_datastore:
+                    for data_id, stored_seq in acked_tombstones[unit_start:unit_start + unit_num]:
+                        # ロックを解放していた間に上書きされたものは残す
+                        if self.tombstone_seq_dict.get(data_id) == stored_seq:
+                            self.remove_tombstone(data_id)
+                            removed_ids.append(data_id)
+                # ロックの解放を待っていたスレッドに実行の機会を与えてから次の単位の処理に移る
+                time.sleep(0)
+
+            if len(removed_ids) > 0:
+                for succ_info in self.existing_node.node_info.successor_info_list:
+                    if succ_info.node_id == self.existing_node.node_info.node_id:
+                        continue
+                    ret = ChordUtil.get_node_by_address(succ_info.address_str)
+                    if (ret.is_ok):
+                        succ_node : 'ChordNode' = cast('ChordNode', ret.result)
+                    else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE || ret.err_code == ErrorCode.NodeIsDownedException_CODE
+                        # 削除させられなかった tombstone はレプリカとして残るが、値は削除済みを示すままであるため問題ない
+                        ChordUtil.dprint(lambda: "do_compaction_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                                         + ChordUtil.gen_debug_str_of_node(succ_info))
+                        continue
+                    for unit_start in range(0, len(removed_ids), unit_num):
+                        # TODO: remove_tombstones call at do_compaction
+                        succ_node.endpoints.grpc__remove_tombstones(removed_ids[unit_start:unit_start + unit_num])
+
+            with self.existing_node.node_info.lock_of_datastore:
+                self.expire_removed_tombstone_versions()
+
+            if isinstance(self.stored_data, MmapValueStore):
+                while used_bytes < gval.COMPACTION_IO_BUDGET_BYTES:
+                    with self.existing_node.node_info.lock_of_datastore:
+                        compacted_bytes = cast(MmapValueStore, self.stored_data).compact(
+                            min(gval.COMPACTION_IO_UNIT_BYTES, gval.COMPACTION_IO_BUDGET_BYTES - used_bytes))
+                    if compacted_bytes == 0:
+                        break
+                    used_bytes += compacted_bytes
+                    time.sleep(0)
+
+            self.write_snapshot_if_needed()
+
+            ChordUtil.dprint(lambda: "do_compaction_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                             + str(len(removed_ids)) + "," + str(used_bytes))
+
+            return PResult.Ok(True)
+        finally:
+            self.existing_node.node_info.lock_of_succ_infos.release_read()
+
+    # 担当範囲の tombstone のうち、successor_info_list内の全ノードに、格納した時点の通番以降までのレプリカを
+    # 現在の predecessor のもとで渡し終えているものの (data_id, 格納した時点の通番) を最大 max_num 個返す.
+    # predecessor が変わって担当範囲が広がった場合は、広がった範囲を含めて再同期が行われるまでは削除しない
+    # 必要なロックは呼び出し元でとってある前提
+    def get_acked_tantou_tombstones(self, max_num : int) -> List[Tuple[int, int]]:
+        if len(self.tombstone_seq_dict) == 0 or self.existing_node.node_info.predecessor_info == None:
+            return []
+        pred_id = cast('NodeRef', self.existing_node.node_info.predecessor_info).node_id
+        self_id = self.existing_node.node_info.node_id
+
+        acked_seq = self.tantou_update_seq
+        for succ_info in self.existing_node.node_info.successor_info_list:
+            if succ_info.node_id == self_id:
+                continue
+            synced = self.replica_synced_seq_dict.get(succ_info.address_str)
+            if synced == None or cast(Tuple[int, int], synced)[1] != pred_id:
+                return []
+            acked_seq = min(acked_seq, cast(Tuple[int, int], synced)[0])
+
+        ret_tombstones : List[Tuple[int, int]] = []
+        for data_id, stored_seq in self.tombstone_seq_dict.items():
+            if len(ret_tombstones) >= max_num:
+                break
+            if stored_seq <= acked_seq and ChordUtil.exist_between_two_nodes_right_mawari(pred_id, self_id, data_id):
+                ret_tombstones.append((data_id, stored_seq))
+        return ret_tombstones
+
+    # 削除した tombstone の版を返す. removed_tombstone_versions に記録が無い場合は -1 を返す
+    # 必要なロックは呼び出し元でとってある前提
+    def get_removed_tombstone_version(self, data_id : int) -> int:
+        removed_info = self.removed_tombstone_versions.get(data_id)
+        if removed_info == None:
+            return -1
+        return cast(Tuple[int, float], removed_info)[0]
+
+    # tombstone を削除し、その版と削除した時刻を removed_tombstone_versions に記録する
+    # 必要なロックは呼び出し元でとってある前提
+    def remove_tombstone(self, data_id : int):
+        removed_version = self.stored_versions[data_id]
+        self.remove_data(data_id)
+        self.removed_tombstone_versions[data_id] = (removed_version, ChordUtil.get_current_time())
+
+    # removed_tombstone_versions のうち、削除してから gval.TOMBSTONE_REMOVAL_WATERMARK_RETENTION_SEC が
+    # 経過したものを取り除く. 削除した時刻の順に並んでいるとは限らないため、全てのエントリを確認する.
+    # tombstone 自体の版(書き込んだ時刻)ではなく削除した時刻で判定するため、successor のダウンなどで削除までに
+    # 時間がかかった tombstone も、削除後の保持期間は記録が残る
+    # 必要なロックは呼び出し元でとってある前提
+    def expire_removed_tombstone_versions(self):
+        expire_time = ChordUtil.get_current_time() - gval.TOMBSTONE_REMOVAL_WATERMARK_RETENTION_SEC
+        expired_ids = [data_id for data_id, (_, removed_time) in self.removed_tombstone_versions.items()
+                       if removed_time < expire_time]
+        for data_id in expired_ids:
+            del self.removed_tombstone_versions[data_id]
+
+    # 担当ノードが削除した tombstone を、レプリカとして保持していれば削除する.
+    # 削除の指示を受け取るまでの間に削除済みでない値で上書きされていたものは残す
+    def remove_tombstones(self, data_ids : List[int]):
+        with self.existing_node.node_info.lock_of_datastore:
+            removed_cnt = 0
+            for data_id in data_ids:
+                if self.stored_data.get(data_id) == DataStore.DELETED_ENTRY_MARKING_STR:
+                    self.remove_tombstone(data_id)
+                    removed_cnt += 1
+
+            ChordUtil.dprint(lambda: "remove_tombstones_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                             + str(len(data_ids)) + "," + str(removed_cnt))
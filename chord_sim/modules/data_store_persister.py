@@ -0,0 +1,148 @@
+# coding:utf-8
+
+import json
+import os
+from typing import Dict, IO, List, Mapping, Optional, Tuple
+
+from . import gval
+
+# DataStore の保持データをローカルディスクに永続化するクラス.
+# store_new_data と remove_data による更新を追記のみのログ(WAL)に書き出し、WAL の記録数が
+# gval.SNAPSHOT_WAL_RECORDS_THRESHOLD に達したら、WAL を切り替えた上で保持データ全体のスナップショットを書き出し、
+# 切り替える前の WAL を削除する.
+# ダウンしたノードが同じアドレスで再起動した際に、スナップショットと WAL から保持データを復元するために用いる.
+# WAL の fsync は gval.WAL_FSYNC_BATCH_NUM 件ごとにまとめて行うため、ダウンの直前の高々その件数分の更新は
+# 失われ得る (失われた分は再参加時に隣接ノードとの差分の受け取りで補われる)
+# 必要なロックは呼び出し元の DataStore でとってある前提 (write_snapshot を除く)
+class DataStorePersister:
+
+    WAL_OP_STORE = "S"
+    WAL_OP_REMOVE = "R"
+
+    def __init__(self, address_str : str):
+        os.makedirs(gval.DATA_STORE_PERSISTENCE_DIR, exist_ok=True)
+        self.wal_path : str = os.path.join(gval.DATA_STORE_PERSISTENCE_DIR, address_str + ".wal")
+        self.snapshot_path : str = os.path.join(gval.DATA_STORE_PERSISTENCE_DIR, address_str + ".snapshot")
+        # rotate_wal で切り替える前の WAL. 書き出し中のスナップショットで置き換えられたら削除する
+        self.old_wal_path : str = self.wal_path + ".old"
+
+        # 追記用に開いている WAL のファイル. 最初の追記の際に開く
+        self.wal_file : Optional[IO[str]] = None
+        # fsync されていない WAL の記録数
+        self.unsynced_cnt : int = 0
+        # 最後に WAL を切り替えて以降の WAL の記録数
+        self.wal_record_cnt : int = 0
+
+    def append_store(self, data_id : int, value_str : str, version : int):
+        self.append_record([DataStorePersister.WAL_OP_STORE, data_id, value_str, version])
+
+    def append_remove(self, data_id : int):
+        self.append_record([DataStorePersister.WAL_OP_REMOVE, data_id])
+
+    # WAL に1行1レコードとして追記し、fsync されていない記録数が gval.WAL_FSYNC_BATCH_NUM に達したら fsync する
+    def append_record(self, record : List):
+        if self.wal_file == None:
+            self.wal_file = open(self.wal_path, "a", encoding="utf-8")
+        wal_file = self.wal_file
+        wal_file.write(json.dumps(record) + "\n")
+        self.unsynced_cnt += 1
+        self.wal_record_cnt += 1
+        if self.unsynced_cnt >= gval.WAL_FSYNC_BATCH_NUM:
+            self.sync()
+
+    def sync(self):
+        if self.wal_file == None or self.unsynced_cnt == 0:
+            return
+        self.wal_file.flush()
+        os.fsync(self.wal_file.fileno())
+        self.unsynced_cnt = 0
+
+    def is_snapshot_needed(self) -> bool:
+        return self.wal_record_cnt >= gval.SNAPSHOT_WAL_RECORDS_THRESHOLD
+
+    # スナップショットの書き出しの前に、その時点までの WAL を切り替える前の WAL とし、以降の追記は新たな WAL に行う.
+    # 前回の書き出しの途中でダウンしたために切り替える前の WAL が残っている場合は、その末尾に WAL の内容を移す
+    def rotate_wal(self):
+        if self.wal_file != None:
+            self.sync()
+            self.wal_file.close()
+            self.wal_file = None
+        if os.path.exists(self.wal_path):
+            if os.path.exists(self.old_wal_path):
+                with open(self.wal_path, "rb") as wal_file, open(self.old_wal_path, "ab") as old_wal_file:
+                    old_wal_file.write(wal_file.read())
+                    old_wal_file.flush()
+                    os.fsync(old_wal_file.fileno())
+                os.remove(self.wal_path)
+            else:
+                os.replace(self.wal_path, self.old_wal_path)
+        self.unsynced_cnt = 0
+        self.wal_record_cnt = 0
+
+    # rotate_wal を呼び出した時点の保持データの複製である stored_data の内容を、stored_versions の版とともに
+    # スナップショットとして書き出し、切り替える前の WAL を削除する.
+    # 複製を渡すため、呼び出し元はロックを解放した状態で呼び出してよい. ただし、次の rotate_wal はこの呼び出しが
+    # 返った後に行うこと.
+    # 一時ファイルに書き出してから置き換えるため、書き出しの途中でダウンしても直前のスナップショットと切り替える前の
+    # WAL は残る. 置き換えた後、切り替える前の WAL を削除する前にダウンした場合は、復元時にその内容が重ねて
+    # 適用されるが、各レコードは更新後の値をそのまま持つため結果は変わらない
+    def write_snapshot(self, stored_data : Mapping[int, str], stored_versions : Mapping[int, int]):
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as snapshot_file:
+            for data_id, value_str in stored_data.items():
+                snapshot_file.write(json.dumps([data_id, value_str, stored_versions[data_id]]) + "\n")
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        if os.path.exists(self.old_wal_path):
+            os.remove(self.old_wal_path)
+
+    # スナップショットを読み込んだ上で、切り替える前の WAL、WAL の順にレコードを適用し、復元した保持データを
+    # data_id をキーとし (valueの文字列, 版) を値とする dict で返す. 版を記録していない形式のファイルのデータの版は 0 とする.
+    # WAL の末尾に書きかけのレコードがあれば、以降の追記がそれに続いてしまわないよう WAL を切り詰める
+    def load(self) -> Dict[int, Tuple[str, int]]:
+        stored_data : Dict[int, Tuple[str, int]] = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r", encoding="utf-8") as snapshot_file:
+                for line in snapshot_file:
+                    record = json.loads(line)
+                    stored_data[record[0]] = (record[1], record[2] if len(record) > 2 else 0)
+
+        self.wal_record_cnt = 0
+        for wal_path in [self.old_wal_path, self.wal_path]:
+            if not os.path.exists(wal_path):
+                continue
+            valid_size = 0
+            with open(wal_path, "rb") as wal_file:
+                for line in wal_file:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(line.decode("utf-8"))
+                    except ValueError:
+                        break
+                    if record[0] == DataStorePersister.WAL_OP_STORE:
+                        stored_data[record[1]] = (record[2], record[3] if len(record) > 3 else 0)
+                    else:
+                        stored_data.pop(record[1], None)
+                    self.wal_record_cnt += 1
+                    valid_size += len(line)
+            if valid_size < os.path.getsize(wal_path):
+                os.truncate(wal_path, valid_size)
+
+        return stored_data
+
+    def close(self):
+        if self.wal_file == None:
+            return
+        self.sync()
+        self.wal_file.close()
+        self.wal_file = None
+
+    # 永続化したファイルを全て削除する
+    def remove_files(self):
+        self.close()
+        for path in [self.wal_path, self.old_wal_path, self.snapshot_path, self.snapshot_path + ".tmp"]:
+            if os.path.exists(path):
+                os.remove(path)
@@ -3,11 +3,11 @@
 from typing import Dict, List, Tuple, Optional, cast, TYPE_CHECKING
 
 from .chord_util import ChordUtil, InternalControlFlowException,\
-    NodeIsDownedExceptiopn, DataIdAndValue, KeyValue, PResult
+    NodeIsDownedExceptiopn, DataIdAndValue, DataChunk, KeyValue, PResult
 
 if TYPE_CHECKING:
     from .chord_node import ChordNode
-    from .node_info import NodeInfo
+    from .node_info import NodeInfo, NodeRef
 
 class Endpoints:
 
@@ -20,6 +20,12 @@ class Endpoints:
     def grpc__put(self, data_id : int, value_str : str) -> bool:
         return self.existing_node.put(data_id, value_str)
 
+    def rrpc__global_multi_put(self, items : List[DataIdAndValue]) -> List[bool]:
+        return self.existing_node.global_multi_put(items)
+
+    def grpc__multi_put(self, items : List[DataIdAndValue]) -> List[bool]:
+        return self.existing_node.multi_put(items)
+
     def grpc__global_get_recover_prev(self, data_id : int) -> Tuple[str, Optional['ChordNode']]:
         return self.existing_node.global_get_recover_prev(data_id)
 
@@ -32,24 +38,54 @@ class Endpoints:
     def grpc__get(self, data_id : int, for_recovery = False) -> str:
         return self.existing_node.get(data_id, for_recovery)
 
+    def rrpc__global_multi_get(self, data_ids : List[int]) -> List[str]:
+        return self.existing_node.global_multi_get(data_ids)
+
+    def grpc__multi_get(self, data_ids : List[int]) -> List[str]:
+        return self.existing_node.multi_get(data_ids)
+
     def grpc__global_delete(self, data_id : int) -> bool:
         return self.existing_node.global_delete(data_id)
 
-    def grpc__pass_node_info(self) -> 'NodeInfo':
+    def grpc__pass_node_info(self) -> 'NodeRef':
         return self.existing_node.pass_node_info()
 
     def grpc__get_all_tantou_data(self, node_id : Optional[int] = None) -> List[DataIdAndValue]:
         return self.existing_node.data_store.get_all_tantou_data(node_id)
 
+    def grpc__get_all_tantou_data_delta(self, digest : List[Tuple[int, int, int]]) -> List[DataIdAndValue]:
+        return self.existing_node.data_store.get_all_tantou_data_delta(digest)
+
     def grpc__receive_replica(self, pass_datas : List[DataIdAndValue]):
         return self.existing_node.data_store.receive_replica(pass_datas)
 
+    def grpc__exchange_digest(self, digest : List[Tuple[int, int, int]]) -> Tuple[List[int], List[DataIdAndValue]]:
+        return self.existing_node.data_store.exchange_digest(digest)
+
+    def grpc__remove_tombstones(self, data_ids : List[int]):
+        return self.existing_node.data_store.remove_tombstones(data_ids)
+
+    def grpc__get_merkle_range_hashes(self, node_idx_list : List[int], from_id : int, end_id : int) -> List[int]:
+        return self.existing_node.data_store.get_merkle_range_hashes(node_idx_list, from_id, end_id)
+
     def grpc__delegate_my_tantou_data(self, node_id : int) -> List[KeyValue]:
         return self.existing_node.data_store.delegate_my_tantou_data(node_id)
 
+    def grpc__delegate_my_tantou_data_chunk(self, node_id : int, from_id : Optional[int], max_num : int) -> DataChunk:
+        return self.existing_node.data_store.delegate_my_tantou_data_chunk(node_id, from_id, max_num)
+
+    def grpc__delegate_my_tantou_data_delta(self, node_id : int, digest : List[Tuple[int, int, int]]) -> List[DataIdAndValue]:
+        return self.existing_node.data_store.delegate_my_tantou_data_delta(node_id, digest)
+
     def grpc__get_all_data(self) -> List[DataIdAndValue]:
         return self.existing_node.data_store.get_all_data()
 
+    def grpc__get_all_data_delta(self, digest : List[Tuple[int, int, int]]) -> List[DataIdAndValue]:
+        return self.existing_node.data_store.get_all_data_delta(digest)
+
+    def grpc__get_all_data_chunk(self, from_id : Optional[int], max_num : int) -> DataChunk:
+        return self.existing_node.data_store.get_all_data_chunk(from_id, max_num)
+
     # TODO: AppropriateExp, DownedExp, InternalExp at grpc__find_successor
     def grpc__find_successor(self, id : int) -> PResult[Optional['ChordNode']]:
         return self.existing_node.router.find_successor(id)
@@ -57,21 +93,31 @@ class Endpoints:
     def grpc__closest_preceding_finger(self, id : int) -> 'ChordNode':
         return self.existing_node.router.closest_preceding_finger(id)
 
-    def grpc__pass_successor_list(self) -> List['NodeInfo']:
+    def grpc__forward_lookup(self, id : int, origin_info : 'NodeRef', query_id : int, hop_cnt : int):
+        return self.existing_node.router.forward_lookup(id, origin_info, query_id, hop_cnt)
+
+    def grpc__receive_lookup_result(self, query_id : int, owner_info : 'NodeRef', pred_id : int, hop_cnt : int):
+        return self.existing_node.router.receive_lookup_result(query_id, owner_info, pred_id, hop_cnt)
+
+    def grpc__pass_successor_list(self) -> List['NodeRef']:
         return self.existing_node.stabilizer.pass_successor_list()
 
-    def grpc__pass_predecessor_info(self) -> Optional['NodeInfo']:
+    def grpc__pass_predecessor_info(self) -> Optional['NodeRef']:
         return self.existing_node.stabilizer.pass_predecessor_info()
 
-    def grpc__set_routing_infos_force(self, predecessor_info : 'NodeInfo', successor_info_0 : 'NodeInfo', ftable_enry_0 : 'NodeInfo'):
+    def grpc__set_routing_infos_force(self, predecessor_info : 'NodeRef', successor_info_0 : 'NodeRef', ftable_enry_0 : 'NodeRef'):
         return self.existing_node.stabilizer.set_routing_infos_force(predecessor_info, successor_info_0, ftable_enry_0)
 
     # TODO: InternalExp, DownedExp at grpc__stabilize_succesor_inner
-    def grpc__stabilize_successor_inner(self) -> PResult[Optional['NodeInfo']]:
+    def grpc__stabilize_successor_inner(self) -> PResult[Optional['NodeRef']]:
         return self.existing_node.stabilizer.stabilize_successor_inner()
 
+    # TODO: InternalExp, DownedExp at grpc__stabilize_successor_inner_with_succ_list
+    def grpc__stabilize_successor_inner_with_succ_list(self) -> PResult[Optional[Tuple['NodeRef', List['NodeRef']]]]:
+        return self.existing_node.stabilizer.stabilize_successor_inner_with_succ_list()
+
     # TODO: InternalExp at grpc__check_predecessor
-    def grpc__check_predecessor(self, node_info : 'NodeInfo') -> PResult[bool]:
+    def grpc__check_predecessor(self, node_info : 'NodeRef') -> PResult[bool]:
         return self.existing_node.stabilizer.check_predecessor(node_info)
 
     # TODO: InternalExp at grpc__check_successor_list_length
@@ -82,7 +128,7 @@ class Endpoints:
     #       ただし初回の呼び出しはget_node_by_addressの中で行われ、そこでのチェックを通った場合のみ
     #       同メソッドは ChordNodeオブジェクトを返す設計とする（通信回数が増えてしまうがそこは許容する）
     def grpc__is_alive(self) -> bool:
-        raise Exception("not implemented yet")
+        return self.existing_node.is_alive
 
     # TODO: 実システムでだけ用いる。ノード情報を取得するAPI
     #       get_nobe_by_address内でgrpc__is_aliveでの生存チェックを通ったら
@@ -92,5 +138,6 @@ class Endpoints:
     def grpc__get_chord_node_info(self) -> 'NodeInfo':
         ret_info : NodeInfo = self.existing_node.node_info.get_partial_deepcopy()
         if self.existing_node.node_info.predecessor_info != None:
-            ret_info.predecessor_info = cast('NodeInfo', self.existing_node.node_info.predecessor_info).get_partial_deepcopy()
+            # NodeRef はイミュータブルであるためコピーせずに設定する
+            ret_info.predecessor_info = self.existing_node.node_info.predecessor_info
         return ret_info
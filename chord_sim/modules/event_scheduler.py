@@ -0,0 +1,37 @@
+# coding:utf-8
+
+import heapq
+from typing import Callable, Dict, List, Tuple
+
+# 離散イベントシミュレーションのためのスケジューラ.
+# 実時間の経過を待つ代わりに仮想時刻を持ち、発生時刻の早い順にイベントを取り出して実行していく.
+# イベントは単一のスレッドで順に実行されるため、乱数のシードを固定すれば実行結果は毎回同じとなる.
+# 同じ時刻のイベントは登録された順に実行する
+class EventScheduler:
+
+    def __init__(self):
+        # 現在の仮想時刻(秒)
+        self.now : float = 0.0
+        # (発生時刻, 登録順の通番, イベント名, 実行する関数) を要素とするヒープ
+        self.event_queue : List[Tuple[float, int, str, Callable[[], None]]] = []
+        self.event_seq : int = 0
+        # イベント名をキーとし、実行した回数を値とする
+        self.executed_event_cnt : Dict[str, int] = {}
+
+    # 現在の仮想時刻から delay_sec 秒後に callback が実行されるよう登録する
+    def schedule(self, delay_sec : float, event_name : str, callback : Callable[[], None]):
+        heapq.heappush(self.event_queue, (self.now + delay_sec, self.event_seq, event_name, callback))
+        self.event_seq += 1
+
+    # 仮想時刻が until_sec に達するか、実行するイベントが無くなるまでイベントを実行する.
+    # 実行したイベントの数を返す
+    def run(self, until_sec : float) -> int:
+        executed_cnt = 0
+        while len(self.event_queue) > 0 and self.event_queue[0][0] <= until_sec:
+            event_time, _, event_name, callback = heapq.heappop(self.event_queue)
+            self.now = event_time
+            callback()
+            self.executed_event_cnt[event_name] = self.executed_event_cnt.get(event_name, 0) + 1
+            executed_cnt += 1
+        self.now = max(self.now, until_sec)
+        return executed_cnt
@@ -0,0 +1,56 @@
+# coding:utf-8
+
+from typing import List, Optional
+
+import modules.gval as gval
+
+# finger_table のエントリの更新を、1回の呼び出し(tick)ごとに1エントリずつ行うためのスケジューラ.
+# 全エントリを毎回更新する代わりに、以下により find_successor の呼び出し回数を減らす.
+# - 下位のエントリの担当ノードが上位のエントリの開始IDも担当している(範囲が同じノードでカバーされている)
+#   場合、上位のエントリは探索せずに同じノードとする(カバーされたエントリは更新対象としない)
+# - 更新しても値が変わらなかったエントリは、次に更新するまでの tick 数を倍にしていく(上限は
+#   gval.FINGER_REFRESH_BACKOFF_MAX_TICKS). 値が変わった場合は毎 tick 更新の対象に戻す
+class FingerRefreshScheduler:
+
+    def __init__(self, table_len : int):
+        self.table_len : int = table_len
+        self.tick : int = 0
+        # 各エントリを次に更新する tick
+        self.next_due_ticks : List[int] = [0] * table_len
+        # 各エントリの現在の更新間隔(tick数)
+        self.backoff_ticks : List[int] = [1] * table_len
+        # 下位のエントリと同じノードでカバーされており、更新対象としないエントリについて、カバーしている
+        # エントリのインデックス. カバーされていないエントリは -1
+        self.covered_by : List[int] = [-1] * table_len
+        # 更新対象を探し始めるインデックス. 更新対象は巡回的に選ぶ
+        self.cursor : int = 0
+
+    # tick を進め、今回更新すべきエントリのインデックスを返す. 無い場合は None を返す
+    def pick_next_idx(self) -> Optional[int]:
+        self.tick += 1
+        for offset in range(self.table_len):
+            idx = (self.cursor + offset) % self.table_len
+            if self.covered_by[idx] == -1 and self.next_due_ticks[idx] <= self.tick:
+                self.cursor = (idx + 1) % self.table_len
+                return idx
+        return None
+
+    # idx のエントリを更新した結果を受けて、次に更新する tick を決める
+    def report_refresh(self, idx : int, is_changed : bool):
+        if is_changed:
+            self.backoff_ticks[idx] = 1
+        else:
+            self.backoff_ticks[idx] = min(self.backoff_ticks[idx] * 2, gval.FINGER_REFRESH_BACKOFF_MAX_TICKS)
+        self.next_due_ticks[idx] = self.tick + self.backoff_ticks[idx]
+
+    # covering_idx のエントリの更新後に、covering_idx より大きく covered_end_idx 未満のインデックスのエントリを
+    # covering_idx のエントリでカバーされているものとする. それ以外で covering_idx のエントリか、今回カバーされた
+    # エントリにカバーされていたエントリは、カバーしていたエントリが更新されなくなるため、即座に更新対象とする
+    def update_covered(self, covering_idx : int, covered_end_idx : int):
+        for idx in range(covering_idx + 1, self.table_len):
+            if idx < covered_end_idx:
+                self.covered_by[idx] = covering_idx
+            elif covering_idx <= self.covered_by[idx] < covered_end_idx:
+                self.covered_by[idx] = -1
+                self.backoff_ticks[idx] = 1
+                self.next_due_ticks[idx] = self.tick
@@ -1,13 +1,19 @@
 # coding:utf-8
 
 import threading
-from typing import Dict, List, TYPE_CHECKING
+from typing import Dict, List, Optional, TYPE_CHECKING
+
+from .log_writer import LogLevel, LogWriter
 # from readerwriterlock import rwlock
 
 if TYPE_CHECKING:
     from .chord_node import ChordNode
     from .node_info import NodeInfo
     from .chord_util import KeyValue
+    from .event_scheduler import EventScheduler
+    from .transport import Transport
+    from .latency_model import LatencyModel
+    from .stabilize_notifier import StabilizeNotifier
     from .chord_node import ChordNode
 
 ID_SPACE_BITS = 30 # 160 <- sha1での本来の値
@@ -30,6 +36,27 @@ STABILIZE_SUCCESSOR_BATCH_TIMES = 20 #10 #20
 # を行わせるメソッドの一回の呼び出しで何バッチが実行されるか
 STABILIZE_FTABLE_BATCH_TIMES = 2 #1
 
+# finger_table の更新を、全エントリの更新を繰り返す代わりに Stabilizer.stabilize_finger_table_adaptive で
+# 1回あたり1エントリずつ行うか
+ENABLE_ADAPTIVE_FINGER_REFRESH = True
+# ENABLE_ADAPTIVE_FINGER_REFRESH が True の場合に、stabilize処理 の1回の呼び出しで各ノードが
+# stabilize_finger_table_adaptive を呼び出す回数
+FINGER_REFRESH_TICKS_PER_ROUND = 4
+# 値が変わらなかったエントリの更新間隔を伸ばしていく際の上限(tick数)
+FINGER_REFRESH_BACKOFF_MAX_TICKS = 32
+
+# メンバーシップの変化(join、predecessor の変更、ノードのダウンの検出)を stabilize_notifier に通知し、
+# 影響を受けるノードのみ即座に stabilize処理 を行うか. True の場合、全ノードの stabilize処理 は
+# BACKGROUND_STABILIZE_INTERVAL_SEC 秒ごとにのみ行う
+ENABLE_STABILIZE_NOTIFICATION = True
+BACKGROUND_STABILIZE_INTERVAL_SEC = 30.0
+# 通知を受けたノードに stabilize_successor を行わせる回数
+NOTIFIED_STABILIZE_SUCCESSOR_TIMES = 2
+# 離散イベントシミュレーションとして実行する場合に、通知を受けたノードの stabilize処理 を行う間隔(仮想時刻での秒)
+SIM_NOTIFIED_STABILIZE_INTERVAL_SEC = 1.0
+# stabilize処理 が必要になったノードの通知先. None の場合は通知を行わない
+stabilize_notifier : Optional['StabilizeNotifier'] = None
+
 # 一時的にこれより短くなる場合もある
 SUCCESSOR_LIST_NORMAL_LEN = 3
 
@@ -81,11 +108,89 @@ GLOBAL_GET_RETRY_CNT_LIMIT_TO_DEBEUG_PRINT = 30
 
 # マスターデータとレプリカの区別なく、データIDをKeyに、当該IDに対応するデータを
 # 保持しているノードのリストを得られる dict
-all_data_placement_dict : Dict[str, List['NodeInfo']] = {}
+all_data_placement_dict : Dict[int, List['NodeInfo']] = {}
 
 # 既に発行したputの回数
 already_issued_put_cnt = 0
 
+# DataStoreが保持するMerkle木の深さ
+# ID空間を 2^MERKLE_TREE_DEPTH 個の範囲に分割したものが葉となる
+MERKLE_TREE_DEPTH = 10
+
+# find_successor で再帰的な探索を行うか. False の場合は反復的な探索を行う
+# find_successor の引数 recursive で呼び出しごとに指定することもできる
+ROUTING_RECURSIVE = False
+# 再帰的な探索で、起点のノードが担当ノードからの結果を待つ時間(秒)
+# 転送の途中でダウンしたノードがあった場合などは結果が返らないため、この時間で探索を失敗とする
+RECURSIVE_LOOKUP_TIMEOUT_SEC = 3.0
+# 再帰的な探索の要求の転送と結果の返送を、送信元の処理と切り離して(片方向に)行うスレッドの数
+RECURSIVE_LOOKUP_SEND_THREAD_NUM = 32
+
+# 探索の性能を計測するために、ノード間の通信の遅延を模擬するか
+ENABLE_SIM_LINK_DELAY = False
+# latency_model が設定されていない場合に模擬する、ノード間の片道の通信の遅延(秒)
+SIM_LINK_DELAY_SEC = 0.0
+# ノード間の通信の遅延を与えるモデル. None の場合は一律に SIM_LINK_DELAY_SEC とする
+latency_model : Optional['LatencyModel'] = None
+
+# stabilize_finger_table で、各エントリが満たすべきIDの範囲に含まれるノードのうち、
+# latency_model で最も遅延の小さいノードを選ぶか(Proximity Neighbor Selection)
+# False の場合は従来通り、エントリの開始IDの担当ノードを格納する
+ENABLE_PROXIMITY_NEIGHBOR_SELECTION = False
+
+# 各ノードが find_successor の結果をキャッシュしておくエントリ数の上限
+OWNER_CACHE_SIZE_MAX = 64
+
+# stabilize_successor で successor に stabilize_successor_inner を行わせる際に、successor の
+# successor_info_list も同じ応答で受け取り(piggyback)、それを用いて successor_info_list を組み立てるか.
+# False の場合は従来通り、successor を1ノードずつ辿って stabilize_successor_inner と pass_successor_list を呼び出す
+ENABLE_SUCC_LIST_PIGGYBACK = True
+
+# join処理 でのデータの委譲と、partial_join_op での successor からの全データの受け取りを、
+# DataChunk に分割して DATA_TRANSFER_CHUNK_SIZE 個ずつ行うか. False の場合は従来通り一度に全て受け取る
+ENABLE_CHUNKED_DATA_TRANSFER = True
+# 1回の呼び出しで受け渡すデータの数の上限. 渡す側がデータストアのロックを保持し続ける時間を抑えるために用いる
+DATA_TRANSFER_CHUNK_SIZE = 1000
+
+# 各ノードの DataStore の更新を DataStorePersister でローカルディスクに永続化するか.
+# True の場合、ダウンしたノードを同じアドレスで再起動させた際に保持データをディスクから復元し、
+# 隣接ノードからは差分のみを受け取る
+ENABLE_DATA_STORE_PERSISTENCE = False
+# 永続化したファイルを置くディレクトリ. ノードごとに アドレス.wal と アドレス.snapshot が作成される
+DATA_STORE_PERSISTENCE_DIR = "./chord_sim_data"
+# WAL への追記を何件ごとにまとめて fsync するか
+WAL_FSYNC_BATCH_NUM = 64
+# 最後にスナップショットを書き出して以降の WAL の記録数がこれに達していれば、do_compaction の際に WAL を切り替えて
+# スナップショットを書き出す
+SNAPSHOT_WAL_RECORDS_THRESHOLD = 10000
+
+# DataStore の保持データを dict ではなく MmapValueStore に格納するか. True の場合、値はメモリマップした一時ファイル上の
+# ログに、data_id から値の位置を引くインデックスとともに置かれ、プロセスのメモリに収まらない量のデータを保持できる
+ENABLE_MMAP_VALUE_STORE = False
+# MmapValueStore が一時ファイルを作成するディレクトリ. None の場合はOSの既定の一時ディレクトリとする
+MMAP_VALUE_STORE_DIR : Optional[str] = None
+# MmapValueStore のインデックスの初期のスロット数(2の冪に切り上げられる). 足りなくなった時点で倍に拡張される
+MMAP_INDEX_INITIAL_SLOT_NUM = 1024
+# MmapValueStore の値のログを構成するセグメント1つのサイズ(バイト). 追記先のセグメントが一杯になったら新たなセグメントを作成する
+MMAP_SEGMENT_SIZE = 1 << 20
+
+# stabilize処理 に合わせて各ノードで行う DataStore.do_compaction の1回の呼び出しで読み書きするバイト数の上限.
+# 削除済みを示すエントリ(tombstone)の削除と、MmapValueStore のセグメントの回収の合計とする
+COMPACTION_IO_BUDGET_BYTES = 1 << 20
+# do_compaction でデータストアのロックを保持したまま読み書きするバイト数の上限. この単位ごとにロックを解放し、
+# 並行して発行された get や put を待たせ続けないようにする
+COMPACTION_IO_UNIT_BYTES = 64 * 1024
+# 参照されなくなったレコードの割合がこれ以上のセグメントを MmapValueStore.compact での回収の対象とする
+COMPACTION_GARBAGE_RATIO_THRESHOLD = 0.5
+# tombstone を削除したノードが、その版を削除済みの目印として保持し続ける秒数(シミュレーション上の時刻).
+# 保持している間は、削除した版以前の値を他ノードから受け取っても格納しない. この秒数より長く
+# 同期されないままだったノードが持つ古い値は、削除したデータを復活させ得る
+TOMBSTONE_REMOVAL_WATERMARK_RETENTION_SEC = 3600.0
+
+# 他ノードから受け取ったレプリカや委譲されたデータを、保持している値と版を比較して新しい場合のみ格納するか(last-writer-wins).
+# False の場合は従来通り受け取った順に上書きする
+ENABLE_VERSIONED_REPLICA_MERGE = True
+
 # stabilize_successorのループの回せる回数の上限
 TRYING_GET_SUCC_TIMES_LIMIT = SUCCESSOR_LIST_NORMAL_LEN * 5
 
@@ -97,9 +202,51 @@ TRYING_GET_SUCC_TIMES_LIMIT = SUCCESSOR_LIST_NORMAL_LEN * 5
 
 STABILIZE_THREAD_NUM = 3 #10
 
+# 離散イベントシミュレーションとして実行する場合のスケジューラ. スレッドで実行する場合は None
+event_scheduler : Optional['EventScheduler'] = None
+# 離散イベントシミュレーションとして実行する場合の、全ノードでのstabilize処理の間隔(仮想時刻での秒)
+# スレッドで実行する場合は間隔を空けずに繰り返している
+SIM_STABILIZE_INTERVAL_SEC = 10.0
+# 他のプロセスが保持するノードへの呼び出しを仲介するオブジェクト. None の場合は全てのノードが
+# このプロセスの all_node_dict に存在するものとして直接呼び出す.
+# ShardedStabilizer により生成されたワーカープロセスでは ShardWorker か TcpTransport が設定される
+transport : Optional['Transport'] = None
+
+# ShardWorker で他のワーカーからの要求を処理するスレッドの数
+# 処理中の要求から他のワーカーへの呼び出しが入れ子になるため、入れ子の深さに対して十分な数とする
+SHARD_WORKER_SERVER_THREAD_NUM = 32
+# ShardWorker での他のワーカーへの要求に対する応答の待ち合わせのタイムアウト(秒)
+SHARD_WORKER_RPC_TIMEOUT_SEC = 10.0
+# ShardedStabilizer で、ワーカープロセスからの stabilize処理 1ラウンド分の完了や経路表の返送を待つ時間の上限(秒)
+SHARD_WORKER_REPLY_TIMEOUT_SEC = 600.0
+
+# TcpTransport で受け付けた要求を処理するスレッドの数
+# 処理中の要求から他のプロセスへの呼び出しが入れ子になるため、入れ子の深さに対して十分な数とする
+TCP_RPC_SERVER_THREAD_NUM = 32
+# TcpTransport での接続と、要求に対する応答の待ち合わせのタイムアウト(秒)
+TCP_RPC_TIMEOUT_SEC = 10.0
+# TcpTransport で保持しておく他のプロセスへの接続数の上限
+TCP_CONNECTION_POOL_SIZE = 16
+# Transport で保持しておく他のプロセスのノードのプロキシと生存状態の数の上限
+PEER_HANDLE_CACHE_SIZE = 256
+
+# 離散イベントシミュレーションとして実行する場合に、各スレッドの処理に相当するイベントが
+# ネットワークの構築完了を待つ際の確認間隔(仮想時刻での秒)
+SIM_WAIT_CONSTRUCTION_INTERVAL_SEC = 1.0
+
+# AsyncEndpoints による呼び出し1回ごとに模擬する通信の遅延(秒)
+ASYNC_RPC_LATENCY_SEC = 0.0
+
 ENABLE_DATA_STORE_OPERATION_DPRINT = False
 ENABLE_ROUTING_INFO_DPRINT = False
 
+# ChordUtil.dprint で出力するログのレベルの下限. これ未満のレベルのログは出力されない
+# LogLevel.NONE とすることで全てのログの出力を止められる
+LOG_LEVEL = LogLevel.DEBUG
+
+# ChordUtil.dprint で出力するログの書き出しを行うオブジェクト
+log_writer = LogWriter()
+
 # partial_join_opが実行されることを待っているノードが存在するか否か
 # join と partial_join_op の間で、該当ノードがkillされることを避けるために用いる
 is_waiting_partial_join_op_exists = False
\ No newline at end of file
@@ -0,0 +1,27 @@
+# coding:utf-8
+
+from .chord_util import ChordUtil
+
+# 各ノードの DataStore が保持するデータに版を付けるためのハイブリッド論理時計(Hybrid Logical Clock).
+# 版は (ミリ秒単位の物理時刻 << LOGICAL_BITS) | 論理カウンタ の整数で表し、大小の比較がそのまま版の新旧の比較となる.
+# 自ノードで発行する版は、物理時刻が進んでいなくても、それまでに発行したものと他ノードから受け取ったものの
+# いずれよりも大きくなる. そのため、あるデータの値を受け取ったノードがその後に上書きした値は、必ず新しい版となる
+# 必要なロックは呼び出し元の DataStore でとってある前提
+class HybridLogicalClock:
+
+    LOGICAL_BITS = 16
+
+    def __init__(self):
+        # 発行したか、受け取った版のうち最大のもの
+        self.last_version : int = 0
+
+    # 新たな版を発行する
+    def now(self) -> int:
+        physical_version = int(ChordUtil.get_current_time() * 1000) << HybridLogicalClock.LOGICAL_BITS
+        self.last_version = max(self.last_version + 1, physical_version)
+        return self.last_version
+
+    # 他ノードから受け取った版を反映し、以降に発行する版がそれより大きくなるようにする
+    def update(self, received_version : int):
+        if received_version > self.last_version:
+            self.last_version = received_version
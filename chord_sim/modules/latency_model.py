@@ -0,0 +1,64 @@
+# coding:utf-8
+
+import math
+import random
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict, Tuple
+
+# ノード間の通信の遅延を与えるモデル.
+# gval.latency_model に設定すると、ChordUtil.get_link_latency が返す遅延として用いられ、経路表の
+# 近接性を考慮した選択(gval.ENABLE_PROXIMITY_NEIGHBOR_SELECTION)や、通信の遅延の模擬に利用される
+class LatencyModel(ABC):
+
+    # from_address のノードから to_address のノードへの片道の通信の遅延(秒)を返す
+    @abstractmethod
+    def get_latency(self, from_address : str, to_address : str) -> float:
+        pass
+
+# 各ノードに仮想的な2次元平面上の座標を割り当て、座標間のユークリッド距離に比例した遅延を与える.
+# 座標はアドレスから決まるため、同じアドレスのノードには実行ごとに同じ座標が割り当てられる
+class CoordinateLatencyModel(LatencyModel):
+
+    def __init__(self, base_latency_sec : float = 0.001, latency_per_unit_sec : float = 0.05, seed : int = 0):
+        # 距離によらず生じる遅延
+        self.base_latency_sec : float = base_latency_sec
+        # 座標は各軸 0以上1未満の範囲とし、距離1あたりの遅延
+        self.latency_per_unit_sec : float = latency_per_unit_sec
+        self.seed : int = seed
+        # アドレスをキーとし、座標を値とする
+        self.coord_dict : Dict[str, Tuple[float, float]] = {}
+
+    def get_coord(self, address : str) -> Tuple[float, float]:
+        coord = self.coord_dict.get(address)
+        if coord == None:
+            # 組み込みの hash はプロセスごとに値が変わるため、crc32 から乱数のシードを作る
+            rand = random.Random(zlib.crc32(address.encode()) ^ self.seed)
+            coord = (rand.random(), rand.random())
+            self.coord_dict[address] = coord
+        return coord
+
+    def get_latency(self, from_address : str, to_address : str) -> float:
+        if from_address == to_address:
+            return 0.0
+        from_x, from_y = self.get_coord(from_address)
+        to_x, to_y = self.get_coord(to_address)
+        return self.base_latency_sec + self.latency_per_unit_sec * math.hypot(from_x - to_x, from_y - to_y)
+
+# ノードの組ごとの遅延を明示的に与える. 与えられていない組には default_latency_sec を用いる
+# 遅延は対称であるとし、(a, b) を与えれば (b, a) にも同じ値を用いる
+class MatrixLatencyModel(LatencyModel):
+
+    def __init__(self, default_latency_sec : float = 0.0):
+        self.default_latency_sec : float = default_latency_sec
+        # (アドレス, アドレス) をキーとし、遅延を値とする
+        self.latency_dict : Dict[Tuple[str, str], float] = {}
+
+    def set_latency(self, address_a : str, address_b : str, latency_sec : float):
+        self.latency_dict[(address_a, address_b)] = latency_sec
+        self.latency_dict[(address_b, address_a)] = latency_sec
+
+    def get_latency(self, from_address : str, to_address : str) -> float:
+        if from_address == to_address:
+            return 0.0
+        return self.latency_dict.get((from_address, to_address), self.default_latency_sec)
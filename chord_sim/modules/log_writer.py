@@ -0,0 +1,79 @@
+# coding:utf-8
+
+import atexit
+import collections
+import sys
+import threading
+from typing import Deque, List, Union
+
+# ログの出力レベル
+# gval.LOG_LEVEL 未満のレベルで出力しようとしたログは、文字列の生成も含めて行われない
+class LogLevel:
+    DEBUG = 10
+    INFO = 20
+    WARN = 30
+    # gval.LOG_LEVEL に設定することで全てのログの出力を止める
+    NONE = 100
+
+# ログの文字列の標準出力への書き出しをバックグラウンドのスレッドで行うためのクラス.
+# 呼び出し元のスレッドはキューに文字列を積むだけで、print による同期的な出力を待たされない.
+# 書き出し用のスレッドは一定間隔で起床し、キューに溜まっている文字列をまとめて1回の write で書き出す.
+# ログ1行毎にスレッドを起床させると、GILの受け渡しのコストが呼び出し元の処理を遅くしてしまうため、このようにしている.
+# 書き出しの時点の sys.stdout に出力するため、contextlib.redirect_stdout などでの出力先の差し替えにも従う
+class LogWriter:
+
+    # 書き出し用のスレッドが起床する間隔
+    WRITE_INTERVAL_SEC = 0.05
+
+    def __init__(self):
+        # 要素は書き出す文字列か、flush の完了を待ち合わせるための threading.Event
+        # deque の append と popleft はスレッドセーフであるため、ロックはとらない
+        self.log_deque : Deque[Union[str, threading.Event]] = collections.deque()
+        # flush が要求された場合に、書き出し用のスレッドを即座に起床させるために用いる
+        self.wakeup_event : threading.Event = threading.Event()
+        self.writer_thread : threading.Thread = threading.Thread(target=self.write_loop_th, daemon=True)
+        self.writer_thread.start()
+        # プロセス終了時にキューに残っているログが失われないようにする
+        atexit.register(self.flush)
+
+    def write(self, log_str : str, flush : bool = False):
+        self.log_deque.append(log_str)
+        if flush:
+            self.flush()
+
+    # 呼び出し時点までにキューに積まれたログが全て書き出され、sys.stdout が flush されるまで待つ
+    def flush(self):
+        flushed_event = threading.Event()
+        self.log_deque.append(flushed_event)
+        self.wakeup_event.set()
+        flushed_event.wait()
+
+    def write_loop_th(self):
+        while True:
+            self.wakeup_event.wait(timeout=LogWriter.WRITE_INTERVAL_SEC)
+            self.wakeup_event.clear()
+
+            str_list : List[str] = []
+            while True:
+                try:
+                    entry = self.log_deque.popleft()
+                except IndexError:
+                    break
+                if isinstance(entry, str):
+                    str_list.append(entry)
+                    continue
+                # flush の要求であれば、それまでに積まれたものを書き出してから待ち合わせを解除する
+                self.write_to_stdout(str_list, flush=True)
+                str_list = []
+                entry.set()
+            self.write_to_stdout(str_list)
+
+    def write_to_stdout(self, str_list : List[str], flush : bool = False):
+        try:
+            if len(str_list) > 0:
+                sys.stdout.write("".join(str_list))
+            if flush:
+                sys.stdout.flush()
+        except ValueError:
+            # 差し替えられていた出力先が既に close されている場合. ログは捨てる
+            pass
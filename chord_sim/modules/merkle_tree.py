@@ -0,0 +1,56 @@
+# coding:utf-8
+
+import hashlib
+from typing import List, Tuple
+
+from . import gval
+
+# ID空間を 2^MERKLE_TREE_DEPTH 個の等幅の範囲（葉）に分割し、各範囲に含まれるデータのハッシュ値を
+# 木構造で集約して保持するクラス.
+# 各ノードのハッシュ値は配下のデータのエントリハッシュのXORであるため、データの追加・更新・削除の際は
+# 葉から根までの MERKLE_TREE_DEPTH + 1 個のノードを更新するだけで済む.
+# ノードは配列上でヒープと同じ形で保持し、インデックス1が根（ID空間全体）で、インデックス i の子は
+# 2i と 2i + 1 となる
+class MerkleTree:
+
+    def __init__(self):
+        self.depth : int = gval.MERKLE_TREE_DEPTH
+        # data_id をこの bit数 だけ右シフトすると葉の番号となる
+        self.leaf_shift : int = gval.ID_SPACE_BITS - self.depth
+        self.leaf_idx_base : int = 2 ** self.depth
+        self.hashes : List[int] = [0] * (2 ** (self.depth + 1))
+
+    # データ1件分のハッシュ値を返す
+    # data_id と値と版から求めるため、値か版が更新された場合もハッシュ値が変わる
+    @classmethod
+    def calc_entry_hash(cls, data_id : int, value_str : str, version : int) -> int:
+        hasher = hashlib.blake2b(digest_size=8)
+        hasher.update(data_id.to_bytes(gval.ID_SPACE_BITS // 8 + 1, 'big'))
+        hasher.update(version.to_bytes(8, 'big'))
+        hasher.update(value_str.encode())
+        return int.from_bytes(hasher.digest(), 'big')
+
+    # data_id のデータのエントリハッシュが変化した際に呼び出す
+    # delta_hash には 変化前のエントリハッシュ と 変化後のエントリハッシュ のXORを渡す
+    # (追加・削除の場合は存在しない側を0として扱う)
+    def update(self, data_id : int, delta_hash : int):
+        idx = self.leaf_idx_base + (data_id >> self.leaf_shift)
+        while idx >= 1:
+            self.hashes[idx] ^= delta_hash
+            idx >>= 1
+
+    def get_hash(self, node_idx : int) -> int:
+        return self.hashes[node_idx]
+
+    def is_leaf(self, node_idx : int) -> bool:
+        return node_idx >= self.leaf_idx_base
+
+    def get_children(self, node_idx : int) -> Tuple[int, int]:
+        return 2 * node_idx, 2 * node_idx + 1
+
+    # ノードがカバーするID空間上の範囲を [始点, 終点) の形で返す
+    def get_node_range(self, node_idx : int) -> Tuple[int, int]:
+        level = node_idx.bit_length() - 1
+        width = gval.ID_SPACE_RANGE >> level
+        range_start = (node_idx - (1 << level)) * width
+        return range_start, range_start + width
@@ -0,0 +1,364 @@
+# coding:utf-8
+
+import mmap
+import os
+import struct
+import tempfile
+import weakref
+from typing import Dict, IO, Iterator, Mapping, MutableMapping, Optional, Tuple, cast
+
+from . import gval
+
+# 値のログを構成するセグメント. メモリマップした一時ファイル1つに対応し、レコードを末尾に追記していく
+class LogSegment:
+
+    def __init__(self, size : int):
+        self.size : int = size
+        self.file : IO[bytes] = MmapValueStore.create_file(size)
+        self.map : mmap.mmap = mmap.mmap(self.file.fileno(), size)
+        # 次のレコードを書き込む位置
+        self.end : int = 0
+        # 上書きと削除により参照されなくなったレコードの合計バイト数
+        self.garbage_bytes : int = 0
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+# DataStore の保持データ (data_id -> valueの文字列) を、値の版とともにメモリマップした一時ファイルに格納する MutableMapping.
+# gval.ENABLE_MMAP_VALUE_STORE が True の場合に DataStore.stored_data として dict の代わりに用いられる.
+# data_id から値の位置を引くオープンアドレス法(線形探索)のインデックスと、値を追記していく値のログからなり、
+# どちらもOSのページキャッシュ上に置かれるため、プロセスのメモリに収まらない量のデータを保持できる.
+# 値のログは gval.MMAP_SEGMENT_SIZE バイトごとの LogSegment に分かれており、上書きと削除で参照されなくなった
+# レコードは各セグメントの garbage_bytes として計上され、compact で回収される.
+# 必要なロックは呼び出し元の DataStore でとってある前提
+class MmapValueStore(MutableMapping[int, str]):
+
+    # インデックスの1スロット: (data_id, 値のログ上のレコードの位置)
+    # レコードの位置は (セグメントの番号 << SEGMENT_POS_BITS) | セグメント内の位置 とする
+    SLOT_STRUCT = struct.Struct("<qq")
+    EMPTY_KEY = -1
+    DELETED_KEY = -2
+    SEGMENT_POS_BITS = 32
+    # 値のログの1レコードのヘッダ: (data_id, 値の版, 値のバイト数). ヘッダの直後に値を UTF-8 で格納する
+    RECORD_HEADER_STRUCT = struct.Struct("<qqI")
+    # 使用中と削除済みのスロットの割合がこれを超えたら、インデックスを再構築する
+    INDEX_MAX_LOAD_FACTOR = 0.7
+    # ファイルの内容を複製する際に一度に読み込むバイト数
+    COPY_UNIT_BYTES = 1 << 20
+
+    # fork されたプロセスで複製が必要なインスタンス. Mapping はハッシュ不可能なため id をキーとする
+    live_stores : 'weakref.WeakValueDictionary[int, MmapValueStore]' = weakref.WeakValueDictionary()
+
+    def __init__(self):
+        if gval.ID_SPACE_BITS > 63:
+            raise Exception("MmapValueStore supports data_id up to 63 bits")
+
+        # スロット数は 2の冪 とする
+        self.slot_bits : int = max(gval.MMAP_INDEX_INITIAL_SLOT_NUM - 1, 1).bit_length()
+        self.slot_num : int = 1 << self.slot_bits
+        self.index_file : IO[bytes] = self.create_file(self.slot_num * MmapValueStore.SLOT_STRUCT.size)
+        self.index_map : mmap.mmap = mmap.mmap(self.index_file.fileno(), self.slot_num * MmapValueStore.SLOT_STRUCT.size)
+        self.fill_empty_slots(self.index_map, self.slot_num)
+        # 使用中のスロットの数と、削除済みを示すスロットの数
+        self.used_slot_cnt : int = 0
+        self.deleted_slot_cnt : int = 0
+
+        # セグメントの番号をキーとする. 追記は番号の最も大きい active_segment_no のセグメントにのみ行う
+        self.segment_dict : Dict[int, LogSegment] = {}
+        self.active_segment_no : int = 0
+        self.segment_dict[0] = LogSegment(gval.MMAP_SEGMENT_SIZE)
+
+        # compact で回収中のセグメントの番号と、次に読むレコードのセグメント内の位置
+        self.compacting_segment_no : Optional[int] = None
+        self.compaction_cursor : int = 0
+
+        # 各データの版を、data_id をキーとして参照するためのビュー
+        self.versions : MmapVersionView = MmapVersionView(self)
+
+        MmapValueStore.live_stores[id(self)] = self
+
+    @classmethod
+    def create_file(cls, size : int) -> IO[bytes]:
+        # 作成と同時にパスが削除される(Windows では閉じた際に削除される)ため、ノードが破棄されるとファイルも残らない
+        new_file = tempfile.TemporaryFile(dir=gval.MMAP_VALUE_STORE_DIR)
+        new_file.truncate(size)
+        return new_file
+
+    @classmethod
+    def fill_empty_slots(cls, index_map : mmap.mmap, slot_num : int):
+        index_map[:] = MmapValueStore.SLOT_STRUCT.pack(MmapValueStore.EMPTY_KEY, 0) * slot_num
+
+    # data_id が格納されているスロット、格納されていなければ格納すべきスロットの番号と、格納済みか否か、
+    # 格納済みであれば値のログ上のレコードの位置を返す
+    def find_slot(self, data_id : int) -> Tuple[int, bool, int]:
+        mask = self.slot_num - 1
+        # data_id は一様に分布しているとは限らないため、フィボナッチハッシュで散らす(64bitの積の上位ビットを用いる)
+        slot_idx = ((data_id * 11400714819323198485) & 0xFFFFFFFFFFFFFFFF) >> (64 - self.slot_bits)
+        first_deleted_idx : Optional[int] = None
+        while True:
+            key, offset = MmapValueStore.SLOT_STRUCT.unpack_from(self.index_map, slot_idx * MmapValueStore.SLOT_STRUCT.size)
+            if key == data_id:
+                return slot_idx, True, offset
+            if key == MmapValueStore.EMPTY_KEY:
+                return (slot_idx if first_deleted_idx == None else cast(int, first_deleted_idx)), False, -1
+            if key == MmapValueStore.DELETED_KEY and first_deleted_idx == None:
+                first_deleted_idx = slot_idx
+            slot_idx = (slot_idx + 1) & mask
+
+    def read_slot(self, slot_idx : int) -> Tuple[int, int]:
+        return MmapValueStore.SLOT_STRUCT.unpack_from(self.index_map, slot_idx * MmapValueStore.SLOT_STRUCT.size)
+
+    def write_slot(self, slot_idx : int, data_id : int, offset : int):
+        MmapValueStore.SLOT_STRUCT.pack_into(self.index_map, slot_idx * MmapValueStore.SLOT_STRUCT.size, data_id, offset)
+
+    # レコードの位置を (セグメント, セグメント内の位置) に分解する
+    def locate_record(self, offset : int) -> Tuple[LogSegment, int]:
+        return self.segment_dict[offset >> MmapValueStore.SEGMENT_POS_BITS], offset & ((1 << MmapValueStore.SEGMENT_POS_BITS) - 1)
+
+    # offset のレコードの値の、セグメント上の範囲 [始点, 終点) を返す
+    def get_value_range(self, offset : int) -> Tuple[LogSegment, int, int]:
+        segment, pos = self.locate_record(offset)
+        _, _, value_len = MmapValueStore.RECORD_HEADER_STRUCT.unpack_from(segment.map, pos)
+        value_start = pos + MmapValueStore.RECORD_HEADER_STRUCT.size
+        return segment, value_start, value_start + value_len
+
+    # offset のレコードが参照されなくなったことを、それを含むセグメントに計上する
+    def discard_record(self, offset : int):
+        segment, value_start, value_end = self.get_value_range(offset)
+        segment.garbage_bytes += value_end - (value_start - MmapValueStore.RECORD_HEADER_STRUCT.size)
+
+    # data_id の値を、値のログをマップした領域のスライスとしてコピーせずに返す. 格納されていなければ None を返す.
+    # 返した memoryview が解放されるまでマップを閉じられないため、呼び出し元は次の更新より前に release すること
+    def get_view(self, data_id : int) -> Optional[memoryview]:
+        _, is_found, offset = self.find_slot(data_id)
+        if not is_found:
+            return None
+        segment, value_start, value_end = self.get_value_range(offset)
+        return memoryview(segment.map)[value_start:value_end]
+
+    def __getitem__(self, data_id : int) -> str:
+        _, is_found, offset = self.find_slot(data_id)
+        if not is_found:
+            raise KeyError(data_id)
+        segment, value_start, value_end = self.get_value_range(offset)
+        # マップされた領域から直接デコードし、中間の bytes を生成しない
+        with memoryview(segment.map) as segment_view, segment_view[value_start:value_end] as value_view:
+            return str(value_view, "utf-8")
+
+    # data_id の (値, 版) をインデックスの1回の探索で返す. 格納されていなければ KeyError を raise する
+    def get_entry(self, data_id : int) -> Tuple[str, int]:
+        _, is_found, offset = self.find_slot(data_id)
+        if not is_found:
+            raise KeyError(data_id)
+        segment, pos = self.locate_record(offset)
+        _, version, value_len = MmapValueStore.RECORD_HEADER_STRUCT.unpack_from(segment.map, pos)
+        value_start = pos + MmapValueStore.RECORD_HEADER_STRUCT.size
+        with memoryview(segment.map) as segment_view, segment_view[value_start:value_start + value_len] as value_view:
+            return str(value_view, "utf-8"), version
+
+    # data_id の値の版を返す. 格納されていなければ None を返す
+    def get_version(self, data_id : int) -> Optional[int]:
+        _, is_found, offset = self.find_slot(data_id)
+        if not is_found:
+            return None
+        segment, pos = self.locate_record(offset)
+        return MmapValueStore.RECORD_HEADER_STRUCT.unpack_from(segment.map, pos)[1]
+
+    # 版を指定せずに格納した値の版は 0 とする
+    def __setitem__(self, data_id : int, value_str : str):
+        self.store(data_id, value_str, 0)
+
+    # data_id の値を版 version とともに格納する
+    def store(self, data_id : int, value_str : str, version : int):
+        value_bytes = value_str.encode("utf-8")
+        offset = self.append_record(data_id, version, value_bytes)
+
+        slot_idx, is_found, old_offset = self.find_slot(data_id)
+        if is_found:
+            self.discard_record(old_offset)
+        else:
+            if self.read_slot(slot_idx)[0] == MmapValueStore.DELETED_KEY:
+                self.deleted_slot_cnt -= 1
+            self.used_slot_cnt += 1
+        self.write_slot(slot_idx, data_id, offset)
+
+        if self.used_slot_cnt + self.deleted_slot_cnt > self.slot_num * MmapValueStore.INDEX_MAX_LOAD_FACTOR:
+            # 削除済みのスロットが大半であれば、スロット数は変えずに削除済みのスロットを取り除くだけとする
+            if self.used_slot_cnt * 2 > self.slot_num * MmapValueStore.INDEX_MAX_LOAD_FACTOR:
+                self.rebuild_index(self.slot_num * 2)
+            else:
+                self.rebuild_index(self.slot_num)
+
+    def __delitem__(self, data_id : int):
+        slot_idx, is_found, offset = self.find_slot(data_id)
+        if not is_found:
+            raise KeyError(data_id)
+        self.discard_record(offset)
+        self.write_slot(slot_idx, MmapValueStore.DELETED_KEY, 0)
+        self.used_slot_cnt -= 1
+        self.deleted_slot_cnt += 1
+
+    def __contains__(self, data_id : object) -> bool:
+        return isinstance(data_id, int) and self.find_slot(data_id)[1]
+
+    def __iter__(self) -> Iterator[int]:
+        for slot_idx in range(self.slot_num):
+            key, _ = self.read_slot(slot_idx)
+            if key >= 0:
+                yield key
+
+    def __len__(self) -> int:
+        return self.used_slot_cnt
+
+    # 値のログの全セグメントの使用済みのバイト数と、そのうち参照されなくなったレコードのバイト数を返す
+    def get_log_usage(self) -> Tuple[int, int]:
+        return sum([segment.end for segment in self.segment_dict.values()]), \
+               sum([segment.garbage_bytes for segment in self.segment_dict.values()])
+
+    # 値のログの末尾にレコードを追記し、その位置を返す.
+    # 追記先のセグメントに収まらない場合は新たなセグメントを作成する. 以前のセグメントには以降追記しない
+    def append_record(self, data_id : int, version : int, value_bytes : bytes) -> int:
+        record_size = MmapValueStore.RECORD_HEADER_STRUCT.size + len(value_bytes)
+        segment = self.segment_dict[self.active_segment_no]
+        if segment.end + record_size > segment.size:
+            self.active_segment_no += 1
+            segment = LogSegment(max(gval.MMAP_SEGMENT_SIZE, record_size))
+            self.segment_dict[self.active_segment_no] = segment
+
+        pos = segment.end
+        MmapValueStore.RECORD_HEADER_STRUCT.pack_into(segment.map, pos, data_id, version, len(value_bytes))
+        value_start = pos + MmapValueStore.RECORD_HEADER_STRUCT.size
+        segment.map[value_start:value_start + len(value_bytes)] = value_bytes
+        segment.end = pos + record_size
+        return (self.active_segment_no << MmapValueStore.SEGMENT_POS_BITS) | pos
+
+    # 追記の終わったセグメントのうち、参照されなくなったレコードの割合が gval.COMPACTION_GARBAGE_RATIO_THRESHOLD 以上のものを
+    # 割合の大きい順に回収する. 回収中のセグメントのレコードを先頭から読み、インデックスから参照されているものだけを
+    # 追記先のセグメントに書き直し、読み終えたセグメントはファイルごと削除する.
+    # 読み書きしたバイト数が io_budget_bytes に達した時点で中断し、次回の呼び出しで続きから行う.
+    # 全て参照されなくなったセグメントは読まずに削除する. 読み書きしたバイト数を返す
+    def compact(self, io_budget_bytes : int) -> int:
+        used_bytes = 0
+        while used_bytes < io_budget_bytes:
+            if self.compacting_segment_no == None:
+                self.compacting_segment_no = self.select_segment_to_compact()
+                self.compaction_cursor = 0
+                if self.compacting_segment_no == None:
+                    break
+
+            segment_no = cast(int, self.compacting_segment_no)
+            segment = self.segment_dict[segment_no]
+            if segment.garbage_bytes == segment.end:
+                self.compaction_cursor = segment.end
+            while self.compaction_cursor < segment.end and used_bytes < io_budget_bytes:
+                pos = self.compaction_cursor
+                data_id, version, value_len = MmapValueStore.RECORD_HEADER_STRUCT.unpack_from(segment.map, pos)
+                record_size = MmapValueStore.RECORD_HEADER_STRUCT.size + value_len
+                used_bytes += record_size
+                slot_idx, is_found, offset = self.find_slot(data_id)
+                if is_found and offset == (segment_no << MmapValueStore.SEGMENT_POS_BITS) | pos:
+                    value_start = pos + MmapValueStore.RECORD_HEADER_STRUCT.size
+                    self.write_slot(slot_idx, data_id,
+                                    self.append_record(data_id, version, segment.map[value_start:value_start + value_len]))
+                    used_bytes += record_size
+                self.compaction_cursor = pos + record_size
+
+            if self.compaction_cursor >= segment.end:
+                segment.close()
+                del self.segment_dict[segment_no]
+                self.compacting_segment_no = None
+        return used_bytes
+
+    def select_segment_to_compact(self) -> Optional[int]:
+        ret_no : Optional[int] = None
+        max_ratio = 0.0
+        for segment_no, segment in self.segment_dict.items():
+            if segment_no == self.active_segment_no or segment.end == 0:
+                continue
+            garbage_ratio = segment.garbage_bytes / segment.end
+            if garbage_ratio >= gval.COMPACTION_GARBAGE_RATIO_THRESHOLD and garbage_ratio > max_ratio:
+                ret_no = segment_no
+                max_ratio = garbage_ratio
+        return ret_no
+
+    # スロット数を new_slot_num としたインデックスを新たなファイルに作成し、削除済みのスロットを除いて格納し直す
+    def rebuild_index(self, new_slot_num : int):
+        old_map = self.index_map
+        old_file = self.index_file
+        old_slot_num = self.slot_num
+
+        self.slot_bits = new_slot_num.bit_length() - 1
+        self.slot_num = new_slot_num
+        self.index_file = self.create_file(new_slot_num * MmapValueStore.SLOT_STRUCT.size)
+        self.index_map = mmap.mmap(self.index_file.fileno(), new_slot_num * MmapValueStore.SLOT_STRUCT.size)
+        self.fill_empty_slots(self.index_map, new_slot_num)
+        for slot_idx in range(old_slot_num):
+            key, offset = MmapValueStore.SLOT_STRUCT.unpack_from(old_map, slot_idx * MmapValueStore.SLOT_STRUCT.size)
+            if key >= 0:
+                self.write_slot(self.find_slot(key)[0], key, offset)
+        self.deleted_slot_cnt = 0
+
+        old_map.close()
+        old_file.close()
+
+    # 内容を複製した新たなファイルをマップして返す.
+    # 内容全体をメモリ上に読み込まないよう、区切って複製する
+    @classmethod
+    def copy_to_new_file(cls, old_map : mmap.mmap) -> Tuple[IO[bytes], mmap.mmap]:
+        new_file = MmapValueStore.create_file(len(old_map))
+        new_map = mmap.mmap(new_file.fileno(), len(old_map))
+        for copy_start in range(0, len(old_map), MmapValueStore.COPY_UNIT_BYTES):
+            new_map[copy_start:copy_start + MmapValueStore.COPY_UNIT_BYTES] = \
+                old_map[copy_start:copy_start + MmapValueStore.COPY_UNIT_BYTES]
+        return new_file, new_map
+
+    # fork された子プロセスでは、親プロセスとファイルを共有したままだと互いの更新が見えてしまうため、
+    # 内容を新たなファイルに複製してマップし直す
+    def detach_from_parent(self):
+        new_index_file, new_index_map = MmapValueStore.copy_to_new_file(self.index_map)
+        self.index_map.close()
+        self.index_file.close()
+        self.index_file, self.index_map = new_index_file, new_index_map
+
+        for segment in self.segment_dict.values():
+            new_segment_file, new_segment_map = MmapValueStore.copy_to_new_file(segment.map)
+            segment.close()
+            segment.file, segment.map = new_segment_file, new_segment_map
+
+    @classmethod
+    def detach_all_from_parent(cls):
+        for store in list(MmapValueStore.live_stores.values()):
+            store.detach_from_parent()
+
+    def close(self):
+        MmapValueStore.live_stores.pop(id(self), None)
+        self.index_map.close()
+        self.index_file.close()
+        for segment in self.segment_dict.values():
+            segment.close()
+
+# MmapValueStore に格納された各データの版を、data_id をキーとして参照する読み取り専用の Mapping.
+# 版はレコードのヘッダから読むため、プロセスのメモリ上には保持しない
+class MmapVersionView(Mapping[int, int]):
+
+    def __init__(self, store : MmapValueStore):
+        self.store : MmapValueStore = store
+
+    def __getitem__(self, data_id : int) -> int:
+        version = self.store.get_version(data_id)
+        if version == None:
+            raise KeyError(data_id)
+        return cast(int, version)
+
+    def __contains__(self, data_id : object) -> bool:
+        return data_id in self.store
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.store)
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=MmapValueStore.detach_all_from_parent)
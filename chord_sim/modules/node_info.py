@@ -1,12 +1,38 @@
 # coding:utf-8
 
 import copy
-from typing import List, Optional
+from typing import List, Optional, NamedTuple, Union
 
 from . import gval
 from .chord_util import ChordUtil
+from .rw_lock import ReentrantRWLock
 import threading
 
+# 経路表(successor_info_list, predecessor_info, finger_table) の要素として保持する、ノードを
+# 識別するための情報のみを持つイミュータブルなオブジェクト.
+# 一度生成した後は変更されないため、他ノードから取得したものをコピーせずにそのまま保持でき、
+# また、経路表のリストも要素を書き換えるのではなく新たなリストに差し替えることで更新する
+# (copy-on-write) ため、参照する側はロックをとらずにある時点のスナップショットとして利用できる.
+# NodeInfo と同様に node_id で同一性を判定し、dictのキーとして使用可能としてある
+class NodeRef(NamedTuple):
+    node_id : int
+    address_str : str
+    born_id : int
+
+    def __eq__(self, other):
+        if not isinstance(other, (NodeRef, NodeInfo)):
+            return False
+        return self.node_id == other.node_id
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return self.node_id
+
+    def __str__(self):
+        return ChordUtil.gen_debug_str_of_node(self)
+
 # メモ: オブジェクトをdictのキーとして使用可能としてある
 class NodeInfo:
 
@@ -20,45 +46,46 @@ class NodeInfo:
         #       利用できないことは念頭おいて置く必要あり NodeInfo#born_id
         self.born_id: int = -1
 
-        # 以下の2つはNodeInfoオブジェクトを保持.
-        # ある時点で取得したものが保持されており、変化する場合のあるフィールド
-        # の内容は最新の内容となっているとは限らないため注意が必要.
-        # そのような情報が必要な場合はChordNodeオブジェクトから参照し、
-        # 必要であれば、その際に下のフィールドにdeepcopyを設定しなおさ
-        # なければならない.
+        # 以下の2つはNodeRefオブジェクトを保持.
+        # ある時点で取得したものが保持されており、successorやpredecessorの
+        # 経路表などの情報が必要な場合はChordNodeオブジェクトから参照しなければならない.
+        # successor_info_list はリストの要素を直接書き換えず、新たなリストを設定する
+        # ことで更新する
 
         # 状況に応じて伸縮するが、インデックス0には必ず 非None な要素が入っている
         # ように制御する
-        self.successor_info_list: List[NodeInfo] = []
+        self.successor_info_list: List[NodeRef] = []
         # join後はNoneになることのないように制御される
-        self.predecessor_info: Optional[NodeInfo] = None
+        self.predecessor_info: Optional[NodeRef] = None
 
         # predecessor_info と successor_info_list のそれぞれに対応する
-        # ロック変数(re-entrantロック)
-        self.lock_of_pred_info : threading.RLock = threading.RLock()
-        self.lock_of_succ_infos : threading.RLock = threading.RLock()
+        # ロック変数(re-entrantなRWロック)
+        # 経路表を参照するだけの処理は acquire_read、更新を行う処理は acquire_write でロックをとる
+        self.lock_of_pred_info : ReentrantRWLock = ReentrantRWLock()
+        self.lock_of_succ_infos : ReentrantRWLock = ReentrantRWLock()
 
         # stored_data, master2data_idx、master_node_dict 全てのフィールドに対する
         # ロック変数(re-entrantロック)
         self.lock_of_datastore : threading.RLock = threading.RLock()
 
-        # NodeInfoオブジェクトを要素として持つリスト
+        # NodeRefオブジェクトを要素として持つリスト
         # インデックスの小さい方から狭い範囲が格納される形で保持する
+        # 要素の単位で更新されるが、要素自体はイミュータブルであるため参照する側はロックをとる必要はない
         # sha1で生成されるハッシュ値は160bit符号無し整数であるため要素数は160となる
         # TODO: 現在は ID_SPACE_BITS が検証時の実行時間の短縮のため30となっている
-        self.finger_table: List[Optional[NodeInfo]] = [None] * gval.ID_SPACE_BITS
+        self.finger_table: List[Optional[NodeRef]] = [None] * gval.ID_SPACE_BITS
+
+    # 自ノードを識別する情報を NodeRef として返す
+    # あるノードの情報を他のノードが取得し、経路表などに保持する際に利用する
+    def get_ref(self) -> NodeRef:
+        return NodeRef(self.node_id, self.address_str, self.born_id)
 
     # 単純にdeepcopyするとチェーン構造になっているものが全てコピーされてしまう
     # ため、そこの考慮を行い、また、finger_tableはコピーしない形での deepcopy
     # を返す.
-    # 上述の考慮により、コピーした NodeInfoオブジェクト の successor_infoと
-    # predecessor_infoは deepcopy の対象ではあるが、それらの中の同名のフィールド
-    # にはNoneが設定される. これにより、あるノードがコピーされた NodeInfo を保持
-    # した場合、predecessor や successorは辿ることができるが、その先は辿ることが
-    # 直接的にはできないことになる（predecessor や successorの ChordNodeオブジェクト
-    # を引いてやれば可能）
-    # 用途としては、あるノードの node_info を他のノードが取得し保持する際に利用される
-    # ことを想定して実装されている.
+    # 経路表に保持する場合は get_ref を用いること. 本メソッドは実システムにおいて
+    # 他ノードの ChordNodeオブジェクトを暫定的に構築するための情報を返す場合にのみ
+    # 利用する
     def get_partial_deepcopy(self) -> 'NodeInfo':
         ret_node_info: NodeInfo = NodeInfo()
 
@@ -76,7 +103,7 @@ class NodeInfo:
         return ret_node_info
 
     def __eq__(self, other):
-        if not isinstance(other, NodeInfo):
+        if not isinstance(other, (NodeInfo, NodeRef)):
             return False
         return self.node_id == other.node_id
 
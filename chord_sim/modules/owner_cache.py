@@ -0,0 +1,76 @@
+# coding:utf-8
+
+import bisect
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Optional, TYPE_CHECKING
+
+from . import gval
+from .chord_util import ChordUtil
+
+if TYPE_CHECKING:
+    from .node_info import NodeRef
+
+# find_successor で求めた担当ノードを、その担当範囲 (predecessorのID, 担当ノードのID) と合わせて
+# キャッシュしておくクラス.
+# 担当ノードのIDを昇順に並べたリストを保持しておき、二分探索で data_id 以上で最小の担当ノードを求めて
+# その担当範囲に data_id が含まれていればキャッシュヒットとする.
+# エントリ数が OWNER_CACHE_SIZE_MAX を越えた場合は最も長く参照されていないものから取り除く
+class OwnerCache:
+
+    def __init__(self):
+        # 担当ノードのIDをキーとし、(predecessorのID, 担当ノードのNodeRef) を値とする
+        # 参照された順に末尾に移動させる
+        self.cache_dict : 'OrderedDict[int, Tuple[int, NodeRef]]' = OrderedDict()
+        # cache_dict のキーを昇順に並べたリスト
+        self.sorted_owner_ids : List[int] = []
+        self.lock : threading.Lock = threading.Lock()
+
+    # data_id を担当するノードがキャッシュされていればその NodeRef を返す. 無ければ None を返す
+    def get(self, data_id : int) -> Optional['NodeRef']:
+        with self.lock:
+            if len(self.sorted_owner_ids) == 0:
+                return None
+            idx = bisect.bisect_left(self.sorted_owner_ids, data_id)
+            if idx == len(self.sorted_owner_ids):
+                # 0 を跨いだ先の担当ノードが候補となる
+                idx = 0
+            owner_id = self.sorted_owner_ids[idx]
+            pred_id, owner_info = self.cache_dict[owner_id]
+            if not ChordUtil.exist_between_two_nodes_right_mawari(pred_id, owner_id, data_id):
+                return None
+            self.cache_dict.move_to_end(owner_id)
+            return owner_info
+
+    def add(self, pred_id : int, owner_info : 'NodeRef'):
+        with self.lock:
+            if owner_info.node_id not in self.cache_dict:
+                bisect.insort(self.sorted_owner_ids, owner_info.node_id)
+            self.cache_dict[owner_info.node_id] = (pred_id, owner_info)
+            self.cache_dict.move_to_end(owner_info.node_id)
+
+            if len(self.cache_dict) > gval.OWNER_CACHE_SIZE_MAX:
+                evicted_id, _ = self.cache_dict.popitem(last=False)
+                self.remove_from_sorted_ids(evicted_id)
+
+    # data_id を担当するとしてキャッシュされているエントリを取り除く
+    # キャッシュした担当ノードに put や get を依頼して担当範囲外とされた場合に呼び出す
+    def invalidate(self, data_id : int):
+        with self.lock:
+            for owner_id, (pred_id, owner_info) in list(self.cache_dict.items()):
+                if ChordUtil.exist_between_two_nodes_right_mawari(pred_id, owner_id, data_id):
+                    del self.cache_dict[owner_id]
+                    self.remove_from_sorted_ids(owner_id)
+
+    # ダウンしていることが判明したノードのエントリを取り除く
+    def invalidate_by_address(self, address : str):
+        with self.lock:
+            for owner_id, (pred_id, owner_info) in list(self.cache_dict.items()):
+                if owner_info.address_str == address:
+                    del self.cache_dict[owner_id]
+                    self.remove_from_sorted_ids(owner_id)
+
+    # ロックは呼び出し元でとってある前提
+    def remove_from_sorted_ids(self, owner_id : int):
+        idx = bisect.bisect_left(self.sorted_owner_ids, owner_id)
+        del self.sorted_owner_ids[idx]
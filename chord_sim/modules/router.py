@@ -1,30 +1,55 @@
 # coding:utf-8
 
-from typing import Dict, List, Optional, cast, TYPE_CHECKING
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, cast, TYPE_CHECKING
 
 import modules.gval as gval
 from .chord_util import ChordUtil, NodeIsDownedExceptiopn, \
     AppropriateNodeNotFoundException, InternalControlFlowException, PResult, ErrorCode
+from .owner_cache import OwnerCache
 
 if TYPE_CHECKING:
-    from .node_info import NodeInfo
+    from .node_info import NodeRef
     from .chord_node import ChordNode
 
 class Router:
 
+    # 再帰的な探索の要求の転送と結果の返送を行うスレッドプール. 全ノードで共有する
+    # 転送を送信元の処理から切り離すことで、各ノードは転送先の処理の完了を待たずに要求の処理を終える
+    send_executor : Optional[ThreadPoolExecutor] = None
+    lock_of_send_executor : threading.Lock = threading.Lock()
+
     def __init__(self, existing_node : 'ChordNode'):
         self.existing_node : 'ChordNode' = existing_node
+        # find_successor で求めた担当ノードのキャッシュ
+        self.owner_cache : OwnerCache = OwnerCache()
+        # 再帰的な探索で、担当ノードから直接返された結果を受け取るためのもの
+        # 探索ごとの通番をキーとし、(担当ノード, 担当ノードの predecessor のID, ホップ数) を値とする
+        self.lookup_result_dict : Dict[int, Tuple['NodeRef', int, int]] = {}
+        # 結果を待っている探索の通番をキーとし、結果を受け取った際にセットする Event を値とする
+        self.lookup_waiter_dict : Dict[int, threading.Event] = {}
+        self.lock_of_lookup_result_dict : threading.Lock = threading.Lock()
+        self.lookup_seq : itertools.count = itertools.count()
+        # 計測用の、このノードを起点とした探索の回数と、それらのホップ数の合計
+        self.lookup_cnt : int = 0
+        self.lookup_hop_cnt_sum : int = 0
 
     # id（int）で識別されるデータを担当するノードの名前解決を行う
     # Attention: 適切な担当ノードを得ることができなかった場合、FindNodeFailedExceptionがraiseされる
+    # recursive に True を指定した場合は find_successor_recursive で探索を行う. None の場合は gval.ROUTING_RECURSIVE に従う
     # TODO: AppropriateExp, DownedExp, InternalExp at find_successor
-    def find_successor(self, id : int) -> PResult[Optional['ChordNode']]:
-        # TODO: ここでのロックをはじめとしてRust実装ではロック対象を更新するか否かでRWロックを使い分けるようにする. at find_successor
-        #       そうでないと、少なくともglobal_xxxの呼び出しを同一ノードもしくは、いくつかのノードに行うような運用でクエリが並列に
-        #       動作せず、パフォーマンスが出ないはず
-        if self.existing_node.node_info.lock_of_succ_infos.acquire(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+    def find_successor(self, id : int, recursive : Optional[bool] = None) -> PResult[Optional['ChordNode']]:
+        if (gval.ROUTING_RECURSIVE if recursive == None else recursive):
+            return self.find_successor_recursive(id)
+
+        # 経路表の参照のみを行うため Readerロックをとる. これにより、同一ノードに対するglobal_xxxの呼び出しなどの
+        # クエリは並列に動作し、stabilize処理による更新(Writerロック)とのみ排他される
+        # TODO: Rust実装でも同様にRWロックを使い分けるようにする. at find_successor
+        if self.existing_node.node_info.lock_of_succ_infos.acquire_read(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
             # 失敗させる
-            ChordUtil.dprint("find_successor_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            ChordUtil.dprint(lambda: "find_successor_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + "LOCK_ACQUIRE_TIMEOUT")
             #raise InternalControlFlowException("gettting lock of successor_linfo_list is timedout.")
             return PResult.Err(None, ErrorCode.InternalControlFlowException_CODE)
@@ -32,25 +57,25 @@ class Router:
         if self.existing_node.is_alive == False:
             # 処理の合間でkillされてしまっていた場合の考慮
             # 何もしないで終了する
-            self.existing_node.node_info.lock_of_succ_infos.release()
-            ChordUtil.dprint("find_successor_0_5," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            self.existing_node.node_info.lock_of_succ_infos.release_read()
+            ChordUtil.dprint(lambda: "find_successor_0_5," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + "REQUEST_RECEIVED_BUT_I_AM_ALREADY_DEAD")
             #raise NodeIsDownedExceptiopn()
             return PResult.Err(None, ErrorCode.NodeIsDownedException_CODE)
 
         try:
-            ChordUtil.dprint("find_successor_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            ChordUtil.dprint(lambda: "find_successor_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                   + ChordUtil.gen_debug_str_of_data(id))
 
             n_dash = self.find_predecessor(id)
             if n_dash == None:
-                ChordUtil.dprint("find_successor_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                ChordUtil.dprint(lambda: "find_successor_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                                  + ChordUtil.gen_debug_str_of_data(id))
                 #raise AppropriateNodeNotFoundException()
                 return PResult.Err(None, ErrorCode.AppropriateNodeNotFoundException_CODE)
 
             # TODO: x direct access to node_info of n_dash at find_successor
-            ChordUtil.dprint("find_successor_3," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            ChordUtil.dprint(lambda: "find_successor_3," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + ChordUtil.gen_debug_str_of_node(n_dash.node_info) + ","
                              + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info.successor_info_list[0]) + ","
                              + ChordUtil.gen_debug_str_of_data(id))
@@ -61,25 +86,47 @@ class Router:
             ret = ChordUtil.get_node_by_address(n_dash.node_info.successor_info_list[0].address_str)
             if(ret.is_ok):
                 n_dash_successor : 'ChordNode' = cast('ChordNode', ret.result)
+                # n_dash と そのsuccessor の間に id が位置していれば、その範囲の担当ノードとしてキャッシュしておく
+                # TODO: x direct access to node_info of n_dash and n_dash_successor at find_successor
+                if ChordUtil.exist_between_two_nodes_right_mawari(n_dash.node_info.node_id, n_dash_successor.node_info.node_id, id):
+                    self.owner_cache.add(n_dash.node_info.node_id, n_dash_successor.node_info.get_ref())
                 return PResult.Ok(n_dash_successor)
             else: # ret.err_code == ErrorCode.InternalControlFlowException_CODE || ret.err_code == ErrorCode.NodeIsDownedException_CODE
                 # ここでは何も対処しない
-                ChordUtil.dprint("find_successor_4,FOUND_NODE_IS_DOWNED," + ChordUtil.gen_debug_str_of_node(
+                ChordUtil.dprint(lambda: "find_successor_4,FOUND_NODE_IS_DOWNED," + ChordUtil.gen_debug_str_of_node(
                     self.existing_node.node_info) + ","
                                  + ChordUtil.gen_debug_str_of_data(id))
                 return PResult.Err(None, ErrorCode.AppropriateNodeNotFoundException_CODE)
         finally:
-            self.existing_node.node_info.lock_of_succ_infos.release()
+            self.existing_node.node_info.lock_of_succ_infos.release_read()
+
+    # id を担当するノードがキャッシュされており、かつ、ダウンしていなければそのノードを返す
+    # そうでない場合は None を返すため、呼び出し元は find_successor で探索を行う必要がある
+    def get_cached_owner(self, id : int) -> Optional['ChordNode']:
+        owner_info = self.owner_cache.get(id)
+        if owner_info == None:
+            return None
+
+        ret = ChordUtil.get_node_by_address(cast('NodeRef', owner_info).address_str)
+        if (ret.is_ok):
+            return cast('ChordNode', ret.result)
+        else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE || ret.err_code == ErrorCode.NodeIsDownedException_CODE
+            # ダウンしているノードのエントリは以降も使えないので取り除く
+            self.owner_cache.invalidate_by_address(cast('NodeRef', owner_info).address_str)
+            ChordUtil.dprint(lambda: "get_cached_owner_1,CACHED_NODE_IS_DOWNED," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                             + ChordUtil.gen_debug_str_of_node(owner_info))
+            return None
 
     # id(int)　の前で一番近い位置に存在するノードを探索する
     def find_predecessor(self, id: int) -> 'ChordNode':
-        ChordUtil.dprint("find_predecessor_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info))
+        ChordUtil.dprint(lambda: "find_predecessor_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info))
 
         n_dash : 'ChordNode' = self.existing_node
+        hop_cnt = 0
 
-        if self.existing_node.node_info.lock_of_succ_infos.acquire(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+        if self.existing_node.node_info.lock_of_succ_infos.acquire_read(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
             # 最初の n_dash を返してしまい、find_predecessorは失敗したと判断させる
-            ChordUtil.dprint("find_predecessor_1_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            ChordUtil.dprint(lambda: "find_predecessor_1_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + "LOCK_ACQUIRE_TIMEOUT")
             return n_dash
         try:
@@ -87,7 +134,7 @@ class Router:
             # TODO: direct access to node_id and successor_info_list of n_dash at find_predecessor
             while not ChordUtil.exist_between_two_nodes_right_mawari(n_dash.node_info.node_id, n_dash.node_info.successor_info_list[0].node_id, id):
                 # TODO: x direct access to node_info of n_dash at find_predecessor
-                ChordUtil.dprint("find_predecessor_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                ChordUtil.dprint(lambda: "find_predecessor_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                                  + ChordUtil.gen_debug_str_of_node(n_dash.node_info))
                 # TODO: closest_preceding_finger call at find_predecessor
                 n_dash_found = n_dash.endpoints.grpc__closest_preceding_finger(id)
@@ -98,7 +145,7 @@ class Router:
                     # 同じを経路表を用いて探索することになり、結果は同じになり無限ループと
                     # なってしまうため、探索は継続せず、探索結果として n_dash (= n_dash_found) を返す
                     # TODO: x direct access to node_info of n_dash at find_predecessor
-                    ChordUtil.dprint("find_predecessor_3," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                    ChordUtil.dprint(lambda: "find_predecessor_3," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                                      + ChordUtil.gen_debug_str_of_node(n_dash.node_info))
                     return n_dash_found
 
@@ -119,39 +166,163 @@ class Router:
                     # 探索対象のデータのid を通り越すことは無い）
 
                     # TODO: x direct access to node_info of n_dash at find_predecessor
-                    ChordUtil.dprint("find_predecessor_4," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                    ChordUtil.dprint(lambda: "find_predecessor_4," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                                      + ChordUtil.gen_debug_str_of_node(n_dash.node_info))
 
                     return n_dash
 
                 # TODO: x direct access to node_info of n_dash and n_dash_found at find_predecessor
-                ChordUtil.dprint("find_predecessor_5_n_dash_updated," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                ChordUtil.dprint(lambda: "find_predecessor_5_n_dash_updated," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                                  + ChordUtil.gen_debug_str_of_node(n_dash.node_info) + "->"
                                  + ChordUtil.gen_debug_str_of_node(n_dash_found.node_info))
 
                 # チェックの結果問題ないので n_dashを closest_preceding_fingerで探索して得た
                 # ノード情報 n_dash_foundに置き換える
                 n_dash = n_dash_found
+
+                # 反復的な探索では、新たな n_dash ごとに successor と closest_preceding_finger を問い合わせる
+                # 要求と応答の往復が必要となる
+                ChordUtil.simulate_link_delay(self.existing_node.node_info.address_str, n_dash.node_info.address_str)
+                ChordUtil.simulate_link_delay(n_dash.node_info.address_str, self.existing_node.node_info.address_str)
+                hop_cnt += 1
         finally:
-            self.existing_node.node_info.lock_of_succ_infos.release()
+            self.existing_node.node_info.lock_of_succ_infos.release_read()
+            self.lookup_cnt += 1
+            self.lookup_hop_cnt_sum += hop_cnt
 
         return n_dash
 
+    # 再帰的な探索により id を担当するノードを求める.
+    # 探索の要求は各ノードが自身の経路表をもとに次のノードへ転送していき(forward_lookup)、担当ノードを
+    # 知ったノードが起点である自ノードに直接結果を返す(receive_lookup_result). 反復的な探索と異なり、
+    # ホップごとに起点のノードとの往復が生じないため、片道の通信がホップ数 + 1回で済む.
+    # 転送と返送は片方向の送信(send_lookup_message)として行い、起点のノードは結果を受け取るか
+    # gval.RECURSIVE_LOOKUP_TIMEOUT_SEC が経過するまで待つ
+    def find_successor_recursive(self, id : int) -> PResult[Optional['ChordNode']]:
+        if self.existing_node.is_alive == False:
+            ChordUtil.dprint(lambda: "find_successor_recursive_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                             + "REQUEST_RECEIVED_BUT_I_AM_ALREADY_DEAD")
+            return PResult.Err(None, ErrorCode.NodeIsDownedException_CODE)
+
+        query_id = next(self.lookup_seq)
+        waiter = threading.Event()
+        with self.lock_of_lookup_result_dict:
+            self.lookup_waiter_dict[query_id] = waiter
+        self.forward_lookup(id, self.existing_node.node_info.get_ref(), query_id, 0)
+        waiter.wait(timeout=gval.RECURSIVE_LOOKUP_TIMEOUT_SEC)
+        with self.lock_of_lookup_result_dict:
+            self.lookup_waiter_dict.pop(query_id, None)
+            result = self.lookup_result_dict.pop(query_id, None)
+        if result == None:
+            # 転送の途中でダウンしたノードがあった場合などは、結果が返ってこない
+            ChordUtil.dprint(lambda: "find_successor_recursive_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                             + ChordUtil.gen_debug_str_of_data(id) + ",NO_RESULT")
+            return PResult.Err(None, ErrorCode.AppropriateNodeNotFoundException_CODE)
+        owner_info, pred_id, hop_cnt = cast(Tuple['NodeRef', int, int], result)
+        self.lookup_cnt += 1
+        self.lookup_hop_cnt_sum += hop_cnt
+
+        ret = ChordUtil.get_node_by_address(owner_info.address_str)
+        if (ret.is_ok):
+            # 反復的な探索と同様に、結果を返したノードと担当ノードの間に id が位置していれば、その範囲の担当ノードとしてキャッシュしておく
+            if ChordUtil.exist_between_two_nodes_right_mawari(pred_id, owner_info.node_id, id):
+                self.owner_cache.add(pred_id, owner_info)
+            return PResult.Ok(cast('ChordNode', ret.result))
+        else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE || ret.err_code == ErrorCode.NodeIsDownedException_CODE
+            ChordUtil.dprint(lambda: "find_successor_recursive_2,FOUND_NODE_IS_DOWNED," + ChordUtil.gen_debug_str_of_node(
+                self.existing_node.node_info) + "," + ChordUtil.gen_debug_str_of_data(id))
+            return PResult.Err(None, ErrorCode.AppropriateNodeNotFoundException_CODE)
+
+    # 再帰的な探索の要求を処理する. 自身の successor が id の担当ノードであれば起点のノードに結果を返し、
+    # そうでなければ closest_preceding_finger で得たノードに要求を転送する.
+    # 転送先は常に自身よりも id に近いノードであるため、転送が循環することはない.
+    # 転送と返送は片方向の送信であり、転送先の処理の完了を待たずに返る
+    def forward_lookup(self, id : int, origin_info : 'NodeRef', query_id : int, hop_cnt : int):
+        if self.existing_node.node_info.lock_of_succ_infos.acquire_read(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+            ChordUtil.dprint(lambda: "forward_lookup_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                             + "LOCK_ACQUIRE_TIMEOUT")
+            return
+        try:
+            succ_info : 'NodeRef' = self.existing_node.node_info.successor_info_list[0]
+            if ChordUtil.exist_between_two_nodes_right_mawari(self.existing_node.node_info.node_id, succ_info.node_id, id):
+                next_node : Optional['ChordNode'] = None
+            else:
+                next_node = self.closest_preceding_finger(id)
+                if next_node is self.existing_node:
+                    # 経路表からはより近いノードが見つからない場合、反復的な探索と同様に自身の successor を結果とする
+                    next_node = None
+        finally:
+            self.existing_node.node_info.lock_of_succ_infos.release_read()
+
+        if next_node == None:
+            ChordUtil.dprint(lambda: "forward_lookup_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                             + ChordUtil.gen_debug_str_of_node(succ_info) + "," + ChordUtil.gen_debug_str_of_data(id))
+            my_id = self.existing_node.node_info.node_id
+            self.send_lookup_message(origin_info.address_str,
+                                     lambda node: node.endpoints.grpc__receive_lookup_result(query_id, succ_info, my_id, hop_cnt))
+            return
+
+        # TODO: x direct access to node_info of next_node at forward_lookup
+        ChordUtil.dprint(lambda: "forward_lookup_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                         + ChordUtil.gen_debug_str_of_node(cast('ChordNode', next_node).node_info) + "," + ChordUtil.gen_debug_str_of_data(id))
+        self.send_lookup_message(cast('ChordNode', next_node).node_info.address_str,
+                                 lambda node: node.endpoints.grpc__forward_lookup(id, origin_info, query_id, hop_cnt + 1))
+
+    # 再帰的な探索の要求や結果を address のノードに片方向に送る.
+    # 送信(通信の遅延の模擬と呼び出し)は send_executor のスレッドで行い、呼び出し元は送信の完了を待たない.
+    # 送信に失敗した場合はその要求や結果は失われ、起点のノードでの待ち合わせがタイムアウトする
+    def send_lookup_message(self, address : str, send_func : Callable[['ChordNode'], None]):
+        def send_th():
+            ChordUtil.simulate_link_delay(self.existing_node.node_info.address_str, address)
+            ret = ChordUtil.get_node_by_address(address)
+            if ret.is_ok == False:
+                ChordUtil.dprint(lambda: "send_lookup_message_1,NODE_IS_DOWNED," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                                 + address)
+                return
+            try:
+                send_func(cast('ChordNode', ret.result))
+            except Exception as e:
+                ChordUtil.dprint(lambda: "send_lookup_message_2,SEND_FAILED," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                                 + address + "," + repr(e))
+
+        with Router.lock_of_send_executor:
+            if Router.send_executor == None:
+                Router.send_executor = ThreadPoolExecutor(max_workers=gval.RECURSIVE_LOOKUP_SEND_THREAD_NUM)
+            send_executor = cast(ThreadPoolExecutor, Router.send_executor)
+        send_executor.submit(send_th)
+
+    # 再帰的な探索の結果を担当ノードを知ったノードから受け取り、結果を待っている探索を再開させる.
+    # pred_id は結果を返したノード(担当ノードの predecessor)のID.
+    # 既にタイムアウトした探索の結果は捨てる
+    def receive_lookup_result(self, query_id : int, owner_info : 'NodeRef', pred_id : int, hop_cnt : int):
+        with self.lock_of_lookup_result_dict:
+            waiter = self.lookup_waiter_dict.get(query_id)
+            if waiter == None:
+                return
+            self.lookup_result_dict[query_id] = (owner_info, pred_id, hop_cnt)
+            waiter.set()
+
     #  自身の持つ経路情報をもとに,  id から前方向に一番近いノードの情報を返す
     def closest_preceding_finger(self, id : int) -> 'ChordNode':
         # 範囲の広いエントリから探索していく
         # finger_tableはインデックスが小さい方から大きい方に、範囲が大きくなっていく
         # ように構成されているため、リバースしてインデックスの大きな方から小さい方へ
         # 順に見ていくようにする
+        # 要素はイミュータブルな NodeRef であるため、ある時点のスナップショットとして埋まっているエントリを集める
+        filled_node_infos : List['NodeRef'] = []
         for node_info in reversed(self.existing_node.node_info.finger_table):
             # 埋まっていないエントリも存在し得る
             if node_info == None:
-                ChordUtil.dprint("closest_preceding_finger_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info))
+                ChordUtil.dprint(lambda: "closest_preceding_finger_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info))
                 continue
+            filled_node_infos.append(cast('NodeRef', node_info))
 
-            casted_node_info = cast('NodeInfo', node_info)
+        # 各エントリが自身のIDと探索対象のIDの間にあるかの判定はまとめて行う
+        is_between_list = ChordUtil.exist_between_two_nodes_right_mawari_batch(
+            self.existing_node.node_info.node_id, id, [node_info.node_id for node_info in filled_node_infos])
 
-            ChordUtil.dprint("closest_preceding_finger_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+        for casted_node_info, is_between in zip(filled_node_infos, is_between_list):
+            ChordUtil.dprint(lambda: "closest_preceding_finger_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                   + ChordUtil.gen_debug_str_of_node(casted_node_info))
 
             # テーブル内のエントリが保持しているノードのIDが自身のIDと探索対象のIDの間にあれば
@@ -161,8 +332,8 @@ class Router:
             #  可能性が高いということになる。そこで探索範囲を狭めていって、飛び越さない範囲で一番近いノードを
             #  見つけるという処理になっていると思われる）
             # #if self.existing_node.node_info.node_id < entry.node_id and entry.node_id <= id:
-            if ChordUtil.exist_between_two_nodes_right_mawari(self.existing_node.node_info.node_id, id, casted_node_info.node_id):
-                ChordUtil.dprint("closest_preceding_finger_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            if is_between:
+                ChordUtil.dprint(lambda: "closest_preceding_finger_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                                  + ChordUtil.gen_debug_str_of_node(casted_node_info))
                 # try:
                     # casted_node : 'ChordNode' = ChordUtil.get_node_by_address(casted_node_info.address_str)
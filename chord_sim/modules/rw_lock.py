@@ -0,0 +1,147 @@
+# coding:utf-8
+
+import threading
+import time
+from typing import Dict, Optional
+
+# 読み込み時と更新時でロックを使い分けるためのre-entrantなRWロック.
+# 参照のみを行う処理同士（経路表を辿るだけのクエリ処理など）は並行して実行でき、
+# 更新を行う処理（stabilize処理など）は他の全ての処理を排他する.
+# readerwriterlockパッケージのRWロックは再入可能でないため、Writerロックを保持した状態で
+# find_successor を呼び出すといった既存の処理の流れに合わせて独自に実装している.
+# - 同一スレッドはRead, Writeいずれのロックも多重に取得できる
+# - Writerロックを保持しているスレッドはReaderロックも取得できる
+# - Writerロックの取得待ちのスレッドが存在する間は、新たなReaderロックの取得を待たせる
+#   (ただし既にReaderロックを保持しているスレッドの再取得は待たせない)
+class ReentrantRWLock:
+
+    def __init__(self):
+        # 以下のフィールドの更新を排他するためのロック
+        self.mutex : threading.Lock = threading.Lock()
+        # Writerが取得待ちの間と保持している間はWriterが保持し続ける. Readerは取得した上ですぐに解放することで
+        # Writerが存在しないことを確認する. これにより、取得待ちのWriterがいる場合は新たなReaderを待たせる
+        self.turnstile : threading.Lock = threading.Lock()
+        # Readerが1つ以上保持している間(最初のReaderが取得し最後のReaderが解放する)、もしくはWriterが
+        # 保持している間は取得された状態となる
+        self.room_empty : threading.Lock = threading.Lock()
+        # Writerロックを保持しているスレッドのident と その取得回数
+        self.writer_ident : Optional[int] = None
+        self.writer_count : int = 0
+        # Readerロックを保持しているスレッドのident をキーとし、取得回数を値とする
+        self.reader_counts : Dict[int, int] = {}
+        # Readerロックを保持したままWriterロックを取得した場合に、Readerとして取得済みの room_empty を
+        # そのまま利用したか
+        self.is_upgraded : bool = False
+
+    # timeout に負の値を渡した場合はロックが取得できるまで待ち続ける
+    # ブロックする場合の待ち合わせはC実装の threading.Lock に任せ、Pythonレベルでのスレッドの
+    # 起床のやりとりが生じないようにしている
+    def acquire_read(self, timeout : float = -1) -> bool:
+        me = threading.get_ident()
+        with self.mutex:
+            if self.writer_ident == me or me in self.reader_counts:
+                self.reader_counts[me] = self.reader_counts.get(me, 0) + 1
+                return True
+
+        if self.turnstile.acquire(timeout=timeout) == False:
+            return False
+        try:
+            # turnstile を保持している間は Writer が room_empty を保持していることはないため
+            # 以下で room_empty の取得を待つことはない
+            with self.mutex:
+                if len(self.reader_counts) == 0:
+                    self.room_empty.acquire()
+                self.reader_counts[me] = 1
+        finally:
+            self.turnstile.release()
+        return True
+
+    def release_read(self):
+        me = threading.get_ident()
+        with self.mutex:
+            count = self.reader_counts[me] - 1
+            if count == 0:
+                del self.reader_counts[me]
+                if len(self.reader_counts) == 0 and self.writer_ident != me:
+                    self.room_empty.release()
+            else:
+                self.reader_counts[me] = count
+
+    # 自身のみがReaderロックを保持している場合は、Writerロックに昇格する.
+    # 他にもReaderロックを保持しているスレッドが存在する場合は、それらが解放されるまで待つことになるため、
+    # 昇格を待つスレッドが複数存在した場合はタイムアウトするまで取得できない
+    def acquire_write(self, timeout : float = -1) -> bool:
+        me = threading.get_ident()
+        with self.mutex:
+            if self.writer_ident == me:
+                self.writer_count += 1
+                return True
+
+        start_time = time.monotonic()
+        if self.turnstile.acquire(timeout=timeout) == False:
+            return False
+
+        with self.mutex:
+            is_upgraded = len(self.reader_counts) == 1 and me in self.reader_counts
+        if not is_upgraded:
+            remaining = -1 if timeout < 0 else max(0.0, timeout - (time.monotonic() - start_time))
+            if self.room_empty.acquire(timeout=remaining) == False:
+                self.turnstile.release()
+                return False
+
+        with self.mutex:
+            self.writer_ident = me
+            self.writer_count = 1
+            self.is_upgraded = is_upgraded
+        return True
+
+    def release_write(self):
+        with self.mutex:
+            self.writer_count -= 1
+            if self.writer_count > 0:
+                return
+            self.writer_ident = None
+            if self.is_upgraded:
+                # room_empty は Readerとして取得したものであるため、最後のReaderの解放時に解放される
+                self.is_upgraded = False
+                if len(self.reader_counts) == 0:
+                    self.room_empty.release()
+            elif len(self.reader_counts) == 0:
+                self.room_empty.release()
+            else:
+                # Writerロックを保持している間にReaderロックも取得し、まだ解放していない場合.
+                # room_empty はそのままReaderとしての保持に引き継ぐ
+                pass
+            self.turnstile.release()
+
+    # with文でReaderロックを取得するためのオブジェクトを返す
+    def gen_rlock(self) -> '_RLockView':
+        return _RLockView(self)
+
+    # with文でWriterロックを取得するためのオブジェクトを返す
+    def gen_wlock(self) -> '_WLockView':
+        return _WLockView(self)
+
+class _RLockView:
+
+    def __init__(self, rwlock : ReentrantRWLock):
+        self.rwlock : ReentrantRWLock = rwlock
+
+    def __enter__(self):
+        self.rwlock.acquire_read()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.rwlock.release_read()
+
+class _WLockView:
+
+    def __init__(self, rwlock : ReentrantRWLock):
+        self.rwlock : ReentrantRWLock = rwlock
+
+    def __enter__(self):
+        self.rwlock.acquire_write()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.rwlock.release_write()
@@ -0,0 +1,292 @@
+# coding:utf-8
+
+import multiprocessing
+import queue
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import modules.gval as gval
+from .chord_util import ChordUtil, PResult
+from .chord_node import ChordNode
+from .log_writer import LogWriter
+from .node_info import NodeRef
+from .transport import Transport, TcpTransport, TransportError
+
+# ネットワーク上のノードをID空間上で連続する範囲ごとにシャードに分割し、シャード毎に用意したワーカープロセスで
+# stabilize処理を並列に実行するためのモジュール.
+# スレッドによる並列化ではGILにより処理が直列化されてしまうため、プロセスに分けることで複数のコアを利用する.
+# ワーカープロセスは fork により生成し、生成時点の全ノードのコピーを引き継ぐが、自身が担当するシャードの
+# ノードのみを更新する. 他のシャードのノードに対する Endpoints の呼び出しは、担当ワーカーのキューに要求を
+# 送り、担当ワーカーで実行した結果を受け取る形で行う.
+# 他のワーカーからの要求は、stabilize処理 を行うスレッドとは別のスレッドプールで処理する. stabilize処理 のスレッドが
+# ノードのロックを保持したまま応答を待っている間に届いた要求も、ロックの取得を待つことになり、同一スレッドでの
+# 再入によって排他を迂回することはない. 要求が入れ子になった場合も、ロックの取得がタイムアウトすることで解消される.
+# ワーカー間の呼び出しで通信に失敗した場合、その呼び出しを含む stabilize処理 1回分を失敗として数える.
+# transport_kind に "tcp" を指定した場合、ワーカー間の呼び出しはキューの代わりに TcpTransport で行う.
+# この場合もキューは親プロセスからの指示の受け渡しにのみ用いる
+
+# ワーカープロセス側の処理を行うクラス.
+# 他のワーカーのノードへの呼び出しをキュー経由で届ける Transport を兼ねる
+class ShardWorker(Transport):
+
+    def __init__(self, worker_idx : int, owner_idx_dict : Dict[str, int], inbox_list : List[Any], parent_queue : Any):
+        super().__init__()
+        self.worker_idx : int = worker_idx
+        # ノードのアドレスをキーとし、担当するワーカーのインデックスを値とする
+        self.owner_idx_dict : Dict[str, int] = owner_idx_dict
+        # 各ワーカーへの要求と応答を受け取るキュー. 自身のものは self.inbox
+        self.inbox_list : List[Any] = inbox_list
+        self.inbox : Any = inbox_list[worker_idx]
+        self.parent_queue : Any = parent_queue
+        self.owned_node_list : List[ChordNode] = [node for address, node in gval.all_node_dict.items()
+                                                  if owner_idx_dict.get(address) == worker_idx]
+        self.next_req_id : int = 0
+        self.lock_of_pending : threading.Lock = threading.Lock()
+        # 要求の通番をキーとし、[応答の到着を通知するEvent, 応答] を値とする
+        self.pending_dict : Dict[int, List[Any]] = {}
+        # 他のワーカーからの要求を処理するスレッドプール
+        self.executor : ThreadPoolExecutor = ThreadPoolExecutor(max_workers=gval.SHARD_WORKER_SERVER_THREAD_NUM)
+        # 親プロセスからの指示を届いた順に処理するスレッド
+        self.control_executor : ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1)
+
+    def is_owned(self, address : str) -> bool:
+        return self.owner_idx_dict.get(address) == self.worker_idx
+
+    # 生存状態は fork 時点でのコピーのものを用いる
+    def probe_liveness(self, address : str) -> bool:
+        return gval.all_node_dict[address].is_alive
+
+    def fetch_node_ref(self, address : str) -> NodeRef:
+        return gval.all_node_dict[address].node_info.get_ref()
+
+    def get_remote_node_by_address(self, address : str) -> PResult[Optional[ChordNode]]:
+        ret = ChordUtil.get_local_node_by_address(address)
+        if ret.is_ok == False:
+            return ret
+        return PResult.Ok(self.get_remote_node(address))
+
+    # 担当ワーカーに要求を送り、応答が返ってくるまで待つ.
+    # 応答は serve_forever を実行しているスレッドが受け取り、待っているスレッドを起床させる
+    def call(self, address : str, method_name : str, args : Tuple[Any, ...]) -> Any:
+        # [応答の到着を通知するEvent, 要求先での処理が例外で終わったか, 応答]
+        waiter : List[Any] = [threading.Event(), False, None]
+        with self.lock_of_pending:
+            req_id = self.next_req_id
+            self.next_req_id += 1
+            self.pending_dict[req_id] = waiter
+        self.inbox_list[self.owner_idx_dict[address]].put(("req", req_id, self.worker_idx, address, method_name, self.marshal(args)))
+        if waiter[0].wait(timeout=gval.SHARD_WORKER_RPC_TIMEOUT_SEC) == False:
+            with self.lock_of_pending:
+                self.pending_dict.pop(req_id, None)
+            raise TransportError("rpc timeout: " + method_name)
+        if waiter[1]:
+            raise TransportError(waiter[2])
+        return self.unmarshal(waiter[2])
+
+    # 自身の inbox に届いたメッセージを終了を指示されるまで受け取り続ける.
+    # 応答は待っているスレッドに渡し、他のワーカーからの要求はスレッドプールで、親プロセスからの指示は
+    # control_executor で処理させる
+    def serve_forever(self):
+        while True:
+            msg = self.inbox.get()
+            msg_type = msg[0]
+            if msg_type == "res" or msg_type == "err":
+                _, req_id, result = msg
+                with self.lock_of_pending:
+                    waiter = self.pending_dict.pop(req_id, None)
+                if waiter != None:
+                    waiter[1] = msg_type == "err"
+                    waiter[2] = result
+                    waiter[0].set()
+            elif msg_type == "req":
+                self.executor.submit(self.handle_request, msg)
+            elif msg_type == "stop":
+                break
+            else:
+                self.control_executor.submit(self.handle_control, msg)
+        self.control_executor.shutdown(wait=True)
+        self.executor.shutdown(wait=False)
+
+    # 他のワーカーからの要求を処理して応答を返す. 処理が例外で終わった場合は、要求元で TransportError として
+    # raise させるためにその内容を返す
+    def handle_request(self, msg : Tuple[Any, ...]):
+        _, req_id, from_idx, address, method_name, args = msg
+        try:
+            node = gval.all_node_dict[address]
+            result = getattr(node.endpoints, method_name)(*self.unmarshal(args))
+            reply = ("res", req_id, self.marshal(result))
+        except Exception as e:
+            reply = ("err", req_id, method_name + "," + repr(e))
+        self.inbox_list[from_idx].put(reply)
+
+    # 親プロセスからの指示を処理し、結果を返す. 処理が例外で終わった場合は、親プロセスが応答を待ち続けないよう
+    # その内容を返す
+    def handle_control(self, msg : Tuple[Any, ...]):
+        msg_type = msg[0]
+        try:
+            if msg_type == "round":
+                _, round_seed = msg
+                failed_cnt = self.stabilize_once(round_seed)
+                self.parent_queue.put(("done", self.worker_idx, failed_cnt))
+            else: # msg_type == "collect"
+                self.parent_queue.put(("state", self.worker_idx, self.collect_node_states()))
+        except Exception as e:
+            self.parent_queue.put(("error", self.worker_idx, msg_type + "," + repr(e)))
+
+    # stabilize処理 1回分を行い、成功したかを返す. 他のワーカーのノードとの通信に失敗した場合も失敗とする
+    def run_stabilize_op(self, stabilize_op : Callable[[], PResult[bool]]) -> bool:
+        try:
+            return stabilize_op().is_ok
+        except TransportError as e:
+            ChordUtil.dprint(lambda: "run_stabilize_op_1,TRANSPORT_ERROR," + str(self.worker_idx) + "," + str(e))
+            return False
+
+    # 担当するノードに stabilize_successor と stabilize_finger_table(_adaptive) を、chord_sim.py の
+    # do_stabilize_successor_th, do_stabilize_ftable_th と同じ回数行わせる.
+    # 処理に失敗した回数を返す
+    def stabilize_once(self, round_seed : int) -> int:
+        random.seed(round_seed)
+        shuffled_node_list = random.sample(self.owned_node_list, len(self.owned_node_list))
+        failed_cnt = 0
+        for _ in range(0, gval.STABILIZE_SUCCESSOR_BATCH_TIMES):
+            for node in shuffled_node_list:
+                if not self.run_stabilize_op(node.stabilizer.stabilize_successor):
+                    failed_cnt += 1
+        if gval.ENABLE_ADAPTIVE_FINGER_REFRESH:
+            for _ in range(0, gval.FINGER_REFRESH_TICKS_PER_ROUND):
+                for node in shuffled_node_list:
+                    if not self.run_stabilize_op(node.stabilizer.stabilize_finger_table_adaptive):
+                        failed_cnt += 1
+            return failed_cnt
+        for _ in range(0, gval.STABILIZE_FTABLE_BATCH_TIMES):
+            for table_idx in range(0, gval.ID_SPACE_BITS):
+                for node in shuffled_node_list:
+                    if not self.run_stabilize_op(lambda: node.stabilizer.stabilize_finger_table(table_idx)):
+                        failed_cnt += 1
+        return failed_cnt
+
+    # 担当するノードの経路表と保持データを、親プロセスに反映させるために返す
+    # 保持データは MmapValueStore の場合にそのままでは pickle できないため dict として返す. 各データの版も合わせて返す
+    def collect_node_states(self) -> List[Tuple[str, List[NodeRef], Optional[NodeRef], List[Optional[NodeRef]], Dict[int, str], Dict[int, int]]]:
+        return [(node.node_info.address_str, node.node_info.successor_info_list, node.node_info.predecessor_info,
+                 node.node_info.finger_table, dict(node.data_store.stored_data), dict(node.data_store.stored_versions))
+                for node in self.owned_node_list]
+
+def shard_worker_main(worker_idx : int, owner_idx_dict : Dict[str, int], inbox_list : List[Any], parent_queue : Any,
+                      listen_sock_list : List[socket.socket]):
+    # fork 前のプロセスのログ出力用スレッドは引き継がれないため、ログを出力する場合は新たに生成する
+    gval.log_writer = LogWriter()
+    shard_worker = ShardWorker(worker_idx, owner_idx_dict, inbox_list, parent_queue)
+    tcp_transport : Optional[TcpTransport] = None
+    if len(listen_sock_list) > 0:
+        endpoint_dict : Dict[str, Tuple[str, int]] = {address : listen_sock_list[owner_idx].getsockname()
+                                                      for address, owner_idx in owner_idx_dict.items()}
+        for idx, listen_sock in enumerate(listen_sock_list):
+            if idx != worker_idx:
+                listen_sock.close()
+        tcp_transport = TcpTransport(listen_sock_list[worker_idx], endpoint_dict)
+        gval.transport = tcp_transport
+    else:
+        gval.transport = shard_worker
+    shard_worker.serve_forever()
+    if tcp_transport != None:
+        tcp_transport.shutdown()
+    ChordUtil.flush_log()
+
+# 親プロセス側から、ワーカープロセスの生成とstabilize処理の実行の指示を行うクラス.
+# ワーカープロセスの生成後に親プロセス側で行ったノードの追加や更新はワーカープロセスには反映されないため、
+# ネットワークの構築後に生成し、stabilize処理を終えたら sync_node_states で結果を反映させた上で shutdown する.
+# transport_kind には "queue" か "tcp" を指定する
+class ShardedStabilizer:
+
+    def __init__(self, worker_num : int, transport_kind : str = "queue"):
+        self.worker_num : int = worker_num
+        # ID空間上で連続する範囲のノードが同じシャードとなるようにすることで、successor_info_list 内の
+        # ノードに対する呼び出しの多くがワーカー内で完結するようにする
+        sorted_node_list = sorted(gval.all_node_dict.values(), key=lambda node: node.node_info.node_id)
+        owner_idx_dict : Dict[str, int] = {}
+        for idx, node in enumerate(sorted_node_list):
+            owner_idx_dict[node.node_info.address_str] = idx * worker_num // len(sorted_node_list)
+
+        # TCPの場合、各ワーカーが要求を受け付けるソケットは fork 前に用意し、ポート番号を全ワーカーで共有する
+        listen_sock_list : List[socket.socket] = []
+        if transport_kind == "tcp":
+            for _ in range(worker_num):
+                listen_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                listen_sock.bind(("127.0.0.1", 0))
+                listen_sock.listen()
+                listen_sock_list.append(listen_sock)
+
+        ctx = multiprocessing.get_context("fork")
+        self.inbox_list : List[Any] = [ctx.SimpleQueue() for _ in range(worker_num)]
+        # 応答の待ち合わせにタイムアウトを設けるため、SimpleQueue ではなく Queue とする
+        self.parent_queue : Any = ctx.Queue()
+        # fork 時点で出力されていないログがワーカープロセスにも引き継がれ、重複して出力されないようにする
+        ChordUtil.flush_log()
+        self.process_list : List[Any] = [
+            ctx.Process(target=shard_worker_main,
+                        args=(worker_idx, owner_idx_dict, self.inbox_list, self.parent_queue, listen_sock_list),
+                        daemon=True)
+            for worker_idx in range(worker_num)]
+        for process in self.process_list:
+            process.start()
+        for listen_sock in listen_sock_list:
+            listen_sock.close()
+
+    # 全てのワーカーに担当するノードの stabilize処理 を1回ずつ行わせ、全て終わるまで待つ.
+    # 処理に失敗した回数の合計を返す
+    def stabilize_once(self) -> int:
+        for inbox in self.inbox_list:
+            inbox.put(("round", random.randint(0, gval.ID_SPACE_RANGE - 1)))
+        failed_cnt = 0
+        for _ in range(self.worker_num):
+            _, _, worker_failed_cnt = self.get_worker_reply()
+            failed_cnt += worker_failed_cnt
+        return failed_cnt
+
+    # ワーカープロセスからの応答を1つ受け取る. 終了してしまったワーカープロセスがあるか、処理が例外で終わったか、
+    # gval.SHARD_WORKER_REPLY_TIMEOUT_SEC 待っても応答が無い場合は TransportError を raise する
+    def get_worker_reply(self) -> Tuple[Any, ...]:
+        deadline = time.monotonic() + gval.SHARD_WORKER_REPLY_TIMEOUT_SEC
+        while True:
+            try:
+                reply = self.parent_queue.get(timeout=1.0)
+                if reply[0] == "error":
+                    raise TransportError("shard worker " + str(reply[1]) + " failed: " + reply[2])
+                return reply
+            except queue.Empty:
+                pass
+            if any(not process.is_alive() for process in self.process_list):
+                raise TransportError("shard worker exited")
+            if time.monotonic() >= deadline:
+                raise TransportError("shard worker reply timeout")
+
+    # ワーカープロセスで更新された経路表と保持データを、親プロセスのノードに反映させる
+    def sync_node_states(self):
+        for inbox in self.inbox_list:
+            inbox.put(("collect",))
+        for _ in range(self.worker_num):
+            _, _, node_states = self.get_worker_reply()
+            for address, succ_list, pred_info, finger_table, stored_data, stored_versions in node_states:
+                node = gval.all_node_dict[address]
+                with node.node_info.lock_of_pred_info.gen_wlock(), node.node_info.lock_of_succ_infos.gen_wlock():
+                    node.node_info.successor_info_list = succ_list
+                    node.node_info.predecessor_info = pred_info
+                    node.node_info.finger_table = finger_table
+                with node.node_info.lock_of_datastore:
+                    for data_id in [data_id for data_id in node.data_store.stored_data if data_id not in stored_data]:
+                        node.data_store.remove_data(data_id)
+                    for data_id, value_str in stored_data.items():
+                        if node.data_store.stored_data.get(data_id) != value_str \
+                           or node.data_store.stored_versions[data_id] != stored_versions[data_id]:
+                            node.data_store.store_new_data(data_id, value_str, stored_versions[data_id])
+
+    def shutdown(self):
+        for inbox in self.inbox_list:
+            inbox.put(("stop",))
+        for process in self.process_list:
+            process.join()
@@ -0,0 +1,70 @@
+# coding:utf-8
+
+import threading
+from typing import Dict, List, Set, Tuple
+
+# メンバーシップの変化(join、predecessor の変更、ノードのダウンの検出)により stabilize処理 が必要になった
+# ノードのアドレスを溜めておき、stabilize処理 を行うスレッド(またはイベント)に渡す.
+# 全ノードの stabilize処理 を間隔を空けずに繰り返す代わりに、通知されたノードについてのみ即座に
+# stabilize処理 を行い、全ノードの stabilize処理 は gval.BACKGROUND_STABILIZE_INTERVAL_SEC 秒ごとに
+# 行う形とするために用いる
+class StabilizeNotifier:
+
+    def __init__(self):
+        # アドレスをキーとし、当該ノードの stabilize処理 で successor_info_list が変化した場合に、さらに
+        # その predecessor へ通知を伝播させる残りの回数を値とする
+        self.pending_dict : Dict[str, int] = {}
+        self.cond_of_pending_dict : threading.Condition = threading.Condition()
+        # ダウンを検出済みのノードのアドレス. ダウンしたノードは all_node_dict に残り続け、経路表から
+        # 取り除かれるまで繰り返しアクセスされるため、同じノードのダウンについては1度しか通知しない
+        self.downed_address_set : Set[str] = set()
+        # 0 より大きい間は通知を溜めておくのみとし、wait_notified で返さない.
+        # join処理 中に行われた通知を、参加したノードが all_node_dict に登録されるまで保留するために用いる
+        self.defer_cnt : int = 0
+        # 計測用. 受け付けた通知の数
+        self.notified_cnt : int = 0
+
+    # address のノードで stabilize処理 が必要になったことを通知する
+    def notify(self, address : str, propagate_cnt : int):
+        with self.cond_of_pending_dict:
+            self.pending_dict[address] = max(propagate_cnt, self.pending_dict.get(address, -1))
+            self.notified_cnt += 1
+            self.cond_of_pending_dict.notify()
+
+    # downed_address のノードのダウンを検出した際に、その隣接ノード(predecessor と successor)に通知する.
+    # 既に検出済みのノードであれば何もしない
+    def notify_node_downed(self, downed_address : str, neighbor_address_list : List[str], propagate_cnt : int):
+        with self.cond_of_pending_dict:
+            if downed_address in self.downed_address_set:
+                return
+            self.downed_address_set.add(downed_address)
+        for address in neighbor_address_list:
+            if address != downed_address:
+                self.notify(address, propagate_cnt)
+
+    # address のノードが all_node_dict に登録された際に呼び出す. ダウンしたノードが同じアドレスで再起動した場合に、
+    # 再度ダウンした際の通知が検出済みとして捨てられないよう、検出済みのアドレスから取り除く
+    def notify_node_registered(self, address : str):
+        with self.cond_of_pending_dict:
+            self.downed_address_set.discard(address)
+
+    def begin_defer(self):
+        with self.cond_of_pending_dict:
+            self.defer_cnt += 1
+
+    def end_defer(self):
+        with self.cond_of_pending_dict:
+            self.defer_cnt -= 1
+            self.cond_of_pending_dict.notify()
+
+    # 通知されたノードが存在するか、timeout_sec 秒経過するまで待ち、通知されていたノードの
+    # (アドレス, 伝播させる残りの回数) のリストを返す. 返したノードは通知済みのものから取り除く
+    def wait_notified(self, timeout_sec : float) -> List[Tuple[str, int]]:
+        with self.cond_of_pending_dict:
+            if timeout_sec > 0:
+                self.cond_of_pending_dict.wait_for(lambda: len(self.pending_dict) > 0 and self.defer_cnt == 0, timeout_sec)
+            if self.defer_cnt > 0:
+                return []
+            notified_list = list(self.pending_dict.items())
+            self.pending_dict = {}
+            return notified_list
@@ -1,16 +1,18 @@
 # coding:utf-8
 
-from typing import Dict, List, Optional, cast, TYPE_CHECKING
+from typing import Callable, Dict, List, Optional, Tuple, cast, TYPE_CHECKING
 
 import sys
 import modules.gval as gval
 import traceback
 from .chord_util import ChordUtil, KeyValue, NodeIsDownedExceptiopn, AppropriateNodeNotFoundException, \
-    InternalControlFlowException, DataIdAndValue, ErrorCode, PResult
+    InternalControlFlowException, DataIdAndValue, DataChunk, ErrorCode, PResult
 from .taskqueue import TaskQueue
+from .log_writer import LogLevel
+from .finger_refresh_scheduler import FingerRefreshScheduler
 
 if TYPE_CHECKING:
-    from .node_info import NodeInfo
+    from .node_info import NodeRef
     from .chord_node import ChordNode
 
 class Stabilizer:
@@ -22,35 +24,43 @@ class Stabilizer:
 
     def __init__(self, existing_node : 'ChordNode'):
         self.existing_node : 'ChordNode' = existing_node
-
-    # 自ノードの持っている successor_info_listの deep copy を返す
-    def pass_successor_list(self) -> List['NodeInfo']:
-        return [ node_info.get_partial_deepcopy() for node_info in self.existing_node.node_info.successor_info_list]
-
-    def pass_predecessor_info(self) -> Optional['NodeInfo']:
-        if self.existing_node.node_info.predecessor_info != None:
-            return cast('NodeInfo', self.existing_node.node_info.predecessor_info).get_partial_deepcopy()
-        else:
-            return None
+        # stabilize_finger_table_adaptive で更新する finger_table のエントリを選ぶ
+        self.finger_refresh_scheduler : FingerRefreshScheduler = FingerRefreshScheduler(gval.ID_SPACE_BITS)
+        # 計測用. stabilize_successor の呼び出し回数と、その中で行った他ノードへの呼び出し
+        # (get_node_by_address を含む)の回数
+        self.stabilize_successor_cnt : int = 0
+        self.stabilize_successor_rpc_cnt : int = 0
+        # 計測用. join処理 と partial_join_op で他ノードから受け取ったデータの数
+        self.join_received_data_cnt : int = 0
+
+    # 自ノードの持っている successor_info_list を返す
+    # successor_info_list は更新時に新たなリストに差し替えられ、要素の NodeRef もイミュータブルであるため、
+    # ロックをとらずに参照したリストをそのまま返せば、ある時点のスナップショットとなる
+    # (他ノードのstabilize処理から頻繁に呼び出されるため、ロックの待ち合わせを生じさせないようにしている)
+    def pass_successor_list(self) -> List['NodeRef']:
+        return self.existing_node.node_info.successor_info_list
+
+    def pass_predecessor_info(self) -> Optional['NodeRef']:
+        return self.existing_node.node_info.predecessor_info
 
     # successor_info_listの長さをチェックし、規定長を越えていた場合余剰なノードにレプリカを
     # 削除させた上で、リストから取り除く
     # TODO: InternalExp at check_successor_list_length
     def check_successor_list_length(self) -> PResult[bool]:
-        if self.existing_node.node_info.lock_of_succ_infos.acquire(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
-            ChordUtil.dprint("check_successor_list_length_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+        if self.existing_node.node_info.lock_of_succ_infos.acquire_write(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+            ChordUtil.dprint(lambda: "check_successor_list_length_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + "LOCK_ACQUIRE_TIMEOUT")
             #raise InternalControlFlowException("gettting lock of succcessor_info_list is timedout.")
             return PResult.Err(False, ErrorCode.InternalControlFlowException_CODE)
 
         try:
             ChordUtil.dprint(
-                "check_successor_list_length_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                lambda: "check_successor_list_length_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                 + str(len(self.existing_node.node_info.successor_info_list)))
 
             if len(self.existing_node.node_info.successor_info_list) > gval.SUCCESSOR_LIST_NORMAL_LEN:
                 list_len = len(self.existing_node.node_info.successor_info_list)
-                delete_elem_list : List['NodeInfo'] = []
+                delete_elem_list : List['NodeRef'] = []
                 for idx in range(gval.SUCCESSOR_LIST_NORMAL_LEN, list_len):
                     # successor_info_listからエントリが削除された場合、rangeで得られる数字列全てに要素がない
                     # 状態が起こるため、最新のlengthでチェックし直す
@@ -58,37 +68,37 @@ class Stabilizer:
                         break
 
                     ChordUtil.dprint(
-                        "check_successor_list_length_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                        lambda: "check_successor_list_length_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                         + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info.successor_info_list[idx])
                         + str(len(self.existing_node.node_info.successor_info_list)))
 
                     delete_elem_list.append(self.existing_node.node_info.successor_info_list[idx])
 
-                # 上のループで削除すると決まった要素を取り除く
-                for elem in delete_elem_list:
-                    self.existing_node.node_info.successor_info_list.remove(elem)
+                # 上のループで削除すると決まった要素を取り除いたリストに差し替える
+                self.existing_node.node_info.successor_info_list = [
+                    elem for elem in self.existing_node.node_info.successor_info_list if elem not in delete_elem_list]
 
             return PResult.Ok(True)
         finally:
-            self.existing_node.node_info.lock_of_succ_infos.release()
+            self.existing_node.node_info.lock_of_succ_infos.release_write()
 
     # 経路表の情報を他ノードから強制的に設定する.
     # joinメソッドの中で、secondノードがfirstノードに対してのみ用いるものであり、他のケースで利用してはならない
-    def set_routing_infos_force(self, predecessor_info : 'NodeInfo', successor_info_0 : 'NodeInfo', ftable_enry_0 : 'NodeInfo'):
-        with self.existing_node.node_info.lock_of_pred_info, self.existing_node.node_info.lock_of_succ_infos:
+    def set_routing_infos_force(self, predecessor_info : 'NodeRef', successor_info_0 : 'NodeRef', ftable_enry_0 : 'NodeRef'):
+        with self.existing_node.node_info.lock_of_pred_info.gen_wlock(), self.existing_node.node_info.lock_of_succ_infos.gen_wlock():
             self.existing_node.node_info.predecessor_info = predecessor_info
-            self.existing_node.node_info.successor_info_list[0] = successor_info_0
+            self.existing_node.node_info.successor_info_list = [successor_info_0] + self.existing_node.node_info.successor_info_list[1:]
             self.existing_node.node_info.finger_table[0] = ftable_enry_0
 
     # node_addressに対応するノードに問い合わせを行い、教えてもらったノードをsuccessorとして設定する
     def join(self, node_address : str):
-        with self.existing_node.node_info.lock_of_pred_info, self.existing_node.node_info.lock_of_succ_infos:
+        with self.existing_node.node_info.lock_of_pred_info.gen_wlock(), self.existing_node.node_info.lock_of_succ_infos.gen_wlock():
             # 実装上例外は発生しない.
             # また実システムでもダウンしているノードの情報が与えられることは想定しない
             #tyukai_node = ChordUtil.get_node_by_address(node_address)
             tyukai_node = cast('ChordNode', ChordUtil.get_node_by_address(node_address).result)
             # TODO: x direct access to node_info of tyukai_node at join
-            ChordUtil.dprint("join_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            ChordUtil.dprint(lambda: "join_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + ChordUtil.gen_debug_str_of_node(tyukai_node.node_info))
 
             # try:
@@ -111,7 +121,7 @@ class Stabilizer:
                 # 自ノードの情報、仲介ノードの情報
                 # TODO: x direct access to node_info of tyukai_node at join
                 ChordUtil.dprint(
-                    "join_2,RETRY_IS_NEEDED," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                    lambda: "join_2,RETRY_IS_NEEDED," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                     + ChordUtil.gen_debug_str_of_node(tyukai_node.node_info))
                 return
 
@@ -129,10 +139,10 @@ class Stabilizer:
             # try:
 
             # TODO: x direct access to node_info of successor at join
-            self.existing_node.node_info.successor_info_list.append(successor.node_info.get_partial_deepcopy())
+            self.existing_node.node_info.successor_info_list = self.existing_node.node_info.successor_info_list + [successor.node_info.get_ref()]
 
             # finger_tableのインデックス0は必ずsuccessorになるはずなので、設定しておく
-            self.existing_node.node_info.finger_table[0] = self.existing_node.node_info.successor_info_list[0].get_partial_deepcopy()
+            self.existing_node.node_info.finger_table[0] = self.existing_node.node_info.successor_info_list[0]
 
             # TODO: x direct access to node_info of tyukai_node at join
             if tyukai_node.node_info.node_id == tyukai_node.node_info.successor_info_list[0].node_id:
@@ -142,12 +152,12 @@ class Stabilizer:
 
                 # 2ノードでsuccessorでもpredecessorでも、チェーン構造で正しい環が構成されるよう強制的に全て設定してしまう
                 # TODO: x direct access to node_info of predecessor at join
-                self.existing_node.node_info.predecessor_info = predecessor.node_info.get_partial_deepcopy()
+                self.existing_node.node_info.predecessor_info = predecessor.node_info.get_ref()
 
                 tyukai_node.endpoints.grpc__set_routing_infos_force(
-                    self.existing_node.node_info.get_partial_deepcopy(),
-                    self.existing_node.node_info.get_partial_deepcopy(),
-                    self.existing_node.node_info.get_partial_deepcopy()
+                    self.existing_node.node_info.get_ref(),
+                    self.existing_node.node_info.get_ref(),
+                    self.existing_node.node_info.get_ref()
                 )
 
                 # tyukai_node.node_info.predecessor_info = self.existing_node.node_info.get_partial_deepcopy()
@@ -156,14 +166,14 @@ class Stabilizer:
                 # tyukai_node.node_info.finger_table[0] = self.existing_node.node_info.get_partial_deepcopy()
 
                 # TODO: x direct access to node_info of tyukai_node at join
-                ChordUtil.dprint("join_3," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                ChordUtil.dprint(lambda: "join_3," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                                  + ChordUtil.gen_debug_str_of_node(tyukai_node.node_info) + ","
                                  + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info.successor_info_list[0]))
             else:
                 # successorと、successorノードの情報だけ適切なものとする
                 # TODO: check_predecessor call at join
-                    #successor.endpoints.grpc__check_predecessor(self.existing_node.node_info)
-                ret2 = successor.endpoints.grpc__check_predecessor(self.existing_node.node_info)
+                    #successor.endpoints.grpc__check_predecessor(self.existing_node.node_info.get_ref())
+                ret2 = successor.endpoints.grpc__check_predecessor(self.existing_node.node_info.get_ref())
                 if (ret2.is_ok):
                     pass
                 else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE
@@ -176,30 +186,44 @@ class Stabilizer:
 
                     # 自ノードの情報、仲介ノードの情報
                     # TODO: x direct access to node_info of tyukai_node at join
-                    ChordUtil.dprint("join_3,RETRY_IS_NEEDED," + ChordUtil.gen_debug_str_of_node(
+                    ChordUtil.dprint(lambda: "join_3,RETRY_IS_NEEDED," + ChordUtil.gen_debug_str_of_node(
                         self.existing_node.node_info) + ","
                                      + ChordUtil.gen_debug_str_of_node(tyukai_node.node_info))
-                    ChordUtil.dprint(traceback.format_exc())
+                    ChordUtil.dprint(lambda: traceback.format_exc())
                     return PResult.Err(False, cast(int, ret2.err_code))
 
                 # successor_info_listを埋めておく
                 # TODO: pass_successor_list call at join
-                succ_list_of_succ: List[NodeInfo] = successor.endpoints.grpc__pass_successor_list()
-                list_len = len(succ_list_of_succ)
-                for idx in range(0, gval.SUCCESSOR_LIST_NORMAL_LEN - 1):
-                    if idx < list_len:
-                        self.existing_node.node_info.successor_info_list.append(
-                            succ_list_of_succ[idx].get_partial_deepcopy())
+                succ_list_of_succ: List[NodeRef] = successor.endpoints.grpc__pass_successor_list()
+                self.existing_node.node_info.successor_info_list = self.existing_node.node_info.successor_info_list \
+                                                                   + succ_list_of_succ[0:gval.SUCCESSOR_LIST_NORMAL_LEN - 1]
 
             # successorから自身が担当することになるID範囲のデータの委譲を受け、格納する
 
-            # TODO: delegate_my_tantou_data call at join
-            tantou_data_list: List[KeyValue] = successor.endpoints.grpc__delegate_my_tantou_data(
-                self.existing_node.node_info.node_id)
+            if self.existing_node.data_store.is_recovered:
+                # ディスクから復元した保持データと異なるものだけを受け取る
+                # TODO: delegate_my_tantou_data_delta call at join
+                delta_data_list : List[DataIdAndValue] = successor.endpoints.grpc__delegate_my_tantou_data_delta(
+                    self.existing_node.node_info.node_id, self.existing_node.data_store.gen_all_data_digest())
+                self.existing_node.data_store.receive_replica(delta_data_list)
+                self.join_received_data_cnt += len(delta_data_list)
+            elif gval.ENABLE_CHUNKED_DATA_TRANSFER:
+                # TODO: delegate_my_tantou_data_chunk call at join
+                self.join_received_data_cnt += self.receive_data_chunks(
+                    lambda from_id: successor.endpoints.grpc__delegate_my_tantou_data_chunk(
+                        self.existing_node.node_info.node_id, from_id, gval.DATA_TRANSFER_CHUNK_SIZE))
+            else:
+                # TODO: delegate_my_tantou_data call at join
+                tantou_data_list: List[KeyValue] = successor.endpoints.grpc__delegate_my_tantou_data(
+                    self.existing_node.node_info.node_id)
+
+                self.existing_node.data_store.receive_replica(
+                    [DataIdAndValue(data_id=cast(int, key_value.data_id), value_data=key_value.value_data, version=key_value.version)
+                     for key_value in tantou_data_list])
+                self.join_received_data_cnt += len(tantou_data_list)
 
-            with self.existing_node.node_info.lock_of_datastore:
-                for key_value in tantou_data_list:
-                    self.existing_node.data_store.store_new_data(cast(int, key_value.data_id), key_value.value_data)
+            # 自ノードの successor_info_list と finger_table を埋めさせる
+            ChordUtil.request_stabilize(self.existing_node.node_info.address_str)
 
             # 残りのレプリカに関する処理は stabilize処理のためのスレッドに別途実行させる
             self.existing_node.tqueue.append_task(TaskQueue.JOIN_PARTIAL)
@@ -222,20 +246,38 @@ class Stabilizer:
             #     ChordUtil.dprint(traceback.format_exc())
             #     return
 
+    # fetch_chunk に前回受け取った DataChunk の next_from_id (最初は None) を渡して次の DataChunk を受け取り、
+    # 自ノードのデータストアに格納することを、範囲内のデータを全て受け取るまで繰り返す.
+    # 受け取ったデータの数を返す
+    def receive_data_chunks(self, fetch_chunk : Callable[[Optional[int]], DataChunk]) -> int:
+        from_id : Optional[int] = None
+        received_num = 0
+        while True:
+            chunk : DataChunk = fetch_chunk(from_id)
+            self.existing_node.data_store.store_data_chunk(chunk)
+            received_num += len(chunk.data_ids)
+            if chunk.next_from_id == None:
+                break
+            from_id = chunk.next_from_id
+
+        ChordUtil.dprint(lambda: "receive_data_chunks_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                         + str(received_num))
+        return received_num
+
     # join処理のうちレプリカに関する処理を分割したもの
     # stabilize処理を行うスレッドによって一度だけ(失敗した場合はカウントしないとして)実行される
     # TODO: InternalExp at partial_join_op
     def partial_join_op(self) -> PResult[bool]:
-        if self.existing_node.node_info.lock_of_pred_info.acquire(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+        if self.existing_node.node_info.lock_of_pred_info.acquire_write(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
             ChordUtil.dprint(
-                "partial_join_op_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                lambda: "partial_join_op_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                 + "LOCK_ACQUIRE_TIMEOUT")
             #raise InternalControlFlowException("gettting lock of predecessor_info is timedout.")
             return PResult.Err(False, ErrorCode.InternalControlFlowException_CODE)
-        if self.existing_node.node_info.lock_of_succ_infos.acquire(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
-            self.existing_node.node_info.lock_of_pred_info.release()
+        if self.existing_node.node_info.lock_of_succ_infos.acquire_write(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+            self.existing_node.node_info.lock_of_pred_info.release_write()
             ChordUtil.dprint(
-                "partial_join_op_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                lambda: "partial_join_op_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                 + "LOCK_ACQUIRE_TIMEOUT")
             #raise InternalControlFlowException("gettting lock of succcessor_info_list is timedout.")
             return PResult.Err(False, ErrorCode.InternalControlFlowException_CODE)
@@ -243,9 +285,9 @@ class Stabilizer:
         if self.existing_node.is_alive == False:
             # 処理の合間でkillされてしまっていた場合の考慮
             # 何もしないで終了する
-            self.existing_node.node_info.lock_of_succ_infos.release()
-            self.existing_node.node_info.lock_of_pred_info.release()
-            ChordUtil.dprint("partial_join_op_2_5," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            self.existing_node.node_info.lock_of_succ_infos.release_write()
+            self.existing_node.node_info.lock_of_pred_info.release_write()
+            ChordUtil.dprint(lambda: "partial_join_op_2_5," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + "REQUEST_RECEIVED_BUT_I_AM_ALREADY_DEAD")
             return PResult.Ok(True)
 
@@ -253,26 +295,24 @@ class Stabilizer:
 
         try:
             # successor[0] から委譲を受けたデータを successorList 内の全ノードにレプリカとして配る
-            tantou_data_list : List[DataIdAndValue] = self.existing_node.data_store.get_all_tantou_data()
+            # (各ノードとはダイジェストを交換し、保持していないデータのみを渡す)
             for node_info in self.existing_node.node_info.successor_info_list:
                 # try:
                     #succ : 'ChordNode' = ChordUtil.get_node_by_address(node_info.address_str)
                 ret = ChordUtil.get_node_by_address(node_info.address_str)
                 if (ret.is_ok):
                     succ: 'ChordNode' = cast('ChordNode', ret.result)
-                    ChordUtil.dprint("partial_join_op_3," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                    ChordUtil.dprint(lambda: "partial_join_op_3," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                                      + ChordUtil.gen_debug_str_of_node(node_info) + "," + str(len(self.existing_node.node_info.successor_info_list)))
 
-                    # TODO: receive_replica call at partial_join_op
-                    succ.endpoints.grpc__receive_replica(
-                        [DataIdAndValue(data_id = data.data_id, value_data=data.value_data) for data in tantou_data_list]
-                    )
+                    with self.existing_node.node_info.lock_of_datastore:
+                        self.existing_node.data_store.resync_replica(succ)
                 else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE || ret.err_code == ErrorCode.NodeIsDownedException_CODE
                     # ノードがダウンしていた場合等は無視して次のノードに進む.
                     # ノードダウンに関する対処とそれに関連したレプリカの適切な配置はそれぞれ stabilize処理 と
                     # put処理 の中で後ほど行われるためここでは対処しない
                     # (ただし、レプリカが当該ノードに存在しない状態が短くない時間発生する可能性はある)
-                    ChordUtil.dprint("partial_join_op_4,NODE_IS_DOWNED or InternalControlFlowException,"
+                    ChordUtil.dprint(lambda: "partial_join_op_4,NODE_IS_DOWNED or InternalControlFlowException,"
                                      + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                                      + ChordUtil.gen_debug_str_of_node(node_info))
                     continue
@@ -289,7 +329,7 @@ class Stabilizer:
 
             def handle_err():
                 ChordUtil.dprint(
-                    "partial_join_op_6,NODE_IS_DOWNED or InternalControlFlowException" + ChordUtil.gen_debug_str_of_node(
+                    lambda: "partial_join_op_6,NODE_IS_DOWNED or InternalControlFlowException" + ChordUtil.gen_debug_str_of_node(
                         self.existing_node.node_info) + ","
                     + ChordUtil.gen_debug_str_of_node(node_info))
                 # ノードがダウンしていた場合等は無視して先に進む.
@@ -301,7 +341,7 @@ class Stabilizer:
             if self.existing_node.node_info.predecessor_info != None:
                 # predecessorが非Noneであれば当該ノードの担当データをレプリカとして保持しておかなければならないため
                 # データを渡してもらい、格納する
-                self_predecessor_info : NodeInfo = cast('NodeInfo', self.existing_node.node_info.predecessor_info)
+                self_predecessor_info : 'NodeRef' = cast('NodeRef', self.existing_node.node_info.predecessor_info)
                 # try:
                     #self_predeessor_node : 'ChordNode' = ChordUtil.get_node_by_address(self_predecessor_info.address_str)
                 ret = ChordUtil.get_node_by_address(self_predecessor_info.address_str)
@@ -311,14 +351,17 @@ class Stabilizer:
                     handle_err()
                     #return PResult.Ok(True)
 
-                # TODO: get_all_tantou_data call at partial_join_op
-                pred_tantou_datas : List[DataIdAndValue] = self_predeessor_node.endpoints.grpc__get_all_tantou_data()
-                for iv_entry in pred_tantou_datas:
-                    self.existing_node.data_store.store_new_data(iv_entry.data_id,
-                                                                 iv_entry.value_data,
-                                                                 )
-
-                ChordUtil.dprint("partial_join_op_5," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                if self.existing_node.data_store.is_recovered:
+                    # TODO: get_all_tantou_data_delta call at partial_join_op
+                    pred_tantou_datas : List[DataIdAndValue] = self_predeessor_node.endpoints.grpc__get_all_tantou_data_delta(
+                        self.existing_node.data_store.gen_all_data_digest())
+                else:
+                    # TODO: get_all_tantou_data call at partial_join_op
+                    pred_tantou_datas = self_predeessor_node.endpoints.grpc__get_all_tantou_data()
+                self.existing_node.data_store.receive_replica(pred_tantou_datas)
+                self.join_received_data_cnt += len(pred_tantou_datas)
+
+                ChordUtil.dprint(lambda: "partial_join_op_5," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                                  + ChordUtil.gen_debug_str_of_node(self_predeessor_node.node_info) + "," + str(len(pred_tantou_datas)))
 
                 # predecessor が非Noneであれば、当該predecessorのsuccessor_info_listの長さが標準を越えてしまって
@@ -345,24 +388,35 @@ class Stabilizer:
             # successorから保持している全てのレプリカを受け取り格納する（successorよりは前に位置することになるため、
             # 基本的にsuccessorが保持しているレプリカは自身も全て保持している状態とならなければならない）
             # (前方に位置するノードが join や put によるレプリカの配布を行っているタイミングとバッティングするとsuccessorが持っている古い
-            #  データで更新してしまうということが起こる可能性はあるが、タイミングとしては稀であり、また後続の put で再度最新のデータを受け取る
-            #  ため、問題ないと判断する)
+            #  データを受け取ることがあるが、receive_replica で版を比較し、保持している値より新しいものだけを格納するため問題ない)
             # try:
 
             # successor : 'ChordNode' = ChordUtil.get_node_by_address(self.existing_node.node_info.successor_info_list[0].address_str)
             ret = ChordUtil.get_node_by_address(self.existing_node.node_info.successor_info_list[0].address_str)
             if (ret.is_ok):
                 successor : 'ChordNode' = cast('ChordNode', ret.result)
-                # TODO: get_all_data call at partial_join_op
-                passed_all_replica: List[DataIdAndValue] = successor.endpoints.grpc__get_all_data()
-                self.existing_node.data_store.store_replica_of_multi_masters(passed_all_replica)
+                if self.existing_node.data_store.is_recovered:
+                    # TODO: get_all_data_delta call at partial_join_op
+                    delta_data_list : List[DataIdAndValue] = successor.endpoints.grpc__get_all_data_delta(
+                        self.existing_node.data_store.gen_all_data_digest())
+                    self.existing_node.data_store.store_replica_of_multi_masters(delta_data_list)
+                    self.join_received_data_cnt += len(delta_data_list)
+                elif gval.ENABLE_CHUNKED_DATA_TRANSFER:
+                    # TODO: get_all_data_chunk call at partial_join_op
+                    self.join_received_data_cnt += self.receive_data_chunks(
+                        lambda from_id: successor.endpoints.grpc__get_all_data_chunk(from_id, gval.DATA_TRANSFER_CHUNK_SIZE))
+                else:
+                    # TODO: get_all_data call at partial_join_op
+                    passed_all_replica: List[DataIdAndValue] = successor.endpoints.grpc__get_all_data()
+                    self.existing_node.data_store.store_replica_of_multi_masters(passed_all_replica)
+                    self.join_received_data_cnt += len(passed_all_replica)
             else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE || ret.err_code == ErrorCode.NodeIsDownedException_CODE
                 # ノードがダウンしていた場合等は無視して先に進む.
                 # ノードダウンに関する対処とそれに関連したレプリカの適切な配置はそれぞれ stabilize処理 と
                 # put処理 の中で後ほど行われるためここでは対処しない
                 # (ただし、レプリカが本ノードに存在しない状態が短くない時間発生する可能性はある)
                 ChordUtil.dprint(
-                    "partial_join_op_7,NODE_IS_DOWNED or InternalControlFlowException" + ChordUtil.gen_debug_str_of_node(
+                    lambda: "partial_join_op_7,NODE_IS_DOWNED or InternalControlFlowException" + ChordUtil.gen_debug_str_of_node(
                         self.existing_node.node_info) + ","
                     + ChordUtil.gen_debug_str_of_node(node_info))
 
@@ -382,21 +436,21 @@ class Stabilizer:
             gval.is_waiting_partial_join_op_exists = False
 
             # 自ノードの情報、仲介ノードの情報、successorとして設定したノードの情報
-            ChordUtil.dprint("partial_join_op_8," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            ChordUtil.dprint(lambda: "partial_join_op_8," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info.successor_info_list[0]))
 
             return PResult.Ok(True)
         finally:
-            self.existing_node.node_info.lock_of_succ_infos.release()
-            self.existing_node.node_info.lock_of_pred_info.release()
+            self.existing_node.node_info.lock_of_succ_infos.release_write()
+            self.existing_node.node_info.lock_of_pred_info.release_write()
 
     # id が自身の正しい predecessor でないかチェックし、そうであった場合、経路表の情報を更新する
     # 本メソッドはstabilize処理の中で用いられる
     # Attention: InternalControlFlowException を raiseする場合がある
     # TODO: InternalExp at check_predecessor
-    def check_predecessor(self, node_info : 'NodeInfo') -> PResult[bool]:
-        if self.existing_node.node_info.lock_of_pred_info.acquire(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
-            ChordUtil.dprint("check_predecessor_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+    def check_predecessor(self, node_info : 'NodeRef') -> PResult[bool]:
+        if self.existing_node.node_info.lock_of_pred_info.acquire_write(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+            ChordUtil.dprint(lambda: "check_predecessor_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + "LOCK_ACQUIRE_TIMEOUT")
             #raise InternalControlFlowException("gettting lock of predecessor_info is timedout.")
             return PResult.Err(False, ErrorCode.InternalControlFlowException_CODE)
@@ -406,16 +460,16 @@ class Stabilizer:
         try:
             if self.existing_node.node_info.predecessor_info == None:
                 # predecesorが設定されていなければ無条件にチェックを求められたノードを設定する
-                self.existing_node.node_info.predecessor_info = node_info.get_partial_deepcopy()
-                ChordUtil.dprint("check_predecessor_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                self.existing_node.node_info.predecessor_info = node_info
+                ChordUtil.dprint(lambda: "check_predecessor_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                                  + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info.successor_info_list[0]))
 
-            ChordUtil.dprint("check_predecessor_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            ChordUtil.dprint(lambda: "check_predecessor_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                   + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info.successor_info_list[0]))
 
             # この時点で認識している predecessor がノードダウンしていないかチェックする
-            # is_pred_alived = ChordUtil.is_node_alive(cast('NodeInfo', self.existing_node.node_info.predecessor_info).address_str)
-            ret = ChordUtil.is_node_alive(cast('NodeInfo', self.existing_node.node_info.predecessor_info).address_str)
+            # is_pred_alived = ChordUtil.is_node_alive(cast('NodeRef', self.existing_node.node_info.predecessor_info).address_str)
+            ret = ChordUtil.is_node_alive(cast('NodeRef', self.existing_node.node_info.predecessor_info).address_str)
             if (ret.is_ok):
                 is_pred_alived : bool = cast(bool, ret.result)
             else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE
@@ -424,40 +478,43 @@ class Stabilizer:
             if is_pred_alived:
                 distance_check = ChordUtil.calc_distance_between_nodes_left_mawari(self.existing_node.node_info.node_id, node_info.node_id)
                 distance_cur = ChordUtil.calc_distance_between_nodes_left_mawari(self.existing_node.node_info.node_id,
-                                                                                 cast('NodeInfo',self.existing_node.node_info.predecessor_info).node_id)
+                                                                                 cast('NodeRef',self.existing_node.node_info.predecessor_info).node_id)
 
                 # 確認を求められたノードの方が現在の predecessor より predecessorらしければ
                 # 経路表の情報を更新する
                 if distance_check < distance_cur:
-                    self.existing_node.node_info.predecessor_info = node_info.get_partial_deepcopy()
+                    # 元の predecessor の successor は node_info のノードに変わるべきであるため、
+                    # 元の predecessor に stabilize処理 を行わせる
+                    ChordUtil.request_stabilize(cast('NodeRef', self.existing_node.node_info.predecessor_info).address_str)
+                    self.existing_node.node_info.predecessor_info = node_info
 
-                    ChordUtil.dprint("check_predecessor_3," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                    ChordUtil.dprint(lambda: "check_predecessor_3," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                           + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info.successor_info_list[0]) + ","
                           + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info.predecessor_info))
             else: # predecessorがダウンしていた場合は無条件でチェックを求められたノードをpredecessorに設定する
-                self.existing_node.node_info.predecessor_info = node_info.get_partial_deepcopy()
+                self.existing_node.node_info.predecessor_info = node_info
 
             return PResult.Ok(True)
         finally:
-            self.existing_node.node_info.lock_of_pred_info.release()
+            self.existing_node.node_info.lock_of_pred_info.release_write()
 
     # ロックは呼び出し元のstabilize_successor_innerでとってある前提
     # TODO: DownedExp at stabilize_successor_inner_fill_succ_list
     def stabilize_successor_inner_fill_succ_list(self) -> PResult[bool]:
         # 本メソッド呼び出しでsuccessorとして扱うノードはsuccessorListからダウンしているノードを取り除いた上で
         # successor_info_list[0]となったノードとする
-        ChordUtil.dprint("stabilize_successor_inner_fill_succ_list_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info))
+        ChordUtil.dprint(lambda: "stabilize_successor_inner_fill_succ_list_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info))
 
         if self.existing_node.is_alive == False:
             # 処理の合間でkillされてしまっていた場合の考慮
             # 何もしないで終了する
             ChordUtil.dprint(
-                "stabilize_successor_innner_fill_succ_list_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                lambda: "stabilize_successor_innner_fill_succ_list_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                 + "REQUEST_RECEIVED_BUT_I_AM_ALREADY_DEAD")
             #raise NodeIsDownedExceptiopn()
             return PResult.Err(False, ErrorCode.NodeIsDownedException_CODE)
 
-        successor_list_tmp: List['NodeInfo'] = []
+        successor_list_tmp: List['NodeRef'] = []
         for idx in range(len(self.existing_node.node_info.successor_info_list)):
             # try:
                 #if ChordUtil.is_node_alive(self.existing_node.node_info.successor_info_list[idx].address_str):
@@ -466,7 +523,7 @@ class Stabilizer:
                 if cast(bool, ret.result) == True:
                     successor_list_tmp.append(self.existing_node.node_info.successor_info_list[idx])
                 else: # == False
-                    ChordUtil.dprint("stabilize_successor_inner_fill_succ_list_1,SUCCESSOR_IS_DOWNED,"
+                    ChordUtil.dprint(lambda: "stabilize_successor_inner_fill_succ_list_1,SUCCESSOR_IS_DOWNED,"
                                      + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                                      + ChordUtil.gen_debug_str_of_node(
                         self.existing_node.node_info.successor_info_list[idx]))
@@ -487,11 +544,11 @@ class Stabilizer:
         if len(successor_list_tmp) == 0:
             # successorListの全てのノードを当たっても、生きているノードが存在しなかった場合
             # 起きてはいけない状況なので例外を投げてプログラムを終了させる
-            ChordUtil.dprint("stabilize_successor_inner_fill_succ_list_3,,"
+            ChordUtil.dprint(lambda: "stabilize_successor_inner_fill_succ_list_3,,"
                              + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + str(len(self.existing_node.node_info.successor_info_list)) + ","
                              + str(self.existing_node.node_info.successor_info_list),
-                             flush=True)
+                             flush=True, level=LogLevel.WARN)
             raise Exception("Maybe some parameters related to fault-tolerance of Chord network are not appropriate")
         else:
             self.existing_node.node_info.successor_info_list = successor_list_tmp
@@ -507,25 +564,25 @@ class Stabilizer:
         if successor.node_info.predecessor_info == None:
             pred_id_of_successor = -1
             # 以下の呼び出しにより、successorの predecessor_info には自ノードが設定される
-            successor.endpoints.grpc__check_predecessor(self.existing_node.node_info)
+            successor.endpoints.grpc__check_predecessor(self.existing_node.node_info.get_ref())
         else:
-            pred_id_of_successor = cast('NodeInfo', successor.node_info.predecessor_info).node_id
+            pred_id_of_successor = cast('NodeRef', successor.node_info.predecessor_info).node_id
 
         ChordUtil.dprint(
-            "stabilize_successor_inner_fix_chain_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            lambda: "stabilize_successor_inner_fix_chain_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
             + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info.successor_info_list[0]) + ","
             + str(pred_id_of_successor))
 
         # predecessor_infoが未設定であったが、grpc_check_predecessorによって設定された場合のため再度
         # pred_id_of_successorを取得する
         # なお、後続の処理を進める意味は無いが、ひとまずそのまま進める
-        pred_id_of_successor = cast('NodeInfo', successor.node_info.predecessor_info).node_id
+        pred_id_of_successor = cast('NodeRef', successor.node_info.predecessor_info).node_id
 
         if self.existing_node.is_alive == False:
             # 処理の合間でkillされてしまっていた場合の考慮
             # 何もしないで終了する
             ChordUtil.dprint(
-                "stabilize_successor_innner_fix_chain_1_5," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                lambda: "stabilize_successor_innner_fix_chain_1_5," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                 + "REQUEST_RECEIVED_BUT_I_AM_ALREADY_DEAD")
             #raise NodeIsDownedExceptiopn()
             return PResult.Err(False, ErrorCode.NodeIsDownedException_CODE)
@@ -538,7 +595,7 @@ class Stabilizer:
             # パターン1
             # 特に訂正は不要
             ChordUtil.dprint(
-                "stabilize_successor_inner_fix_chain_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                lambda: "stabilize_successor_inner_fix_chain_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                 + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info.successor_info_list[0]) + ","
                 + str(pred_id_of_successor))
         else:
@@ -552,8 +609,8 @@ class Stabilizer:
             #     を呼び出すまでもなく、successorのpredecessorは自身になっている. 従って後続でノードダウン検出した場合の
             #     check_predecessorの呼び出しは不要であるが呼び出しは行うようにしておく
 
-                #successor.endpoints.grpc__check_predecessor(self.existing_node.node_info)
-            ret = successor.endpoints.grpc__check_predecessor(self.existing_node.node_info)
+                #successor.endpoints.grpc__check_predecessor(self.existing_node.node_info.get_ref())
+            ret = successor.endpoints.grpc__check_predecessor(self.existing_node.node_info.get_ref())
             if (ret.is_ok):
                 pass
             else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE
@@ -561,7 +618,7 @@ class Stabilizer:
                 # した際にcheck_predecessorで発生する場合があるので、ここで対処する
                 # join処理中のノードのpredecessor, sucessorはjoin処理の中で適切に設定されているはずなの特に処理は不要
                 ChordUtil.dprint(
-                    "stabilize_successor_inner_fix_chain_3," + ChordUtil.gen_debug_str_of_node(
+                    lambda: "stabilize_successor_inner_fix_chain_3," + ChordUtil.gen_debug_str_of_node(
                         self.existing_node.node_info) + ","
                     + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info.successor_info_list[0]))
 
@@ -574,6 +631,11 @@ class Stabilizer:
             #             self.existing_node.node_info) + ","
             #         + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info.successor_info_list[0]))
 
+            # check_predecessor により successor の predecessor が自身に変わっている場合があるため(元の predecessor が
+            # ダウンしていた場合など)、取得し直す. 取得し直さないと、自身を自身の successor に設定してしまう
+            # TODO: x direct access to predecessor_info of successor at stabilize_successor_inner_fix_chain
+            pred_id_of_successor = cast('NodeRef', successor.node_info.predecessor_info).node_id
+
             # TODO: x direct access to node_info of successor at stabilize_successor_inner_fix_chain
             distance_unknown = ChordUtil.calc_distance_between_nodes_left_mawari(successor.node_info.node_id,
                                                                                  pred_id_of_successor)
@@ -592,16 +654,16 @@ class Stabilizer:
 
                     # successor[0]の変更は行わず、ダウンしていたノードではなく自身をpredecessorとするよう(間接的に)要請する
                     # TODO: check_predecessor call at stabilize_successor_inner_fix_chain
-                    #successor.endpoints.grpc__check_predecessor(self.existing_node.node_info)
-                    ret2 = successor.endpoints.grpc__check_predecessor(self.existing_node.node_info)
+                    #successor.endpoints.grpc__check_predecessor(self.existing_node.node_info.get_ref())
+                    ret2 = successor.endpoints.grpc__check_predecessor(self.existing_node.node_info.get_ref())
                     if (ret2.is_ok):
                         pass
                     else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE
-                        ChordUtil.dprint("stabilize_successor_inner_fix_chain_4," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                        ChordUtil.dprint(lambda: "stabilize_successor_inner_fix_chain_4," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                             + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info.successor_info_list[0]))
                         return PResult.Err(False, cast(int, ret2.err_code))
 
-                    ChordUtil.dprint("stabilize_successor_inner_fix_chain_5," + ChordUtil.gen_debug_str_of_node(
+                    ChordUtil.dprint(lambda: "stabilize_successor_inner_fix_chain_5," + ChordUtil.gen_debug_str_of_node(
                         self.existing_node.node_info) + ","
                                      + ChordUtil.gen_debug_str_of_node(
                         self.existing_node.node_info.successor_info_list[0]))
@@ -612,22 +674,21 @@ class Stabilizer:
 
                 # TODO: x direct access to predecessor_info of successor at stabilize_successor_inner_fix_chain
                 # new_successor = ChordUtil.get_node_by_address(
-                #     cast('NodeInfo', successor.node_info.predecessor_info).address_str)
-                ret3 = ChordUtil.get_node_by_address(cast('NodeInfo', successor.node_info.predecessor_info).address_str)
+                #     cast('NodeRef', successor.node_info.predecessor_info).address_str)
+                ret3 = ChordUtil.get_node_by_address(cast('NodeRef', successor.node_info.predecessor_info).address_str)
                 if (ret3.is_ok):
                     new_successor: 'ChordNode' = cast('ChordNode', ret3.result)
                 else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE
                     return handle_err()
 
                 # TODO: x direct access to node_info of new_successor at stabilize_successor_inner_fix_chain
-                self.existing_node.node_info.successor_info_list.insert(0,
-                                                                        new_successor.node_info.get_partial_deepcopy())
+                self.existing_node.node_info.successor_info_list = [new_successor.node_info.get_ref()] \
+                                                                   + self.existing_node.node_info.successor_info_list
 
                 # 新たなsuccesorに対して担当データのレプリカを渡す
-                tantou_data_list: List[DataIdAndValue] = \
-                    self.existing_node.data_store.get_all_tantou_data()
-                # TODO: receive_replica call at stabilize_successor_inner_fix_chain
-                new_successor.endpoints.grpc__receive_replica(tantou_data_list)
+                # (ダイジェストを交換し、保持していないデータのみを渡す)
+                with self.existing_node.node_info.lock_of_datastore:
+                    self.existing_node.data_store.resync_replica(new_successor)
 
                 # successorListから溢れたノードがいた場合、自ノードの担当データのレプリカを削除させ、successorListから取り除く
                 # (この呼び出しの中でsuccessorListからのノード情報の削除も行われる)
@@ -642,15 +703,15 @@ class Stabilizer:
                 # 新たなsuccessorに対して自身がpredecessorでないか確認を要請し必要であれ
                 # ば情報を更新してもらう
                 # TODO: check_predecessor call at stabilize_successor_inner_fix_chain
-                #new_successor.endpoints.grpc__check_predecessor(self.existing_node.node_info)
-                ret5 = new_successor.endpoints.grpc__check_predecessor(self.existing_node.node_info)
+                #new_successor.endpoints.grpc__check_predecessor(self.existing_node.node_info.get_ref())
+                ret5 = new_successor.endpoints.grpc__check_predecessor(self.existing_node.node_info.get_ref())
                 if (ret5.is_ok):
                     pass
                 else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE
                     return handle_err()
 
                 # TODO: x direct access to node_info of new_successor at stabilize_successor_inner_fix_chain
-                ChordUtil.dprint("stabilize_successor_inner_fix_chain_3," + ChordUtil.gen_debug_str_of_node(
+                ChordUtil.dprint(lambda: "stabilize_successor_inner_fix_chain_3," + ChordUtil.gen_debug_str_of_node(
                     self.existing_node.node_info) + ","
                                  + ChordUtil.gen_debug_str_of_node(
                     self.existing_node.node_info.successor_info_list[0]) + ","
@@ -664,7 +725,7 @@ class Stabilizer:
                 #
                 #     # successor[0]の変更は行わず、ダウンしていたノードではなく自身をpredecessorとするよう(間接的に)要請する
                 #     # TODO: check_predecessor call at stabilize_successor_inner_fix_chain
-                #     successor.endpoints.grpc__check_predecessor(self.existing_node.node_info)
+                #     successor.endpoints.grpc__check_predecessor(self.existing_node.node_info.get_ref())
                 #     ChordUtil.dprint("stabilize_successor_inner_fix_chain_4," + ChordUtil.gen_debug_str_of_node(
                 #         self.existing_node.node_info) + ","
                 #                      + ChordUtil.gen_debug_str_of_node(
@@ -679,15 +740,15 @@ class Stabilizer:
     #　注: この呼び出しにより、self.existing_node.node_info.successor_info_list[0] は更新される
     #  規約: 呼び出し元は、selfが生きていることを確認した上で本メソッドを呼び出さなければならない
     # TODO: InternalExp, DownedExp at stabilize_successor_inner
-    def stabilize_successor_inner(self) -> PResult[Optional['NodeInfo']]:
-        if self.existing_node.node_info.lock_of_pred_info.acquire(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
-            ChordUtil.dprint("stabilize_successor_inner_0_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+    def stabilize_successor_inner(self) -> PResult[Optional['NodeRef']]:
+        if self.existing_node.node_info.lock_of_pred_info.acquire_write(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+            ChordUtil.dprint(lambda: "stabilize_successor_inner_0_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + "LOCK_ACQUIRE_TIMEOUT")
             #raise InternalControlFlowException("gettting lock of predecessor_info is timedout.")
             return PResult.Err(None, ErrorCode.InternalControlFlowException_CODE)
-        if self.existing_node.node_info.lock_of_succ_infos.acquire(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
-            self.existing_node.node_info.lock_of_pred_info.release()
-            ChordUtil.dprint("find_successor_inner_0_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+        if self.existing_node.node_info.lock_of_succ_infos.acquire_write(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+            self.existing_node.node_info.lock_of_pred_info.release_write()
+            ChordUtil.dprint(lambda: "find_successor_inner_0_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + "LOCK_ACQUIRE_TIMEOUT")
             #raise InternalControlFlowException("gettting lock of succcessor_info_list is timedout.")
             return PResult.Err(None, ErrorCode.InternalControlFlowException_CODE)
@@ -695,10 +756,10 @@ class Stabilizer:
         if self.existing_node.is_alive == False:
             # 処理の合間でkillされてしまっていた場合の考慮
             # 何もしないで終了する
-            self.existing_node.node_info.lock_of_succ_infos.release()
-            self.existing_node.node_info.lock_of_pred_info.release()
+            self.existing_node.node_info.lock_of_succ_infos.release_write()
+            self.existing_node.node_info.lock_of_pred_info.release_write()
             ChordUtil.dprint(
-                "stabilize_successor_innner_0_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                lambda: "stabilize_successor_innner_0_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                 + "REQUEST_RECEIVED_BUT_I_AM_ALREADY_DEAD")
             #raise InternalControlFlowException("request received but I am already dead.")
             return PResult.Err(None, ErrorCode.InternalControlFlowException_CODE)
@@ -737,24 +798,33 @@ class Stabilizer:
             else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE || ret.err_code == ErrorCode.NodeIsDownedException_CODE
                 return PResult.Err(None, cast(int, ret3.err_code))
 
-            return PResult.Ok(self.existing_node.node_info.successor_info_list[0].get_partial_deepcopy())
+            return PResult.Ok(self.existing_node.node_info.successor_info_list[0])
         finally:
-            self.existing_node.node_info.lock_of_succ_infos.release()
-            self.existing_node.node_info.lock_of_pred_info.release()
+            self.existing_node.node_info.lock_of_succ_infos.release_write()
+            self.existing_node.node_info.lock_of_pred_info.release_write()
+
+    # stabilize_successor_inner を行い、その結果の自ノードの successor_info_list[0] と successor_info_list を
+    # まとめて返す. stabilize_successor から successor に対して stabilize_successor_inner と pass_successor_list
+    # を別々に呼び出す代わりに用い、1回の呼び出しで successor_info_list を組み立てられるようにする
+    def stabilize_successor_inner_with_succ_list(self) -> PResult[Optional[Tuple['NodeRef', List['NodeRef']]]]:
+        ret = self.stabilize_successor_inner()
+        if ret.is_ok == False:
+            return PResult.Err(None, cast(int, ret.err_code))
+        return PResult.Ok((cast('NodeRef', ret.result), self.pass_successor_list()))
 
     # successorListに関するstabilize処理を行う
     # コメントにおいては、successorListの構造を意識した記述の場合、一番近いsuccessorを successor[0] と
     # 記述し、以降に位置するノードは近い順に successor[idx] と記述する
     # TODO: InternalExp at stabilize_successor
     def stabilize_successor(self) -> PResult[bool]:
-        if self.existing_node.node_info.lock_of_pred_info.acquire(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
-            ChordUtil.dprint("stabilize_successor_0_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+        if self.existing_node.node_info.lock_of_pred_info.acquire_write(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+            ChordUtil.dprint(lambda: "stabilize_successor_0_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + "LOCK_ACQUIRE_TIMEOUT")
             #raise InternalControlFlowException("gettting lock of predecessor_info is timedout.")
             return PResult.Err(False, ErrorCode.InternalControlFlowException_CODE)
-        if self.existing_node.node_info.lock_of_succ_infos.acquire(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
-            self.existing_node.node_info.lock_of_pred_info.release()
-            ChordUtil.dprint("stabilize_successor_0_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+        if self.existing_node.node_info.lock_of_succ_infos.acquire_write(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+            self.existing_node.node_info.lock_of_pred_info.release_write()
+            ChordUtil.dprint(lambda: "stabilize_successor_0_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + "LOCK_ACQUIRE_TIMEOUT")
             #raise InternalControlFlowException("gettting lock of succcessor_info_list is timedout.")
             return PResult.Err(False, ErrorCode.InternalControlFlowException_CODE)
@@ -762,19 +832,21 @@ class Stabilizer:
         if self.existing_node.is_alive == False:
             # 処理の合間でkillされてしまっていた場合の考慮
             # 何もしないで終了する
-            self.existing_node.node_info.lock_of_succ_infos.release()
-            self.existing_node.node_info.lock_of_pred_info.release()
-            ChordUtil.dprint("stabilize_successor_0_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            self.existing_node.node_info.lock_of_succ_infos.release_write()
+            self.existing_node.node_info.lock_of_pred_info.release_write()
+            ChordUtil.dprint(lambda: "stabilize_successor_0_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + "REQUEST_RECEIVED_BUT_I_AM_ALREADY_DEAD")
             return PResult.Ok(True)
 
+        self.stabilize_successor_cnt += 1
+
         # with self.existing_node.node_info.lock_of_datastore:
         #     # stabilizeの度に、担当データとして保持しているデータ全てのレプリカを successor_info_list 内のノードに
         #     # 配布する
         #     self.existing_node.data_store.distribute_replica()
 
         try:
-            ChordUtil.dprint("stabilize_successor_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            ChordUtil.dprint(lambda: "stabilize_successor_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                   + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info.successor_info_list[0]))
 
             # 後続のノード（successorや、successorのsuccessor ....）を辿っていき、
@@ -786,11 +858,11 @@ class Stabilizer:
             # を返答させるといったものである.
 
             # 最終的に self.existing_node.node_info.successor_info_listに上書きするリスト
-            updated_list : List['NodeInfo'] = []
+            updated_list : List['NodeRef'] = []
 
             # 最初は自ノードを指定してそのsuccessor[0]を取得するところからスタートする
             cur_node : 'ChordNode' = self.existing_node
-            last_node_info : 'NodeInfo' = self.existing_node.node_info
+            last_node_info : 'NodeRef' = self.existing_node.node_info.get_ref()
 
             tried_getting_succ_cnt = 0
             exception_occured = False
@@ -802,43 +874,70 @@ class Stabilizer:
                 try:
                     if exception_occured == False:
                         # TODO: stabilize_successor_inner call at stabilize_successor
-                        #cur_node_info : 'NodeInfo' = cur_node.endpoints.grpc__stabilize_successor_inner()
-                        ret = cur_node.endpoints.grpc__stabilize_successor_inner()
-                        if (ret.is_ok):
-                            cur_node_info : 'NodeInfo' = cast('NodeInfo', ret.result)
+                        #cur_node_info : 'NodeRef' = cur_node.endpoints.grpc__stabilize_successor_inner()
+                        if cur_node is not self.existing_node:
+                            self.stabilize_successor_rpc_cnt += 1
+                        if gval.ENABLE_SUCC_LIST_PIGGYBACK:
+                            ret = cur_node.endpoints.grpc__stabilize_successor_inner_with_succ_list()
+                        else:
+                            ret = cur_node.endpoints.grpc__stabilize_successor_inner()
+                        if (ret.is_ok) and gval.ENABLE_SUCC_LIST_PIGGYBACK:
+                            cur_node_info, piggybacked_succ_list = cast(Tuple['NodeRef', List['NodeRef']], ret.result)
+                            # 応答に含まれていた cur_node の successor_info_list を、チェーンを辿れなくなった際の
+                            # バックアップとして用いる. 先頭は cur_node_info なので、インデックスは 0 とする
+                            cur_backup_succ_list = piggybacked_succ_list
+                            cur_backup_node_info_idx = 0
+                            filled_len = len(updated_list)
+                            if filled_len > 0:
+                                # cur_node は自ノード以外で stabilize_successor_inner の中で successor_info_list の
+                                # 生存確認を済ませているため、その successor_info_list で残りを埋めて探索を終える
+                                for node_info in piggybacked_succ_list:
+                                    if len(updated_list) >= gval.SUCCESSOR_LIST_NORMAL_LEN \
+                                            or node_info.node_id == self.existing_node.node_info.node_id \
+                                            or node_info in updated_list:
+                                        break
+                                    updated_list.append(node_info)
+                                if len(updated_list) > filled_len:
+                                    ChordUtil.dprint(
+                                        lambda: "stabilize_successor_3_6,FILLED_BY_PIGGYBACKED_SUCC_LIST," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                                        + str(updated_list))
+                                    break
+                        elif (ret.is_ok):
+                            cur_node_info : 'NodeRef' = cast('NodeRef', ret.result)
                         else:  # ret.err_code == ErrorCode.InternalControlFlowException_CODE || ret.err_code == ErrorCode.NodeIsDownedException_CODE
                             # cur_nodeがjoin中のノードでget_node_by_addressで例外が発生してしまったか、
                             # ロックの取得でタイムアウトが発生した
                             # あるいは、cur_node(selfの場合もあれば他ノードの場合もある)が、生存している状態が通常期待される
                             # ところで、node_kill_th の処理がノードをダウン状態にしてしまった
                             ChordUtil.dprint(
-                                "stabilize_successor_4," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info)
+                                lambda: "stabilize_successor_4," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info)
                                 + ",TARGET_NODE_DOES_NOT_EXIST_EXCEPTION_IS_RAISED")
                             exception_occured = True
                             continue
                     else:
-                        cur_node_info : 'NodeInfo' = last_node_info
+                        cur_node_info : 'NodeRef' = last_node_info
 
                     if cur_node_info.node_id == self.existing_node.node_info.node_id or exception_occured == True:
                         # 返ってきたノード情報は無視し、元々持っている node_info_list内のノードを返ってきたノード情報として扱う
                         # 長さが足りなかった場合はあきらめる
                         if cur_backup_node_info_idx + 1 < len(cur_backup_succ_list):
-                            ChordUtil.dprint("stabilize_successor_2,RETURNED_NODE_SAME_AS_SELF," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                            ChordUtil.dprint(lambda: "stabilize_successor_2,RETURNED_NODE_SAME_AS_SELF," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                                              + ChordUtil.gen_debug_str_of_node(cur_node_info))
                             # 返ってきたノードが適切なものでなかったという意味で、正常にループが回った場合や、例外処理が行われた
                             # 場合のインクリメントに加えて、インクリメントを行っておかなくてはならない
                             cur_backup_node_info_idx += 1
-                            cur_node_info = cur_backup_succ_list[cur_backup_node_info_idx].get_partial_deepcopy()
+                            cur_node_info = cur_backup_succ_list[cur_backup_node_info_idx]
                         else:
-                            ChordUtil.dprint("stabilize_successor_2_5,RETURNED_NODE_SAME_AS_SELF_AND_END_SEARCH_SUCCESSOR," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                            ChordUtil.dprint(lambda: "stabilize_successor_2_5,RETURNED_NODE_SAME_AS_SELF_AND_END_SEARCH_SUCCESSOR," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                                              + ChordUtil.gen_debug_str_of_node(cur_node_info))
                             break
 
-                    ChordUtil.dprint("stabilize_successor_3," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                    ChordUtil.dprint(lambda: "stabilize_successor_3," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                                      + ChordUtil.gen_debug_str_of_node(cur_node_info) + ","
                                      + str(exception_occured))
 
                     #cur_node : 'ChordNode' = ChordUtil.get_node_by_address(cur_node_info.address_str)
+                    self.stabilize_successor_rpc_cnt += 1
                     ret2 = ChordUtil.get_node_by_address(cur_node_info.address_str)
                     if (ret2.is_ok):
                         cur_node: 'ChordNode' = cast('ChordNode', ret2.result)
@@ -848,7 +947,7 @@ class Stabilizer:
                         # あるいは、cur_node(selfの場合もあれば他ノードの場合もある)が、生存している状態が通常期待される
                         # ところで、node_kill_th の処理がノードをダウン状態にしてしまった
                         ChordUtil.dprint(
-                            "stabilize_successor_4," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info)
+                            lambda: "stabilize_successor_4," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info)
                             + ",TARGET_NODE_DOES_NOT_EXIST_EXCEPTION_IS_RAISED")
                         exception_occured = True
                         continue
@@ -857,14 +956,18 @@ class Stabilizer:
                     # チェーンを辿っている中で、生存しているノードが得られた場合は、辿っていく中で
                     # 例外が発生した際などに、チェーンを辿らずにノード情報を得るために用いる successorのリスト
                     # をそちらに置き換える
-                    # TODO: pass_successor_list call at stabilize_successor
-                    cur_backup_succ_list = cur_node.endpoints.grpc__pass_successor_list()
-                    # 利用するリストが置き換わったので、それに合わせてインデックスをリセットする
-                    # finally節で +1 するので筋悪ではあるが、-1にしておく
-                    cur_backup_node_info_idx = -1
+                    # gval.ENABLE_SUCC_LIST_PIGGYBACK が True の場合は、次の cur_node への呼び出しの応答に
+                    # 含まれているリストを用いるため、ここでは取得しない
+                    if gval.ENABLE_SUCC_LIST_PIGGYBACK == False:
+                        # TODO: pass_successor_list call at stabilize_successor
+                        self.stabilize_successor_rpc_cnt += 1
+                        cur_backup_succ_list = cur_node.endpoints.grpc__pass_successor_list()
+                        # 利用するリストが置き換わったので、それに合わせてインデックスをリセットする
+                        # finally節で +1 するので筋悪ではあるが、-1にしておく
+                        cur_backup_node_info_idx = -1
 
                     ChordUtil.dprint(
-                        "stabilize_successor_3_5," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                        lambda: "stabilize_successor_3_5," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                         + ChordUtil.gen_debug_str_of_node(cur_node_info) + ","
                         + str(cur_backup_succ_list) + ","
                         + str(cur_backup_node_info_idx) + ","
@@ -895,28 +998,104 @@ class Stabilizer:
                 pass
             else:
                 self.existing_node.node_info.successor_info_list = updated_list
-
-            ChordUtil.dprint("stabilize_successor_5," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                # finger_tableのインデックス0は必ずsuccessorになるはずなので、合わせて更新しておく.
+                # closest_preceding_finger は finger_table のみを参照するため、successor が変わったまま古い値が
+                # 残っていると、探索が本来の predecessor の手前で終了してしまう
+                if not (self.existing_node.node_info.finger_table[0] == updated_list[0]):
+                    self.existing_node.node_info.finger_table[0] = updated_list[0]
+                    # finger_table[0] でカバーされていたエントリも更新されるよう、次の tick で更新させる
+                    self.finger_refresh_scheduler.report_refresh(0, True)
+
+            ChordUtil.dprint(lambda: "stabilize_successor_5," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                          + str(self.existing_node.node_info.successor_info_list))
 
             return PResult.Ok(True)
         finally:
-            self.existing_node.node_info.lock_of_succ_infos.release()
-            self.existing_node.node_info.lock_of_pred_info.release()
+            self.existing_node.node_info.lock_of_succ_infos.release_write()
+            self.existing_node.node_info.lock_of_pred_info.release_write()
+
+    # finger_table のエントリのうち、FingerRefreshScheduler が選んだものを1つだけ更新する.
+    # 更新したエントリの担当ノードが上位のエントリの開始IDも担当している場合は、上位のエントリにも
+    # 同じノードを設定し、それらは更新対象から外す
+    def stabilize_finger_table_adaptive(self) -> PResult[bool]:
+        scheduler = self.finger_refresh_scheduler
+        idx = scheduler.pick_next_idx()
+        if idx == None:
+            return PResult.Ok(True)
+        casted_idx = cast(int, idx)
+
+        old_entry = self.existing_node.node_info.finger_table[casted_idx]
+        ret = self.stabilize_finger_table(casted_idx)
+        new_entry = self.existing_node.node_info.finger_table[casted_idx]
+        # 失敗した場合も次の tick で再度更新されるよう、値が変わったものとして扱う
+        scheduler.report_refresh(casted_idx, ret.is_ok == False or not (old_entry == new_entry))
+        self.fill_covered_fingers(casted_idx)
+        return ret
+
+    # finger_table[idx] の担当ノードでカバーされる上位のエントリに同じノードを設定する.
+    # エントリの開始IDの担当ノードと、その手前のノードの間には他のノードが存在しないため、
+    # 担当ノードまでの距離が 2^j 以上であれば、j番目のエントリの開始IDの担当ノードも同じノードとなる.
+    # Proximity Neighbor Selection を行う場合、エントリは開始IDの担当ノードとは限らないため行わない
+    def fill_covered_fingers(self, idx : int):
+        if self.existing_node.node_info.lock_of_pred_info.acquire_write(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+            return
+        if self.existing_node.node_info.lock_of_succ_infos.acquire_write(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+            self.existing_node.node_info.lock_of_pred_info.release_write()
+            return
+        try:
+            base_entry = self.existing_node.node_info.finger_table[idx]
+            covered_end_idx = idx + 1
+            if base_entry != None and gval.ENABLE_PROXIMITY_NEIGHBOR_SELECTION == False:
+                distance = ChordUtil.calc_distance_between_nodes_right_mawari(
+                    self.existing_node.node_info.node_id, cast('NodeRef', base_entry).node_id)
+                while covered_end_idx < gval.ID_SPACE_BITS and distance >= 2**covered_end_idx:
+                    self.existing_node.node_info.finger_table[covered_end_idx] = base_entry
+                    covered_end_idx += 1
+            self.finger_refresh_scheduler.update_covered(idx, covered_end_idx)
+        finally:
+            self.existing_node.node_info.lock_of_succ_infos.release_write()
+            self.existing_node.node_info.lock_of_pred_info.release_write()
+
+    # Proximity Neighbor Selection. finger_table[idx] には、自身のIDから 2^idx 以上 2^(idx+1) 未満の距離にある
+    # ノードであれば、どのノードを格納しても探索のホップ数のオーダーは変わらない. そこで、エントリの開始IDの
+    # 担当ノードである found_node と、その successor_info_list 内のノードのうち、この範囲に含まれるものの中から
+    # 自身からの遅延が最も小さいノードを選ぶ
+    # 必要なロックは呼び出し元でとってある前提
+    def select_proximate_finger(self, idx : int, found_node : 'ChordNode') -> 'NodeRef':
+        my_info = self.existing_node.node_info
+        found_info = found_node.node_info.get_ref()
+        # TODO: pass_successor_list call at select_proximate_finger
+        candidates : List['NodeRef'] = [found_info] + found_node.endpoints.grpc__pass_successor_list()
+        distances = ChordUtil.calc_distance_between_nodes_right_mawari_batch(
+            my_info.node_id, [candidate.node_id for candidate in candidates])
+        valid_candidates : List['NodeRef'] = [candidate for candidate, distance in zip(candidates, distances)
+                                              if 2**idx <= distance < 2**(idx + 1) and candidate.node_id != my_info.node_id]
+        if len(valid_candidates) == 0:
+            # found_node が範囲外の場合は、範囲内にノードが存在しないため found_node をそのまま用いる
+            return found_info
+
+        selected_info = min(valid_candidates, key=lambda candidate: ChordUtil.get_link_latency(my_info.address_str, candidate.address_str))
+        if selected_info.node_id != found_info.node_id:
+            ret = ChordUtil.get_node_by_address(selected_info.address_str)
+            if ret.is_ok == False:
+                return found_info
+        ChordUtil.dprint(lambda: "select_proximate_finger_1," + ChordUtil.gen_debug_str_of_node(my_info) + ","
+                         + ChordUtil.gen_debug_str_of_node(found_info) + "->" + ChordUtil.gen_debug_str_of_node(selected_info))
+        return selected_info
 
     # FingerTableに関するstabilize処理を行う
     # 一回の呼び出しで1エントリを更新する
     # FingerTableのエントリはこの呼び出しによって埋まっていく
     # TODO: InternalExp at stabilize_finger_table
     def stabilize_finger_table(self, idx) -> PResult[bool]:
-        if self.existing_node.node_info.lock_of_pred_info.acquire(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
-            ChordUtil.dprint("stabilize_finger_table_0_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+        if self.existing_node.node_info.lock_of_pred_info.acquire_write(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+            ChordUtil.dprint(lambda: "stabilize_finger_table_0_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + "LOCK_ACQUIRE_TIMEOUT")
             #raise InternalControlFlowException("gettting lock of predecessor_info is timedout.")
             return PResult.Err(False, ErrorCode.InternalControlFlowException_CODE)
-        if self.existing_node.node_info.lock_of_succ_infos.acquire(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
-            self.existing_node.node_info.lock_of_pred_info.release()
-            ChordUtil.dprint("stabilize_finger_table_0_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+        if self.existing_node.node_info.lock_of_succ_infos.acquire_write(timeout=gval.LOCK_ACQUIRE_TIMEOUT) == False:
+            self.existing_node.node_info.lock_of_pred_info.release_write()
+            ChordUtil.dprint(lambda: "stabilize_finger_table_0_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + "LOCK_ACQUIRE_TIMEOUT")
             #raise InternalControlFlowException("gettting lock of succcessor_info_list is timedout.")
             return PResult.Err(False, ErrorCode.InternalControlFlowException_CODE)
@@ -924,18 +1103,18 @@ class Stabilizer:
         if self.existing_node.is_alive == False:
             # 処理の合間でkillされてしまっていた場合の考慮
             # 何もしないで終了する
-            self.existing_node.node_info.lock_of_succ_infos.release()
-            self.existing_node.node_info.lock_of_pred_info.release()
+            self.existing_node.node_info.lock_of_succ_infos.release_write()
+            self.existing_node.node_info.lock_of_pred_info.release_write()
             if self.existing_node.is_alive == False:
                 ChordUtil.dprint(
-                    "stabilize_finger_table_0_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                    lambda: "stabilize_finger_table_0_2," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                     + "REQUEST_RECEIVED_BUT_I_AM_ALREADY_DEAD")
                 return PResult.Ok(True)
 
         try:
             ChordUtil.dprint_routing_info(self.existing_node, sys._getframe().f_code.co_name)
 
-            ChordUtil.dprint("stabilize_finger_table_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info))
+            ChordUtil.dprint(lambda: "stabilize_finger_table_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info))
 
             # FingerTableの各要素はインデックスを idx とすると 2^IDX 先のIDを担当する、もしくは
             # 担当するノードに最も近いノードが格納される
@@ -953,7 +1132,7 @@ class Stabilizer:
                 # 今回のエントリの更新はあきらめるが、例外の発生原因はおおむね見つけたノードがダウンしていた
                 # ことであるので、更新対象のエントリには None を設定しておく
                 self.existing_node.node_info.finger_table[idx] = None
-                ChordUtil.dprint("stabilize_finger_table_2_5,NODE_IS_DOWNED," + ChordUtil.gen_debug_str_of_node(
+                ChordUtil.dprint(lambda: "stabilize_finger_table_2_5,NODE_IS_DOWNED," + ChordUtil.gen_debug_str_of_node(
                     self.existing_node.node_info))
                 return PResult.Ok(True)
 
@@ -966,13 +1145,16 @@ class Stabilizer:
             #     return
 
             # TODO: x direct access to node_info of found_node at stabilize_finger_table
-            self.existing_node.node_info.finger_table[idx] = found_node.node_info.get_partial_deepcopy()
+            if gval.ENABLE_PROXIMITY_NEIGHBOR_SELECTION:
+                self.existing_node.node_info.finger_table[idx] = self.select_proximate_finger(idx, found_node)
+            else:
+                self.existing_node.node_info.finger_table[idx] = found_node.node_info.get_ref()
 
             # TODO: x direct access to node_info of found_node at stabilize_finger_table
-            ChordUtil.dprint("stabilize_finger_table_3," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+            ChordUtil.dprint(lambda: "stabilize_finger_table_3," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                              + ChordUtil.gen_debug_str_of_node(found_node.node_info))
 
             return PResult.Ok(True)
         finally:
-            self.existing_node.node_info.lock_of_succ_infos.release()
-            self.existing_node.node_info.lock_of_pred_info.release()
\ No newline at end of file
+            self.existing_node.node_info.lock_of_succ_infos.release_write()
+            self.existing_node.node_info.lock_of_pred_info.release_write()
\ No newline at end of file
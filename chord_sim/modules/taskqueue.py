@@ -21,7 +21,7 @@ class TaskQueue:
     # 処理が失敗した場合は先頭に戻す
     def exec_first(self):
         if len(self.tqueue) > 0:
-            ChordUtil.dprint("exec_first_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + "," + str(self.tqueue))
+            ChordUtil.dprint(lambda: "exec_first_0," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + "," + str(self.tqueue))
             task_code : str = self.tqueue.pop()
             if task_code == TaskQueue.JOIN_PARTIAL:
                 # try:
@@ -33,7 +33,7 @@ class TaskQueue:
                     # 実行に失敗したため再実行すべく先頭に戻す
                     self.tqueue.insert(0, task_code)
                     ChordUtil.dprint(
-                        "exec_first_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
+                        lambda: "exec_first_1," + ChordUtil.gen_debug_str_of_node(self.existing_node.node_info) + ","
                         + "INTERNAL_CONTROL_FLOW_EXCEPTION_OCCURED")
 
                 # except (InternalControlFlowException, NodeIsDownedExceptiopn):
@@ -0,0 +1,480 @@
+# coding:utf-8
+
+import collections
+import io
+import pickle
+import socket
+import struct
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, cast, OrderedDict
+
+import modules.gval as gval
+from .chord_util import ChordUtil, PResult, ErrorCode, DataIdAndValue, DataChunk, KeyValue
+from .chord_node import ChordNode
+from .node_info import NodeRef
+
+# ノード間の呼び出し(Endpoints のメソッドの呼び出し)をどのように届けるかを切り替えるためのモジュール.
+# gval.transport が None の場合は、全てのノードが同一プロセスの gval.all_node_dict に存在するものとして
+# 直接メソッドを呼び出す(InProcessTransport と同じ動作). 他のプロセスが保持するノードに対しては
+# RemoteChordNode を返し、その endpoints の呼び出しを Transport の実装に応じた方法で保持するプロセスに届ける
+
+# 他のプロセスのノードとの通信が失敗した場合に raise する
+class TransportError(Exception):
+    pass
+
+# プロセス間でやりとりする際に ChordNode オブジェクトの代わりに用いる
+class NodeAddress(NamedTuple):
+    address_str : str
+
+# 他のプロセスが保持するノードを ChordNode と同じように扱うためのプロキシ.
+# ChordUtil.get_node_by_address から返される
+class RemoteChordNode:
+
+    def __init__(self, transport : 'Transport', node_ref : NodeRef):
+        self.transport : 'Transport' = transport
+        self.node_info : RemoteNodeInfo = RemoteNodeInfo(self, node_ref)
+        self.endpoints : RemoteEndpoints = RemoteEndpoints(self)
+
+    @property
+    def is_alive(self) -> bool:
+        return self.transport.is_remote_node_alive(self.node_info.address_str)
+
+    def call(self, method_name : str, args : Tuple[Any, ...]) -> Any:
+        return self.transport.call(self.node_info.address_str, method_name, args)
+
+# 他のプロセスのノードの node_info へのアクセスに対応する.
+# 変化しないフィールドはそのまま保持し、経路表は保持するプロセスに問い合わせて取得する
+class RemoteNodeInfo:
+
+    def __init__(self, remote_node : RemoteChordNode, node_ref : NodeRef):
+        self.remote_node : RemoteChordNode = remote_node
+        self.node_id : int = node_ref.node_id
+        self.address_str : str = node_ref.address_str
+        self.born_id : int = node_ref.born_id
+
+    def get_ref(self) -> NodeRef:
+        return NodeRef(self.node_id, self.address_str, self.born_id)
+
+    @property
+    def successor_info_list(self) -> List[NodeRef]:
+        return self.remote_node.call("grpc__pass_successor_list", ())
+
+    @property
+    def predecessor_info(self) -> Optional[NodeRef]:
+        return self.remote_node.call("grpc__pass_predecessor_info", ())
+
+# 他のプロセスのノードの endpoints へのアクセスに対応する.
+# grpc__ で始まるメソッドの呼び出しを保持するプロセスへの要求に変換する.
+# 戻り値が PResult であるメソッドの呼び出しで通信に失敗した場合は、TransportError の代わりに
+# ノードがダウンしていたことを示す PResult を返す. それ以外のメソッドでは TransportError が raise されるため、
+# 呼び出し元の処理の単位で捕捉すること
+class RemoteEndpoints:
+
+    # 戻り値が PResult である Endpoints のメソッドの名前
+    PRESULT_METHOD_NAMES = frozenset(["grpc__find_successor", "grpc__stabilize_successor_inner",
+                                      "grpc__stabilize_successor_inner_with_succ_list", "grpc__check_predecessor",
+                                      "grpc__check_successor_list_length"])
+
+    def __init__(self, remote_node : RemoteChordNode):
+        self.remote_node : RemoteChordNode = remote_node
+
+    def __getattr__(self, method_name : str) -> Callable[..., Any]:
+        if not method_name.startswith("grpc__"):
+            raise AttributeError(method_name)
+        if method_name in RemoteEndpoints.PRESULT_METHOD_NAMES:
+            return lambda *args: self.call_returning_presult(method_name, args)
+        return lambda *args: self.remote_node.call(method_name, args)
+
+    def call_returning_presult(self, method_name : str, args : Tuple[Any, ...]) -> PResult[Any]:
+        try:
+            return self.remote_node.call(method_name, args)
+        except TransportError as e:
+            ChordUtil.dprint(lambda: "call_returning_presult_1,TRANSPORT_ERROR," + self.remote_node.node_info.address_str + ","
+                             + method_name + "," + str(e))
+            return PResult.Err(None, ErrorCode.NodeIsDownedException_CODE)
+
+# 他のプロセスのノードについて、プロキシと最後に確認した生存状態をまとめて保持する
+class PeerHandle:
+
+    def __init__(self):
+        # まだプロキシを必要としておらず、生存状態のみを保持している場合は None
+        self.remote_node : Optional[RemoteChordNode] = None
+        # 未確認の場合は None
+        self.is_alive : Optional[bool] = None
+
+# Transport の実装の基底クラス.
+# 自プロセスが保持するノードかの判定と、他のプロセスのノードへの呼び出しの方法をサブクラスで実装する.
+# 他のプロセスのノードのプロキシと生存状態は、最近使われた gval.PEER_HANDLE_CACHE_SIZE 個を保持しておき、
+# 経路の探索やレプリカの配布で get_node_by_address が呼ばれる度には生存確認を行わない.
+# 生存状態は stabilize処理 から呼ばれる ChordUtil.is_node_alive で refresh_liveness により更新する.
+# ダウンしていたノードと呼び出しに失敗したノードは、次に refresh_liveness で生存が確認されるまでダウンしているものとして
+# 保持し、その間に get_node_by_address が呼ばれても問い合わせは行わない
+class Transport(ABC):
+
+    def __init__(self):
+        # アドレスをキーとし、他のプロセスのノードの PeerHandle を値とする. 末尾ほど最近使われたもの
+        self.peer_handle_dict : OrderedDict[str, PeerHandle] = collections.OrderedDict()
+        self.lock_of_peer_handle_dict : threading.Lock = threading.Lock()
+
+    @abstractmethod
+    def is_owned(self, address : str) -> bool:
+        pass
+
+    # address のノードに対して method_name の Endpoints のメソッドを args を引数として呼び出し、結果を返す
+    @abstractmethod
+    def call(self, address : str, method_name : str, args : Tuple[Any, ...]) -> Any:
+        pass
+
+    # 他のプロセスのノードの生存を実際に問い合わせて確認する
+    @abstractmethod
+    def probe_liveness(self, address : str) -> bool:
+        pass
+
+    # 他のプロセスのノードの NodeRef を得る
+    @abstractmethod
+    def fetch_node_ref(self, address : str) -> NodeRef:
+        pass
+
+    # 他のプロセスのノードについて、存在と生存を確認した上でプロキシを返す
+    @abstractmethod
+    def get_remote_node_by_address(self, address : str) -> PResult[Optional['ChordNode']]:
+        pass
+
+    def get_node_by_address(self, address : str) -> PResult[Optional['ChordNode']]:
+        if self.is_owned(address):
+            return ChordUtil.get_local_node_by_address(address)
+        return self.get_remote_node_by_address(address)
+
+    def get_peer_handle(self, address : str) -> Optional[PeerHandle]:
+        with self.lock_of_peer_handle_dict:
+            peer_handle = self.peer_handle_dict.get(address)
+            if peer_handle != None:
+                self.peer_handle_dict.move_to_end(address)
+            return peer_handle
+
+    # address の PeerHandle を返す. 保持していなければ生成してキャッシュに加える
+    # 必要なロックは呼び出し元でとってある前提
+    def get_or_add_peer_handle(self, address : str) -> PeerHandle:
+        peer_handle = self.peer_handle_dict.get(address)
+        if peer_handle != None:
+            self.peer_handle_dict.move_to_end(address)
+            return cast(PeerHandle, peer_handle)
+        new_handle = PeerHandle()
+        self.peer_handle_dict[address] = new_handle
+        while len(self.peer_handle_dict) > gval.PEER_HANDLE_CACHE_SIZE:
+            self.peer_handle_dict.popitem(last=False)
+        return new_handle
+
+    def get_remote_node(self, address : str) -> RemoteChordNode:
+        peer_handle = self.get_peer_handle(address)
+        if peer_handle != None and cast(PeerHandle, peer_handle).remote_node != None:
+            return cast(RemoteChordNode, cast(PeerHandle, peer_handle).remote_node)
+        new_remote_node = RemoteChordNode(self, self.fetch_node_ref(address))
+        with self.lock_of_peer_handle_dict:
+            peer_handle = self.get_or_add_peer_handle(address)
+            if peer_handle.remote_node == None:
+                peer_handle.remote_node = new_remote_node
+            return cast(RemoteChordNode, peer_handle.remote_node)
+
+    # キャッシュしている生存状態を返す. 未確認の場合のみ問い合わせる
+    def is_remote_node_alive(self, address : str) -> bool:
+        peer_handle = self.get_peer_handle(address)
+        if peer_handle != None and cast(PeerHandle, peer_handle).is_alive != None:
+            return cast(bool, cast(PeerHandle, peer_handle).is_alive)
+        return self.refresh_liveness(address)
+
+    # 生存を問い合わせてキャッシュしている生存状態を更新し、結果を返す.
+    # PeerHandle を保持していなければ生成し、以降の get_node_by_address で改めて問い合わせないようにする
+    def refresh_liveness(self, address : str) -> bool:
+        if self.is_owned(address):
+            return True
+        is_alive = self.probe_liveness(address)
+        with self.lock_of_peer_handle_dict:
+            self.get_or_add_peer_handle(address).is_alive = is_alive
+        return is_alive
+
+    # 呼び出しに失敗したノードを、次に refresh_liveness で生存が確認されるまでダウンしているものとする
+    def mark_peer_down(self, address : str):
+        with self.lock_of_peer_handle_dict:
+            self.get_or_add_peer_handle(address).is_alive = False
+
+    # ChordNode オブジェクトは NodeAddress に置き換えて送る
+    def marshal(self, obj : Any) -> Any:
+        if isinstance(obj, (ChordNode, RemoteChordNode)):
+            return NodeAddress(obj.node_info.address_str)
+        if isinstance(obj, PResult):
+            return PResult(self.marshal(obj.result), obj.is_ok, err_code=obj.err_code)
+        if isinstance(obj, list):
+            return [self.marshal(elem) for elem in obj]
+        if type(obj) == tuple:
+            return tuple(self.marshal(elem) for elem in obj)
+        return obj
+
+    def unmarshal(self, obj : Any) -> Any:
+        if isinstance(obj, NodeAddress):
+            if self.is_owned(obj.address_str):
+                return gval.all_node_dict[obj.address_str]
+            return self.get_remote_node(obj.address_str)
+        if isinstance(obj, PResult):
+            return PResult(self.unmarshal(obj.result), obj.is_ok, err_code=obj.err_code)
+        if isinstance(obj, list):
+            return [self.unmarshal(elem) for elem in obj]
+        if type(obj) == tuple:
+            return tuple(self.unmarshal(elem) for elem in obj)
+        return obj
+
+# 従来通り、全てのノードを同一プロセス内のものとして直接呼び出す.
+# 全てのノードを自プロセスが保持するものとするため、プロキシが生成されることはない
+class InProcessTransport(Transport):
+
+    def is_owned(self, address : str) -> bool:
+        return True
+
+    def call(self, address : str, method_name : str, args : Tuple[Any, ...]) -> Any:
+        return getattr(gval.all_node_dict[address].endpoints, method_name)(*args)
+
+    def probe_liveness(self, address : str) -> bool:
+        node = gval.all_node_dict.get(address)
+        return node != None and cast(ChordNode, node).is_alive
+
+    def fetch_node_ref(self, address : str) -> NodeRef:
+        return gval.all_node_dict[address].node_info.get_ref()
+
+    def get_remote_node_by_address(self, address : str) -> PResult[Optional['ChordNode']]:
+        return ChordUtil.get_local_node_by_address(address)
+
+# フレームのヘッダ: ペイロード長(4byte), 要求の通番(8byte), 種別(1byte)
+FRAME_HEADER = struct.Struct("!IQB")
+FRAME_TYPE_REQUEST = 0
+FRAME_TYPE_RESPONSE = 1
+FRAME_TYPE_ERROR = 2
+
+# フレームのペイロードの復元に用いる Unpickler.
+# pickle は復元の際に任意のクラスの生成や関数の呼び出しを行わせることができるため、他のプロセスから受け取った
+# バイト列の復元で生成できるクラスを、ノード間の呼び出しの引数と戻り値に現れるものに限る.
+# 組み込みの型(int, str, list, tuple, dict, None など)はクラスの参照を介さずに復元されるため、制限の対象外となる
+class RestrictedUnpickler(pickle.Unpickler):
+
+    ALLOWED_CLASSES = frozenset((cls.__module__, cls.__qualname__)
+                                for cls in [NodeRef, NodeAddress, PResult, DataIdAndValue, DataChunk, KeyValue])
+
+    def find_class(self, module : str, name : str) -> Any:
+        if (module, name) not in RestrictedUnpickler.ALLOWED_CLASSES:
+            raise pickle.UnpicklingError("class is not allowed: " + module + "." + name)
+        return super().find_class(module, name)
+
+def send_frame(sock : socket.socket, req_id : int, frame_type : int, payload : Any):
+    body = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(FRAME_HEADER.pack(len(body), req_id, frame_type) + body)
+
+def recv_exactly(sock : socket.socket, size : int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if len(chunk) == 0:
+            raise TransportError("connection closed")
+        buf += chunk
+    return bytes(buf)
+
+# 受け取ったフレームを (要求の通番, 種別, ペイロード) として返す.
+# ペイロードを復元できなかった場合は TransportError を raise し、呼び出し元に接続を閉じさせる
+def recv_frame(sock : socket.socket) -> Tuple[int, int, Any]:
+    body_len, req_id, frame_type = FRAME_HEADER.unpack(recv_exactly(sock, FRAME_HEADER.size))
+    body = recv_exactly(sock, body_len)
+    try:
+        return req_id, frame_type, RestrictedUnpickler(io.BytesIO(body)).load()
+    except Exception as e:
+        raise TransportError("invalid frame: " + repr(e))
+
+# 他のプロセスへの永続的なTCP接続.
+# 要求は応答を待たずに続けて送ることができ(パイプライン化)、応答は要求の通番で対応付ける.
+# 応答の受信は接続ごとのスレッドで行い、応答を待っているスレッドを起床させる
+class TcpConnection:
+
+    def __init__(self, endpoint : Tuple[str, int]):
+        self.sock : socket.socket = socket.create_connection(endpoint, timeout=gval.TCP_RPC_TIMEOUT_SEC)
+        self.sock.settimeout(None)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.lock_of_send : threading.Lock = threading.Lock()
+        self.lock_of_pending : threading.Lock = threading.Lock()
+        self.next_req_id : int = 0
+        # 要求の通番をキーとし、[応答の到着を通知するEvent, 種別, ペイロード] を値とする
+        self.pending_dict : Dict[int, List[Any]] = {}
+        self.is_closed : bool = False
+        self.receiver_thread : threading.Thread = threading.Thread(target=self.receive_loop_th, daemon=True)
+        self.receiver_thread.start()
+
+    def call(self, address : str, method_name : str, args : Any) -> Any:
+        waiter : List[Any] = [threading.Event(), FRAME_TYPE_ERROR, "connection closed"]
+        with self.lock_of_pending:
+            if self.is_closed:
+                raise TransportError("connection closed")
+            req_id = self.next_req_id
+            self.next_req_id += 1
+            self.pending_dict[req_id] = waiter
+        try:
+            with self.lock_of_send:
+                send_frame(self.sock, req_id, FRAME_TYPE_REQUEST, (address, method_name, args))
+        except OSError as e:
+            self.close()
+            raise TransportError(str(e))
+        if waiter[0].wait(timeout=gval.TCP_RPC_TIMEOUT_SEC) == False:
+            with self.lock_of_pending:
+                self.pending_dict.pop(req_id, None)
+            raise TransportError("rpc timeout: " + method_name)
+        if waiter[1] == FRAME_TYPE_ERROR:
+            raise TransportError(waiter[2])
+        return waiter[2]
+
+    def is_idle(self) -> bool:
+        with self.lock_of_pending:
+            return len(self.pending_dict) == 0
+
+    def receive_loop_th(self):
+        try:
+            while True:
+                req_id, frame_type, payload = recv_frame(self.sock)
+                with self.lock_of_pending:
+                    waiter = self.pending_dict.pop(req_id, None)
+                if waiter != None:
+                    waiter[1] = frame_type
+                    waiter[2] = payload
+                    waiter[0].set()
+        except (OSError, TransportError):
+            self.close()
+
+    # 接続を閉じ、応答を待っている全ての要求を失敗させる
+    def close(self):
+        with self.lock_of_pending:
+            self.is_closed = True
+            waiters = list(self.pending_dict.values())
+            self.pending_dict.clear()
+        for waiter in waiters:
+            waiter[0].set()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+# TCPでノード間の呼び出しを届ける.
+# 各プロセスは自身が保持するノードへの要求を listen_sock で受け付け、他のプロセスのノードへの要求は
+# 保持するプロセスへの永続的な接続を用いて送る. 受け付けた要求はスレッドプールで処理するため、
+# 処理中に他のプロセスへの呼び出しが入れ子になってもデッドロックしない
+class TcpTransport(Transport):
+
+    def __init__(self, listen_sock : socket.socket, endpoint_dict : Dict[str, Tuple[str, int]]):
+        super().__init__()
+        self.listen_sock : socket.socket = listen_sock
+        self.my_endpoint : Tuple[str, int] = listen_sock.getsockname()
+        # ノードのアドレスをキーとし、保持するプロセスの (ホスト, ポート) を値とする
+        self.endpoint_dict : Dict[str, Tuple[str, int]] = endpoint_dict
+        # (ホスト, ポート) をキーとし、そのプロセスへの接続を値とする. 末尾ほど最近使われたもの
+        self.conn_dict : OrderedDict[Tuple[str, int], TcpConnection] = collections.OrderedDict()
+        self.lock_of_conn_dict : threading.Lock = threading.Lock()
+        self.executor : ThreadPoolExecutor = ThreadPoolExecutor(max_workers=gval.TCP_RPC_SERVER_THREAD_NUM)
+        self.accept_thread : threading.Thread = threading.Thread(target=self.accept_loop_th, daemon=True)
+        self.accept_thread.start()
+
+    def is_owned(self, address : str) -> bool:
+        return self.endpoint_dict.get(address) == self.my_endpoint
+
+    # endpoint への接続を返す. 接続は最近使われた gval.TCP_CONNECTION_POOL_SIZE 個まで保持し、
+    # 超えた場合は応答待ちの要求が無いもののうち最も使われていないものを閉じる
+    def get_connection(self, endpoint : Tuple[str, int]) -> TcpConnection:
+        with self.lock_of_conn_dict:
+            conn = self.conn_dict.get(endpoint)
+            if conn != None and not cast(TcpConnection, conn).is_closed:
+                self.conn_dict.move_to_end(endpoint)
+                return cast(TcpConnection, conn)
+            try:
+                conn = TcpConnection(endpoint)
+            except OSError as e:
+                raise TransportError(str(e))
+            self.conn_dict[endpoint] = conn
+            for old_endpoint, old_conn in list(self.conn_dict.items()):
+                if len(self.conn_dict) <= gval.TCP_CONNECTION_POOL_SIZE:
+                    break
+                if old_conn.is_closed or old_conn.is_idle():
+                    old_conn.close()
+                    del self.conn_dict[old_endpoint]
+            return cast(TcpConnection, conn)
+
+    def call(self, address : str, method_name : str, args : Tuple[Any, ...]) -> Any:
+        endpoint = self.endpoint_dict[address]
+        try:
+            result = self.get_connection(endpoint).call(address, method_name, self.marshal(args))
+        except TransportError:
+            # 通信できなかったノードは、stabilize処理 で生存が確認されるまで利用しない
+            self.mark_peer_down(address)
+            raise
+        return self.unmarshal(result)
+
+    def probe_liveness(self, address : str) -> bool:
+        if address not in self.endpoint_dict:
+            return False
+        try:
+            return self.call(address, "grpc__is_alive", ())
+        except TransportError:
+            return False
+
+    def fetch_node_ref(self, address : str) -> NodeRef:
+        return self.call(address, "grpc__pass_node_info", ())
+
+    def get_remote_node_by_address(self, address : str) -> PResult[Optional['ChordNode']]:
+        if address not in self.endpoint_dict:
+            return PResult.Err(None, ErrorCode.InternalControlFlowException_CODE)
+        # 生存状態はキャッシュしているものを用い、呼び出しの度には問い合わせない
+        if self.is_remote_node_alive(address) == False:
+            ChordUtil.dprint(lambda: "get_remote_node_by_address_1,NODE_IS_DOWNED," + address)
+            return PResult.Err(None, ErrorCode.NodeIsDownedException_CODE)
+        try:
+            return PResult.Ok(cast('ChordNode', self.get_remote_node(address)))
+        except TransportError:
+            return PResult.Err(None, ErrorCode.NodeIsDownedException_CODE)
+
+    def accept_loop_th(self):
+        while True:
+            try:
+                sock, _ = self.listen_sock.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self.serve_connection_th, args=(sock,), daemon=True).start()
+
+    # 1つの接続で届く要求を順に受け取り、スレッドプールで処理させる.
+    # 応答は処理が終わった順に返すため、要求の順序とは一致しない場合がある
+    def serve_connection_th(self, sock : socket.socket):
+        lock_of_send = threading.Lock()
+        try:
+            while True:
+                req_id, _, payload = recv_frame(sock)
+                self.executor.submit(self.handle_request, sock, lock_of_send, req_id, payload)
+        except (OSError, TransportError):
+            sock.close()
+
+    def handle_request(self, sock : socket.socket, lock_of_send : threading.Lock, req_id : int, payload : Any):
+        address, method_name, args = payload
+        try:
+            node = gval.all_node_dict[address]
+            result = getattr(node.endpoints, method_name)(*self.unmarshal(args))
+            frame_type, body = FRAME_TYPE_RESPONSE, self.marshal(result)
+        except Exception as e:
+            frame_type, body = FRAME_TYPE_ERROR, method_name + "," + repr(e)
+        try:
+            with lock_of_send:
+                send_frame(sock, req_id, frame_type, body)
+        except OSError:
+            pass
+
+    def shutdown(self):
+        try:
+            self.listen_sock.close()
+        except OSError:
+            pass
+        with self.lock_of_conn_dict:
+            for conn in self.conn_dict.values():
+                conn.close()
+            self.conn_dict.clear()
+        self.executor.shutdown(wait=False)